@@ -6,6 +6,8 @@ import seaborn as sns
 import warnings
 import os
 import traceback
+from province import resolve_province_series
+from table_cache import read_table
 warnings.filterwarnings('ignore')
 
 # 设置中文字体
@@ -32,7 +34,7 @@ def read_govfund_data(file_path='govfund_filtered.xlsx'):
             return None
             
         # 尝试读取Excel文件
-        df = pd.read_excel(file_path)
+        df = read_table(file_path)
         print(f"成功读取文件: {file_path}")
         print(f"数据形状: {df.shape}")
         print(f"列名: {list(df.columns)}")
@@ -118,7 +120,7 @@ def analyze_fund_establishment_by_year_province(df):
         
         # 处理省份信息
         try:
-            df['省份'] = df[province_col].apply(lambda x: x.split('|')[1] if '|' in str(x) else str(x))
+            df['省份'] = resolve_province_series(df[province_col], to='stat').fillna(df[province_col].astype(str))
             print("省份信息处理完成")
         except Exception as e:
             print(f"处理省份信息时出错: {e}")
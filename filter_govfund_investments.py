@@ -1,6 +1,8 @@
 import pandas as pd
 import os
 import warnings
+from province import province_name
+from table_cache import read_table
 warnings.filterwarnings('ignore')
 
 def filter_govfund_investments():
@@ -17,7 +19,7 @@ def filter_govfund_investments():
         
         # 1. 读取政府投资基金数据
         print("\n1. 读取政府投资基金数据...")
-        govfund_df = pd.read_excel('govfund_filtered.xlsx')
+        govfund_df = read_table('govfund_filtered.xlsx')
         print(f"   govfund_filtered.xlsx 形状: {govfund_df.shape}")
         
         # 提取基金简称列表
@@ -27,7 +29,7 @@ def filter_govfund_investments():
         
         # 2. 读取投资数据
         print("\n2. 读取投资数据...")
-        invest_df = pd.read_excel('invest.xlsx')
+        invest_df = read_table('invest.xlsx')
         print(f"   invest.xlsx 形状: {invest_df.shape}")
         
         # 检查基金名称列
@@ -131,7 +133,7 @@ def analyze_investments_by_province_year():
         
         # 读取政府投资基金投资数据
         print("\n1. 读取政府投资基金投资数据...")
-        df = pd.read_excel('govfund_analysis_results.xlsx', sheet_name='分省政府投资基金')
+        df = read_table('govfund_analysis_results.xlsx', sheet_name='分省政府投资基金')
         print(f"   数据形状: {df.shape}")
         
         # 检查必要的列
@@ -147,16 +149,7 @@ def analyze_investments_by_province_year():
         
         # 处理地区列 - 提取省份信息
         def extract_province(region):
-            if pd.isna(region):
-                return '未知'
-            
-            region_str = str(region)
-            # 常见的省份后缀
-            suffixes = ['省', '市', '自治区', '特别行政区']
-            for suffix in suffixes:
-                if region_str.endswith(suffix):
-                    return region_str[:-len(suffix)]
-            return region_str
+            return province_name(region, style='short') or '未知'
         
         # 处理投资时间列 - 提取年份
         def extract_year(investment_time):
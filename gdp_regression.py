@@ -6,6 +6,7 @@ from sklearn.metrics import r2_score, mean_squared_error
 import warnings
 import os
 import traceback
+from table_cache import read_table
 warnings.filterwarnings('ignore')
 
 def read_gdp_data(file_path='gdp.xlsx'):
@@ -19,7 +20,7 @@ def read_gdp_data(file_path='gdp.xlsx'):
             print(f"错误: GDP文件不存在 - {file_path}")
             return None
             
-        df = pd.read_excel(file_path)
+        df = read_table(file_path)
         print(f"成功读取GDP文件: {file_path}")
         print(f"GDP数据形状: {df.shape}")
         print(f"GDP列名: {list(df.columns)}")
@@ -60,7 +61,7 @@ def read_fund_results(file_path='govfund_analysis_results.xlsx'):
             
         # 检查sheet是否存在
         try:
-            df = pd.read_excel(file_path, sheet_name='年份省份统计')
+            df = read_table(file_path, sheet_name='年份省份统计')
             print(f"成功读取基金分析结果: {file_path}")
             print(f"基金数据形状: {df.shape}")
             print(f"基金列名: {list(df.columns)}")
@@ -6,6 +6,7 @@ from sklearn.linear_model import LinearRegression
 from sklearn.metrics import r2_score, mean_squared_error
 import statsmodels.api as sm
 import warnings
+from table_cache import read_table
 warnings.filterwarnings('ignore')
 
 # 设置中文字体
@@ -23,7 +24,7 @@ def read_gdp_data(file_path='gdp.xlsx'):
         pandas.DataFrame: GDP数据
     """
     try:
-        df = pd.read_excel(file_path)
+        df = read_table(file_path)
         print(f"成功读取GDP文件: {file_path}")
         print(f"GDP数据形状: {df.shape}")
         print(f"GDP列名: {list(df.columns)}")
@@ -48,7 +49,7 @@ def read_govfund_analysis_results(file_path='govfund_analysis_results.xlsx'):
     """
     try:
         # 读取年份省份统计sheet
-        df = pd.read_excel(file_path, sheet_name='年份省份统计')
+        df = read_table(file_path, sheet_name='年份省份统计')
         print(f"成功读取基金分析结果: {file_path}")
         print(f"基金数据形状: {df.shape}")
         print(f"基金列名: {list(df.columns)}")
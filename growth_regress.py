@@ -4,8 +4,15 @@ import statsmodels.api as sm
 from statsmodels.regression.linear_model import OLS
 from linearmodels.panel import PanelOLS
 import os
+import sys
 import traceback
 import warnings
+from province import resolve_province_series
+from table_cache import read_table
+
+# 添加patent_analysis目录到Python路径（回归结果缓存）
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'patent_analysis'))
+from result_cache import cached_fit
 warnings.filterwarnings('ignore')
 
 def check_required_files():
@@ -34,7 +41,7 @@ def check_required_files():
 def read_urban():
     """读取城镇化率数据"""
     try:
-        df = pd.read_excel('2000-2023年各省份城镇化水平.xlsx',sheet_name='原始版本',index_col=0)
+        df = read_table('2000-2023年各省份城镇化水平.xlsx',sheet_name='原始版本',index_col=0)
         df.columns = df.columns.astype(str)
         print(f"✓ 成功读取城镇化率数据")
         print(f"  数据形状: {df.shape}")
@@ -61,7 +68,7 @@ def read_fixed_invest():
         sheet_name = '总数据'
         print(f"  使用Sheet: {sheet_name}")
         
-        df = pd.read_excel(file_path, sheet_name=sheet_name)
+        df = read_table(file_path, sheet_name=sheet_name)
         print(f"  数据形状: {df.shape}")
         print(f"  列名: {list(df.columns)}")
     
@@ -84,7 +91,7 @@ def read_gdp_data():
     """读取GDP数据文件"""
     try:
         print("正在读取GDP数据文件...")
-        df = pd.read_excel('gdp.xlsx')
+        df = read_table('gdp.xlsx')
         print(f"✓ 成功读取GDP文件")
         print(f"  数据形状: {df.shape}")
         print(f"  列名: {list(df.columns)}")
@@ -129,7 +136,7 @@ def read_fund_data():
     """读取基金分析结果文件"""
     try:
         print("\n正在读取基金分析结果文件...")
-        df = pd.read_excel('govfund_analysis_results.xlsx',sheet_name='年份省份统计')
+        df = read_table('govfund_analysis_results.xlsx',sheet_name='年份省份统计')
         print(f"✓ 成功读取基金分析结果文件")
         print(f"  数据形状: {df.shape}")
         print(f"  列名: {list(df.columns)}")
@@ -174,7 +181,7 @@ def read_employment_data():
     """读取就业人口数据文件"""
     try:
         print("\n正在读取就业人口数据文件...")
-        df = pd.read_excel('就业人口.xlsx')
+        df = read_table('就业人口.xlsx')
         print(f"✓ 成功读取就业人口数据文件")
         print(f"  数据形状: {df.shape}")
         print(f"  列名: {list(df.columns)}")
@@ -219,7 +226,7 @@ def read_investment_detail_data():
     """读取省份年份投资详情数据文件"""
     try:
         print("\n正在读取省份年份投资详情数据...")
-        df = pd.read_excel('govfund_analysis_results.xlsx', sheet_name='省份年份投资详情')
+        df = read_table('govfund_analysis_results.xlsx', sheet_name='省份年份投资详情')
         print(f"✓ 成功读取投资详情数据")
         print(f"  数据形状: {df.shape}")
         print(f"  列名: {list(df.columns)}")
@@ -257,23 +264,112 @@ def read_investment_detail_data():
         traceback.print_exc()
         return None
 
-def get_fund(province, year, df):
-    """根据省份和年份获取基金数量"""
-    try:
-        for idx, row in df.iterrows():
-            if row['省份'] == province and row['成立年份'] == year:
-                return row['基金数量']
-        
-        # 如果没有找到匹配的数据
-        # print(f"  警告: 未找到 {province} 在 {year} 年的基金数据")
-        return 0  # 返回0而不是None，避免后续错误
-        
-    except Exception as e:
-        print(f"  错误: 在查找基金数据时发生异常: {e}")
-        return 0
+# 面板年份范围（不含两端）
+PANEL_YEAR_RANGE = (2008, 2023)
 
-def regress():
-    """执行回归分析"""
+def index_by_province_year(df, province_col, year_col, value_col, name=None):
+    """
+    把数据表转换为以规范(省份代码, 年份)为索引的一列数据
+    省份名称的不同写法（如'广东'、'广东省'）解析为同一个行政区划代码；同一(省份, 年份)有多行时取第一行
+    
+    参数:
+    df: 数据表
+    province_col: 省份列名
+    year_col: 年份列名
+    value_col: 数值列名
+    name: 结果列名，默认与value_col相同
+    
+    返回:
+    以(province_code, year)为索引的Series，省份或年份无法解析的行被丢弃
+    """
+    name = name or value_col
+    keyed = pd.DataFrame({
+        'province_code': resolve_province_series(df[province_col]).to_numpy(),
+        'year': pd.to_numeric(df[year_col], errors='coerce').to_numpy(),
+        name: df[value_col].to_numpy(),
+    })
+    keyed = keyed.dropna(subset=['province_code', 'year'])
+    keyed = keyed.astype({'province_code': 'int64', 'year': 'int64'})
+    keyed = keyed.drop_duplicates(['province_code', 'year'])
+    return keyed.set_index(['province_code', 'year'])[name]
+
+def urban_by_province_year(urban_df):
+    """城镇化率宽表（行为省份简称，列为年份）转换为以(省份代码, 年份)为索引的一列数据"""
+    year_columns = [col for col in urban_df.columns if str(col).isdigit()]
+    urban_long = urban_df[year_columns].rename_axis('省份').reset_index().melt(
+        id_vars='省份', var_name='年份', value_name='城镇化率')
+    return index_by_province_year(urban_long, '省份', '年份', '城镇化率')
+
+def build_panel(gdp_df, investment_detail_df, urban_df, investment_df, investment_col, employment_df):
+    """
+    组装省份×年份回归面板
+    各数据表先转换为以规范(省份代码, 年份)为索引的一列，再按GDP数据的键一次性索引连接；
+    每张表缺失的(省份, 年份)由反连接找出并汇总报告。
+    缺少投资笔数、固定资产投资、就业人员时记为0；缺少城镇化率的记录不进入面板
+    
+    参数:
+    gdp_df: GDP数据（年份、省级、人均地区生产总值/元）
+    investment_detail_df: 省份年份投资详情（省份、年份、投资笔数）
+    urban_df: 城镇化率宽表（见read_urban）
+    investment_df: 固定资产投资数据（地区、年份、investment_col）
+    investment_col: 固定资产投资数值列名
+    employment_df: 就业人口数据（省份名称、年度标识、就业人员）
+    
+    返回:
+    (以(province, year)为索引的面板DataFrame, {数据名: 缺失的(province, year)记录DataFrame})
+    """
+    in_range = gdp_df[(gdp_df['年份'] > PANEL_YEAR_RANGE[0]) & (gdp_df['年份'] < PANEL_YEAR_RANGE[1])]
+    valid = in_range.dropna(subset=['人均地区生产总值/元', '省级', '年份'])
+    print(f"  总记录数: {len(in_range)}")
+    if len(valid) < len(in_range):
+        print(f"  跳过包含空值的记录: {len(in_range) - len(valid)}")
+    
+    panel = pd.DataFrame({
+        'province': valid['省级'].to_numpy(),
+        'year': valid['年份'].to_numpy(),
+        '人均GDP': valid['人均地区生产总值/元'].to_numpy(),
+    })
+    # 无法解析的省份记为-1，在各数据表中都找不到
+    keys = pd.MultiIndex.from_arrays([
+        resolve_province_series(valid['省级']).fillna(-1).astype('int64').to_numpy(),
+        valid['年份'].astype('int64').to_numpy(),
+    ])
+    
+    sources = [
+        ('投资笔数', index_by_province_year(investment_detail_df, '省份', '年份', '投资笔数'), 0),
+        ('城镇化率', urban_by_province_year(urban_df), None),
+        ('固定资产投资', index_by_province_year(investment_df, '地区', '年份', investment_col, '固定资产投资'), 0),
+        ('就业人员', index_by_province_year(employment_df, '省份名称', '年度标识', '就业人员'), 0),
+    ]
+    
+    missing = {}
+    keep = np.ones(len(panel), dtype=bool)
+    for name, values, default in sources:
+        found = keys.isin(values.index)
+        panel[name] = values.reindex(keys).to_numpy()
+        if found.all():
+            continue
+        missing[name] = panel.loc[~found, ['province', 'year']].reset_index(drop=True)
+        if default is None:
+            keep &= found
+        else:
+            panel.loc[~found, name] = default
+        examples = '、'.join(f"{row.province}{row.year}年"
+                            for row in missing[name].drop_duplicates().head(5).itertuples())
+        print(f"  ⚠️ {name}: {(~found).sum()} 条记录没有对应数据（{'不进入面板' if default is None else f'记为{default}'}），"
+              f"例如: {examples}")
+    
+    panel = panel[keep].set_index(['province', 'year'])
+    print(f"  匹配记录数: {len(panel)}")
+    return panel, missing
+
+def regress(cache=None):
+    """
+    执行回归分析
+    
+    参数:
+    cache: 回归结果缓存，None/False不缓存，True使用默认目录，字符串为缓存目录（见patent_analysis/result_cache.py）
+    """
     try:
         print("=== GDP与投资笔数回归分析 ===")
         print(f"当前工作目录: {os.getcwd()}")
@@ -324,59 +420,10 @@ def regress():
         
         # urban_df = urban_df.rename(columns={'年份': 'year', '省份': 'province', '城镇化率': 'urban_rate'})
         
-        # 执行回归分析
-        print("\n开始执行回归分析...")
-        y = []
-        x = []
-        panel_data = []
-        matched_count = 0
-        total_count = 0
-        
-        for idx, row in gdp_df.iterrows():
-            try:
-                if row['年份'] > 2008 and row['年份'] < 2023:
-                    total_count += 1
-                    pgdp = row['人均地区生产总值/元']
-                    province = row['省级']
-                    year = row['年份']
-                    
-                    # 检查数据有效性
-                    if pd.isna(pgdp) or pd.isna(province) or pd.isna(year):
-                        print(f"  跳过第{idx+1}行: 包含空值")
-                        continue
-                    
-                    # 获取投资笔数（替代基金数量）
-                    investment_count = get_investment_count(province, year, investment_detail_df)
-                    
-                    pos = convert_province(province)
-                    if str(year) not in urban_df.columns:
-                        print('year not in urban_df.columns')
-                    urban_rate = urban_df.loc[pos, str(year)]
-                    
-                    # 获取固定资产投资数据
-                    investment_value = get_investment(province, year, investment_df, investment_col)
-                    
-                    # 获取就业人员数据
-                    employment_value = get_employment(province, year, employment_df)
-                    
-                    matched_count += 1
-
-                    # y.append(pgdp)
-                    # x.append(investment_count)
-                    panel_data.append({'province': province, 'year': year, '人均GDP': pgdp, '投资笔数': investment_count, '城镇化率': urban_rate, '固定资产投资': investment_value, '就业人员': employment_value})
-                    # x.append([investment_count, urban_rate, np.log(investment_value)])
-                        
-            except Exception as e:
-                print(f"  错误: 处理第{idx+1}行数据时发生异常: {e}")
-                continue
-        
-        print(f"\n数据处理完成:")
-        print(f"  总记录数: {total_count}")
-        print(f"  匹配记录数: {matched_count}")
-        print(f"  有效样本数: {len(y)}")
-        
-        panel_df = pd.DataFrame(panel_data)
-        panel_df.set_index(['province', 'year'], inplace=True)
+        # 组装回归面板
+        print("\n开始组装回归面板...")
+        panel_df, _ = build_panel(gdp_df, investment_detail_df, urban_df, investment_df, investment_col, employment_df)
+        
         # 创建数据框
         try:
             x_df = panel_df[['投资笔数','城镇化率','固定资产投资','就业人员']]
@@ -419,7 +466,10 @@ def regress():
             
             model = PanelOLS(y_df, x_df, entity_effects=False, time_effects=True)
     
-            results = model.fit()
+            # 数据和设定未变化时直接读取缓存的回归结果
+            spec = {'model': 'growth_regress.regress', 'dependent': y_df.name, 'regressors': list(x_df.columns),
+                    'entity_effects': False, 'time_effects': True, 'cov_type': 'unadjusted'}
+            results = cached_fit(cache, pd.concat([x_df, y_df], axis=1), spec, model.fit)
             
             print("\n=== 回归分析结果 ===")
             print(results)
@@ -454,66 +504,6 @@ def regress():
         print("详细错误信息:")
         traceback.print_exc()
 
-def convert_province(province):
-    """转换省份名称格式"""
-    if province.endswith('市') or province.endswith('省'):
-        return province[:-1]
-    else:
-        return province
-
-def get_investment(province, year, investment_df, investment_col):
-    """根据省份和年份获取固定资产投资数据"""
-    try:
-        # 转换省份名称格式
-        
-        # 在投资数据中查找匹配
-        for idx, row in investment_df.iterrows():
-            # 检查省份名称是否匹配（支持多种格式）
-            if (province == row['地区'] and year == row['年份']):
-                return row[investment_col]
-        
-        # 如果没有找到匹配的数据
-        print(f"  警告: 未找到 {province} 在 {year} 年的投资数据")
-        return 0  # 返回0而不是None，避免后续错误
-        
-    except Exception as e:
-        print(f"  错误: 在查找投资数据时发生异常: {e}")
-        return 0
-
-def get_employment(province, year, employment_df):
-    """根据省份和年份获取就业人员数据"""
-    try:
-        # 在就业人口数据中查找匹配
-        for idx, row in employment_df.iterrows():
-            # 检查省份名称和年份是否匹配
-            if (province == row['省份名称'] and year == row['年度标识']):
-                return row['就业人员']
-        
-        # 如果没有找到匹配的数据
-        print(f"  警告: 未找到 {province} 在 {year} 年的就业人员数据")
-        return 0  # 返回0而不是None，避免后续错误
-        
-    except Exception as e:
-        print(f"  错误: 在查找就业人员数据时发生异常: {e}")
-        return 0
-
-def get_investment_count(province, year, investment_detail_df):
-    """根据省份和年份获取投资笔数"""
-    try:
-        # 在投资详情数据中查找匹配
-        for idx, row in investment_detail_df.iterrows():
-            # 检查省份名称和年份是否匹配
-            if (province == row['省份'] and year == row['年份']):
-                return row['投资笔数']
-        
-        # 如果没有找到匹配的数据
-        # print(f"  警告: 未找到 {province} 在 {year} 年的投资笔数数据")
-        return 0  # 返回0而不是None，避免后续错误
-        
-    except Exception as e:
-        print(f"  错误: 在查找投资笔数数据时发生异常: {e}")
-        return 0
-
 if __name__ == "__main__":
     try:
         regress()
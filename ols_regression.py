@@ -5,82 +5,46 @@ OLS回归分析脚本
 使用statsmodels进行普通最小二乘回归
 """
 
+import os
+import sys
 import pandas as pd
 import numpy as np
 import statsmodels.api as sm
 from statsmodels.regression.linear_model import OLS
+from table_cache import read_table
 
-def perform_ols_regression():
+# 添加patent_analysis目录到Python路径
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'patent_analysis'))
+from did import build_panel_data
+from result_cache import cached_fit
+
+def perform_ols_regression(cache=None, engine='statsmodels', chunksize=2000):
     """
     执行OLS回归分析
+    
+    参数:
+    cache: 回归结果缓存，None/False不缓存，True使用默认目录，字符串为缓存目录（见patent_analysis/result_cache.py）
+    engine: 'statsmodels'读入全部数据回归；'streaming'分块读取并累加叉积矩阵，不把面板读入内存
+            （只做回归，不输出分组统计和面板数据文件）
+    chunksize: engine='streaming'时每块读取的公司数
     """
     try:
         print("=== 执行OLS回归分析 ===")
         
+        if engine == 'streaming':
+            return perform_streaming_ols_regression(cache, chunksize)
+        
         # 1. 读取数据
         print("1. 读取数据...")
-        df = pd.read_excel('regress_data_with_gdp.xlsx', sheet_name='回归数据')
+        df = read_table('regress_data_with_gdp.xlsx', sheet_name='回归数据')
         print(f"   - 数据行数: {len(df):,}")
         
         # 2. 创建面板数据结构
         print("2. 创建面板数据结构...")
         
-        panel_data = []
-        for idx, row in df.iterrows():
-            company = row['公司名称']
-            investment_year = row['投资年份']
-            treatment = row['treatment']
-            province = row['省份']
-            
-            # 前3年数据 (post=0)
-            for year_offset in range(1, 4):
-                year = investment_year - year_offset
-                if year >= 1992:
-                    patent_count = row[f'前3年专利数_前{year_offset}年']
-                    gdp_value = row[f'前3年GDP_前{year_offset}年']
-                    ln_gdp = row[f'ln_前3年GDP_前{year_offset}年']
-                    
-                    panel_data.append({
-                        'company': company,
-                        'year': year,
-                        'investment_year': investment_year,
-                        'treatment': treatment,
-                        'post': 0,
-                        'patent_count': patent_count,
-                        'ln_patent_plus_1': np.log(patent_count + 1),
-                        'province': province,
-                        'gdp': gdp_value,
-                        'ln_gdp': ln_gdp,
-                        'time_to_investment': year_offset,
-                        'period': 'pre'
-                    })
-            
-            # 后3年数据 (post=1)
-            for year_offset in range(1, 4):
-                year = investment_year + year_offset
-                if year <= 2025:
-                    patent_count = row[f'后3年专利数_后{year_offset}年']
-                    gdp_value = row[f'后3年GDP_后{year_offset}年']
-                    ln_gdp = row[f'ln_后3年GDP_后{year_offset}年']
-                    
-                    panel_data.append({
-                        'company': company,
-                        'year': year,
-                        'investment_year': investment_year,
-                        'treatment': treatment,
-                        'post': 1,
-                        'patent_count': patent_count,
-                        'ln_patent_plus_1': np.log(patent_count + 1),
-                        'province': province,
-                        'gdp': gdp_value,
-                        'ln_gdp': ln_gdp,
-                        'time_to_investment': -year_offset,
-                        'period': 'post'
-                    })
-        
-        # 3. 创建面板数据框
+        # 3. 创建面板数据框（与did.py共用向量化的面板构建）
         print("3. 创建面板数据框...")
-        panel_df = pd.DataFrame(panel_data)
+        panel_df = build_panel_data(df)
         print(f"   - 面板数据行数: {len(panel_df):,}")
         print(f"   - 面板数据列数: {len(panel_df.columns)}")
         
@@ -152,16 +116,18 @@ def perform_ols_regression():
         # 添加常数项
         X_with_constant = sm.add_constant(X)
         
-        # 创建OLS模型
+        # 创建OLS模型（数据和设定未变化时直接读取缓存的回归结果）
         model = OLS(y, X_with_constant)
-        results = model.fit()
+        spec = {'model': 'ols_regression.perform_ols_regression', 'dependent': 'ln_patent_plus_1',
+                'regressors': list(X_with_constant.columns), 'cov_type': 'nonrobust'}
+        results = cached_fit(cache, pd.concat([X_with_constant, y], axis=1), spec, model.fit)
         
         print("   - 回归完成")
         
         # 8. 显示回归结果
         print("\n8. 回归结果:")
         print("=" * 80)
-        print(results.summary())
+        print(results.summary() if callable(results.summary) else results.summary)
         print("=" * 80)
         
         # 9. 关键系数解释
@@ -270,6 +236,48 @@ def perform_ols_regression():
         traceback.print_exc()
         return None
 
+def perform_streaming_ols_regression(cache=None, chunksize=2000, input_file='regress_data_with_gdp.xlsx'):
+    """
+    分块流式OLS：与perform_ols_regression相同的设定（含常数项、常规标准误），逐块累加叉积矩阵
+    
+    返回:
+    与perform_ols_regression相同结构的结果字典（panel_df为None）
+    """
+    from streaming_ols import fit_streaming, panel_chunks
+    from result_cache import file_fingerprint
+    
+    control_vars = ['treatment', 'post', 'treatment_post', 'ln_gdp']
+    print(f"1. 分块读取数据: {input_file} (每块 {chunksize:,} 家公司)")
+    print("2. 分块流式OLS回归...")
+    spec = {'model': 'ols_regression.perform_ols_regression', 'dependent': 'ln_patent_plus_1',
+            'regressors': ['const'] + control_vars, 'cov_type': 'nonrobust', 'engine': 'streaming'}
+    results = cached_fit(cache, file_fingerprint(input_file), spec,
+                         lambda: fit_streaming(panel_chunks(input_file, chunksize), 'ln_patent_plus_1', control_vars,
+                                               add_constant=True, cov_type='unadjusted'))
+    
+    print("\n3. 回归结果:")
+    print("=" * 80)
+    print(results)
+    print("=" * 80)
+    
+    print("\n4. 模型诊断:")
+    print(f"   - R²: {results.rsquared:.4f}")
+    print(f"   - 调整R²: {results.rsquared_adj:.4f}")
+    print(f"   - F统计量: {results.fvalue:.4f}")
+    print(f"   - AIC: {results.aic:.4f}")
+    print(f"   - BIC: {results.bic:.4f}")
+    
+    return {
+        'panel_df': None,
+        'regression_results': results,
+        'did_effect': results.params['treatment_post'],
+        'did_t_value': results.tvalues['treatment_post'],
+        'did_p_value': results.pvalues['treatment_post'],
+        'gdp_effect': results.params['ln_gdp'],
+        'r_squared': results.rsquared,
+        'adj_r_squared': results.rsquared_adj
+    }
+
 if __name__ == "__main__":
     # 执行OLS回归分析
     result = perform_ols_regression()
@@ -1,40 +1,49 @@
+import os
+import sys
 import pandas as pd
 import re
 import numpy as np
 
-def extract_province_from_region(input_file='regress_data.xlsx', output_file=None):
+# 添加项目根目录到Python路径（共享的省份解析模块）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from province import province_name, resolve_province_series
+from table_cache import read_table
+import session_cache
+from excel_export import write_workbook
+
+def extract_province_from_region(input_file='regress_data.xlsx', output_file=None, data=None, save=True):
     """
     读取指定的regress_data文件，找到每个公司在invest的地区列里的省份名，加到该行里
     
     参数:
     input_file: 输入的regress_data文件路径
     output_file: 输出文件路径，如果为None则自动生成
+    data: 上游步骤已在内存中的回归数据（input_file的'回归数据'表），给定时不再读取input_file
+    save: 是否立即写出Excel文件；为False时返回结果中的'write'为写出文件的函数
     """
     try:
         print("=== 提取公司所在省份信息 ===")
         
         # 1. 读取patent_investment_timeline数据
-        print(f"1. 读取{input_file}数据...")
-        timeline_df = pd.read_excel(input_file, sheet_name='回归数据')
+        if data is not None:
+            print(f"1. 使用内存中的{input_file}数据...")
+            timeline_df = data
+        else:
+            print(f"1. 读取{input_file}数据...")
+            timeline_df = read_table(input_file, sheet_name='回归数据')
         print(f"   - 数据行数: {len(timeline_df):,}")
         
         # 2. 读取invest_with_treatment数据
         print("2. 读取invest数据...")
-        invest_df = pd.read_excel('invest.xlsx', sheet_name='有专利公司首次投资')
+        invest_df = session_cache.read_excel('invest.xlsx', sheet_name='有专利公司首次投资')
         print(f"   - 投资数据行数: {len(invest_df):,}")
         
         # 3. 创建公司名称到省份的映射
         print("3. 创建公司名称到省份的映射...")
-        company_province_map = {}
-        
-        for idx, row in invest_df.iterrows():
-            company_name = row['融资主体']
-            region = row['地区']
-            
-            # 从地区列提取省份名
-            province = extract_province(region)
-            if province:
-                company_province_map[company_name] = province
+        # 从地区列提取省份名（按去重后的地区取值解析）
+        provinces = resolve_province_series(invest_df['地区'], to='stat')
+        has_province = provinces.notna()
+        company_province_map = dict(zip(invest_df.loc[has_province, '融资主体'], provinces[has_province]))
         
         print(f"   - 成功提取省份信息的公司数: {len(company_province_map):,}")
         
@@ -73,13 +82,10 @@ def extract_province_from_region(input_file='regress_data.xlsx', output_file=Non
         else:
             output_filename = output_file
         
-        with pd.ExcelWriter(output_filename, engine='openpyxl') as writer:
-            timeline_df.to_excel(writer, sheet_name='投资前后专利数据', index=False)
-            
+        def write():
             # 创建汇总统计sheet
             summary_stats = timeline_df.describe()
-            summary_stats.to_excel(writer, sheet_name='数据统计')
-            
+        
             # 按年份统计
             yearly_stats = timeline_df.groupby('投资年份').agg({
                 '前3年专利总数': 'mean',
@@ -87,8 +93,7 @@ def extract_province_from_region(input_file='regress_data.xlsx', output_file=Non
                 '专利增长率': 'mean',
                 'treatment': 'count'
             }).round(2)
-            yearly_stats.to_excel(writer, sheet_name='按年份统计')
-            
+        
             # 按省份统计
             province_stats = timeline_df.groupby('省份').agg({
                 '前3年专利总数': ['mean', 'count'],
@@ -96,16 +101,28 @@ def extract_province_from_region(input_file='regress_data.xlsx', output_file=Non
                 '专利增长率': 'mean',
                 'treatment': 'count'
             }).round(2)
-            province_stats.to_excel(writer, sheet_name='按省份统计')
         
-        print(f"   - Excel文件已保存: {output_filename}")
+            write_workbook(output_filename, {
+                '投资前后专利数据': timeline_df,
+                '数据统计': summary_stats,
+                '按年份统计': yearly_stats,
+                '按省份统计': province_stats,
+            }, no_index=['投资前后专利数据'])
+        
+            print(f"   - Excel文件已保存: {output_filename}")
+        
+        if save:
+            write()
+        else:
+            print(f"   - Excel文件延后写出: {output_filename}")
         
         return {
             'timeline_df': timeline_df,
             'excel_file': output_filename,
             'total_companies': len(timeline_df),
             'companies_with_province': len(timeline_df) - missing_province,
-            'missing_province': missing_province
+            'missing_province': missing_province,
+            'write': None if save else write
         }
         
     except Exception as e:
@@ -117,51 +134,35 @@ def extract_province_from_region(input_file='regress_data.xlsx', output_file=Non
 def extract_province(region):
     """
     从地区字符串中提取省份名
+    地区格式通常是: "中国|省份|城市|区县"，统一返回gdp.xlsx使用的统计口径名称
     """
-    if pd.isna(region) or region == '':
-        return None
-    
-    # 地区格式通常是: "中国|省份|城市|区县"
-    parts = str(region).split('|')
-    
-    if len(parts) >= 2:
-        # 第二个部分通常是省份
-        province = parts[1]
-        
-        # 清理省份名称
-        province = province.strip()
-        
-        # 处理一些特殊情况
-        if province in ['中国']:
-            # 如果第二个是"中国"，尝试第三个
-            if len(parts) >= 3:
-                province = parts[2]
-            else:
-                return None
-        
-        return province
-    
-    return None
+    return province_name(region)
 
-def add_province_gdp_data(input_file='regress_data_with_province.xlsx', output_file=None):
+def add_province_gdp_data(input_file='regress_data_with_province.xlsx', output_file=None, data=None, save=True):
     """
     添加投资前三年，后三年所在省份的gdp数据
     
     参数:
     input_file: 输入的带省份信息的数据文件路径
     output_file: 输出文件路径，如果为None则自动生成
+    data: 上游步骤已在内存中的数据（input_file的'投资前后专利数据'表），给定时不再读取input_file
+    save: 是否立即写出Excel文件；为False时返回结果中的'write'为写出文件的函数
     """
     try:
         print("=== 添加省份GDP数据 ===")
         
         # 1. 读取带省份信息的timeline数据
-        print(f"1. 读取{input_file}数据...")
-        timeline_df = pd.read_excel(input_file, sheet_name='投资前后专利数据')
+        if data is not None:
+            print(f"1. 使用内存中的{input_file}数据...")
+            timeline_df = data
+        else:
+            print(f"1. 读取{input_file}数据...")
+            timeline_df = read_table(input_file, sheet_name='投资前后专利数据')
         print(f"   - 数据行数: {len(timeline_df):,}")
         
         # 2. 读取GDP数据
         print("2. 读取GDP数据...")
-        gdp_df = pd.read_excel('gdp.xlsx')
+        gdp_df = session_cache.read_excel('gdp.xlsx')
         print(f"   - GDP数据行数: {len(gdp_df):,}")
         print(f"   - GDP数据年份范围: {gdp_df['年份'].min()} - {gdp_df['年份'].max()}")
         
@@ -171,10 +172,10 @@ def add_province_gdp_data(input_file='regress_data_with_province.xlsx', output_f
         
         for idx, row in gdp_df.iterrows():
             year = row['年份']
-            province = row['省级']
+            province = province_name(row['省级'])
             gdp_value = row['地区生产总值/亿元']
             
-            if pd.notna(gdp_value) and gdp_value > 0:
+            if province and pd.notna(gdp_value) and gdp_value > 0:
                 gdp_map[(province, year)] = gdp_value
         
         print(f"   - 成功创建GDP映射: {len(gdp_map):,} 个省份-年份组合")
@@ -207,9 +208,9 @@ def add_province_gdp_data(input_file='regress_data_with_province.xlsx', output_f
         for idx, row in timeline_df.iterrows():
             company = row['公司名称']
             investment_year = row['投资年份']
-            province = row['省份']
+            province = province_name(row['省份'])
             
-            if pd.isna(province):
+            if province is None:
                 continue
             
             total_attempts += 1
@@ -277,42 +278,49 @@ def add_province_gdp_data(input_file='regress_data_with_province.xlsx', output_f
         else:
             output_filename = output_file
         
-        with pd.ExcelWriter(output_filename, engine='openpyxl') as writer:
-            timeline_df.to_excel(writer, sheet_name='回归数据', index=False)
-            
+        def write():
             # 创建汇总统计sheet
             summary_stats = timeline_df.describe()
-            summary_stats.to_excel(writer, sheet_name='数据统计')
-            
+        
             # 动态识别列名
             total_columns = [col for col in timeline_df.columns if '前3年' in col and '总数' in col]
             growth_columns = [col for col in timeline_df.columns if '增长率' in col]
-            
+        
             # 按年份统计
             agg_dict = {'treatment': 'count'}
             for col in total_columns:
                 agg_dict[col] = 'mean'
             for col in growth_columns:
                 agg_dict[col] = 'mean'
-            
+        
             yearly_stats = timeline_df.groupby('投资年份').agg(agg_dict).round(2)
-            yearly_stats.to_excel(writer, sheet_name='按年份统计')
-            
+        
             # 按省份统计
             agg_dict_province = {'treatment': 'count'}
             for col in total_columns:
                 agg_dict_province[col] = ['mean', 'count']
             for col in growth_columns:
                 agg_dict_province[col] = 'mean'
-            
+        
             province_stats = timeline_df.groupby('省份').agg(agg_dict_province).round(2)
-            province_stats.to_excel(writer, sheet_name='按省份统计')
-            
+        
             # GDP统计
             gdp_stats = timeline_df[gdp_columns].describe()
-            gdp_stats.to_excel(writer, sheet_name='GDP统计')
         
-        print(f"   - Excel文件已保存: {output_filename}")
+            write_workbook(output_filename, {
+                '回归数据': timeline_df,
+                '数据统计': summary_stats,
+                '按年份统计': yearly_stats,
+                '按省份统计': province_stats,
+                'GDP统计': gdp_stats,
+            }, no_index=['回归数据'])
+        
+            print(f"   - Excel文件已保存: {output_filename}")
+        
+        if save:
+            write()
+        else:
+            print(f"   - Excel文件延后写出: {output_filename}")
 
         
         # 8. 显示一些示例数据
@@ -326,7 +334,8 @@ def add_province_gdp_data(input_file='regress_data_with_province.xlsx', output_f
             'total_companies': len(timeline_df),
             'gdp_matched_count': matched_count,
             'gdp_total_attempts': total_attempts,
-            'gdp_match_rate': matched_count / total_attempts * 100
+            'gdp_match_rate': matched_count / total_attempts * 100,
+            'write': None if save else write
         }
         
     except Exception as e:
@@ -1,5 +1,11 @@
+import os
+import sys
 import pandas as pd
 
+# 添加项目根目录到Python路径（共享的表格读取缓存模块）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from table_cache import read_table
+
 def analyze_fund_overlap():
     """
     读取invest.xlsx和govfund_filtered.xlsx，统计基金名称匹配的行数
@@ -7,13 +13,13 @@ def analyze_fund_overlap():
     try:
         # 读取投资事件数据
         print("正在读取 invest.xlsx...")
-        invest_df = pd.read_excel('invest.xlsx')
+        invest_df = read_table('invest.xlsx')
         print(f"投资事件数据行数: {len(invest_df)}")
         print(f"投资事件数据列名: {list(invest_df.columns)}")
         
         # 读取政府引导基金数据
         print("\n正在读取 govfund_filtered.xlsx...")
-        govfund_df = pd.read_excel('govfund_filtered.xlsx')
+        govfund_df = read_table('govfund_filtered.xlsx')
         print(f"政府引导基金数据行数: {len(govfund_df)}")
         print(f"政府引导基金数据列名: {list(govfund_df.columns)}")
         
@@ -90,5 +96,5 @@ def get_gdp(province, year, gdplist):
 if __name__ == "__main__":
     # 分析基金名称匹配情况
     # matched_data, unmatched_data = analyze_fund_overlap()
-    gdplist = pd.read_excel("gdp.xlsx")
+    gdplist = read_table("gdp.xlsx")
     print(get_gdp('北京市',2021,gdplist))
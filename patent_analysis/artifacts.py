@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流水线步骤之间的内存数据传递
+同一进程中顺序执行的步骤直接拿到上游步骤返回的DataFrame，不再先写xlsx再读回来；
+xlsx仍然会写出（供增量执行清单、人工查看和单独运行某一步使用），
+但在后台线程中写（write_mode='async'）或在流水线结束时统一写（write_mode='end'）
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ArtifactStore:
+    """
+    按输出文件路径保存步骤产出的DataFrame，并负责延迟写出对应的xlsx
+
+    参数:
+    write_mode: 'async'（提交到后台线程立即开始写）或'end'（flush时统一写）
+    """
+
+    def __init__(self, write_mode='async'):
+        if write_mode not in ('async', 'end'):
+            raise ValueError("write_mode必须是'async'或'end'")
+        self.write_mode = write_mode
+        self._frames = {}
+        self._deferred = {}
+        self._futures = {}
+        # openpyxl写文件不是线程安全的，用单个后台线程依次写
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='artifact-writer')
+
+    def put(self, path, df, write):
+        """
+        保存步骤产出
+
+        参数:
+        path: 输出文件路径（与步骤output_files中的写法一致）
+        df: 下游步骤要用的DataFrame
+        write: 无参数函数，调用后把完整结果写到path
+        """
+        self._frames[path] = df
+        if self.write_mode == 'async':
+            self._futures[path] = self._executor.submit(write)
+        else:
+            self._deferred[path] = write
+
+    def get(self, path):
+        """
+        取上游产出的DataFrame副本（副本不受后台写入和下游修改的相互影响），不在内存中时返回None
+        """
+        df = self._frames.get(path)
+        return None if df is None else df.copy()
+
+    def rows(self, path):
+        """内存中产出的行数，不在内存中时返回None"""
+        df = self._frames.get(path)
+        return None if df is None else len(df)
+
+    def __contains__(self, path):
+        return path in self._frames
+
+    def pending(self, paths):
+        """paths中尚未写完的文件"""
+        return [path for path in paths
+                if path in self._deferred or (path in self._futures and not self._futures[path].done())]
+
+    def flush(self):
+        """
+        写出所有延迟的文件并等待后台写入完成
+
+        返回:
+        {文件路径: 异常}，全部写出成功时为空字典
+        """
+        for path, write in self._deferred.items():
+            self._futures[path] = self._executor.submit(write)
+        self._deferred = {}
+
+        errors = {}
+        for path, future in self._futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                errors[path] = e
+        self._futures = {}
+        return errors
+
+    def close(self):
+        self.flush()
+        self._executor.shutdown(wait=True)
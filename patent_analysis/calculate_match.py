@@ -1,5 +1,11 @@
+import os
+import sys
 import pandas as pd
 
+# 添加项目根目录到Python路径（共享的表格读取缓存模块）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from table_cache import read_table
+
 def calculate_fund_match():
     """
     计算govfund_filtered中基金简称匹配invest文件中基金名称的数量和比例
@@ -7,8 +13,8 @@ def calculate_fund_match():
     try:
         # 读取两个文件
         print("正在读取文件...")
-        govfund_df = pd.read_excel('govfund_filtered.xlsx')
-        invest_df = pd.read_excel('invest.xlsx')
+        govfund_df = read_table('govfund_filtered.xlsx')
+        invest_df = read_table('invest.xlsx')
         
         print(f"govfund_filtered数据形状: {govfund_df.shape}")
         print(f"invest数据形状: {invest_df.shape}")
@@ -105,8 +111,8 @@ def calculate_investment_ratio():
     try:
         # 读取两个文件
         print("正在读取文件...")
-        govfund_df = pd.read_excel('govfund_filtered.xlsx')
-        invest_df = pd.read_excel('invest.xlsx')
+        govfund_df = read_table('govfund_filtered.xlsx')
+        invest_df = read_table('invest.xlsx')
         
         print(f"govfund_filtered数据形状: {govfund_df.shape}")
         print(f"invest数据形状: {invest_df.shape}")
@@ -222,8 +228,8 @@ def analyze_non_govfund_investments():
     try:
         # 读取两个文件
         print("正在读取文件...")
-        govfund_df = pd.read_excel('govfund_filtered.xlsx')
-        invest_df = pd.read_excel('invest.xlsx')
+        govfund_df = read_table('govfund_filtered.xlsx')
+        invest_df = read_table('invest.xlsx')
         
         # 查找基金简称列和基金名称列
         fund_name_col_govfund = None
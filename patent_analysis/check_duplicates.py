@@ -1,8 +1,14 @@
+import os
+import sys
 import pandas as pd
 
+# 添加项目根目录到Python路径（共享的表格读取缓存模块）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from table_cache import read_table
+
 # 读取数据
-invest_df = pd.read_excel('invest.xlsx')
-fund_df = pd.read_excel('govfund_filtered.xlsx')
+invest_df = read_table('invest.xlsx')
+fund_df = read_table('govfund_filtered.xlsx')
 
 print("=== 检查fund_df中简称重复的情况 ===")
 print(f"fund_df数据形状: {fund_df.shape}")
@@ -1,9 +1,15 @@
+import os
+import sys
 import pandas as pd
 
+# 添加项目根目录到Python路径（共享的表格读取缓存模块）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from table_cache import read_table
+
 # 查看invest.xlsx文件结构
 print("=== invest.xlsx 文件结构 ===")
 try:
-    invest_df = pd.read_excel('invest.xlsx')
+    invest_df = read_table('invest.xlsx')
     print(f"行数: {len(invest_df)}")
     print(f"列数: {len(invest_df.columns)}")
     print("列名:")
@@ -24,7 +30,7 @@ print("\n" + "="*50 + "\n")
 # 查看company_patent_yearly.xlsx文件结构
 print("=== company_patent_yearly.xlsx 文件结构 ===")
 try:
-    patent_df = pd.read_excel('company_patent_yearly.xlsx')
+    patent_df = read_table('company_patent_yearly.xlsx')
     print(f"行数: {len(patent_df)}")
     print(f"列数: {len(patent_df.columns)}")
     print("列名:")
@@ -5,16 +5,25 @@
 用于诊断DID回归中的多重共线性问题
 """
 
+import os
+import sys
 import pandas as pd
 import numpy as np
-from scipy import stats
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# 添加项目根目录到Python路径（共享的表格读取缓存模块）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from table_cache import read_table
+
+from diagnostics import diagnose_design
 
 def check_multicollinearity(X, variable_names=None):
     """
     检查回归变量之间的多重共线性
     
     参数:
-    X: 回归变量矩阵
+    X: 回归变量矩阵（稠密数组或scipy.sparse矩阵）
     variable_names: 变量名称列表
     
     返回:
@@ -25,60 +34,49 @@ def check_multicollinearity(X, variable_names=None):
     
     print("=== 多重共线性检查 ===")
     
-    # 1. 计算相关性矩阵
+    # 所有诊断量都由一次X'X得到
+    diagnosis = diagnose_design(X, variable_names)
+    
+    # 1. 相关性矩阵
     print("\n1. 相关性矩阵:")
-    corr_matrix = np.corrcoef(X.T)
-    corr_df = pd.DataFrame(corr_matrix, columns=variable_names, index=variable_names)
+    corr_df = diagnosis['corr']
+    corr_matrix = corr_df.to_numpy()
     print(corr_df.round(3))
     
     # 2. 检查高相关性
     print("\n2. 高相关性检查 (|r| > 0.8):")
     high_corr_pairs = []
-    for i in range(len(variable_names)):
-        for j in range(i+1, len(variable_names)):
-            corr_val = corr_matrix[i, j]
-            if abs(corr_val) > 0.8:
-                high_corr_pairs.append((variable_names[i], variable_names[j], corr_val))
-                print(f"   {variable_names[i]} vs {variable_names[j]}: r = {corr_val:.3f}")
+    rows, cols = np.nonzero(np.triu(np.abs(np.nan_to_num(corr_matrix)) > 0.8, k=1))
+    for i, j in zip(rows, cols):
+        high_corr_pairs.append((variable_names[i], variable_names[j], corr_matrix[i, j]))
+        print(f"   {variable_names[i]} vs {variable_names[j]}: r = {corr_matrix[i, j]:.3f}")
     
     if not high_corr_pairs:
         print("   ✅ 没有发现高相关性变量对")
     
-    # 3. 计算VIF (Variance Inflation Factor)
+    # 3. VIF (Variance Inflation Factor)：相关系数矩阵之逆的对角线
     print("\n3. VIF值检查:")
     vif_values = {}
-    
-    for i in range(X.shape[1]):
-        # 将第i个变量作为因变量，其他变量作为自变量
-        y_temp = X[:, i]
-        X_temp = np.delete(X, i, axis=1)
-        
-        # 添加常数项
-        X_temp_with_const = np.column_stack([np.ones(X_temp.shape[0]), X_temp])
-        
-        try:
-            # 计算R²
-            beta = np.linalg.lstsq(X_temp_with_const, y_temp, rcond=None)[0]
-            y_pred = X_temp_with_const @ beta
-            ss_res = np.sum((y_temp - y_pred) ** 2)
-            ss_tot = np.sum((y_temp - np.mean(y_temp)) ** 2)
-            r_squared = 1 - (ss_res / ss_tot)
-            
-            # 计算VIF
-            vif = 1 / (1 - r_squared) if r_squared < 1 else float('inf')
-            vif_values[variable_names[i]] = vif
-            
+    for name, vif in diagnosis['vif'].items():
+        if np.isnan(vif):
+            print(f"   - {name}: 常数列，不计算VIF")
+            continue
+        vif_values[name] = vif
+        if np.isinf(vif):
+            print(f"   ❌ {name}: VIF = ∞ (完全共线)")
+        else:
             status = "⚠️" if vif > 10 else "✅"
-            print(f"   {status} {variable_names[i]}: VIF = {vif:.2f}")
-            
-        except:
-            vif_values[variable_names[i]] = float('inf')
-            print(f"   ❌ {variable_names[i]}: VIF = ∞ (计算失败)")
+            print(f"   {status} {name}: VIF = {vif:.2f}")
     
     # 4. 多重共线性诊断
     print("\n4. 多重共线性诊断:")
     high_vif_vars = [var for var, vif in vif_values.items() if vif > 10]
     
+    if diagnosis['collinear_groups']:
+        print(f"   ❌ 设计矩阵秩亏 (秩 {diagnosis['rank']} / {diagnosis['n_columns']} 列)，完全共线的列组:")
+        for label in dict.fromkeys(group['label'] for group in diagnosis['collinear_groups']):
+            print(f"     {label}")
+    
     if high_vif_vars:
         print(f"   ❌ 发现高VIF变量 (VIF > 10): {', '.join(high_vif_vars)}")
         print("   建议:")
@@ -88,26 +86,15 @@ def check_multicollinearity(X, variable_names=None):
     else:
         print("   ✅ 没有发现严重的多重共线性问题")
     
-    # 5. 条件数检查
+    # 5. 条件数检查（标准化数据的条件数；Belsley条件数不中心化，仅供参考）
     print("\n5. 条件数检查:")
-    try:
-        # 标准化数据
-        X_centered = X - np.mean(X, axis=0)
-        X_scaled = X_centered / np.std(X, axis=0)
-        
-        # 计算条件数
-        eigenvals = np.linalg.eigvals(X_scaled.T @ X_scaled)
-        condition_number = np.sqrt(np.max(eigenvals) / np.min(eigenvals))
-        
-        print(f"   条件数: {condition_number:.2f}")
-        
-        if condition_number > 30:
-            print("   ⚠️ 条件数较高，可能存在多重共线性")
-        else:
-            print("   ✅ 条件数正常")
-            
-    except Exception as e:
-        print(f"   ❌ 条件数计算失败: {e}")
+    condition_number = diagnosis['condition_number']
+    print(f"   条件数: {condition_number:.2f}（Belsley {diagnosis['scaled_condition_number']:.2f}）")
+    
+    if condition_number > 30:
+        print("   ⚠️ 条件数较高，可能存在多重共线性")
+    else:
+        print("   ✅ 条件数正常")
     
     return vif_values, corr_df
 
@@ -119,7 +106,7 @@ def diagnose_did_data():
     
     try:
         # 读取数据
-        df = pd.read_excel('regress_data_with_gdp.xlsx', sheet_name='回归数据')
+        df = read_table('regress_data_with_gdp.xlsx', sheet_name='回归数据')
         print(f"✅ 成功读取数据，共 {len(df):,} 行")
         
         # 检查关键变量
@@ -5,6 +5,9 @@ import pickle
 import time
 from tqdm import tqdm
 
+import session_cache
+from excel_export import SparseSheet, write_workbook
+
 def analyze_company_patents():
     """
     读取invest中的公司名，在t'ri'm'pa't'e'n't中查找该公司在各年份获得的专利数量
@@ -14,7 +17,7 @@ def analyze_company_patents():
     
     # 1. 读取filtered_companies数据
     print("invest.csv...")
-    companies_df = pd.read_excel('invest.xlsx', sheet_name='有专利公司首次投资')
+    companies_df = session_cache.read_excel('invest.xlsx', sheet_name='有专利公司首次投资')
     company_names = companies_df['融资主体'].tolist()
     print(f"共读取到 {len(company_names)} 家公司")
     
@@ -87,14 +90,12 @@ def analyze_company_patents():
     sparse_matrix = csr_matrix((data, (rows, cols)), 
                               shape=(len(company_names), len(years)))
     
-    # 保存为CSV格式（便于查看）
-    print("正在保存CSV格式...")
-    result_df = pd.DataFrame(
-        sparse_matrix.toarray(),
-        index=company_names,
-        columns=years
-    )
-    result_df.to_excel('company_patent_yearly.xlsx', sheet_name='原始数据')
+    # 保存为Excel格式（便于查看）：流式逐行写出宽表，另附只含非零元素的长表
+    print("正在保存Excel格式...")
+    write_workbook('company_patent_yearly.xlsx', {
+        '原始数据': SparseSheet(sparse_matrix, company_names, years),
+        '长表': SparseSheet(sparse_matrix, company_names, years, layout='long', names=('公司名称', '年份', '专利数量')),
+    })
     
     # 9. 输出统计信息
     print("\n=== 分析结果 ===")
@@ -109,7 +110,7 @@ def analyze_company_patents():
     print("前5家公司的专利情况:")
     for i in range(min(5, len(company_names))):
         company = company_names[i]
-        patents_by_year = result_df.iloc[i]
+        patents_by_year = pd.Series(sparse_matrix[i].toarray().flatten(), index=years)
         total_patents = patents_by_year.sum()
         print(f"{company}: 总计 {total_patents} 件专利")
         # 显示有专利的年份
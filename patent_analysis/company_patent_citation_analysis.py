@@ -6,6 +6,9 @@ from tqdm import tqdm
 import warnings
 warnings.filterwarnings('ignore')
 
+import session_cache
+from excel_export import write_workbook
+
 def analyze_company_patent_citations():
     """
     读取data/trimpatent_all.csv文件，选出其中申请人在invest.xlsx的融资主体里的行，
@@ -16,7 +19,7 @@ def analyze_company_patent_citations():
     # 1. 读取invest.xlsx中的融资主体数据
     print("正在读取invest.xlsx...")
     try:
-        invest_df = pd.read_excel('invest.xlsx')
+        invest_df = session_cache.read_excel('invest.xlsx')
         company_names = invest_df['融资主体'].dropna().unique().tolist()
         print(f"共读取到 {len(company_names)} 家融资主体公司")
     except Exception as e:
@@ -153,8 +156,11 @@ def analyze_company_patent_citations():
     # 7. 保存结果
     print("正在保存结果...")
     
-    # 保存为Excel格式（便于查看）
-    result_df.to_excel('company_patent_citations_yearly.xlsx', sheet_name='被引证次数')
+    # 保存为Excel格式（便于查看）：流式逐行写出宽表，另附只含非零元素的长表
+    citations_long = company_citations_by_year[company_citations_by_year['被引证次数'] != 0].rename(
+        columns={'申请人': '公司名称', '申请年份': '年份'})
+    write_workbook('company_patent_citations_yearly.xlsx',
+                   {'被引证次数': result_df, '长表': citations_long}, no_index=['长表'])
     
     # 保存为pickle格式（便于后续分析）
     with open('company_patent_citations_data.pkl', 'wb') as f:
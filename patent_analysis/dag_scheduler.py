@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流水线依赖图调度
+由各步骤的input_files/output_files推出依赖关系（某步骤的输出是另一步骤的输入即为依赖），
+按拓扑顺序把所有前置步骤已完成的步骤提交到进程池，互不依赖的步骤（如专利数量和被引证次数两条分支）同时执行；
+任一步骤失败后不再启动新步骤（fail fast），已在运行的步骤执行完毕后返回；
+步骤按声明的资源类型由executors.StepExecutor分配到线程池、进程池或串行执行
+"""
+
+import os
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from executors import StepExecutor
+
+
+def build_dependency_graph(steps):
+    """
+    由输入/输出文件构建依赖图
+
+    参数:
+    steps: 步骤字典列表，每个含'name'、'input_files'、'output_files'
+
+    返回:
+    {步骤名: [前置步骤名, ...]}（只包含steps内部的依赖，外部输入文件不构成依赖）
+    """
+    producers = {}
+    for step in steps:
+        for output_file in step['output_files']:
+            if output_file in producers:
+                raise ValueError(f"输出文件{output_file}同时由'{producers[output_file]}'和'{step['name']}'生成")
+            producers[output_file] = step['name']
+
+    graph = {}
+    for step in steps:
+        upstream = {producers[f] for f in step['input_files'] if f in producers} - {step['name']}
+        graph[step['name']] = [s['name'] for s in steps if s['name'] in upstream]
+    return graph
+
+
+def topological_order(graph):
+    """
+    拓扑排序（同一层内保持步骤的原始顺序），存在环时抛出ValueError
+    """
+    remaining = {name: set(upstream) for name, upstream in graph.items()}
+    order = []
+    while remaining:
+        ready = [name for name, upstream in remaining.items() if not upstream]
+        if not ready:
+            raise ValueError(f"步骤之间存在循环依赖: {', '.join(remaining)}")
+        for name in ready:
+            order.append(name)
+            del remaining[name]
+        for upstream in remaining.values():
+            upstream.difference_update(ready)
+    return order
+
+
+def downstream_steps(graph, names):
+    """names中各步骤及其所有下游步骤（按拓扑顺序）"""
+    selected = set(names)
+    for name in topological_order(graph):
+        if any(upstream in selected for upstream in graph[name]):
+            selected.add(name)
+    return [name for name in topological_order(graph) if name in selected]
+
+
+def upstream_steps(graph, names):
+    """names中各步骤及其所有上游步骤（按拓扑顺序）"""
+    selected = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(graph[name])
+    return [name for name in topological_order(graph) if name in selected]
+
+
+def dependency_levels(graph):
+    """每个步骤所在的层（没有前置步骤的为第0层），用于显示可并行的步骤"""
+    levels = {}
+    for name in topological_order(graph):
+        levels[name] = 1 + max((levels[u] for u in graph[name]), default=-1)
+    return levels
+
+
+def run_dag(steps, task_for, max_workers=None, log=None, check_inputs=None, skip=None, on_success=None,
+            on_failure=None, executor=None):
+    """
+    按依赖图并行执行步骤
+
+    参数:
+    steps: 步骤字典列表（含'name'、'input_files'、'output_files'）
+    task_for: 函数，task_for(step)返回可提交到执行器的无参数可调用对象（提交到进程池时需可pickle），
+              执行后返回(success, message)或(success, message, metrics)（metrics为步骤的性能指标字典）
+    max_workers: 每个执行器的并行线程数/进程数，默认为步骤数与CPU数中较小者
+    log: 日志函数 log(step_name, status, message, duration[, metrics])，status为'开始'、'成功'、'失败'、'跳过'或'未执行'；
+         步骤执行结束时若有性能指标则作为第5个参数传入
+    check_inputs: 函数，check_inputs(step)返回缺失的输入文件列表；提交前检查
+    skip: 函数，skip(step)返回跳过原因（如输入未变化），返回None时执行；跳过的步骤视同完成
+    on_success: 函数，步骤成功后在主进程中调用on_success(step)（如记录增量执行清单）
+    on_failure: 函数，步骤失败后在主进程中调用on_failure(step, message)
+    executor: 已创建的执行器：StepExecutor（按步骤资源类型分配），或任何支持submit的执行器；
+              默认新建StepExecutor（后端见executors.default_backend）
+
+    返回:
+    {步骤名: '成功'/'跳过'/'失败'/'未执行'}
+    """
+    log = log or (lambda *args: None)
+    graph = build_dependency_graph(steps)
+    order = topological_order(graph)
+    by_name = {step['name']: step for step in steps}
+    waiting = {name: set(graph[name]) for name in order}
+    status = {}
+    running = {}
+    failed = False
+
+    own_executor = executor is None
+    if own_executor:
+        executor = StepExecutor(max_workers=max_workers or min(len(steps), os.cpu_count() or 1) or 1)
+    submit_step = getattr(executor, 'submit_step', None)
+    try:
+        while True:
+            if not failed:
+                for name in order:
+                    if name in status or name in running.values() or waiting[name]:
+                        continue
+                    step = by_name[name]
+                    missing = check_inputs(step) if check_inputs else []
+                    if missing:
+                        status[name] = '失败'
+                        failed = True
+                        log(name, '失败', f"缺少输入文件: {missing}", None)
+                        if on_failure:
+                            on_failure(step, f"缺少输入文件: {missing}")
+                        break
+                    reason = skip(step) if skip else None
+                    if reason:
+                        status[name] = '跳过'
+                        for upstream in waiting.values():
+                            upstream.discard(name)
+                        log(name, '跳过', reason, None)
+                        continue
+                    log(name, '开始', step.get('description', '开始执行'), None)
+                    task = task_for(step)
+                    start_time = time.time()
+                    future = submit_step(step, task) if submit_step else executor.submit(task)
+                    future.start_time = start_time
+                    running[future] = name
+
+            # 按拓扑顺序遍历，跳过的步骤的下游在同一轮中即已提交
+            if not running:
+                break
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            # 按提交顺序处理同时完成的步骤（串行后端下日志和清单的顺序确定）
+            for future in [f for f in running if f in done]:
+                name = running.pop(future)
+                duration = time.time() - future.start_time
+                metrics = None
+                try:
+                    outcome = future.result()
+                    success, message = outcome[:2]
+                    if len(outcome) > 2:
+                        metrics = outcome[2]
+                except Exception as e:
+                    success, message = False, f"执行出错: {e}"
+                extra = (metrics,) if metrics is not None else ()
+
+                if success:
+                    status[name] = '成功'
+                    if on_success:
+                        on_success(by_name[name])
+                    for upstream in waiting.values():
+                        upstream.discard(name)
+                    log(name, '成功', message, duration, *extra)
+                else:
+                    status[name] = '失败'
+                    failed = True
+                    log(name, '失败', message, duration, *extra)
+                    if on_failure:
+                        on_failure(by_name[name], message)
+                    if running:
+                        print(f"❌ 步骤失败，不再启动新步骤，等待正在运行的 {len(running)} 个步骤结束")
+    finally:
+        if own_executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    for name in order:
+        if name not in status:
+            status[name] = '未执行'
+            log(name, '未执行', "前置步骤失败，未执行" if failed else "未执行", None)
+    return status
@@ -1,7 +1,13 @@
+import os
+import sys
 import numpy as np
 import pandas as pd
 from typing import Union, List, Tuple
 
+# 添加项目根目录到Python路径（共享的表格读取缓存模块）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from table_cache import read_table
+
 def describe_sequence(data: Union[List, np.ndarray, pd.Series]) -> dict:
     """
     计算数据序列的统计描述
@@ -65,7 +71,7 @@ def print_describe_sequence(data: Union[List, np.ndarray, pd.Series]) -> None:
 
 # 示例用法
 if __name__ == "__main__":
-    df = pd.read_excel('patent_analysis/regress_data_with_gdp.xlsx', sheet_name='回归数据') 
+    df = read_table('patent_analysis/regress_data_with_gdp.xlsx', sheet_name='回归数据') 
     # patent_pre_1 = df['前3年专利数_前1年']
     # patent_pre_2 = df['前3年专利数_前2年']
     # patent_pre_3 = df['前3年专利数_前3年']
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+回归设计矩阵诊断
+只用一次X'X（稀疏设计矩阵也只做稀疏乘积）得到全部诊断量：
+- VIF：相关系数矩阵之逆的对角线（Cholesky分解求解），不再逐列回归
+- 条件数：中心化条件数（相关系数矩阵的条件数，即原先标准化数据的口径，多重共线性预警按它判断）
+  和列缩放为单位长度后的Belsley条件数（不中心化，含常数项，均值远大于标准差的变量如ln_gdp会使其偏大）
+- 完全共线：对X'X的平方根做列主元QR确定秩，指出哪些列（哪组虚拟变量）线性相关
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import linalg, sparse
+
+
+def gram_matrix(X):
+    """X'X（稀疏矩阵用稀疏乘积）"""
+    if sparse.issparse(X):
+        return np.asarray((X.T @ X).toarray(), dtype=float)
+    X = np.asarray(X, dtype=float)
+    return X.T @ X
+
+
+def correlation_matrix(X, gram=None):
+    """
+    由X'X计算相关系数矩阵，不把稀疏设计矩阵转为稠密
+
+    返回:
+    corr: 相关系数矩阵 (p × p)，常数列所在行列为NaN
+    std: 各列标准差（总体口径）
+    """
+    n = X.shape[0]
+    gram = gram_matrix(X) if gram is None else gram
+    means = np.asarray(X.mean(axis=0)).ravel()
+    centered = gram - n * np.outer(means, means)
+    std = np.sqrt(np.maximum(np.diag(centered), 0) / n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = centered / (n * np.outer(std, std))
+    return corr, std
+
+
+def variance_inflation_factors(corr, tol=1e-5):
+    """
+    VIF_j = [R^{-1}]_jj，R为非常数列的相关系数矩阵
+
+    相关系数矩阵奇异（完全共线）时，对应列的VIF为inf
+
+    返回:
+    VIF数组（常数列为NaN）
+    """
+    p = corr.shape[0]
+    vif = np.full(p, np.nan)
+    varying = np.isfinite(np.diag(corr))
+    R = corr[np.ix_(varying, varying)]
+    if R.size == 0:
+        return vif
+
+    try:
+        # L_jj^2 = 1 - R²(第j列对前j-1列)，过小即数值上完全共线
+        factor = linalg.cho_factor(R, lower=True, check_finite=False)
+        if np.min(np.diag(factor[0])) ** 2 > tol ** 2:
+            vif[varying] = np.diag(linalg.cho_solve(factor, np.eye(len(R)), check_finite=False))
+            return vif
+    except linalg.LinAlgError:
+        pass
+
+    # 奇异：对可识别的列求VIF，其余为inf
+    rank, pivots, R_factor = _pivoted_qr(R, tol)
+    independent = np.sort(pivots[:rank])
+    sub = R[np.ix_(independent, independent)]
+    values = np.full(len(R), np.inf)
+    values[independent] = np.diag(linalg.inv(sub))
+    # 与被剔除的列线性相关的列同样无法识别
+    _, _, dependent_members = _dependencies(R, rank, pivots, R_factor)
+    for members in dependent_members:
+        values[members] = np.inf
+    vif[varying] = values
+    return vif
+
+
+def centered_condition_number(corr):
+    """
+    中心化条件数：非常数列相关系数矩阵的最大与最小特征值之比的平方根
+    （与标准化数据X'X的条件数相同，不受变量均值和常数项影响）
+    """
+    varying = np.isfinite(np.diag(corr))
+    R = corr[np.ix_(varying, varying)]
+    if R.size == 0:
+        return np.nan
+    eigenvalues = np.linalg.eigvalsh(R)
+    if eigenvalues[0] <= eigenvalues[-1] * 1e-15:
+        return np.inf
+    return float(np.sqrt(eigenvalues[-1] / eigenvalues[0]))
+
+
+def scaled_condition_number(gram):
+    """
+    Belsley条件数：各列缩放为单位长度后X的最大与最小奇异值之比
+    （含常数项，对常数项与虚拟变量陷阱敏感）
+    """
+    norms = np.sqrt(np.maximum(np.diag(gram), 0))
+    norms[norms == 0] = 1.0
+    scaled = gram / np.outer(norms, norms)
+    eigenvalues = np.linalg.eigvalsh(scaled)
+    if eigenvalues[0] <= eigenvalues[-1] * 1e-15:
+        return np.inf
+    return float(np.sqrt(eigenvalues[-1] / eigenvalues[0]))
+
+
+def _pivoted_qr(gram, tol=1e-5):
+    """
+    对X'X的平方根做列主元QR（与对X本身做列主元QR的R因子相同），返回秩、主元顺序和R
+    """
+    norms = np.sqrt(np.maximum(np.diag(gram), 0))
+    norms[norms == 0] = 1.0
+    scaled = gram / np.outer(norms, norms)
+    eigenvalues, vectors = np.linalg.eigh(scaled)
+    root = np.sqrt(np.maximum(eigenvalues, 0))[:, None] * vectors.T
+    _, R, pivots = linalg.qr(root, pivoting=True, mode='economic')
+    diag = np.abs(np.diag(R))
+    rank = int(np.sum(diag > tol * max(diag[0], 1e-300))) if len(diag) else 0
+    return rank, pivots, R
+
+
+def _dependencies(gram, rank, pivots, R=None, coef_tol=1e-5):
+    """
+    被剔除的每一列用前rank个主元列线性表示，返回(被剔除列, 系数, 参与的列)
+    """
+    if R is None:
+        _, _, R = _pivoted_qr(gram)
+    dependent, coefficients, members = [], [], []
+    R11 = R[:rank, :rank]
+    for position in range(rank, len(pivots)):
+        coef = linalg.solve_triangular(R11, R[:rank, position]) if rank else np.zeros(0)
+        used = pivots[:rank][np.abs(coef) > coef_tol]
+        dependent.append(pivots[position])
+        coefficients.append(coef)
+        members.append(np.sort(np.append(used, pivots[position])))
+    return dependent, coefficients, members
+
+
+def _dummy_prefix(name, prefix_counts):
+    """虚拟变量组前缀（province_广东省 -> province），同前缀的列少于3个时不视为一组"""
+    if '_' not in name:
+        return None
+    prefix = name.rsplit('_', 1)[0]
+    return prefix if prefix_counts.get(prefix, 0) >= 3 else None
+
+
+def _describe_members(member_names, prefix_counts):
+    """把一组线性相关的列描述为'province_*（30列） + const'的形式"""
+    groups, singles = {}, []
+    for name in member_names:
+        prefix = _dummy_prefix(name, prefix_counts)
+        if prefix is None:
+            singles.append(name)
+        else:
+            groups.setdefault(prefix, []).append(name)
+    parts = [f'{prefix}_*（{len(cols)}列）' for prefix, cols in groups.items()] + singles
+    return ' + '.join(parts)
+
+
+def diagnose_design(X, variable_names=None, tol=1e-5):
+    """
+    设计矩阵诊断（VIF、条件数、秩与完全共线的列组）
+
+    参数:
+    X: 设计矩阵（稠密数组、DataFrame或scipy.sparse矩阵）
+    variable_names: 列名
+    tol: 判定秩的相对阈值（X'X平方根的列主元QR精度约为sqrt(机器精度)，不宜小于1e-7；1e-5对应VIF超过1e10视为完全共线）
+
+    返回:
+    dict:
+        vif: 各列VIF（Series，常数列为NaN）
+        corr: 相关系数矩阵（DataFrame）
+        condition_number: 中心化条件数（多重共线性预警按此判断，常用阈值30）
+        scaled_condition_number: Belsley条件数（不中心化、列缩放为单位长度）
+        rank / n_columns: 秩与列数
+        collinear_groups: 完全共线的列组列表，每项含dependent、members和label
+    """
+    if isinstance(X, pd.DataFrame):
+        variable_names = variable_names or list(X.columns)
+        X = X.to_numpy(dtype=float)
+    p = X.shape[1]
+    if variable_names is None:
+        variable_names = [f'Var_{i}' for i in range(p)]
+
+    gram = gram_matrix(X)
+    corr, _ = correlation_matrix(X, gram)
+    vif = variance_inflation_factors(corr, tol)
+
+    rank, pivots, R = _pivoted_qr(gram, tol)
+    prefix_counts = pd.Series([name.rsplit('_', 1)[0] for name in variable_names if '_' in name]).value_counts().to_dict()
+    collinear_groups = []
+    if rank < p:
+        dependent, _, members = _dependencies(gram, rank, pivots, R)
+        for column, member in zip(dependent, members):
+            member_names = [variable_names[i] for i in member]
+            collinear_groups.append({
+                'dependent': variable_names[column],
+                'members': member_names,
+                'label': _describe_members(member_names, prefix_counts),
+            })
+
+    return {
+        'vif': pd.Series(vif, index=variable_names, name='VIF'),
+        'corr': pd.DataFrame(corr, index=variable_names, columns=variable_names),
+        'condition_number': centered_condition_number(corr),
+        'scaled_condition_number': scaled_condition_number(gram),
+        'rank': rank,
+        'n_columns': p,
+        'collinear_groups': collinear_groups,
+    }
+
+
+def preflight_design(X, variable_names, vif_threshold=10, condition_threshold=30):
+    """
+    回归前的设计矩阵检查，打印诊断摘要
+
+    参数:
+    X: 设计矩阵；吸收固定效应的回归应传入去除固定效应后的X（见hdfe.demeaned_design）
+    variable_names: 列名
+    vif_threshold: VIF预警阈值
+    condition_threshold: 中心化条件数预警阈值
+
+    返回:
+    diagnose_design的结果
+    """
+    result = diagnose_design(X, variable_names)
+    print(f"   - 设计矩阵诊断: {X.shape[0]:,} × {result['n_columns']}，秩 {result['rank']}，"
+          f"条件数 {result['condition_number']:.2f}（Belsley {result['scaled_condition_number']:.2f}）")
+
+    if result['collinear_groups']:
+        print(f"   ❌ 设计矩阵秩亏 {result['n_columns'] - result['rank']}，完全共线的列组:")
+        seen = set()
+        for group in result['collinear_groups']:
+            if group['label'] not in seen:
+                seen.add(group['label'])
+                print(f"     {group['label']}")
+    elif result['condition_number'] > condition_threshold:
+        print("   ⚠️ 条件数较高，可能存在多重共线性")
+
+    high_vif = result['vif'][result['vif'] > vif_threshold]
+    if len(high_vif):
+        shown = ', '.join(f'{name}={value:.1f}' for name, value in high_vif.head(10).items())
+        print(f"   ⚠️ 高VIF变量 (VIF > {vif_threshold}): {shown}")
+    return result
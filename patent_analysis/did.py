@@ -1,17 +1,100 @@
+import os
+import sys
 import pandas as pd
 import numpy as np
 
+# 添加项目根目录到Python路径（共享的省份解析模块）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from province import MAINLAND_PROVINCE_CODES, resolve_province, resolve_province_series
+from table_cache import read_table
+
+# 回归样本保留的省份：内地省份（不含西藏）
+DID_PROVINCE_CODES = MAINLAND_PROVINCE_CODES - {resolve_province('西藏')}
+
+def filter_provinces(df, provinces='did'):
+    """
+    按省份筛选回归样本
+    
+    参数:
+    df: 每家公司一行的回归数据（含'省份'列）
+    provinces: 'did'为内地省份（不含西藏），None为不筛选，或省份名列表（可用简称，如['广东', '浙江']）
+    
+    返回:
+    筛选后的DataFrame
+    """
+    if provinces is None:
+        return df
+    codes = DID_PROVINCE_CODES if provinces == 'did' else {resolve_province(name) for name in provinces}
+    return df[resolve_province_series(df['省份']).isin(codes).to_numpy(dtype=bool, na_value=False)]
+
+
 def filter_data():
-    provinces = set(['上海市', '天津市', '江苏省', '浙江省', '广东省', '重庆市', '北京市', '福建省', '河北省',
-       '湖北省', '海南省', '山东省', '吉林省', '河南省', '辽宁省', '安徽省', '四川省', '湖南省',
-       '江西省', '陕西省', '云南省', '甘肃省', '贵州省', '山西省', '黑龙江省','宁夏', '广西',
-       '新疆', '内蒙古', '青海省'])
-    df = pd.read_excel('regress_data_with_gdp.xlsx', sheet_name='回归数据')
-    df = df[df['省份'].isin(provinces)]
+    df = read_table('regress_data_with_gdp.xlsx', sheet_name='回归数据')
+    df = filter_provinces(df)
     with pd.ExcelWriter('regress_data_with_gdp.xlsx', engine='openpyxl') as writer:
         df.to_excel(writer, sheet_name='回归数据')
 
 
+# 面板中每家公司的观测：(post, 相对投资年份的偏移, 专利数列, GDP列, ln GDP列)
+PANEL_OFFSETS = [
+    (0, -1, '前3年专利数_前1年', '前3年GDP_前1年', 'ln_前3年GDP_前1年'),
+    (0, -2, '前3年专利数_前2年', '前3年GDP_前2年', 'ln_前3年GDP_前2年'),
+    (0, -3, '前3年专利数_前3年', '前3年GDP_前3年', 'ln_前3年GDP_前3年'),
+    (1, 1, '后3年专利数_后1年', '后3年GDP_后1年', 'ln_后3年GDP_后1年'),
+    (1, 2, '后3年专利数_后2年', '后3年GDP_后2年', 'ln_后3年GDP_后2年'),
+    (1, 3, '后3年专利数_后3年', '后3年GDP_后3年', 'ln_后3年GDP_后3年'),
+]
+
+
+def build_panel_data(df, min_year=1992, max_year=2025):
+    """
+    把每家公司一行的宽表向量化地展开为公司-年份长面板
+    
+    参数:
+    df: 包含投资和专利数据的DataFrame（每家公司一行）
+    min_year: 投资前年份下限（专利数据范围）
+    max_year: 投资后年份上限（专利数据范围）
+    
+    返回:
+    panel_df: 面板数据DataFrame，行顺序与逐行展开一致（公司内先投资前1-3年，再投资后1-3年）
+    """
+    n_blocks = len(PANEL_OFFSETS)
+    post = np.array([block[0] for block in PANEL_OFFSETS], dtype=np.int8)
+    offsets = np.array([block[1] for block in PANEL_OFFSETS])
+    
+    # (公司数 × 6) 的列块，按行展平后即为逐公司展开的顺序
+    investment_year = df['投资年份'].to_numpy()
+    years = investment_year[:, None] + offsets[None, :]
+    patent_count = df[[block[2] for block in PANEL_OFFSETS]].to_numpy().ravel()
+    gdp = df[[block[3] for block in PANEL_OFFSETS]].to_numpy().ravel()
+    ln_gdp = df[[block[4] for block in PANEL_OFFSETS]].to_numpy().ravel()
+    
+    # 确保年份在专利数据范围内
+    keep = np.where(post[None, :] == 0, years >= min_year, years <= max_year).ravel()
+    
+    def repeat(values):
+        return np.repeat(np.asarray(values), n_blocks)[keep]
+    
+    patent_count = patent_count[keep]
+    post_column = np.tile(post, len(df))[keep]
+    
+    panel_df = pd.DataFrame({
+        'company': pd.Categorical(repeat(df['公司名称'])),
+        'year': pd.to_numeric(years.ravel()[keep], downcast='integer'),
+        'investment_year': pd.to_numeric(repeat(investment_year), downcast='integer'),
+        'treatment': pd.to_numeric(repeat(df['treatment']), downcast='integer'),
+        'post': post_column,
+        'patent_count': patent_count,
+        'ln_patent_plus_1': np.log(patent_count + 1),
+        'province': pd.Categorical(repeat(df['省份'])),
+        'gdp': gdp[keep],
+        'ln_gdp': ln_gdp[keep],
+        'time_to_investment': (-np.tile(offsets, len(df))[keep]).astype(np.int8),
+        'period': pd.Categorical.from_codes(post_column, categories=['pre', 'post']),
+    })
+    return panel_df
+
+
 def prepare_panel_data(df):
     """
     准备面板数据结构
@@ -25,63 +108,8 @@ def prepare_panel_data(df):
     print("2. 创建面板数据结构...")
     
     # 创建前3年和后3年的观测值
-    panel_data = []
-    
-    for idx, row in df.iterrows():
-        company = row['公司名称']
-        investment_year = row['投资年份']
-        treatment = row['treatment']
-        province = row['省份']
-        
-        # 前3年数据 (post=0)
-        for year_offset in range(1, 4):
-            year = investment_year - year_offset
-            if year >= 1992:  # 确保年份在专利数据范围内
-                patent_count = row[f'前3年专利数_前{year_offset}年']
-                gdp_value = row[f'前3年GDP_前{year_offset}年']
-                ln_gdp = row[f'ln_前3年GDP_前{year_offset}年']
-                
-                panel_data.append({
-                    'company': company,
-                    'year': year,
-                    'investment_year': investment_year,
-                    'treatment': treatment,
-                    'post': 0,  # 投资前
-                    'patent_count': patent_count,
-                    'ln_patent_plus_1': np.log(patent_count + 1),
-                    'province': province,
-                    'gdp': gdp_value,
-                    'ln_gdp': ln_gdp,
-                    'time_to_investment': year_offset,
-                    'period': 'pre'
-                })
-        
-        # 后3年数据 (post=1)
-        for year_offset in range(1, 4):
-            year = investment_year + year_offset
-            if year <= 2025:  # 确保年份在专利数据范围内
-                patent_count = row[f'后3年专利数_后{year_offset}年']
-                gdp_value = row[f'后3年GDP_后{year_offset}年']
-                ln_gdp = row[f'ln_后3年GDP_后{year_offset}年']
-                
-                panel_data.append({
-                    'company': company,
-                    'year': year,
-                    'investment_year': investment_year,
-                    'treatment': treatment,
-                    'post': 1,  # 投资后
-                    'patent_count': patent_count,
-                    'ln_patent_plus_1': np.log(patent_count + 1),
-                    'province': province,
-                    'gdp': gdp_value,
-                    'ln_gdp': ln_gdp,
-                    'time_to_investment': -year_offset,
-                    'period': 'post'
-                })
-    
-    # 创建面板数据框
     print("3. 创建面板数据框...")
-    panel_df = pd.DataFrame(panel_data)
+    panel_df = build_panel_data(df)
     print(f"   - 面板数据行数: {len(panel_df):,}")
     print(f"   - 面板数据列数: {len(panel_df.columns)}")
     
@@ -99,13 +127,14 @@ def prepare_panel_data(df):
     return panel_df
 
 
-def generate_dummy_variables(panel_df, enable_province_dummies=True):
+def generate_dummy_variables(panel_df, enable_province_dummies=True, sparse=False):
     """
     生成虚拟变量
     
     参数:
     panel_df: 面板数据DataFrame
     enable_province_dummies: 是否启用省份虚拟变量
+    sparse: 是否以稀疏块生成虚拟变量（列为pandas稀疏类型，可用sparse_design.dummy_block取回scipy.sparse矩阵）
     
     返回:
     panel_df: 添加了虚拟变量的DataFrame
@@ -127,10 +156,17 @@ def generate_dummy_variables(panel_df, enable_province_dummies=True):
         base_province = provinces[0]
         print(f"   - 基准省份: {base_province}")
         
-        for province in provinces[1:]:
-            panel_df[f'province_{province}'] = (panel_df['province'] == province).astype(int)
-        
-        province_dummy_cols = [col for col in panel_df.columns if col.startswith('province_')]
+        if sparse:
+            from sparse_design import sparse_dummies
+            
+            block, province_dummy_cols = sparse_dummies(panel_df['province'], 'province')
+            dummies = pd.DataFrame.sparse.from_spmatrix(block, index=panel_df.index, columns=province_dummy_cols)
+            panel_df = pd.concat([panel_df, dummies], axis=1)
+        else:
+            for province in provinces[1:]:
+                panel_df[f'province_{province}'] = (panel_df['province'] == province).astype(int)
+            
+            province_dummy_cols = [col for col in panel_df.columns if col.startswith('province_')]
         print(f"   - 省份虚拟变量数量: {len(province_dummy_cols)}")
     else:
         print("   - 省份虚拟变量已禁用")
@@ -138,7 +174,8 @@ def generate_dummy_variables(panel_df, enable_province_dummies=True):
     return panel_df, province_dummy_cols
 
 
-def perform_regression(panel_df, province_dummy_cols, enable_province_dummies=True):
+def perform_regression(panel_df, province_dummy_cols, enable_province_dummies=True, engine='panelols', absorb=None,
+                       weights=None, preflight=True, cache=None):
     """
     执行DID回归分析
     
@@ -146,6 +183,12 @@ def perform_regression(panel_df, province_dummy_cols, enable_province_dummies=Tr
     panel_df: 面板数据DataFrame
     province_dummy_cols: 省份虚拟变量列名列表
     enable_province_dummies: 是否启用省份虚拟变量
+    engine: 'panelols'使用linearmodels.PanelOLS，'hdfe'使用交替投影吸收固定效应，
+            'sparse'把省份虚拟变量作为稀疏块加入（含常数项），由稀疏乘积构造正规方程
+    absorb: engine='hdfe'时要吸收的固定效应，如['company', 'year', ('province', 'year')]
+    weights: 观测权重列名（如匹配样本的'match_weight'），None为等权
+    preflight: 回归前是否做设计矩阵诊断（VIF、条件数、完全共线的虚拟变量组）
+    cache: 回归结果缓存，None/False不缓存，True使用默认目录，字符串为缓存目录（见result_cache.py）
     
     返回:
     results: 回归结果
@@ -154,8 +197,6 @@ def perform_regression(panel_df, province_dummy_cols, enable_province_dummies=Tr
     print("7. 执行带年份虚拟变量的DID回归...")
     
     try:
-        from linearmodels import PanelOLS
-        
         # 准备回归变量
         control_vars = ['treatment','treatment_post', 'ln_gdp']
         
@@ -171,11 +212,85 @@ def perform_regression(panel_df, province_dummy_cols, enable_province_dummies=Tr
         if enable_province_dummies:
             control_desc = f"{len(province_dummy_cols)} 个省份虚拟变量 + " + control_desc
         print(f"   - 控制变量: {control_desc}")
+        if weights is not None:
+            print(f"   - 加权回归: {weights}")
         
-        # 执行PanelOLS回归
-        model = PanelOLS(y, X, entity_effects=False, time_effects=False)
-        results = model.fit(cov_type='clustered', cluster_entity=True)
+        # 设计矩阵诊断（稀疏引擎在构造含省份虚拟变量的设计矩阵后再诊断，hdfe引擎诊断去除固定效应后的X）
+        if preflight and engine not in ('sparse', 'hdfe'):
+            from diagnostics import preflight_design
+            
+            preflight_design(X.to_numpy(dtype=float), control_vars)
         
+        if engine == 'hdfe':
+            from hdfe import effect_name
+
+            absorb = list(absorb or [])
+            print(f"   - 吸收固定效应: {', '.join(effect_name(e) for e in absorb) or '无'}")
+            if preflight:
+                # 诊断去除固定效应后实际参与估计的X（与fit_hdfe相同的样本和权重）
+                from diagnostics import preflight_design
+                from hdfe import demeaned_design
+
+                X_tilde, kept, absorbed = demeaned_design(panel_df, 'ln_patent_plus_1', control_vars, absorb=absorb,
+                                                          cluster='company', weights=weights)
+                if absorbed:
+                    print(f"   - 被固定效应完全吸收的变量: {', '.join(absorbed)}")
+                preflight_design(X_tilde, kept)
+
+        def fit():
+            if engine == 'hdfe':
+                # 吸收固定效应，不生成虚拟变量
+                from hdfe import fit_hdfe
+
+                fitted = fit_hdfe(panel_df, 'ln_patent_plus_1', control_vars, absorb=absorb, cluster='company',
+                                  weights=weights)
+                if fitted.dropped:
+                    print(f"   - 被固定效应吸收而剔除的变量: {', '.join(fitted.dropped)}")
+                return fitted
+            if engine == 'sparse':
+                from sparse_design import build_design, dummy_block, sparse_ols
+
+                blocks = [(dummy_block(panel_df, province_dummy_cols), province_dummy_cols)] if enable_province_dummies else []
+                X_sparse, names = build_design(panel_df, control_vars, blocks)
+                print(f"   - 稀疏设计矩阵: {X_sparse.shape[0]:,} × {X_sparse.shape[1]}, 非零元素 {X_sparse.nnz:,}")
+                if preflight:
+                    from diagnostics import preflight_design
+
+                    preflight_design(X_sparse, names)
+                y_values = y.to_numpy(dtype=float)
+                if weights is not None:
+                    # 加权最小二乘：X和y按sqrt(w)缩放
+                    from scipy import sparse as sp
+
+                    root_w = np.sqrt(panel_df[weights].to_numpy(dtype=float))
+                    X_sparse = sp.diags(root_w) @ X_sparse
+                    y_values = root_w * y_values
+                return sparse_ols(X_sparse, y_values, names,
+                                  cluster=panel_df.index.get_level_values('company'), dependent='ln_patent_plus_1')
+
+            from linearmodels import PanelOLS
+
+            # 执行PanelOLS回归
+            model = PanelOLS(y, X, entity_effects=False, time_effects=False,
+                             weights=panel_df[weights] if weights is not None else None)
+            return model.fit(cov_type='clustered', cluster_entity=True)
+
+        # 回归结果缓存：面板数据内容和回归设定都未变化时直接读取上次的结果
+        from result_cache import cached_fit
+
+        spec = {
+            'model': 'did.perform_regression',
+            'dependent': 'ln_patent_plus_1',
+            'regressors': control_vars,
+            'engine': engine,
+            'absorb': absorb if engine == 'hdfe' else None,
+            'province_dummies': province_dummy_cols if (engine == 'sparse' and enable_province_dummies) else None,
+            'weights': weights,
+            'cov_type': 'clustered',
+            'cluster': 'company',
+        }
+        results = cached_fit(cache, panel_df, spec, fit)
+
         print("   - 回归完成")
         print(f"   - 样本数: {len(panel_df):,}")
         print(f"   - 公司数: {panel_df.index.get_level_values('company').nunique():,}")
@@ -193,7 +308,8 @@ def perform_regression(panel_df, province_dummy_cols, enable_province_dummies=Tr
         if 'post' in results.params.index:
             print(f"   - Post效应 (β2): {results.params['post']:.4f}")
         print(f"   - DID效应 (β3): {results.params['treatment_post']:.4f}")
-        print(f"   - GDP控制变量 (β4): {results.params['ln_gdp']:.4f}")
+        if 'ln_gdp' in results.params.index:
+            print(f"   - GDP控制变量 (β4): {results.params['ln_gdp']:.4f}")
         print(f"   - DID效应t值: {results.tstats['treatment_post']:.4f}")
         print(f"   - DID效应p值: {results.pvalues['treatment_post']:.4f}")
         
@@ -247,7 +363,9 @@ def perform_regression(panel_df, province_dummy_cols, enable_province_dummies=Tr
         return None, []
 
 
-def perform_did_regression_with_year_dummies(input_file='regress_data_with_gdp.xlsx', output_file=None, enable_province_dummies=True, use_time_effects=True):
+def perform_did_regression_with_year_dummies(input_file='regress_data_with_gdp.xlsx', output_file=None, enable_province_dummies=True, use_time_effects=True, engine='panelols', absorb=None,
+                                           bootstrap_reps=0, bootstrap_cluster='province', bootstrap_weights='rademacher',
+                                           match=None, cache=None, chunksize=2000, data=None, window=None, weights=None):
     """
     根据patent_investment_timeline_with_province_gdp数据做DID回归
     被解释变量是公司某年的ln(专利数+1)
@@ -260,27 +378,97 @@ def perform_did_regression_with_year_dummies(input_file='regress_data_with_gdp.x
     output_file: 输出文件路径，如果为None则自动生成
     enable_province_dummies: 是否启用省份虚拟变量，默认True
     use_time_effects: 是否启用年份虚拟变量，默认True
+    engine: 回归引擎，'panelols'、'hdfe'（高维固定效应，交替投影吸收）、'sparse'，
+            或'streaming'（分块读取输入文件、累加叉积矩阵，不把面板读入内存；
+            不支持match、window、weights、data和bootstrap_reps，给定时报ValueError）
+    absorb: engine='hdfe'时吸收的固定效应，默认公司固定效应（use_time_effects时再加年份固定效应）
+    bootstrap_reps: 野聚类自助法次数，0表示只报告解析聚类标准误
+    bootstrap_cluster: 自助法的聚类变量，默认按省份聚类
+    bootstrap_weights: 自助法权重，'rademacher'或'webb'
+    match: 匹配对照组的参数（传给matching.matched_sample，True为默认参数），None为不匹配
+    cache: 回归结果缓存（见perform_regression）
+    chunksize: engine='streaming'时每块读取的公司数
+    data: 上游步骤已在内存中的回归数据（input_file的'回归数据'表），给定时不再读取input_file（engine='streaming'时不使用）
+    window: 只使用投资前后window年（1-3）的观测，None为全部3年
+    weights: data中已有的公司权重列（如事先用matching.matched_sample得到的'match_weight'），match给定时忽略
     """
+    if engine == 'streaming':
+        # 流式估计直接分块读取input_file，不经过匹配、窗口筛选、加权和自助法
+        unsupported = [name for name, given in (('match', bool(match)), ('window', window is not None),
+                                                ('weights', weights is not None), ('data', data is not None),
+                                                ('bootstrap_reps', bool(bootstrap_reps))) if given]
+        if unsupported:
+            raise ValueError(f"engine='streaming'不支持参数: {', '.join(unsupported)}")
+    
     try:
         print("=== 执行带年份虚拟变量的DID回归分析 ===")
         
+        if engine == 'streaming':
+            return perform_streaming_regression(input_file, use_time_effects, absorb, cache, chunksize)
+        
         # 1. 读取带GDP数据的timeline数据
-        print(f"1. 读取带GDP数据的timeline数据: {input_file}...")
-        df = pd.read_excel(input_file, sheet_name='回归数据')
+        if data is not None:
+            print(f"1. 使用内存中的带GDP数据的timeline数据: {input_file}...")
+            df = data
+        else:
+            print(f"1. 读取带GDP数据的timeline数据: {input_file}...")
+            df = read_table(input_file, sheet_name='回归数据')
         print(f"   - 数据行数: {len(df):,}")
         
+        # 按省份、行业、投资年份和投资前专利存量匹配对照组
+        if match:
+            from matching import matched_sample
+            
+            df, _ = matched_sample(df, **(match if isinstance(match, dict) else {}))
+            weights = 'match_weight'
+        
         # 2. 准备面板数据
         panel_df = prepare_panel_data(df)
+        if window is not None:
+            if not 1 <= window <= 3:
+                raise ValueError("window必须在1-3之间（回归数据只包含投资前后3年）")
+            panel_df = panel_df[np.abs(panel_df['time_to_investment']) <= window].reset_index(drop=True)
+            for column in ('company', 'province'):
+                panel_df[column] = panel_df[column].cat.remove_unused_categories()
+            print(f"   - 窗口: 投资前后{window}年，面板数据行数: {len(panel_df):,}")
+        if weights is not None:
+            panel_df[weights] = panel_df['company'].map(df.set_index('公司名称')[weights]).astype(float)
         
         # 3. 生成虚拟变量
-        panel_df, province_dummy_cols = generate_dummy_variables(panel_df, enable_province_dummies)
+        panel_df, province_dummy_cols = generate_dummy_variables(panel_df, enable_province_dummies, sparse=(engine == 'sparse'))
         
         # 4. 执行回归分析
-        results, significant_province_dummies = perform_regression(panel_df, province_dummy_cols, enable_province_dummies)
+        if engine == 'hdfe' and absorb is None:
+            absorb = ['company'] + (['year'] if use_time_effects else [])
+        results, significant_province_dummies = perform_regression(panel_df, province_dummy_cols, enable_province_dummies,
+                                                                   engine=engine, absorb=absorb, weights=weights,
+                                                                   cache=cache)
         
         if results is None:
             return None
         
+        # 野聚类自助法检验DID系数（与所用引擎吸收相同的固定效应）
+        bootstrap_result = None
+        if bootstrap_reps:
+            from wild_bootstrap import wild_cluster_bootstrap, print_bootstrap_result
+            
+            print(f"\n12. 野聚类自助法检验 (按{bootstrap_cluster}聚类)...")
+            # 自助法的模型与估计相同：hdfe吸收相同的固定效应；sparse的常数项和省份虚拟变量等价于吸收省份；
+            # panelols不含常数项和固定效应
+            if engine == 'hdfe':
+                bootstrap_absorb = absorb
+            elif engine == 'sparse' and enable_province_dummies:
+                bootstrap_absorb = ['province']
+            else:
+                bootstrap_absorb = []
+            bootstrap_constant = engine != 'panelols'
+            bootstrap_result = wild_cluster_bootstrap(panel_df, 'ln_patent_plus_1', ['treatment', 'treatment_post', 'ln_gdp'],
+                                                      param='treatment_post', cluster=bootstrap_cluster,
+                                                      absorb=bootstrap_absorb, reps=bootstrap_reps,
+                                                      weight_type=bootstrap_weights, weights=weights,
+                                                      constant=bootstrap_constant)
+            print_bootstrap_result(bootstrap_result)
+        
         # 5. 生成输出文件名
         if output_file is None:
             # 根据输入文件名自动生成输出文件名
@@ -299,7 +487,9 @@ def perform_did_regression_with_year_dummies(input_file='regress_data_with_gdp.x
             'did_effect': results.params['treatment_post'],
             'did_t_value': results.tstats['treatment_post'],
             'did_p_value': results.pvalues['treatment_post'],
-            'gdp_effect': results.params['ln_gdp'],
+            'did_bootstrap_p_value': bootstrap_result['pvalue'] if bootstrap_result else np.nan,
+            'gdp_effect': results.params.get('ln_gdp', np.nan),
+            'nobs': getattr(results, 'nobs', len(panel_df)),
             'province_dummy_count': len(province_dummy_cols) if enable_province_dummies else 0,
             'significant_province_dummies': len(significant_province_dummies),
             'panel_file': output_filename
@@ -311,12 +501,207 @@ def perform_did_regression_with_year_dummies(input_file='regress_data_with_gdp.x
         traceback.print_exc()
         return None
 
+def perform_streaming_regression(input_file='regress_data_with_gdp.xlsx', use_time_effects=True, absorb=None,
+                                 cache=None, chunksize=2000):
+    """
+    分块流式DID回归：按块读取每家公司一行的回归数据、展开为面板并累加叉积矩阵，
+    公司固定效应由组均值吸收，年份固定效应以虚拟变量加入，按公司聚类
+    
+    参数:
+    input_file: 输入的带GDP数据的文件路径
+    use_time_effects: 是否加入年份固定效应
+    absorb: 固定效应列表，默认公司（+年份）
+    cache: 回归结果缓存，以输入文件的内容哈希为数据指纹
+    chunksize: 每块读取的公司数
+    
+    返回:
+    与perform_did_regression_with_year_dummies相同结构的结果字典（panel_df为None）
+    """
+    from streaming_ols import fit_streaming, panel_chunks
+    from result_cache import cached_fit, file_fingerprint
+    
+    if absorb is None:
+        absorb = ['company'] + (['year'] if use_time_effects else [])
+    regressors = ['treatment', 'treatment_post', 'ln_gdp']
+    
+    print(f"1. 分块读取: {input_file} (每块 {chunksize:,} 家公司)")
+    print(f"2. 分块流式回归: ln_patent_plus_1 ~ {' + '.join(regressors)} | {' + '.join(map(str, absorb))}")
+    spec = {
+        'model': 'did.perform_streaming_regression',
+        'dependent': 'ln_patent_plus_1',
+        'regressors': regressors,
+        'absorb': absorb,
+        'cov_type': 'clustered',
+        'cluster': 'company',
+    }
+    results = cached_fit(cache, file_fingerprint(input_file), spec,
+                         lambda: fit_streaming(panel_chunks(input_file, chunksize), 'ln_patent_plus_1', regressors,
+                                               absorb=absorb, cluster='company'))
+    if getattr(results, 'dropped', None):
+        print(f"   - 被固定效应吸收而剔除的变量: {', '.join(results.dropped)}")
+    
+    print("\n3. 回归结果:")
+    print("=" * 80)
+    print(results)
+    print("=" * 80)
+    print(f"   - DID效应 (β3): {results.params['treatment_post']:.4f}")
+    print(f"   - DID效应t值: {results.tstats['treatment_post']:.4f}")
+    print(f"   - DID效应p值: {results.pvalues['treatment_post']:.4f}")
+    
+    return {
+        'panel_df': None,
+        'regression_results': results,
+        'did_effect': results.params['treatment_post'],
+        'did_t_value': results.tstats['treatment_post'],
+        'did_p_value': results.pvalues['treatment_post'],
+        'did_bootstrap_p_value': np.nan,
+        'gdp_effect': results.params.get('ln_gdp', np.nan),
+        'province_dummy_count': 0,
+        'significant_province_dummies': 0,
+        'panel_file': None
+    }
+
+def perform_event_study_regression(input_file='regress_data_with_gdp.xlsx', window=None, base=-1,
+                                   absorb=('company', 'year'), plot_file=None):
+    """
+    事件研究（动态DID）：一次回归估计投资前后各年的处理效应
+    
+    参数:
+    input_file: 输入的带GDP数据的文件路径
+    window: 相对投资年份窗口，如(-3, 3)，None为数据中的全部相对年份
+    base: 基期，默认投资前1年
+    absorb: 吸收的固定效应，默认公司+年份
+    plot_file: 事件研究图的输出路径，None时不作图
+    
+    返回:
+    event_study.estimate_event_study的结果字典
+    """
+    from event_study import estimate_event_study, plot_event_study
+    
+    try:
+        print("=== 事件研究（动态DID）回归 ===")
+        print(f"1. 读取带GDP数据的timeline数据: {input_file}...")
+        df = read_table(input_file, sheet_name='回归数据')
+        panel_df = build_panel_data(df)
+        print(f"   - 面板数据行数: {len(panel_df):,}")
+        
+        print(f"2. 估计前导/滞后效应 (基期: 相对年份{base})...")
+        event_result = estimate_event_study(panel_df, absorb=absorb, window=window, base=base)
+        print(event_result['results'])
+        
+        print("\n3. 动态效应:")
+        print(event_result['table'].round(4).to_string())
+        
+        if plot_file:
+            plot_event_study(event_result, plot_file)
+        
+        return event_result
+        
+    except Exception as e:
+        print(f"执行事件研究回归时出现错误: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+def perform_staggered_did_regression(input_file='regress_data_with_gdp.xlsx', control_group='never_treated',
+                                     reps=999, n_jobs=None):
+    """
+    交错处理DID：按首次投资年份分队列估计组别-时期ATT，并聚合为事件时间ATT和总体ATT
+    
+    参数:
+    input_file: 输入的带GDP数据的文件路径
+    control_group: 'never_treated'（从未处理）或'not_yet_treated'（尚未处理）
+    reps: 乘数自助法次数
+    n_jobs: 并行进程数
+    
+    返回:
+    staggered_did.estimate_group_time_att的结果字典
+    """
+    from staggered_did import estimate_group_time_att
+    
+    try:
+        print("=== 交错处理DID（组别-时期ATT） ===")
+        print(f"1. 读取带GDP数据的timeline数据: {input_file}...")
+        df = read_table(input_file, sheet_name='回归数据')
+        panel_df = build_panel_data(df)
+        print(f"   - 面板数据行数: {len(panel_df):,}")
+        
+        control_desc = {'never_treated': '从未处理', 'not_yet_treated': '尚未处理'}[control_group]
+        print(f"2. 估计组别-时期ATT (对照组: {control_desc}公司)...")
+        result = estimate_group_time_att(panel_df, control_group=control_group, reps=reps, n_jobs=n_jobs)
+        print(f"   - 可估计的(队列, 年份)单元: {len(result['group_time'])}")
+        
+        print("\n3. 事件时间ATT:")
+        print(result['event_time'].round(4).to_string(index=False))
+        
+        overall = result['overall']
+        print("\n4. 总体ATT:")
+        print(f"   - ATT: {overall['att']:.4f} (标准误 {overall['std_error']:.4f}, p值 {overall['pvalue']:.4f})")
+        print(f"   - 95%置信区间: [{overall['lower']:.4f}, {overall['upper']:.4f}]")
+        
+        return result
+        
+    except Exception as e:
+        print(f"执行交错处理DID时出现错误: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+def perform_ppml_regression(input_file='regress_data_with_gdp.xlsx', dependent='patent_count',
+                            regressor_sets=(('treatment_post', 'ln_gdp'), ('treatment_post',)),
+                            absorb=('company', 'year'), cluster='company'):
+    """
+    PPML（泊松伪极大似然）DID：直接以专利数为被解释变量，吸收公司和年份固定效应
+    多个设定依次估计，后一个设定以前一个的拟合值为初值
+    
+    参数:
+    input_file: 输入的带GDP数据的文件路径
+    dependent: 计数被解释变量，默认'patent_count'
+    regressor_sets: 各设定的解释变量列表
+    absorb: 吸收的固定效应
+    cluster: 聚类变量
+    
+    返回:
+    各设定的PPMLResults列表
+    """
+    from ppml import fit_ppml, level_effect
+    
+    try:
+        print("=== PPML DID回归（计数被解释变量） ===")
+        print(f"1. 读取带GDP数据的timeline数据: {input_file}...")
+        df = read_table(input_file, sheet_name='回归数据')
+        panel_df = build_panel_data(df)
+        panel_df['treatment_post'] = panel_df['treatment'] * panel_df['post']
+        print(f"   - 面板数据行数: {len(panel_df):,}")
+        print(f"   - {dependent}为0的观测占比: {(panel_df[dependent] == 0).mean():.2%}")
+        
+        results = []
+        previous = None
+        for i, regressors in enumerate(regressor_sets, start=2):
+            print(f"\n{i}. PPML: {dependent} ~ {' + '.join(regressors)} | {' + '.join(map(str, absorb))}")
+            previous = fit_ppml(panel_df, dependent, list(regressors), absorb=absorb, cluster=cluster, start=previous)
+            print(previous)
+            if 'treatment_post' in previous.params.index:
+                effect = level_effect(previous)
+                print(f"   - DID水平效应 exp(β)-1: {effect['effect']:.2%} "
+                      f"(95%置信区间 [{effect['lower']:.2%}, {effect['upper']:.2%}])")
+            results.append(previous)
+        
+        return results
+        
+    except Exception as e:
+        print(f"执行PPML回归时出现错误: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
 if __name__ == "__main__":
     # 执行带年份虚拟变量的DID回归分析
     # 可以通过参数控制是否启用省份虚拟变量和时间虚拟变量
     result = perform_did_regression_with_year_dummies(
         enable_province_dummies=True,  # 启用省份虚拟变量
-        use_time_effects=True       # 启用年份虚拟变量
+        use_time_effects=True,      # 启用年份虚拟变量
+        cache=None                  # 传入True时数据、设定和代码都未变化则复用上次的回归结果
     )
     
     if result:
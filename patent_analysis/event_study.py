@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+事件研究（动态DID）
+用面板中的time_to_investment构造相对投资年份 × treatment 的前导/滞后虚拟变量（以投资前1年为基期），
+一次高维固定效应回归同时估计所有动态效应，输出可直接作图的系数和置信区间数组
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from hdfe import _get_column
+
+
+def relative_time(panel_df):
+    """
+    相对投资年份：投资前k年为-k，投资后k年为+k
+    （面板中time_to_investment投资前为正、投资后为负，与相对时间符号相反）
+    """
+    return -np.asarray(_get_column(panel_df, 'time_to_investment'), dtype=np.int64)
+
+
+def event_column(k):
+    """相对时间k对应的列名：投资前为lead_k，投资后为lag_k"""
+    return f'lead_{-k}' if k < 0 else f'lag_{k}'
+
+
+def build_event_indicators(panel_df, window=None, base=-1, treatment='treatment'):
+    """
+    构造相对时间 × treatment 虚拟变量
+
+    参数:
+    panel_df: 面板数据
+    window: (最小相对时间, 最大相对时间)，窗口外的观测归入两端（端点分箱），None为数据中的全部相对时间
+    base: 基期（被省略的相对时间）
+    treatment: 处理组标识列
+
+    返回:
+    indicators: n × K 的虚拟变量DataFrame（与panel_df同索引）
+    event_times: 各列对应的相对时间数组
+    """
+    rt = relative_time(panel_df)
+    treated = np.asarray(_get_column(panel_df, treatment), dtype=float)
+    if window is None:
+        window = (int(rt.min()), int(rt.max()))
+    rt = np.clip(rt, window[0], window[1])
+
+    # 只保留数据中实际出现的相对时间，去掉基期
+    event_times = np.unique(rt)
+    event_times = event_times[event_times != base]
+    position = np.full(window[1] - window[0] + 1, -1)
+    position[event_times - window[0]] = np.arange(len(event_times))
+
+    # 每个观测最多只有一个非零元素，直接按(行, 列)位置赋值，复杂度与观测数成正比
+    column = position[rt - window[0]]
+    rows = np.flatnonzero((column >= 0) & (treated != 0))
+    values = np.zeros((len(rt), len(event_times)))
+    values[rows, column[rows]] = treated[rows]
+
+    indicators = pd.DataFrame(values, index=panel_df.index, columns=[event_column(k) for k in event_times])
+    return indicators, event_times
+
+
+def estimate_event_study(panel_df, dependent='ln_patent_plus_1', controls=('ln_gdp',),
+                         absorb=('company', 'year'), cluster='company', window=None, base=-1, level=0.95):
+    """
+    一次回归估计事件研究的全部前导/滞后系数
+
+    参数:
+    panel_df: 面板数据（build_panel_data的输出，company/year可在索引中）
+    dependent: 被解释变量
+    controls: 控制变量
+    absorb: 吸收的固定效应
+    cluster: 聚类变量
+    window: 相对时间窗口，见build_event_indicators
+    base: 基期
+    level: 置信水平
+
+    返回:
+    dict:
+        event_time/coef/std_error/lower/upper: 按相对时间排序的数组（含基期，系数和置信区间为0）
+        table: 同样内容的DataFrame
+        results: HDFEResults
+    """
+    from hdfe import fit_hdfe
+
+    indicators, event_times = build_event_indicators(panel_df, window, base)
+    data = pd.concat([panel_df, indicators], axis=1)
+    names = list(indicators.columns)
+    results = fit_hdfe(data, dependent, names + list(controls), absorb=list(absorb), cluster=cluster)
+
+    ci = results.conf_int(level)
+    all_times = np.sort(np.append(event_times, base))
+    table = pd.DataFrame({'event_time': all_times}, index=[event_column(k) for k in all_times])
+    table['coef'] = results.params.reindex(table.index)
+    table['std_error'] = results.std_errors.reindex(table.index)
+    table['lower'] = ci['lower'].reindex(table.index)
+    table['upper'] = ci['upper'].reindex(table.index)
+    table['pvalue'] = results.pvalues.reindex(table.index)
+    table.loc[event_column(base), ['coef', 'std_error', 'lower', 'upper']] = 0.0
+
+    return {
+        'event_time': table['event_time'].to_numpy(),
+        'coef': table['coef'].to_numpy(),
+        'std_error': table['std_error'].to_numpy(),
+        'lower': table['lower'].to_numpy(),
+        'upper': table['upper'].to_numpy(),
+        'table': table,
+        'results': results,
+    }
+
+
+def plot_event_study(event_result, output_file='event_study.png', title='事件研究：政府引导基金投资对专利的动态效应'):
+    """绘制事件研究系数及置信区间图"""
+    import matplotlib.pyplot as plt
+
+    plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei']
+    plt.rcParams['axes.unicode_minus'] = False
+
+    x = event_result['event_time']
+    coef = event_result['coef']
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.errorbar(x, coef, yerr=[coef - event_result['lower'], event_result['upper'] - coef],
+                fmt='o-', capsize=4, color='steelblue')
+    ax.axhline(0, color='gray', linestyle='--', linewidth=1)
+    ax.axvline(-0.5, color='red', linestyle=':', linewidth=1)
+    ax.set_xlabel('相对投资年份')
+    ax.set_ylabel('系数')
+    ax.set_title(title)
+    ax.set_xticks(x)
+    fig.tight_layout()
+    fig.savefig(output_file, dpi=300)
+    plt.close(fig)
+    print(f"   - 事件研究图已保存: {output_file}")
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式写出Excel结果表
+pd.ExcelWriter(engine='openpyxl')先在内存中建好整个工作簿（每个单元格一个对象）再保存，公司×年份矩阵、
+回归数据这类大表写出时内存占用是数据本身的几十倍。这里用openpyxl的write_only模式逐行写出，
+每次只把一块行（CHUNK_ROWS行）转换为Python值，内存占用与表格大小基本无关。
+- write_workbook: 把多个工作表写入一个工作簿，或（separate_files=True时）每个工作表写一个文件并在进程池中并行
+- SparseSheet: 稀疏矩阵工作表，按行写出宽表（不生成稠密矩阵），或写成(行标签, 列标签, 值)长表（只写非零元素）
+write_only模式不支持合并单元格和样式，多层列名按层逐行写出
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+# 每次转换为Python值的行数
+CHUNK_ROWS = 10000
+
+
+class SparseSheet:
+    """
+    稀疏矩阵工作表
+
+    参数:
+    matrix: scipy稀疏矩阵（行×列）
+    row_labels: 行标签（如公司名称）
+    col_labels: 列标签（如年份）
+    layout: 'wide'写成与DataFrame(matrix.toarray(), index=row_labels, columns=col_labels)相同的宽表，
+            'long'写成只含非零元素的长表
+    names: 长表的列名(行标签列, 列标签列, 值列)
+    """
+
+    def __init__(self, matrix, row_labels, col_labels, layout='wide', names=('公司名称', '年份', '数值')):
+        if layout not in ('wide', 'long'):
+            raise ValueError(f"未知的稀疏矩阵工作表格式: {layout}，可选: wide, long")
+        if matrix.shape != (len(row_labels), len(col_labels)):
+            raise ValueError(f"稀疏矩阵形状{matrix.shape}与行列标签数({len(row_labels)}, {len(col_labels)})不一致")
+        self.matrix = matrix.tocsr()
+        self.row_labels = list(row_labels)
+        self.col_labels = list(col_labels)
+        self.layout = layout
+        self.names = tuple(names)
+
+    def __len__(self):
+        return self.matrix.shape[0] if self.layout == 'wide' else self.matrix.nnz
+
+
+def _python_values(values):
+    """数组转换为openpyxl可写的Python值列表（缺失值写为空单元格）"""
+    series = pd.Series(values)
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def _header_rows(df, index):
+    """表头行：列名每层一行，行索引名写在最后一行表头的前几列"""
+    index_names = [name for name in df.index.names] if index else []
+    columns = df.columns
+    levels = columns.nlevels
+    rows = []
+    for level in range(levels):
+        labels = columns.get_level_values(level) if levels > 1 else columns
+        row = [None] * len(index_names)
+        previous = None
+        for position, label in enumerate(labels):
+            # 多层列名的上层与左侧相同时留空（对应pandas写出时的合并单元格）
+            if level < levels - 1 and position > 0 and label == previous:
+                row.append(None)
+            else:
+                row.append(label)
+            previous = label
+        rows.append(row)
+    if index_names:
+        rows[-1][:len(index_names)] = index_names
+    return [_python_values(row) for row in rows]
+
+
+def _write_frame(ws, df, index=True):
+    """DataFrame逐块逐行写入write_only工作表"""
+    for row in _header_rows(df, index):
+        ws.append(row)
+    for start in range(0, len(df), CHUNK_ROWS):
+        block = df.iloc[start:start + CHUNK_ROWS]
+        columns = []
+        if index:
+            columns.extend(_python_values(block.index.get_level_values(level)) for level in range(block.index.nlevels))
+        columns.extend(_python_values(block.iloc[:, position].to_numpy()) for position in range(block.shape[1]))
+        for row in zip(*columns):
+            ws.append(row)
+
+
+def _write_sparse(ws, sheet):
+    """稀疏矩阵逐行写入write_only工作表"""
+    matrix = sheet.matrix
+    if sheet.layout == 'wide':
+        ws.append(_python_values([None] + sheet.col_labels))
+        row_buffer = np.zeros(matrix.shape[1], dtype=matrix.dtype)
+        for i, label in enumerate(sheet.row_labels):
+            start, end = matrix.indptr[i], matrix.indptr[i + 1]
+            row_buffer[:] = 0
+            row_buffer[matrix.indices[start:end]] = matrix.data[start:end]
+            ws.append([label] + row_buffer.tolist())
+        return
+
+    ws.append(list(sheet.names))
+    col_labels = _python_values(sheet.col_labels)
+    for i, label in enumerate(sheet.row_labels):
+        start, end = matrix.indptr[i], matrix.indptr[i + 1]
+        for j, value in zip(matrix.indices[start:end].tolist(), matrix.data[start:end].tolist()):
+            if value != 0:
+                ws.append([label, col_labels[j], value])
+
+
+def _write_single(path, sheets, no_index=()):
+    """把{工作表名: DataFrame或SparseSheet}写入一个工作簿，返回文件路径"""
+    workbook = Workbook(write_only=True)
+    for sheet_name, table in sheets.items():
+        ws = workbook.create_sheet(title=sheet_name)
+        if isinstance(table, SparseSheet):
+            _write_sparse(ws, table)
+        else:
+            _write_frame(ws, table, index=sheet_name not in no_index)
+    workbook.save(path)
+    return path
+
+
+def sheet_file(path, sheet_name):
+    """separate_files模式下工作表对应的文件路径"""
+    stem, ext = os.path.splitext(path)
+    return f"{stem}_{sheet_name}{ext or '.xlsx'}"
+
+
+def write_workbook(path, sheets, no_index=(), separate_files=False, n_jobs=None):
+    """
+    流式写出Excel工作簿
+
+    参数:
+    path: 输出文件路径
+    sheets: {工作表名: DataFrame或SparseSheet}，按顺序写出
+    no_index: 不写行索引的工作表名（对应to_excel(index=False)）
+    separate_files: 是否每个工作表单独写一个文件（sheet_file(path, 工作表名)），
+                    下游不需要单个工作簿时使用，各文件在进程池中并行写出
+    n_jobs: separate_files时的进程数，1时串行，None时为工作表数与CPU数中较小者
+
+    返回:
+    写出的文件路径列表
+    """
+    if not sheets:
+        raise ValueError("没有要写出的工作表")
+    if not separate_files:
+        return [_write_single(path, sheets, no_index)]
+
+    tasks = [(sheet_file(path, sheet_name), {sheet_name: table}, no_index) for sheet_name, table in sheets.items()]
+    n_jobs = n_jobs or min(len(tasks), os.cpu_count() or 1)
+    if n_jobs == 1 or len(tasks) == 1:
+        return [_write_single(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        return list(executor.map(_write_single, *zip(*tasks)))
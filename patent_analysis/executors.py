@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流水线步骤的执行后端
+- serial: 在当前进程中按提交顺序立即执行（结果确定，便于测试和调试）
+- thread: 线程池，适合读写Excel/CSV为主的I/O型步骤，步骤之间共享进程内的读取缓存
+- process: 进程池，适合聚合、回归等CPU型步骤
+- dask: dask.distributed本地集群（可选依赖，需安装dask[distributed]）
+- auto: 按步骤声明的资源类型分配，'io'步骤进线程池，'cpu'步骤进进程池
+线程池中的步骤与其他步骤并发共享同一进程，CPU时间、峰值内存、读写字节数这类进程级计数无法归属到单个步骤，
+剖析时这些指标记为None（见StepProfiler.run的shared_process）；需要逐步骤的完整指标时用process或serial后端
+步骤在配置中用'resources'声明资源类型（'io'或'cpu'，未声明时视为'cpu'）；
+环境变量PIPELINE_EXECUTOR可指定默认后端（如测试时设为serial）
+"""
+
+import os
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+BACKENDS = ('auto', 'serial', 'thread', 'process', 'dask')
+RESOURCE_CLASSES = ('io', 'cpu')
+
+# auto后端下各资源类型使用的后端
+AUTO_ROUTES = {'io': 'thread', 'cpu': 'process'}
+
+# 在当前进程中执行的后端（步骤可以直接使用流水线实例，不需要跨进程传递）
+IN_PROCESS_BACKENDS = ('serial', 'thread')
+
+# 步骤与其他并发步骤共享当前进程的后端（进程级性能指标不能归属到单个步骤）
+SHARED_PROCESS_BACKENDS = ('thread',)
+
+
+def default_backend():
+    """默认后端：环境变量PIPELINE_EXECUTOR，未设置时为'auto'"""
+    return os.environ.get('PIPELINE_EXECUTOR', 'auto')
+
+
+class SerialExecutor(Executor):
+    """提交时立即在当前线程执行的执行器，返回已完成的Future"""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+class _DaskExecutor(Executor):
+    """dask本地集群上的执行器（关闭时同时关闭集群）"""
+
+    def __init__(self, max_workers=None):
+        try:
+            from dask.distributed import Client, LocalCluster
+        except ImportError:
+            raise ImportError("dask后端需要安装dask[distributed]: pip install \"dask[distributed]\"")
+        self._cluster = LocalCluster(n_workers=max_workers or os.cpu_count() or 1, threads_per_worker=1,
+                                     processes=True)
+        self._client = Client(self._cluster)
+        self._executor = self._client.get_executor()
+
+    def submit(self, fn, *args, **kwargs):
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self._executor.shutdown(wait=wait)
+        self._client.close()
+        self._cluster.close()
+
+
+def create_executor(backend, max_workers=None):
+    """
+    创建单个后端的执行器
+
+    参数:
+    backend: 'serial'、'thread'、'process'或'dask'
+    max_workers: 线程数/进程数/集群工作进程数，默认由各后端决定
+
+    返回:
+    concurrent.futures.Executor
+    """
+    if backend == 'serial':
+        return SerialExecutor()
+    if backend == 'thread':
+        return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pipeline-step')
+    if backend == 'process':
+        return ProcessPoolExecutor(max_workers=max_workers)
+    if backend == 'dask':
+        return _DaskExecutor(max_workers)
+    raise ValueError(f"未知的执行后端: {backend}，可选: {', '.join(BACKENDS)}")
+
+
+class StepExecutor:
+    """
+    按步骤资源类型分配执行器
+
+    参数:
+    backend: BACKENDS之一，None时取default_backend()
+    max_workers: 每个执行器的线程数/进程数
+    routes: 自定义{资源类型: 后端}，给定时忽略backend
+    """
+
+    def __init__(self, backend=None, max_workers=None, routes=None):
+        self.backend = backend or default_backend()
+        if routes is None:
+            if self.backend not in BACKENDS:
+                raise ValueError(f"未知的执行后端: {self.backend}，可选: {', '.join(BACKENDS)}")
+            routes = AUTO_ROUTES if self.backend == 'auto' else {name: self.backend for name in RESOURCE_CLASSES}
+        self.routes = dict(routes)
+        self.max_workers = max_workers
+        self._executors = {}
+
+    def backend_for(self, step):
+        """步骤使用的后端"""
+        resources = step.get('resources', 'cpu')
+        if resources not in self.routes:
+            raise ValueError(f"步骤'{step['name']}'的资源类型未知: {resources}，可选: {', '.join(self.routes)}")
+        return self.routes[resources]
+
+    def in_process(self, step):
+        """步骤是否在当前进程中执行"""
+        return self.backend_for(step) in IN_PROCESS_BACKENDS
+
+    def shares_process(self, step):
+        """步骤是否与其他并发步骤共享当前进程"""
+        return self.backend_for(step) in SHARED_PROCESS_BACKENDS
+
+    def submit_step(self, step, fn, *args, **kwargs):
+        """把步骤提交到对应的执行器（执行器在第一次使用时创建）"""
+        backend = self.backend_for(step)
+        if backend not in self._executors:
+            self._executors[backend] = create_executor(backend, self.max_workers)
+        return self._executors[backend].submit(fn, *args, **kwargs)
+
+    def describe(self):
+        """后端说明（用于日志）"""
+        if len(set(self.routes.values())) == 1:
+            return next(iter(self.routes.values()))
+        return ', '.join(f"{resources}步骤→{backend}" for resources, backend in self.routes.items())
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        for executor in self._executors.values():
+            executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+        self._executors = {}
@@ -1,7 +1,13 @@
+import os
+import sys
 import pandas as pd
 import numpy as np
 from difflib import SequenceMatcher
 
+# 添加项目根目录到Python路径（共享的表格读取缓存模块）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from table_cache import read_table
+
 def string_similarity(a, b):
     """计算两个字符串的相似度"""
     if pd.isna(a) or pd.isna(b):
@@ -31,8 +37,8 @@ def filter_patent_companies_v2():
         
         # 1. 读取数据
         print("1. 读取数据文件...")
-        invest_df = pd.read_excel('invest.xlsx')
-        patent_df = pd.read_excel('company_patent_yearly.xlsx')
+        invest_df = read_table('invest.xlsx')
+        patent_df = read_table('company_patent_yearly.xlsx')
         
         print(f"   - invest.xlsx: {len(invest_df):,} 行")
         print(f"   - company_patent_yearly.xlsx: {len(patent_df):,} 行")
@@ -1,5 +1,11 @@
+import os
+import sys
 import pandas as pd
 
+# 添加项目根目录到Python路径（共享的表格读取缓存模块）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from table_cache import read_table
+
 def find_duplicate_rows(filename='govfund_filtered.xlsx'):
     """
     查找govfund_filtered文件里重复的行
@@ -7,7 +13,7 @@ def find_duplicate_rows(filename='govfund_filtered.xlsx'):
     try:
         # 读取文件
         print(f"正在读取 {filename}...")
-        df = pd.read_excel(filename)
+        df = read_table(filename)
         
         print(f"数据总行数: {len(df)}")
         print(f"数据总列数: {len(df.columns)}")
@@ -80,7 +86,7 @@ def remove_duplicates(filename='govfund_filtered.xlsx', output_filename='govfund
     """
     try:
         print(f"正在去重 {filename}...")
-        df = pd.read_excel(filename)
+        df = read_table(filename)
         
         # 去除完全重复的行
         df_deduplicated = df.drop_duplicates()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+匹配对照组
+treatment只表示是否有政府引导基金投资，对照组是其余所有被投企业。
+本模块先按省份、行业(清科)、投资年份精确分块，再在块内按投资前专利存量做最近邻/卡尺匹配：
+单个连续变量时把(块, 变量)编码为一个排序键，用一次searchsorted完成全部处理组的查找；
+多个连续变量时在每个块内建KD树。匹配后的样本（带匹配权重）可直接交给did.py做回归
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from hdfe import factorize_effect
+
+DEFAULT_EXACT = ('省份', '行业(清科)', '投资年份')
+DEFAULT_DISTANCE = ('前3年专利总数',)
+
+
+def _features(df, distance, transform):
+    """连续匹配变量（log1p变换后按标准差标准化，缺失值保留为NaN、不参与标准差计算）"""
+    X = df[list(distance)].to_numpy(dtype=float)
+    if transform == 'log1p':
+        X = np.log1p(np.maximum(X, 0))
+    with np.errstate(invalid='ignore'):
+        scale = np.nanstd(X, axis=0) if len(X) else np.zeros(X.shape[1])
+    scale = np.nan_to_num(scale)
+    return X / np.where(scale > 0, scale, 1.0)
+
+
+def _match_sorted(blocks, x, treated, control, n_neighbors):
+    """
+    单个连续变量的块内最近邻：(块编码, x)合成一个排序键，一次searchsorted查找全部处理组
+    treated/control为参与匹配的处理组/对照组掩码（其余行的x可以是NaN）
+
+    返回:
+    indices: 处理组 × n_neighbors 的对照组行号（-1为块内无对照）
+    distances: 对应的距离
+    """
+    controls = np.flatnonzero(control)
+    treated_rows = np.flatnonzero(treated)
+
+    # x缩放到[0, 0.5]后加上块编码，不同块的键互不重叠（范围只按参与匹配的行计算）
+    used = x[treated | control]
+    low = used.min() if len(used) else 0.0
+    span = used.max() - low if len(used) else 0.0
+    scaled = (x - low) / (2 * span) if span > 0 else np.zeros_like(x)
+    key = blocks + scaled
+    order = controls[np.argsort(key[controls], kind='stable')]
+    sorted_key = key[order]
+
+    # 候选：插入点两侧各n_neighbors个
+    position = np.searchsorted(sorted_key, key[treated_rows])
+    offsets = np.arange(-n_neighbors, n_neighbors)
+    candidates = position[:, None] + offsets[None, :]
+    valid = (candidates >= 0) & (candidates < len(order))
+    candidates = np.clip(candidates, 0, max(len(order) - 1, 0))
+    candidate_rows = order[candidates] if len(order) else np.zeros_like(candidates)
+    valid &= blocks[candidate_rows] == blocks[treated_rows][:, None]
+
+    distance = np.where(valid, np.abs(x[candidate_rows] - x[treated_rows][:, None]), np.inf)
+    nearest = np.argsort(distance, axis=1, kind='stable')[:, :n_neighbors]
+    distances = np.take_along_axis(distance, nearest, axis=1)
+    indices = np.where(np.isfinite(distances), np.take_along_axis(candidate_rows, nearest, axis=1), -1)
+    return indices, distances
+
+
+def _match_kdtree(blocks, X, treated, control, n_neighbors):
+    """多个连续变量：每个块内对对照组建KD树"""
+    from scipy.spatial import cKDTree
+
+    treated_rows = np.flatnonzero(treated)
+    indices = np.full((len(treated_rows), n_neighbors), -1)
+    distances = np.full((len(treated_rows), n_neighbors), np.inf)
+    position = np.empty(len(blocks), dtype=np.int64)
+    position[treated_rows] = np.arange(len(treated_rows))
+
+    order = np.argsort(blocks, kind='stable')
+    bounds = np.flatnonzero(np.diff(blocks[order])) + 1
+    for rows in np.split(order, bounds):
+        block_treated = rows[treated[rows]]
+        block_controls = rows[control[rows]]
+        if len(block_treated) == 0 or len(block_controls) == 0:
+            continue
+        k = min(n_neighbors, len(block_controls))
+        dist, idx = cKDTree(X[block_controls]).query(X[block_treated], k=k)
+        dist, idx = dist.reshape(len(block_treated), k), idx.reshape(len(block_treated), k)
+        indices[position[block_treated], :k] = block_controls[idx]
+        distances[position[block_treated], :k] = dist
+    return indices, distances
+
+
+def match_controls(df, treatment='treatment', exact=DEFAULT_EXACT, distance=DEFAULT_DISTANCE,
+                   n_neighbors=1, caliper=None, transform='log1p'):
+    """
+    精确分块 + 最近邻（有放回）匹配
+
+    参数:
+    df: 每家公司一行的回归数据（preparedata/add_gdp的输出）
+    treatment: 处理组标识列
+    exact: 精确匹配变量，数据中不存在的列会被跳过
+    distance: 最近邻匹配的连续变量（投资前专利存量等）
+    n_neighbors: 每个处理组匹配的对照组个数
+    caliper: 卡尺（以标准化后的距离计），None表示不设卡尺
+    transform: 连续变量变换，'log1p'或None
+
+    返回:
+    matches: 每个(处理组, 对照组)配对一行：treated_index, control_index, distance；
+             matches.attrs['missing_distance']为因连续匹配变量缺失而未参与匹配的{'treated': 个数, 'control': 个数}
+    """
+    exact = [col for col in exact if col in df.columns]
+    blocks = factorize_effect(df, tuple(exact)) if exact else np.zeros(len(df), dtype=np.int64)
+    is_treated = df[treatment].to_numpy() == 1
+
+    X = _features(df, distance, transform)
+    # 精确匹配变量缺失（块编码-1）或连续匹配变量缺失的公司不参与匹配
+    complete = np.isfinite(X).all(axis=1)
+    treated = is_treated & (blocks >= 0) & complete
+    control = ~is_treated & (blocks >= 0) & complete
+    if X.shape[1] == 1:
+        indices, distances = _match_sorted(blocks.astype(float), X[:, 0], treated, control, n_neighbors)
+    else:
+        indices, distances = _match_kdtree(blocks, X, treated, control, n_neighbors)
+    treated_rows = np.flatnonzero(treated)
+
+    ok = indices >= 0
+    if caliper is not None:
+        ok &= distances <= caliper
+
+    t_idx, k_idx = np.nonzero(ok)
+    matches = pd.DataFrame({
+        'treated_index': df.index.to_numpy()[treated_rows[t_idx]],
+        'control_index': df.index.to_numpy()[indices[t_idx, k_idx]],
+        'distance': distances[t_idx, k_idx],
+    })
+    matches.attrs['missing_distance'] = {'treated': int((is_treated & ~complete).sum()),
+                                         'control': int((~is_treated & ~complete).sum())}
+    return matches
+
+
+def matched_sample(df, treatment='treatment', **match_kwargs):
+    """
+    生成匹配后的回归数据
+
+    处理组权重为1，对照组权重为它作为匹配对象的次数 / 每个处理组的匹配数之和
+
+    参数:
+    df: 每家公司一行的回归数据
+    match_kwargs: 传给match_controls的参数
+
+    返回:
+    matched_df: 匹配成功的处理组和被匹配的对照组，含'match_weight'列
+    matches: 配对表
+    """
+    print("   - 匹配对照组...")
+    exact = [col for col in match_kwargs.get('exact', DEFAULT_EXACT) if col in df.columns]
+    skipped = [col for col in match_kwargs.get('exact', DEFAULT_EXACT) if col not in df.columns]
+    print(f"   - 精确匹配变量: {', '.join(exact) or '无'}")
+    if skipped:
+        print(f"   - 数据中缺少的精确匹配变量（已跳过）: {', '.join(skipped)}")
+
+    matches = match_controls(df, treatment=treatment, **match_kwargs)
+    missing = matches.attrs['missing_distance']
+    if missing['treated'] or missing['control']:
+        print(f"   ⚠️ 连续匹配变量缺失、未参与匹配: 处理组 {missing['treated']:,} 家, 对照组 {missing['control']:,} 家")
+
+    per_treated = matches.groupby('treated_index')['control_index'].transform('size')
+    control_weight = (1.0 / per_treated).groupby(matches['control_index']).sum()
+    treated_index = matches['treated_index'].unique()
+
+    weights = pd.concat([pd.Series(1.0, index=treated_index), control_weight])
+    matched_df = df.loc[weights.index].copy()
+    matched_df['match_weight'] = weights.to_numpy()
+
+    n_treated = int((df[treatment] == 1).sum())
+    print(f"   - 处理组: {len(treated_index):,} / {n_treated:,} 家匹配成功")
+    print(f"   - 被匹配的对照组: {len(control_weight):,} 家（有放回）")
+    if len(matches):
+        print(f"   - 平均匹配距离: {matches['distance'].mean():.4f}")
+    return matched_df, matches
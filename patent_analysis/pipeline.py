@@ -9,67 +9,119 @@
 import os
 import sys
 import time
+import json
+import argparse
+import functools
 import pandas as pd
 from datetime import datetime
 
 # 添加当前目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from dag_scheduler import build_dependency_graph, dependency_levels, run_dag, upstream_steps
+from executors import StepExecutor
+from step_manifest import StepManifest
+from artifacts import ArtifactStore
+from step_profiler import StepProfiler, compare_runs, format_metrics, print_comparison, table_rows
+import session_cache
+
+
+def _run_pipeline_step(base_dir, step_name, profile_dir=None, run_id=None):
+    """
+    在工作进程中新建流水线并执行指定步骤（绑定方法不便跨进程传递，按步骤名查找）
+    
+    返回:
+    (success, message, metrics)，metrics为在工作进程中采集的性能指标
+    """
+    pipeline = PatentAnalysisPipeline(base_dir, profile_dir=profile_dir, run_id=run_id)
+    for step in pipeline.pipeline_steps:
+        if step['name'] == step_name:
+            return pipeline._run_step(step)
+    return False, f"未找到步骤: {step_name}"
+
+
 class PatentAnalysisPipeline:
     """专利分析流水线类"""
     
-    def __init__(self, base_dir='.'):
+    def __init__(self, base_dir='.', incremental=True, artifacts=False, profile_dir=None, run_id=None, executor=None):
         """
         初始化流水线
         
         参数:
         base_dir: 基础目录路径
+        incremental: 是否增量执行（输入文件、参数和源码都未变化的步骤直接跳过）
+        artifacts: 内存数据传递模式：False为步骤间通过xlsx文件传递；
+                   True或'async'为下游步骤直接使用上游的DataFrame，xlsx在后台线程中写出；
+                   'end'为xlsx在流水线结束时统一写出
+        profile_dir: 保存每个步骤cProfile结果的目录，None时只采集时间、内存、读写量和行数
+        run_id: 本次运行在性能日志中的标识，默认为启动时间
+        executor: 依赖图模式下的执行后端（见executors.py）：'auto'（io步骤用线程池，cpu步骤用进程池）、
+                  'serial'、'thread'、'process'或'dask'，None时取环境变量PIPELINE_EXECUTOR，默认'auto'
         """
         self.base_dir = base_dir
         self.pipeline_log = []
         self.start_time = time.time()
+        self.incremental = incremental
+        self.manifest = StepManifest(os.path.join(base_dir, 'patent_analysis', 'pipeline_manifest.json'), base_dir)
+        self.artifacts = ArtifactStore('async' if artifacts is True else artifacts) if artifacts else None
+        self._deferred_records = []
+        self.profile_dir = profile_dir
+        self.profiler = StepProfiler(os.path.join(base_dir, 'patent_analysis', 'pipeline_profile.jsonl'),
+                                     profile_dir=profile_dir, run_id=run_id)
+        self.executor = executor
         
         # 流水线步骤配置 - 两条并行流程
+        # resources: 'io'为以读写文件为主的步骤，'cpu'为以计算为主的步骤（依赖图模式下按此分配到线程池或进程池）
         self.pipeline_steps = [
             # 专利数量流水线 (Patent Pipeline)
             {
                 'name': '专利数量分析',
                 'function': self.step_patent_analysis,
+                'sources': ['company_patent_analysis'],
                 'input_files': ['invest.xlsx', 'data/trimpatent_all.csv'],
                 'output_files': ['patent_analysis/company_patent_yearly.xlsx'],
                 'description': '分析公司专利数量年度数据',
+                'resources': 'io',
                 'pipeline': 'patent'
             },
             {
                 'name': '专利数量回归数据准备',
                 'function': self.step_prepare_patent_data,
+                'sources': ['preparedata'],
                 'input_files': ['invest.xlsx', 'patent_analysis/company_patent_yearly.xlsx'],
                 'output_files': ['patent_analysis/regress_data_patents.xlsx'],
                 'description': '准备专利数量回归分析数据',
+                'resources': 'cpu',
                 'pipeline': 'patent'
             },
             {
                 'name': '专利数量数据添加省份信息',
                 'function': self.step_add_province_patents,
+                'sources': ['add_gdp'],
                 'input_files': ['invest.xlsx', 'patent_analysis/regress_data_patents.xlsx'],
                 'output_files': ['patent_analysis/regress_data_patents_with_province.xlsx'],
                 'description': '为专利数量数据添加省份信息',
+                'resources': 'io',
                 'pipeline': 'patent'
             },
             {
                 'name': '专利数量数据添加GDP数据',
                 'function': self.step_add_gdp_patents,
+                'sources': ['add_gdp'],
                 'input_files': ['gdp.xlsx', 'patent_analysis/regress_data_patents_with_province.xlsx'],
                 'output_files': ['patent_analysis/regress_data_patents_with_gdp.xlsx'],
                 'description': '为专利数量数据添加GDP控制变量',
+                'resources': 'cpu',
                 'pipeline': 'patent'
             },
             {
                 'name': '专利数量DID回归分析',
                 'function': self.step_did_regression_patents,
+                'sources': ['did'],
                 'input_files': ['patent_analysis/regress_data_patents_with_gdp.xlsx'],
                 'output_files': ['patent_analysis/did_panel_data_patents_with_year_dummies.xlsx'],
                 'description': '执行专利数量DID回归分析',
+                'resources': 'cpu',
                 'pipeline': 'patent'
             },
             
@@ -77,47 +129,62 @@ class PatentAnalysisPipeline:
             {
                 'name': '被引证次数分析',
                 'function': self.step_citation_analysis,
+                'sources': ['company_patent_citation_analysis'],
                 'input_files': ['invest.xlsx', 'data/trimpatent_all.csv'],
                 'output_files': ['patent_analysis/company_patent_citations_yearly.xlsx'],
                 'description': '分析公司专利被引证次数年度数据',
+                'resources': 'io',
                 'pipeline': 'citation'
             },
             {
                 'name': '被引证次数回归数据准备',
                 'function': self.step_prepare_citation_data,
+                'sources': ['preparedata'],
                 'input_files': ['invest.xlsx', 'patent_analysis/company_patent_citations_yearly.xlsx'],
                 'output_files': ['patent_analysis/regress_data_citations.xlsx'],
                 'description': '准备被引证次数回归分析数据',
+                'resources': 'cpu',
                 'pipeline': 'citation'
             },
             {
                 'name': '被引证次数数据添加省份信息',
                 'function': self.step_add_province_citations,
+                'sources': ['add_gdp'],
                 'input_files': ['invest.xlsx', 'patent_analysis/regress_data_citations.xlsx'],
                 'output_files': ['patent_analysis/regress_data_citations_with_province.xlsx'],
                 'description': '为被引证次数数据添加省份信息',
+                'resources': 'io',
                 'pipeline': 'citation'
             },
             {
                 'name': '被引证次数数据添加GDP数据',
                 'function': self.step_add_gdp_citations,
+                'sources': ['add_gdp'],
                 'input_files': ['gdp.xlsx', 'patent_analysis/regress_data_citations_with_province.xlsx'],
                 'output_files': ['patent_analysis/regress_data_citations_with_gdp.xlsx'],
                 'description': '为被引证次数数据添加GDP控制变量',
+                'resources': 'cpu',
                 'pipeline': 'citation'
             },
             {
                 'name': '被引证次数DID回归分析',
                 'function': self.step_did_regression_citations,
+                'sources': ['did'],
                 'input_files': ['patent_analysis/regress_data_citations_with_gdp.xlsx'],
                 'output_files': ['patent_analysis/did_panel_data_citations_with_year_dummies.xlsx'],
                 'description': '执行被引证次数DID回归分析',
+                'resources': 'cpu',
                 'pipeline': 'citation'
             }
         ]
     
-    def log_step(self, step_name, status, message, duration=None):
-        """记录流水线步骤执行情况"""
+    def log_step(self, step_name, status, message, duration=None, metrics=None):
+        """
+        记录流水线步骤执行情况
+        
+        参数:
+        metrics: 步骤的性能指标（CPU时间、峰值内存、读写量、行数等），同时追加到JSONL性能日志
+        """
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         log_entry = {
             'timestamp': timestamp,
@@ -126,13 +193,54 @@ class PatentAnalysisPipeline:
             'message': message,
             'duration': duration
         }
+        if metrics:
+            log_entry.update(metrics)
+            self.profiler.append(step_name, status, dict(metrics, duration=duration))
         self.pipeline_log.append(log_entry)
         
         # 打印日志
-        status_icon = "✅" if status == "成功" else "❌" if status == "失败" else "⚠️"
+        status_icon = {"成功": "✅", "失败": "❌", "开始": "▶️", "跳过": "⏭️"}.get(status, "⚠️")
         print(f"{status_icon} {step_name}: {message}")
         if duration:
             print(f"   耗时: {duration:.2f}秒")
+        if metrics:
+            print(f"   {format_metrics(metrics)}")
+    
+    def _upstream(self, input_file):
+        """内存数据传递模式下上游步骤产出的DataFrame，没有时返回None（步骤函数改为读文件）"""
+        return self.artifacts.get(input_file) if self.artifacts is not None else None
+    
+    def _deferred_save(self):
+        """内存数据传递模式下让步骤函数不立即写xlsx的参数"""
+        return {'save': False} if self.artifacts is not None else {}
+    
+    def _keep_artifact(self, result):
+        """把步骤产出交给ArtifactStore保存，并延后写出xlsx"""
+        if self.artifacts is not None and result.get('write') is not None:
+            self.artifacts.put(result['excel_file'], result['timeline_df'], result['write'])
+    
+    def _table_rows(self, path):
+        """步骤输入/输出的行数：内存中的产出直接取行数，否则读取文件维度"""
+        if self.artifacts is not None and path in self.artifacts:
+            return self.artifacts.rows(path)
+        return table_rows(os.path.join(self.base_dir, path))
+    
+    def _profile_step(self, step, shared_process=False):
+        """执行步骤并采集性能指标，返回((success, message), metrics)；shared_process见StepProfiler.run"""
+        return self.profiler.run(step['name'], step['function'], step['input_files'], step['output_files'],
+                                 rows_of=self._table_rows, shared_process=shared_process)
+    
+    def _run_step(self, step, shared_process=False):
+        """执行步骤，返回(success, message, metrics)（依赖图模式下提交给执行器的任务）"""
+        (success, message), metrics = self._profile_step(step, shared_process)
+        return success, message, metrics
+    
+    def _task_for(self, step, executor):
+        """步骤在执行器中的任务：当前进程中执行时直接用本实例，否则按步骤名在工作进程中新建流水线"""
+        if executor.in_process(step):
+            return functools.partial(self._run_step, step, executor.shares_process(step))
+        return functools.partial(_run_pipeline_step, self.base_dir, step['name'], self.profile_dir,
+                                 self.profiler.run_id)
     
     def check_files_exist(self, file_list):
         """检查文件是否存在"""
@@ -190,9 +298,10 @@ class PatentAnalysisPipeline:
             print("步骤3: 专利数量回归数据准备")
             print("="*60)
             
-            result = extract_regress_data_patents()
+            result = extract_regress_data_patents(**self._deferred_save())
             
             if result:
+                self._keep_artifact(result)
                 return True, f"专利数量回归数据准备完成，输出文件: {result['excel_file']}"
             else:
                 return False, "专利数量回归数据准备失败"
@@ -209,9 +318,10 @@ class PatentAnalysisPipeline:
             print("步骤4: 被引证次数回归数据准备")
             print("="*60)
             
-            result = extract_regress_data_citations()
+            result = extract_regress_data_citations(**self._deferred_save())
             
             if result:
+                self._keep_artifact(result)
                 return True, f"被引证次数回归数据准备完成，输出文件: {result['excel_file']}"
             else:
                 return False, "被引证次数回归数据准备失败"
@@ -230,10 +340,13 @@ class PatentAnalysisPipeline:
             
             result = extract_province_from_region(
                 input_file='patent_analysis/regress_data_patents.xlsx',
-                output_file='patent_analysis/regress_data_patents_with_province.xlsx'
+                output_file='patent_analysis/regress_data_patents_with_province.xlsx',
+                data=self._upstream('patent_analysis/regress_data_patents.xlsx'),
+                **self._deferred_save()
             )
             
             if result:
+                self._keep_artifact(result)
                 return True, f"专利数量数据省份信息添加完成，输出文件: {result['excel_file']}"
             else:
                 return False, "专利数量数据省份信息添加失败"
@@ -252,10 +365,13 @@ class PatentAnalysisPipeline:
             
             result = extract_province_from_region(
                 input_file='patent_analysis/regress_data_citations.xlsx',
-                output_file='patent_analysis/regress_data_citations_with_province.xlsx'
+                output_file='patent_analysis/regress_data_citations_with_province.xlsx',
+                data=self._upstream('patent_analysis/regress_data_citations.xlsx'),
+                **self._deferred_save()
             )
             
             if result:
+                self._keep_artifact(result)
                 return True, f"被引证次数数据省份信息添加完成，输出文件: {result['excel_file']}"
             else:
                 return False, "被引证次数数据省份信息添加失败"
@@ -274,10 +390,13 @@ class PatentAnalysisPipeline:
             
             result = add_province_gdp_data(
                 input_file='patent_analysis/regress_data_patents_with_province.xlsx',
-                output_file='patent_analysis/regress_data_patents_with_gdp.xlsx'
+                output_file='patent_analysis/regress_data_patents_with_gdp.xlsx',
+                data=self._upstream('patent_analysis/regress_data_patents_with_province.xlsx'),
+                **self._deferred_save()
             )
             
             if result:
+                self._keep_artifact(result)
                 return True, f"专利数量数据GDP添加完成，输出文件: {result['excel_file']}"
             else:
                 return False, "专利数量数据GDP添加失败"
@@ -296,10 +415,13 @@ class PatentAnalysisPipeline:
             
             result = add_province_gdp_data(
                 input_file='patent_analysis/regress_data_citations_with_province.xlsx',
-                output_file='patent_analysis/regress_data_citations_with_gdp.xlsx'
+                output_file='patent_analysis/regress_data_citations_with_gdp.xlsx',
+                data=self._upstream('patent_analysis/regress_data_citations_with_province.xlsx'),
+                **self._deferred_save()
             )
             
             if result:
+                self._keep_artifact(result)
                 return True, f"被引证次数数据GDP添加完成，输出文件: {result['excel_file']}"
             else:
                 return False, "被引证次数数据GDP添加失败"
@@ -318,7 +440,8 @@ class PatentAnalysisPipeline:
             
             result = perform_did_regression_with_year_dummies(
                 input_file='patent_analysis/regress_data_patents_with_gdp.xlsx',
-                output_file='patent_analysis/did_panel_data_patents_with_year_dummies.xlsx'
+                output_file='patent_analysis/did_panel_data_patents_with_year_dummies.xlsx',
+                data=self._upstream('patent_analysis/regress_data_patents_with_gdp.xlsx')
             )
             
             if result:
@@ -340,7 +463,8 @@ class PatentAnalysisPipeline:
             
             result = perform_did_regression_with_year_dummies(
                 input_file='patent_analysis/regress_data_citations_with_gdp.xlsx',
-                output_file='patent_analysis/did_panel_data_citations_with_year_dummies.xlsx'
+                output_file='patent_analysis/did_panel_data_citations_with_year_dummies.xlsx',
+                data=self._upstream('patent_analysis/regress_data_citations_with_gdp.xlsx')
             )
             
             if result:
@@ -351,13 +475,15 @@ class PatentAnalysisPipeline:
         except Exception as e:
             return False, f"被引证次数DID回归分析出错: {str(e)}"
     
-    def run_pipeline(self, start_step=0, end_step=None):
+    def run_pipeline(self, start_step=0, end_step=None, force=False, steps=None):
         """
         运行完整流水线
         
         参数:
         start_step: 开始步骤索引（从0开始）
         end_step: 结束步骤索引（不包含），如果为None则运行到最后
+        force: 是否忽略增量执行清单，重新运行所有步骤
+        steps: 要顺序执行的步骤列表（如select_steps的结果），给定时忽略start_step和end_step
         """
         print("="*80)
         print("专利分析完整流水线启动")
@@ -365,42 +491,55 @@ class PatentAnalysisPipeline:
         print(f"开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"基础目录: {self.base_dir}")
         
-        if end_step is None:
-            end_step = len(self.pipeline_steps)
-        
-        print(f"执行步骤: {start_step} - {end_step-1} (共{end_step-start_step}步)")
+        if steps is None:
+            if end_step is None:
+                end_step = len(self.pipeline_steps)
+            steps = self.pipeline_steps[start_step:end_step]
+            print(f"执行步骤: {start_step} - {end_step-1} (共{end_step-start_step}步)")
+        else:
+            print(f"执行步骤: {', '.join(step['name'] for step in steps)} (共{len(steps)}步)")
         print("="*80)
         
         success_count = 0
-        total_steps = end_step - start_step
+        total_steps = len(steps)
         
-        for step_idx in range(start_step, end_step):
-            step = self.pipeline_steps[step_idx]
+        for step_idx, step in enumerate(steps):
             step_name = step['name']
             step_description = step['description']
             
             print(f"\n{'='*20} 步骤 {step_idx+1}/{total_steps}: {step_name} {'='*20}")
             print(f"描述: {step_description}")
             
-            # 检查输入文件
-            missing_files = self.check_files_exist(step['input_files'])
+            # 检查输入文件（内存中已有的上游产出视为存在）
+            missing_files = [f for f in self.check_files_exist(step['input_files'])
+                             if self.artifacts is None or f not in self.artifacts]
             if missing_files:
                 error_msg = f"缺少输入文件: {missing_files}"
                 self.log_step(step_name, "失败", error_msg)
+                self._record_failure(step, error_msg)
                 print(f"❌ 步骤失败，跳过后续步骤")
                 break
             
+            # 输入文件、参数和源码都未变化时沿用已有输出
+            skip_reason = self._skip_reason(step, force)
+            if skip_reason:
+                self.log_step(step_name, "跳过", skip_reason)
+                success_count += 1
+                continue
+            
             # 执行步骤
             step_start_time = time.time()
             try:
-                success, message = step['function']()
+                (success, message), metrics = self._profile_step(step)
                 step_duration = time.time() - step_start_time
                 
                 if success:
-                    self.log_step(step_name, "成功", message, step_duration)
+                    self.log_step(step_name, "成功", message, step_duration, metrics)
+                    self._record_step(step)
                     success_count += 1
                 else:
-                    self.log_step(step_name, "失败", message, step_duration)
+                    self.log_step(step_name, "失败", message, step_duration, metrics)
+                    self._record_failure(step, message)
                     print(f"❌ 步骤失败，跳过后续步骤")
                     break
                     
@@ -408,9 +547,13 @@ class PatentAnalysisPipeline:
                 step_duration = time.time() - step_start_time
                 error_msg = f"执行出错: {str(e)}"
                 self.log_step(step_name, "失败", error_msg, step_duration)
+                self._record_failure(step, error_msg)
                 print(f"❌ 步骤失败，跳过后续步骤")
                 break
         
+        # 等待延后写出的中间文件
+        files_written = self._flush_artifacts() if self.artifacts is not None else True
+        
         # 流水线完成
         total_duration = time.time() - self.start_time
         print("\n" + "="*80)
@@ -420,10 +563,164 @@ class PatentAnalysisPipeline:
         print(f"总耗时: {total_duration:.2f}秒")
         print(f"完成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         
+        # invest.xlsx、gdp.xlsx等在本次运行中只解析一次，运行结束后释放
+        cache = session_cache.cache_info()
+        if cache['misses']:
+            print(f"Excel读取缓存: 解析 {cache['misses']} 个工作表，命中 {cache['hits']} 次")
+        session_cache.clear()
+        
         # 保存执行日志
         self.save_pipeline_log()
+        self.show_performance_report(self.profiler.run_id, verbose=False)
+        
+        return success_count == total_steps and files_written
+    
+    def _skip_reason(self, step, force=False):
+        """增量执行时步骤可跳过的原因，需要运行时返回None并打印需要运行的原因"""
+        if force or not self.incremental:
+            return None
+        if self.artifacts is not None and any(f in self.artifacts for f in step['input_files']):
+            print("   需要运行: 上游步骤本次已重新运行，数据在内存中")
+            return None
+        stale = self.manifest.stale_reason(step)
+        if stale is None:
+            return "输入文件、参数和源码均未变化，沿用已有输出"
+        print(f"   需要运行: {stale}")
+        return None
+    
+    def _record_step(self, step):
+        """步骤成功后更新增量执行清单（输入或输出文件尚未写完时等写出后再记录）"""
+        if self.artifacts is not None and self.artifacts.pending(step['input_files'] + step['output_files']):
+            self._deferred_records.append(step)
+            return
+        try:
+            self.manifest.record(step)
+            self.manifest.save()
+        except Exception as e:
+            print(f"⚠️ 更新增量执行清单失败: {e}")
+    
+    def _record_failure(self, step, message):
+        """在增量执行清单中记录失败的步骤（供resume使用）"""
+        try:
+            self.manifest.record_failure(step['name'], message)
+            self.manifest.save()
+        except Exception as e:
+            print(f"⚠️ 更新增量执行清单失败: {e}")
+    
+    def select_steps(self, names=None, tags=None, targets=None):
+        """
+        选择要运行的步骤，按依赖顺序返回
+        
+        参数:
+        names: 步骤名称或编号（从1开始）列表
+        tags: 流水线类型列表，如['patent']、['citation']
+        targets: 目标步骤名称或编号列表，选中目标及其所有上游步骤
+        都为None时选择全部步骤；多个条件同时给定时取并集
         
-        return success_count == total_steps
+        返回:
+        步骤字典列表
+        """
+        graph = build_dependency_graph(self.pipeline_steps)
+        if names is None and tags is None and targets is None:
+            return list(self.pipeline_steps)
+        
+        selected = set()
+        for name in names or []:
+            selected.add(self._resolve_step_name(name))
+        for tag in tags or []:
+            tagged = [step['name'] for step in self.pipeline_steps if step.get('pipeline') == tag]
+            if not tagged:
+                raise ValueError(f"未知的流水线类型: {tag}")
+            selected.update(tagged)
+        if targets:
+            selected.update(upstream_steps(graph, [self._resolve_step_name(t) for t in targets]))
+        return [step for step in self.pipeline_steps if step['name'] in selected]
+    
+    def _resolve_step_name(self, name):
+        """步骤名称或编号（从1开始）转换为步骤名称"""
+        names = [step['name'] for step in self.pipeline_steps]
+        if name in names:
+            return name
+        if str(name).isdigit() and 1 <= int(name) <= len(names):
+            return names[int(name) - 1]
+        raise ValueError(f"未找到步骤: {name}")
+    
+    def resume_steps(self, steps=None):
+        """
+        从上次失败的步骤继续：返回steps中第一个失败步骤及其后的全部步骤，以及之前没有成功记录的步骤
+        （顺序执行在失败处停止，之后与失败无关的步骤也没有运行；已是最新的步骤由增量执行清单跳过）
+        
+        返回:
+        步骤字典列表，没有失败记录时为空列表
+        """
+        steps = steps if steps is not None else self.pipeline_steps
+        failed = [i for i, step in enumerate(steps) if step['name'] in self.manifest.failures]
+        if not failed:
+            return []
+        return [step for i, step in enumerate(steps) if i >= failed[0] or step['name'] not in self.manifest.steps]
+    
+    def show_plan(self, steps=None, force=False):
+        """
+        打印执行计划（不执行）：步骤顺序、并行层次，以及每个步骤是沿用缓存还是需要运行
+        
+        返回:
+        {步骤名: '缓存'/'运行'/'可能运行'/'缺少输入'}
+        """
+        steps = steps if steps is not None else self.pipeline_steps
+        graph = build_dependency_graph(steps)
+        levels = dependency_levels(graph)
+        by_name = {step['name']: step for step in steps}
+        
+        print("="*80)
+        print("执行计划（dry run，不执行任何步骤）")
+        print("="*80)
+        plan = {}
+        for name in sorted(levels, key=lambda n: (levels[n], [s['name'] for s in steps].index(n))):
+            step = by_name[name]
+            upstream_runs = any(plan.get(u) in ('运行', '可能运行') for u in graph[name])
+            missing = [f for f in self.check_files_exist(step['input_files'])
+                       if not any(f in by_name[u]['output_files'] for u in graph[name])]
+            if missing:
+                plan[name], detail = '缺少输入', f"❌ 缺少输入文件: {missing}"
+            elif force or not self.incremental:
+                plan[name], detail = '运行', "🔄 运行（忽略增量执行清单）"
+            else:
+                stale = self.manifest.stale_reason(step)
+                if stale is not None:
+                    plan[name], detail = '运行', f"🔄 运行（{stale}）"
+                elif upstream_runs:
+                    plan[name], detail = '可能运行', "🔄 上游步骤需要运行，上游输出变化时运行"
+                else:
+                    plan[name], detail = '缓存', "✅ 最新，沿用已有输出"
+            failure = self.manifest.failures.get(name)
+            if failure:
+                detail += f"（上次失败: {failure['timestamp']} {failure['message']}）"
+            print(f"  [第{levels[name]+1}层] {name} [{step.get('pipeline', 'unknown')}]: {detail}")
+        
+        counts = {state: list(plan.values()).count(state) for state in dict.fromkeys(plan.values())}
+        print("="*80)
+        print("合计: " + ", ".join(f"{state} {count}步" for state, count in counts.items()))
+        return plan
+    
+    def _flush_artifacts(self):
+        """
+        写出所有延后的中间文件，并为写出成功的步骤更新增量执行清单
+        
+        返回:
+        是否全部写出成功
+        """
+        print("\n等待中间文件写出...")
+        flush_start_time = time.time()
+        errors = self.artifacts.flush()
+        for path, error in errors.items():
+            self.log_step(path, "失败", f"中间文件写出失败: {error}")
+        
+        deferred, self._deferred_records = self._deferred_records, []
+        for step in deferred:
+            if not any(path in errors for path in step['input_files'] + step['output_files']):
+                self._record_step(step)
+        print(f"中间文件写出完成，等待 {time.time() - flush_start_time:.2f}秒")
+        return not errors
     
     def save_pipeline_log(self):
         """保存流水线执行日志"""
@@ -436,29 +733,111 @@ class PatentAnalysisPipeline:
         except Exception as e:
             print(f"保存执行日志失败: {e}")
     
-    def run_specific_steps(self, step_names):
+    def show_performance_report(self, run_id=None, verbose=True):
         """
-        运行指定的步骤
+        对比某次运行与之前几次运行的步骤性能，标出变慢、内存或读写量明显增加的步骤
         
         参数:
-        step_names: 步骤名称列表
+        run_id: 要检查的运行标识，None为日志中最近一次运行
+        verbose: 是否打印完整对比表，False时只在有退化时打印提示
         """
-        step_indices = []
-        for step_name in step_names:
-            for i, step in enumerate(self.pipeline_steps):
-                if step['name'] == step_name:
-                    step_indices.append(i)
-                    break
+        if not os.path.exists(self.profiler.log_file):
+            print("暂无步骤性能日志")
+            return None
+        try:
+            report = compare_runs(self.profiler.log_file, run_id=run_id)
+        except Exception as e:
+            print(f"生成步骤性能对比失败: {e}")
+            return None
+        if verbose:
+            print_comparison(report)
+        elif not report.empty and report['regression'].any():
+            flagged = report[report['regression']]
+            print("⚠️ 与之前的运行相比性能退化: "
+                  + ', '.join(f"{row.step}/{row.metric}" for row in flagged.itertuples()))
+        return report
+    
+    def run_specific_steps(self, step_names, max_workers=None, force=False):
+        """
+        运行指定的步骤（按依赖顺序，互不依赖的步骤并行执行）
         
-        if not step_indices:
+        参数:
+        step_names: 步骤名称列表
+        max_workers: 并行进程数
+        force: 是否忽略增量执行清单，重新运行所有指定步骤
+        """
+        known = {step['name'] for step in self.pipeline_steps}
+        step_names = [name for name in step_names if name in known]
+        if not step_names:
             print("❌ 未找到指定的步骤")
             return False
         
-        step_indices.sort()
-        start_step = step_indices[0]
-        end_step = step_indices[-1] + 1
+        return self.run_dag_pipeline(step_names, max_workers=max_workers, force=force)
+    
+    def run_dag_pipeline(self, step_names=None, max_workers=None, force=False):
+        """
+        按依赖图运行流水线：某步骤的输出文件是另一步骤的输入文件即为依赖，
+        前置步骤完成后立即提交到执行器（按步骤的资源类型分配到线程池或进程池），专利数量和被引证次数两条分支真正同时执行；
+        任一步骤失败后不再启动新步骤，正在运行的步骤结束后返回
         
-        return self.run_pipeline(start_step, end_step)
+        参数:
+        step_names: 要运行的步骤名称列表，None为全部步骤
+        max_workers: 并行进程数，默认为步骤数与CPU数中较小者
+        force: 是否忽略增量执行清单，重新运行所有步骤
+        
+        返回:
+        是否全部成功
+        """
+        steps = [step for step in self.pipeline_steps if step_names is None or step['name'] in step_names]
+        graph = build_dependency_graph(steps)
+        levels = dependency_levels(graph)
+        executor = StepExecutor(self.executor, max_workers or min(len(steps), os.cpu_count() or 1) or 1)
+        
+        print("="*80)
+        print("依赖图流水线启动")
+        print("="*80)
+        print(f"开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"基础目录: {self.base_dir}")
+        print(f"执行步骤: 共{len(steps)}步, {max(levels.values()) + 1}层")
+        print(f"执行后端: {executor.describe()}")
+        for level in range(max(levels.values()) + 1):
+            names = [name for name, value in levels.items() if value == level]
+            print(f"  第{level+1}层（并行）: {', '.join(names)}")
+        print("="*80)
+        
+        # 步骤可能分布在不同进程中，依赖图模式下步骤间统一通过xlsx文件传递数据
+        artifacts, self.artifacts = self.artifacts, None
+        if artifacts is not None:
+            print("注意：依赖图模式下步骤间仍通过xlsx文件传递数据")
+        
+        dag_start_time = time.time()
+        try:
+            status = run_dag(
+                steps,
+                lambda step: self._task_for(step, executor),
+                log=self.log_step,
+                check_inputs=lambda step: self.check_files_exist(step['input_files']),
+                skip=lambda step: self._skip_reason(step, force),
+                on_success=self._record_step,
+                on_failure=self._record_failure,
+                executor=executor,
+            )
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.artifacts = artifacts
+        
+        success_count = sum(1 for value in status.values() if value in ('成功', '跳过'))
+        print("\n" + "="*80)
+        print("流水线执行完成")
+        print("="*80)
+        print(f"成功步骤: {success_count}/{len(steps)}")
+        print(f"总耗时: {time.time() - dag_start_time:.2f}秒")
+        print(f"完成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        
+        self.save_pipeline_log()
+        self.show_performance_report(self.profiler.run_id, verbose=False)
+        
+        return success_count == len(steps)
     
     def run_patent_pipeline(self):
         """
@@ -530,36 +909,25 @@ class PatentAnalysisPipeline:
         
         return self.run_pipeline(start_step, end_step)
     
-    def run_parallel_pipelines(self):
+    def run_parallel_pipelines(self, max_workers=None, force=False):
         """
         并行运行两条流水线
-        注意：这是概念上的并行，实际执行仍然是顺序的
-        但两条流水线可以独立运行，互不依赖
+        两条流水线之间没有依赖，按依赖图调度时在不同进程中同时执行，
+        每条流水线内部的步骤仍按输入输出文件的先后顺序执行
+        
+        参数:
+        max_workers: 并行进程数
+        force: 是否忽略增量执行清单，重新运行所有步骤
         """
         print("="*80)
         print("并行流水线启动")
         print("="*80)
-        print("注意：两条流水线将顺序执行，但它们是独立的流程")
-        print("专利数量流水线和被引证次数流水线可以独立运行")
-        
-        # 先运行专利数量流水线
-        print("\n" + "="*60)
-        print("第一阶段：运行专利数量流水线")
-        print("="*60)
-        patent_success = self.run_patent_pipeline()
+        print("专利数量流水线和被引证次数流水线将在不同进程中同时执行")
         
-        if not patent_success:
-            print("❌ 专利数量流水线执行失败")
-            return False
-        
-        # 再运行被引证次数流水线
-        print("\n" + "="*60)
-        print("第二阶段：运行被引证次数流水线")
-        print("="*60)
-        citation_success = self.run_citation_pipeline()
+        success = self.run_dag_pipeline(max_workers=max_workers, force=force)
         
-        if not citation_success:
-            print("❌ 被引证次数流水线执行失败")
+        if not success:
+            print("❌ 并行流水线执行失败")
             return False
         
         print("\n" + "="*80)
@@ -636,10 +1004,120 @@ class PatentAnalysisPipeline:
         print(f"  输出文件:")
         for status in output_status:
             print(f"    {status}")
+        if self.incremental:
+            stale = self.manifest.stale_reason(step)
+            print(f"  增量状态: {'✅ 最新，运行时将跳过' if stale is None else f'🔄 需要运行（{stale}）'}")
+
+
+def build_arg_parser():
+    """命令行参数"""
+    parser = argparse.ArgumentParser(
+        description='专利分析流水线（不带参数且在终端中运行时进入交互菜单）',
+        epilog='示例: python pipeline.py --tag patent --dry-run；python pipeline.py --jobs 2；'
+               'python pipeline.py --resume；python pipeline.py --target 专利数量DID回归分析',
+    )
+    parser.add_argument('--base-dir', default='.', help='基础目录（步骤输入/输出文件的相对路径以此为准），默认当前目录')
+    parser.add_argument('--steps', nargs='+', metavar='STEP', help='按名称或编号（从1开始）选择步骤')
+    parser.add_argument('--tag', action='append', choices=['patent', 'citation'],
+                        help='选择某条流水线的全部步骤，可重复')
+    parser.add_argument('--target', action='append', metavar='STEP', help='运行目标步骤及其所有上游步骤，可重复')
+    parser.add_argument('--dry-run', action='store_true', help='只打印执行计划和每个步骤的缓存状态，不执行')
+    parser.add_argument('--resume', action='store_true', help='从上次失败的步骤继续（运行第一个失败步骤及之后未完成的步骤）')
+    parser.add_argument('--force', action='store_true', help='忽略增量执行清单，重新运行所有选中的步骤')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='并行进程数；1为在当前进程中顺序执行，大于1时按依赖图多进程执行')
+    parser.add_argument('--executor', choices=['auto', 'serial', 'thread', 'process', 'dask'],
+                        help='--jobs大于1时的执行后端：auto为io步骤用线程池、cpu步骤用进程池（默认，或取环境变量PIPELINE_EXECUTOR）')
+    parser.add_argument('--artifacts', choices=['async', 'end'],
+                        help='顺序执行时步骤间在内存中传递数据，xlsx在后台写出（async）或结束时写出（end）')
+    parser.add_argument('--profile-dir', help='保存每个步骤cProfile结果的目录')
+    parser.add_argument('--list', action='store_true', help='列出所有步骤后退出')
+    parser.add_argument('--status', action='store_true', help='显示流水线状态后退出')
+    parser.add_argument('--report', action='store_true', help='显示最近一次运行的步骤性能对比后退出')
+    parser.add_argument('--sweep', metavar='GRID.json',
+                        help='稳健性检验参数扫描：上游步骤只运行一次，各参数组合的DID回归并行执行（见sweep.py）')
+    parser.add_argument('--sweep-output', default='sweep_results.xlsx', help='参数扫描对比表的输出文件')
+    parser.add_argument('--interactive', action='store_true', help='进入交互菜单')
+    return parser
+
+
+def main(argv=None):
+    """
+    命令行入口
+    
+    返回:
+    退出码：0成功，1有步骤失败，2参数错误
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv and sys.stdin.isatty():
+        interactive_main()
+        return 0
+    
+    args = build_arg_parser().parse_args(argv)
+    if args.interactive:
+        interactive_main()
+        return 0
+    if args.jobs < 1:
+        print("❌ --jobs必须大于等于1")
+        return 2
+    
+    pipeline = PatentAnalysisPipeline(args.base_dir, artifacts=args.artifacts or False, profile_dir=args.profile_dir,
+                                      executor=args.executor)
+    
+    if args.list:
+        for i, step in enumerate(pipeline.pipeline_steps):
+            print(f"  {i+1}. {step['name']} [{step.get('pipeline', 'unknown')}]")
+        return 0
+    if args.status:
+        pipeline.show_pipeline_status()
+        return 0
+    if args.report:
+        pipeline.show_performance_report()
+        return 0
+    if args.sweep:
+        from sweep import run_sweep
+        
+        try:
+            with open(args.sweep, 'r', encoding='utf-8') as f:
+                grid = json.load(f)
+            table = run_sweep(grid, pipeline=pipeline, n_jobs=args.jobs,
+                              force=args.force, output_file=args.sweep_output)
+        except (OSError, ValueError) as e:
+            print(f"❌ {e}")
+            return 2
+        return 0 if table is not None and (table['状态'] == '成功').all() else 1
+    
+    try:
+        steps = pipeline.select_steps(args.steps, args.tag, args.target)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+    
+    if args.resume:
+        steps = pipeline.resume_steps(steps)
+        if not steps:
+            print("✅ 选中的步骤没有失败记录，无需续跑")
+            return 0
+        print(f"从上次失败的步骤继续: {', '.join(step['name'] for step in steps)}")
+    
+    if args.dry_run:
+        pipeline.show_plan(steps, force=args.force)
+        return 0
+    
+    if args.jobs > 1:
+        success = pipeline.run_dag_pipeline([step['name'] for step in steps], max_workers=args.jobs, force=args.force)
+    else:
+        success = pipeline.run_pipeline(steps=steps, force=args.force)
+    
+    if success:
+        print("\n🎉 流水线执行成功！")
+    else:
+        print("\n⚠️ 流水线执行失败，修复后可用 --resume 从失败的步骤继续")
+    return 0 if success else 1
 
 
-def main():
-    """主函数"""
+def interactive_main():
+    """交互菜单"""
     print("专利分析流水线工具")
     print("="*50)
     
@@ -654,12 +1132,13 @@ def main():
     print("1. 运行完整流水线（串行执行所有步骤）")
     print("2. 运行专利数量流水线")
     print("3. 运行被引证次数流水线")
-    print("4. 并行运行两条流水线")
+    print("4. 并行运行两条流水线（按依赖图多进程执行）")
     print("5. 运行指定步骤")
     print("6. 只显示状态")
+    print("7. 查看步骤性能对比（最近一次运行 vs 之前的运行）")
     
     try:
-        choice = input("\n请输入选择 (1/2/3/4/5/6): ").strip()
+        choice = input("\n请输入选择 (1/2/3/4/5/6/7): ").strip()
         
         if choice == '1':
             # 运行完整流水线
@@ -720,6 +1199,10 @@ def main():
         elif choice == '6':
             print("已显示流水线状态")
             
+        elif choice == '7':
+            # 对比最近一次运行与之前的运行
+            pipeline.show_performance_report()
+            
         else:
             print("❌ 无效选择")
             
@@ -732,4 +1215,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
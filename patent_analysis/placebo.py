@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+随机化/安慰剂推断
+把treatment在公司间随机重新分配，或随机平移投资年份，重复上千次检验treatment_post效应。
+由FWL定理，控制变量和固定效应的残差化只做一次；每次置换只重新生成安慰剂处理变量，
+一个分块内的所有置换组成n×P矩阵，一次批量去均值、一次矩阵乘积得到全部安慰剂系数。
+类别较少的固定效应（年份等）以稀疏虚拟变量块S处理，去除主固定效应后的M·S不显式生成：
+需要的叉积由稀疏乘积得到（S'M·S = S'S - (F'S)'diag(1/n_f)(F'S)），内存占用与n×类别数无关
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# 添加项目根目录到Python路径（共享的表格读取缓存模块）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from table_cache import read_table
+
+from scipy import sparse
+
+from hdfe import FixedEffectsAbsorber, factorize_effect, _get_column
+from sparse_design import sparse_dummies
+
+# 子进程中共享的置换上下文（由_init_worker设置，避免每个分块重复传输大数组）
+_CONTEXT = None
+
+
+def _init_worker(context):
+    global _CONTEXT
+    _CONTEXT = context
+
+
+def _placebo_regressors(context, mode, n_draws, rng):
+    """生成一个分块的安慰剂处理变量矩阵 (n × n_draws)"""
+    firm = context['firm_codes']
+    if mode == 'firms':
+        # treatment在公司间随机置换
+        treated = rng.permuted(np.repeat(context['firm_treatment'][:, None], n_draws, axis=1), axis=0)
+        return treated[firm] * context['post'][:, None]
+    if mode == 'timing':
+        # 每家处理公司随机平移投资年份
+        shifts = rng.choice(context['shifts'], size=(len(context['firm_treatment']), n_draws))
+        fake_post = context['year'][:, None] > context['investment_year'][:, None] + shifts[firm]
+        return context['treatment'][:, None] * fake_post
+    raise ValueError(f"未知的安慰剂方式: {mode}")
+
+
+def _placebo_chunk(mode, n_draws, seed):
+    """计算一个分块的安慰剂系数"""
+    context = _CONTEXT
+    rng = np.random.default_rng(seed)
+    D = _placebo_regressors(context, mode, n_draws, rng).astype(float)
+
+    D = context['absorber'].demean(D)
+    if context['ztz_inv'].size:
+        D -= _project(context, context['ztz_inv'] @ _cross(context, D))
+
+    return (D.T @ context['y']) / (D ** 2).sum(axis=0)
+
+
+def _cross(context, D):
+    """[Z, M·S]'D（D已去除主固定效应，故(M·S)'D = S'D）"""
+    parts = [context['Z'].T @ D]
+    if context['S'] is not None:
+        parts.append(np.asarray(context['S'].T @ D))
+    return np.vstack(parts)
+
+
+def _project(context, coef):
+    """[Z, M·S] @ coef，虚拟变量部分先做稀疏乘积再去除主固定效应"""
+    k = context['Z'].shape[1]
+    fitted = context['Z'] @ coef[:k]
+    if context['S'] is not None:
+        fitted += context['absorber'].demean(np.asarray(context['S'] @ coef[k:]))
+    return fitted
+
+
+def _dummy_gram(S, Z, primary_codes):
+    """
+    [Z, M·S]的叉积矩阵，M为主固定效应的组内去均值（Z已去除主固定效应）
+
+    S'M·S = S'S - (F'S)' diag(1/n_f) (F'S)，F为主固定效应的指示矩阵；Z'M·S = Z'S
+    """
+    n_groups = int(primary_codes.max()) + 1
+    F = sparse.csr_matrix((np.ones(len(primary_codes)), (primary_codes, np.arange(len(primary_codes)))),
+                          shape=(n_groups, len(primary_codes)))
+    FtS = (F @ S).tocsr()
+    sizes = np.bincount(primary_codes, minlength=n_groups).astype(float)
+    sms = (S.T @ S - FtS.T @ sparse.diags(1 / sizes) @ FtS).toarray()
+    zs = np.asarray((S.T @ Z).T) if Z.shape[1] else np.zeros((0, S.shape[1]))
+    return np.block([[Z.T @ Z, zs], [zs.T, sms]])
+
+
+def placebo_test(df, dependent='ln_patent_plus_1', controls=('ln_gdp',), absorb=('company', 'year'),
+                 mode='firms', reps=1000, shifts=(-2, -1, 1, 2), entity='company',
+                 seed=None, n_jobs=1, chunk_size=250, tol=1e-8, max_dummy_levels=1000):
+    """
+    安慰剂（随机化推断）检验treatment_post效应
+
+    参数:
+    df: 面板数据（需含treatment、post、year、investment_year列，company可在索引中）
+    dependent: 被解释变量
+    controls: 控制变量（残差化后保持不变）
+    absorb: 吸收的固定效应
+    mode: 'firms'在公司间随机置换treatment，'timing'随机平移处理公司的投资年份
+    reps: 置换次数
+    shifts: mode='timing'时投资年份平移量的取值
+    entity: 公司标识
+    seed: 随机种子（分块种子由它派生，结果与n_jobs无关）
+    n_jobs: 进程数，1时串行，None时使用全部CPU
+    chunk_size: 每个分块的置换次数
+    max_dummy_levels: 次要固定效应的类别总数不超过该值时以稀疏虚拟变量精确处理（叉积矩阵为类别数×类别数），
+                      否则交替投影
+
+    返回:
+    dict: 实际系数、经验p值（双侧，(1+#{|β_p|≥|β|})/(1+reps)）和安慰剂系数分布
+    """
+    from hdfe import fit_hdfe
+
+    df = df.assign(_did=np.asarray(_get_column(df, 'treatment'), dtype=float)
+                   * np.asarray(_get_column(df, 'post'), dtype=float))
+    controls = list(controls)
+    absorb = list(absorb)
+    results = fit_hdfe(df, dependent, ['_did'] + controls, absorb=absorb, tol=tol)
+    if '_did' not in results.params.index:
+        raise ValueError("treatment_post被固定效应完全吸收，无法做安慰剂检验")
+
+    mask = results.sample_mask
+    names = list(results.params.index)
+    j = names.index('_did')
+    Z = np.delete(results.demeaned_X, j, axis=1)
+
+    # 类别最多的一组固定效应（公司）一次组内去均值精确吸收，
+    # 其余类别较少的固定效应（年份等）作为去均值后的虚拟变量并入控制变量，置换时无需迭代
+    fe_codes = [pd.factorize(factorize_effect(df, effect)[mask])[0] for effect in absorb]
+    fe_codes.sort(key=lambda codes: -codes.max())
+    n_levels = sum(int(codes.max()) for codes in fe_codes[1:])
+    S = None
+    if fe_codes and n_levels <= max_dummy_levels:
+        absorber = FixedEffectsAbsorber(fe_codes[:1], tol=tol)
+        if len(fe_codes) > 1:
+            S = sparse.hstack([sparse_dummies(codes, 'fe')[0] for codes in fe_codes[1:]]).tocsr().astype(float)
+    else:
+        absorber = FixedEffectsAbsorber(fe_codes or [np.zeros(mask.sum(), dtype=np.int64)], tol=tol)
+    gram = _dummy_gram(S, Z, fe_codes[0]) if S is not None else Z.T @ Z
+
+    firm_codes, _ = pd.factorize(np.asarray(_get_column(df, entity))[mask])
+    treatment = np.asarray(_get_column(df, 'treatment'), dtype=float)[mask]
+    firm_treatment = np.zeros(firm_codes.max() + 1)
+    firm_treatment[firm_codes] = treatment
+
+    context = {
+        'firm_codes': firm_codes,
+        'firm_treatment': firm_treatment,
+        'treatment': treatment,
+        'post': np.asarray(_get_column(df, 'post'), dtype=float)[mask],
+        'year': np.asarray(_get_column(df, 'year'))[mask],
+        'investment_year': np.asarray(_get_column(df, 'investment_year'))[mask],
+        'shifts': np.asarray(shifts),
+        'absorber': absorber,
+        'Z': Z,
+        'S': S,
+        'ztz_inv': np.linalg.pinv(gram),
+        'y': results.demeaned_y,
+    }
+
+    n_chunks = max(int(np.ceil(reps / chunk_size)), 1)
+    sizes = [chunk_size] * (n_chunks - 1) + [reps - chunk_size * (n_chunks - 1)]
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+
+    if n_jobs == 1 or n_chunks == 1:
+        _init_worker(context)
+        chunks = [_placebo_chunk(mode, size, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(context,)) as executor:
+            chunks = list(executor.map(_placebo_chunk, [mode] * n_chunks, sizes, seeds))
+    placebo = np.concatenate(chunks)
+
+    coef = results.params['_did']
+    exceed = int(np.sum(np.abs(placebo) >= abs(coef)))
+    return {
+        'coef': coef,
+        'pvalue': (1 + exceed) / (1 + reps),
+        'placebo': placebo,
+        'placebo_mean': float(placebo.mean()),
+        'placebo_std': float(placebo.std()),
+        'mode': mode,
+        'reps': reps,
+        'nobs': results.nobs,
+    }
+
+
+def run_placebo_test(input_file='regress_data_with_gdp.xlsx', mode='firms', reps=1000, seed=None, n_jobs=None,
+                     output_file=None):
+    """
+    读取回归数据并执行安慰剂检验
+
+    参数:
+    input_file: 带GDP数据的回归数据文件
+    mode: 'firms'或'timing'
+    reps: 置换次数
+    output_file: 安慰剂系数分布的输出文件（xlsx），None时不保存
+    """
+    from did import build_panel_data
+
+    mode_desc = {'firms': '公司间随机分配treatment', 'timing': '随机平移投资年份'}[mode]
+    print(f"=== 安慰剂检验: {mode_desc} ===")
+    print(f"1. 读取回归数据: {input_file}...")
+    df = read_table(input_file, sheet_name='回归数据')
+    panel_df = build_panel_data(df)
+    print(f"   - 面板数据行数: {len(panel_df):,}")
+
+    print(f"2. 执行 {reps:,} 次置换...")
+    result = placebo_test(panel_df, mode=mode, reps=reps, seed=seed, n_jobs=n_jobs)
+
+    print("3. 结果:")
+    print(f"   - 实际DID系数: {result['coef']:.4f}")
+    print(f"   - 安慰剂系数均值: {result['placebo_mean']:.4f}, 标准差: {result['placebo_std']:.4f}")
+    print(f"   - 经验p值: {result['pvalue']:.4f}")
+
+    if output_file:
+        pd.DataFrame({'placebo_coef': result['placebo']}).to_excel(output_file, index=False)
+        print(f"   - 安慰剂系数分布已保存: {output_file}")
+
+    return result
+
+
+if __name__ == "__main__":
+    run_placebo_test(mode='firms')
+    run_placebo_test(mode='timing')
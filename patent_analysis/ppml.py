@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+高维固定效应泊松伪极大似然（PPML）
+专利数和引用数大量为0，对ln(y+1)做OLS得到的不是水平效应，且受+1变换影响。
+本模块直接对计数被解释变量做PPML：迭代加权最小二乘（IRLS），每次迭代用加权交替投影吸收固定效应，
+不生成虚拟变量；每次迭代的交替投影从上一次的去均值结果出发，权重收敛后只需很少的投影次数。
+可传入上一个设定的结果作为初值（warm start），批量跑多个设定时逐个加速
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from hdfe import (FixedEffectsAbsorber, HDFEResults, _get_column, absorbed_degrees_of_freedom,
+                  drop_singletons, effect_name, factorize_effect)
+
+
+class PPMLResults(HDFEResults):
+    """PPML回归结果（系数为对数线性模型的半弹性，exp(β)-1为水平效应）"""
+
+    def __init__(self, *args, deviance=np.nan, null_deviance=np.nan, eta=None, converged=True,
+                 irls_iterations=0, separated=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.deviance = deviance
+        self.null_deviance = null_deviance
+        self.pseudo_rsquared = 1 - deviance / null_deviance if null_deviance else np.nan
+        self.eta = eta
+        self.converged = converged
+        self.irls_iterations = irls_iterations
+        self.separated = separated
+
+    @property
+    def summary(self):
+        ci = self.conf_int()
+        table = pd.DataFrame({
+            'Parameter': self.params,
+            'Std. Err.': self.std_errors,
+            'T-stat': self.tstats,
+            'P-value': self.pvalues,
+            'Lower CI': ci['lower'],
+            'Upper CI': ci['upper'],
+        })
+        lines = [
+            'PPML-HDFE Estimation Summary',
+            '=' * 80,
+            f'Dep. Variable: {self.dependent}',
+            f'No. Observations: {self.nobs:,}' + (f' (剔除全为0的固定效应组 {self.separated:,} 个观测)' if self.separated else ''),
+            f'Absorbed FE: {", ".join(effect_name(e) for e in self.absorb) or "无"}'
+            f' (IRLS迭代 {self.irls_iterations} 次, 交替投影累计 {self.iterations} 次'
+            + ('' if self.converged else ', 未收敛') + ')',
+            f'Cov. Estimator: {self.cov_type}' + (f' ({self.n_clusters:,} clusters)' if self.n_clusters else ''),
+            f'Deviance: {self.deviance:.4f}, Pseudo R-squared: {self.pseudo_rsquared:.4f}',
+        ]
+        if self.dropped:
+            lines.append(f'Dropped (collinear with FE): {", ".join(self.dropped)}')
+        lines += ['-' * 80, table.round(4).to_string(), '=' * 80]
+        return '\n'.join(lines)
+
+
+def poisson_deviance(y, mu):
+    """泊松偏差 2Σ[y·ln(y/μ) - (y-μ)]，y=0的项取2μ"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        term = np.where(y > 0, y * np.log(y / mu), 0.0)
+    return float(2 * np.sum(term - (y - mu)))
+
+
+def drop_separated(y, fe_codes, keep):
+    """
+    迭代剔除结果全为0的固定效应组（如从未申请专利的公司）以及由此产生的单观测组
+    这些观测的拟合值趋于0，对应固定效应不存在有限的极大似然估计
+
+    返回:
+    keep: 保留观测的布尔数组
+    """
+    keep = keep.copy()
+    while True:
+        before = int(keep.sum())
+        for codes in fe_codes:
+            totals = np.bincount(codes[keep], weights=y[keep], minlength=int(codes.max()) + 1)
+            keep &= totals[codes] > 0
+        keep = drop_singletons(fe_codes, keep)
+        if int(keep.sum()) == before:
+            return keep
+
+
+def fit_ppml(df, dependent='patent_count', regressors=('treatment_post', 'ln_gdp'), absorb=('company', 'year'),
+             cluster='company', cov_type=None, start=None, tol=1e-8, max_iter=100, demean_tol=None,
+             verbose=False):
+    """
+    高维固定效应PPML
+
+    参数:
+    df: 面板数据（列或索引层中需包含所有变量）
+    dependent: 非负的计数被解释变量，默认专利数
+    regressors: 解释变量列名列表
+    absorb: 要吸收的固定效应列表，如['company', 'year', ('province', 'year')]
+    cluster: 聚类变量列名
+    cov_type: 'robust'或'clustered'，默认有cluster时为'clustered'
+    start: 上一个设定的PPMLResults（同一份数据），用其线性预测值作为初值
+    tol: 偏差相对变化的收敛阈值
+    max_iter: IRLS最大迭代次数
+    demean_tol: 交替投影收敛阈值，默认随IRLS收敛逐步收紧到tol/10
+    verbose: 是否打印每次迭代的偏差
+
+    返回:
+    PPMLResults
+    """
+    absorb = list(absorb or [])
+    regressors = list(regressors)
+    if cov_type is None:
+        cov_type = 'clustered' if cluster is not None else 'robust'
+
+    y = np.asarray(_get_column(df, dependent), dtype=float)
+    X = np.column_stack([np.asarray(_get_column(df, name), dtype=float) for name in regressors]) \
+        if regressors else np.empty((len(y), 0))
+    fe_codes = [factorize_effect(df, effect) for effect in absorb]
+
+    keep = np.isfinite(y) & np.isfinite(X).all(axis=1)
+    for codes in fe_codes:
+        keep &= codes >= 0
+    cluster_codes = None
+    if cov_type == 'clustered':
+        cluster_codes = factorize_effect(df, cluster)
+        keep &= cluster_codes >= 0
+    if (y[keep] < 0).any():
+        raise ValueError(f"PPML的被解释变量必须非负: {dependent}")
+
+    n_valid = int(keep.sum())
+    if fe_codes:
+        keep = drop_separated(y, fe_codes, keep)
+    separated = n_valid - int(keep.sum())
+
+    y, X = y[keep], X[keep]
+    fe_codes = [pd.factorize(codes[keep])[0] for codes in fe_codes] or [np.zeros(len(y), dtype=np.int64)]
+    if cluster_codes is not None:
+        cluster_codes = pd.factorize(cluster_codes[keep])[0]
+
+    # 初值：上一个设定的线性预测值，否则用(y + ȳ)/2
+    mean_y = y.mean()
+    mu = 0.5 * (y + mean_y)
+    if start is not None and start.eta is not None and len(start.eta) == len(keep):
+        warm = start.eta[keep]
+        mu = np.where(np.isfinite(warm), np.exp(np.clip(warm, -50, 50)), mu)
+    eta = np.log(mu)
+
+    n, p = len(y), X.shape[1]
+    null_deviance = poisson_deviance(y, np.full(n, mean_y))
+    deviance = np.inf
+    previous = None   # (上一次的[z, X], 上一次的去均值结果)
+    total_iterations = 0
+    converged = False
+    collinear = np.zeros(p, dtype=bool)
+
+    for iteration in range(1, max_iter + 1):
+        # 工作变量和权重
+        z = eta + (y - mu) / mu
+        data = np.column_stack([z, X])
+        # 交替投影阈值随偏差收敛逐步收紧（前几次迭代不需要精确去均值）
+        inner_tol = demean_tol or max(min(1e-4, abs(deviance) * 1e-3 if np.isfinite(deviance) else 1e-4), tol / 10)
+        absorber = FixedEffectsAbsorber(fe_codes, weights=mu, tol=inner_tol)
+        start_point = None if previous is None else previous[1] + (data - previous[0])
+        demeaned = absorber.demean(data, start=start_point)
+        total_iterations += absorber.iterations
+        previous = (data, demeaned)
+
+        z_tilde, X_tilde = demeaned[:, 0], demeaned[:, 1:]
+        if iteration == 1:
+            # 被固定效应完全吸收的解释变量
+            original_norm = np.sqrt(((X - X.mean(axis=0)) ** 2).sum(axis=0))
+            collinear = np.sqrt((X_tilde ** 2).sum(axis=0)) <= 1e-8 * np.maximum(original_norm, 1.0)
+        X_tilde = X_tilde[:, ~collinear]
+
+        Xw = X_tilde * mu[:, None]
+        xtx_inv = np.linalg.pinv(X_tilde.T @ Xw)
+        beta = xtx_inv @ (Xw.T @ z_tilde)
+
+        # 线性预测值（含固定效应）= z - 加权回归残差
+        eta = z - (z_tilde - X_tilde @ beta)
+        mu = np.exp(np.clip(eta, -50, 50))
+        new_deviance = poisson_deviance(y, mu)
+        change = abs(new_deviance - deviance) / max(min(new_deviance, deviance), 0.1)
+        deviance = new_deviance
+        if verbose:
+            print(f"   - IRLS迭代 {iteration}: 偏差 {deviance:.6f}, 交替投影 {absorber.iterations} 次")
+        if change < tol:
+            converged = True
+            break
+
+    if not converged:
+        print(f"   ⚠️ PPML在{max_iter}次迭代内未收敛（偏差相对变化 {change:.2e}）")
+
+    names = [name for name, flag in zip(regressors, collinear) if not flag]
+    dropped = [name for name, flag in zip(regressors, collinear) if flag]
+    k = len(names)
+    dof_absorbed = absorbed_degrees_of_freedom(fe_codes, cluster_codes) if absorb else 1
+    df_resid = max(n - k - dof_absorbed, 1)
+
+    # 三明治协方差：bread为最后一次迭代的(X̃'WX̃)^{-1}，得分为X̃(y-μ)
+    scores = X_tilde * (y - mu)[:, None]
+    n_clusters = None
+    if cov_type == 'clustered':
+        n_clusters = int(cluster_codes.max()) + 1
+        cluster_scores = np.zeros((n_clusters, k))
+        np.add.at(cluster_scores, cluster_codes, scores)
+        correction = n_clusters / (n_clusters - 1) * (n - 1) / df_resid
+        cov = correction * xtx_inv @ (cluster_scores.T @ cluster_scores) @ xtx_inv
+        df_resid = n_clusters - 1
+    else:
+        cov = n / df_resid * xtx_inv @ (scores.T @ scores) @ xtx_inv
+
+    # 对齐到输入数据的线性预测值（剔除的观测为NaN），供下一个设定warm start
+    full_eta = np.full(len(keep), np.nan)
+    full_eta[keep] = eta
+
+    params = pd.Series(beta, index=names, name='parameter')
+    return PPMLResults(params, pd.DataFrame(cov, index=names, columns=names), n, df_resid, y - mu,
+                       z_tilde, X_tilde, cov_type, absorb, n_clusters=n_clusters, dropped=dropped,
+                       iterations=total_iterations, dof_absorbed=dof_absorbed, tss_within=None,
+                       dependent=dependent, cluster_codes=cluster_codes, sample_mask=keep,
+                       deviance=deviance, null_deviance=null_deviance, eta=full_eta, converged=converged,
+                       irls_iterations=iteration, separated=separated)
+
+
+def level_effect(results, param='treatment_post', level=0.95):
+    """
+    把PPML系数转换为水平效应（百分比变化）exp(β)-1及其置信区间
+    """
+    ci = results.conf_int(level).loc[param]
+    return {
+        'coef': results.params[param],
+        'effect': np.expm1(results.params[param]),
+        'lower': np.expm1(ci['lower']),
+        'upper': np.expm1(ci['upper']),
+    }
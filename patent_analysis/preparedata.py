@@ -1,8 +1,16 @@
+import os
+import sys
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 
-def extract_regress_data(patent_data_file=None, data_type='patent_count'):
+# 添加项目根目录到Python路径（共享的表格读取缓存模块）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from table_cache import read_table
+import session_cache
+from excel_export import write_workbook
+
+def extract_regress_data(patent_data_file=None, data_type='patent_count', save=True):
     """
     从invest读取公司首次获投资的时间，
     从专利数据中获取该公司在获得投资前3年和后3年的专利数或被引证次数，
@@ -11,6 +19,7 @@ def extract_regress_data(patent_data_file=None, data_type='patent_count'):
     参数:
     patent_data_file: 专利数据文件路径，如果为None则使用默认文件
     data_type: 数据类型，'patent_count'表示专利数量，'citation_count'表示被引证次数
+    save: 是否立即写出Excel文件；为False时不写，返回结果中的'write'为写出文件的函数（由调用方延后执行）
     """
     try:
         print("=== 提取投资前后专利时间序列数据 ===")
@@ -18,7 +27,7 @@ def extract_regress_data(patent_data_file=None, data_type='patent_count'):
         
         # 1. 读取首次投资数据
         print("1. 读取首次投资数据...")
-        first_investments_df = pd.read_excel('invest.xlsx', sheet_name='有专利公司首次投资')
+        first_investments_df = session_cache.read_excel('invest.xlsx', sheet_name='有专利公司首次投资')
         print(f"   - 首次投资记录数: {len(first_investments_df):,}")
         
         # 2. 读取专利年度数据
@@ -45,10 +54,10 @@ def extract_regress_data(patent_data_file=None, data_type='patent_count'):
         
 
         try:
-            patent_df = pd.read_excel('patent_analysis/' + patent_data_file, sheet_name=sheet_name)
+            patent_df = read_table('patent_analysis/' + patent_data_file, sheet_name=sheet_name)
         except:
             # 如果指定的sheet不存在，尝试第一个sheet
-            patent_df = pd.read_excel(patent_data_file, sheet_name=0)
+            patent_df = read_table(patent_data_file, sheet_name=0)
             print(f"   - 使用默认sheet: {patent_df.columns[0]}")
         
         print(f"   - 专利数据文件: {patent_data_file}")
@@ -201,7 +210,12 @@ def extract_regress_data(patent_data_file=None, data_type='patent_count'):
         print("6. 创建数据框...")
         timeline_df = pd.DataFrame(timeline_data)
         print(f"   - 成功提取数据: {len(timeline_df):,} 家公司")
-        
+
+        # 保留首次投资的行业，供匹配对照组时作为精确匹配变量
+        if '行业(清科)' in first_investments_df.columns and len(timeline_df) > 0:
+            industry = first_investments_df.drop_duplicates('融资主体').set_index('融资主体')['行业(清科)']
+            timeline_df['行业(清科)'] = timeline_df['公司名称'].map(industry)
+
         # 7. 数据统计
         print("7. 数据统计...")
         print(f"   - 有投资记录的公司: {len(timeline_df):,}")
@@ -242,13 +256,10 @@ def extract_regress_data(patent_data_file=None, data_type='patent_count'):
             sheet_name_yearly = '专利数量按年份统计'
         
         # 保存为Excel文件
-        with pd.ExcelWriter(excel_filename, engine='openpyxl') as writer:
-            timeline_df.to_excel(writer, sheet_name='回归数据', index=False)
-            
+        def write():
             # 创建汇总统计sheet
             summary_stats = timeline_df.describe()
-            summary_stats.to_excel(writer, sheet_name=sheet_name_summary)
-            
+        
             # 按年份统计
             if data_type == 'citation_count':
                 yearly_stats = timeline_df.groupby('投资年份').agg({
@@ -264,16 +275,27 @@ def extract_regress_data(patent_data_file=None, data_type='patent_count'):
                     '专利增长率': 'mean',
                     'treatment': 'count'
                 }).round(2)
-            yearly_stats.to_excel(writer, sheet_name=sheet_name_yearly)
         
-        print(f"   - Excel文件已保存: {excel_filename}")
+            write_workbook(excel_filename, {
+                '回归数据': timeline_df,
+                sheet_name_summary: summary_stats,
+                sheet_name_yearly: yearly_stats,
+            }, no_index=['回归数据'])
+        
+            print(f"   - Excel文件已保存: {excel_filename}")
+        
+        if save:
+            write()
+        else:
+            print(f"   - Excel文件延后写出: {excel_filename}")
      
         return {
             'timeline_df': timeline_df,
             'excel_file': excel_filename,
             'total_companies': len(timeline_df),
             'year_range': f"{timeline_df['投资年份'].min()} - {timeline_df['投资年份'].max()}",
-            'data_type': data_type
+            'data_type': data_type,
+            'write': None if save else write
         }
         
     except FileNotFoundError as e:
@@ -285,17 +307,17 @@ def extract_regress_data(patent_data_file=None, data_type='patent_count'):
         traceback.print_exc()
         return None
 
-def extract_regress_data_patents():
+def extract_regress_data_patents(save=True):
     """
     提取专利数量数据的便捷函数
     """
-    return extract_regress_data(patent_data_file='company_patent_yearly.xlsx', data_type='patent_count')
+    return extract_regress_data(patent_data_file='company_patent_yearly.xlsx', data_type='patent_count', save=save)
 
-def extract_regress_data_citations():
+def extract_regress_data_citations(save=True):
     """
     提取被引证次数数据的便捷函数
     """
-    return extract_regress_data(patent_data_file='company_patent_citations_yearly.xlsx', data_type='citation_count')
+    return extract_regress_data(patent_data_file='company_patent_citations_yearly.xlsx', data_type='citation_count', save=save)
 
 if __name__ == "__main__":
     print("=== 专利数量数据分析 ===")
@@ -1,5 +1,11 @@
+import os
+import sys
 import pandas as pd
 
+# 添加项目根目录到Python路径（共享的表格读取缓存模块）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from table_cache import read_table
+
 
 def analyze_data(df):
     """
@@ -40,7 +46,7 @@ def filter_and_save_data(df):
             print(f"\n=== 处理{fund_name} ===")
             
             # 读取Excel文件，以第4行（索引为3）作为列名
-            df = pd.read_excel(filename, header=3)
+            df = read_table(filename, header=3)
             print(f"{fund_name}数据读取成功！")
             print(f"数据形状: {df.shape}")
             print(f"列名: {list(df.columns)}")
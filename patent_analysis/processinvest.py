@@ -1,7 +1,12 @@
+import sys
 import pandas as pd
 import os
 import glob
 
+# 添加项目根目录到Python路径（共享的表格读取缓存模块）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from table_cache import read_table
+
 def read_and_merge_investment_data():
     """
     读取../政府引导基金投资事件 文件夹中2000及以后的文件，合并所有数据到invest.xlsx中
@@ -31,7 +36,7 @@ def read_and_merge_investment_data():
                 print(f"正在处理文件: {filename}")
                 
                 # 读取Excel文件，以第4行（索引为3）作为列名
-                df = pd.read_excel(file_path, header=3)
+                df = read_table(file_path, header=3)
                 
                 print(f"  - 数据形状: {df.shape}")
                 print(f"  - 列名: {list(df.columns)}")
@@ -100,13 +105,13 @@ def add_treatment_column():
         
         # 1. 读取invest.xlsx文件
         print("1. 读取invest.xlsx文件...")
-        invest_df = pd.read_excel('invest.xlsx', sheet_name='所有投资')
+        invest_df = read_table('invest.xlsx', sheet_name='所有投资')
         print(f"   - 投资数据行数: {len(invest_df):,}")
         print(f"   - 列数: {len(invest_df.columns)}")
         
         # 2. 读取govfund_filtered.xlsx文件
         print("2. 读取govfund_filtered.xlsx文件...")
-        govfund_df = pd.read_excel('govfund_filtered.xlsx')
+        govfund_df = read_table('govfund_filtered.xlsx')
         print(f"   - 政府基金数据行数: {len(govfund_df):,}")
         
         # 3. 创建政府基金名称集合（包括简称和全称）
@@ -209,7 +214,7 @@ def extract_first_investment_for_patent_companies():
         # 1. 读取有专利公司数据
         print("1. 读取有专利公司数据...")
         try:
-            patent_companies_df = pd.read_excel('company_patent_yearly.xlsx', sheet_name='有专利公司')
+            patent_companies_df = read_table('company_patent_yearly.xlsx', sheet_name='有专利公司')
             print(f"   - 有专利公司数据形状: {patent_companies_df.shape}")
             
             # 检查公司名称列
@@ -227,7 +232,7 @@ def extract_first_investment_for_patent_companies():
         
         # 2. 读取投资数据
         print("2. 读取投资数据...")
-        invest_df = pd.read_excel('invest.xlsx', sheet_name='treatment')
+        invest_df = read_table('invest.xlsx', sheet_name='treatment')
         print(f"   - 投资记录总数: {len(invest_df):,}")
         
         # 3. 获取有专利的公司名称列表
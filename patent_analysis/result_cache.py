@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+回归结果缓存
+缓存键 = 输入数据的内容哈希 + 规范化的回归设定（被解释变量、解释变量、固定效应、协方差类型等）
+        + 拟合代码的哈希（调用模块及其递归依赖的本地模块，与流水线清单的步骤源码指纹相同），
+命中时直接读取系数、协方差矩阵和回归摘要，不再重新拟合；上游数据或估计代码一旦变化，键随之改变，旧结果自然失效。
+每个结果存为一个压缩的.npz文件（数值数组 + JSON元数据）
+"""
+
+import os
+import sys
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_DIR = '.regression_cache'
+
+# 查找拟合代码依赖的本地模块的目录：本目录和上级目录（ols_regression.py等在上级目录）
+_HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIRS = [_HERE, os.path.dirname(_HERE)]
+
+# 从回归结果对象中保存的标量统计量（存在且为数值时才保存）
+SCALAR_STATISTICS = ('nobs', 'df_resid', 'rsquared', 'rsquared_adj', 'rsquared_within', 'fvalue', 'f_pvalue',
+                     'aic', 'bic', 'n_clusters')
+
+
+def frame_fingerprint(df):
+    """
+    DataFrame的内容哈希（含索引、列名和数据类型），数据任一值变化都会改变哈希
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([list(map(str, df.index.names)), list(map(str, df.columns)),
+                              list(map(str, df.dtypes))], ensure_ascii=False).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def file_fingerprint(path, chunk_size=1 << 20):
+    """文件内容的哈希（用于以上游文件而非内存数据作为缓存键）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def code_fingerprint(module_file, search_dirs=None):
+    """
+    拟合代码的哈希：模块文件及其递归import的本地模块（见step_manifest.source_files）的内容哈希
+
+    参数:
+    module_file: 调用回归的模块文件
+    search_dirs: 查找本地模块的目录，默认为module_file所在目录和SOURCE_DIRS
+    """
+    from step_manifest import source_files
+
+    module_file = os.path.abspath(module_file)
+    module_dir = os.path.dirname(module_file)
+    search_dirs = search_dirs or [module_dir] + [d for d in SOURCE_DIRS if d != module_dir]
+    module_name = os.path.splitext(os.path.basename(module_file))[0]
+    return {os.path.basename(path): file_fingerprint(path) for path in source_files([module_name], search_dirs)}
+
+
+def _normalize(value):
+    """把回归设定转换为可稳定序列化的形式（元组转列表、numpy标量转Python标量）"""
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in sorted(value.items(), key=lambda item: str(item[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def spec_key(fingerprint, spec, code=None):
+    """
+    缓存键：数据哈希 + 规范化回归设定 + 拟合代码哈希的哈希
+
+    参数:
+    fingerprint: 数据内容哈希（frame_fingerprint/file_fingerprint的结果，或多个哈希的列表）
+    spec: 回归设定字典，如{'dependent': ..., 'regressors': [...], 'absorb': [...], 'cov_type': 'clustered'}
+    code: 拟合代码的哈希（code_fingerprint的结果）
+    """
+    payload = json.dumps({'data': _normalize(fingerprint), 'spec': _normalize(spec), 'code': _normalize(code)},
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class CachedResult:
+    """从缓存恢复的回归结果，同时提供linearmodels（std_errors/tstats）和statsmodels（bse/tvalues）的属性名"""
+
+    def __init__(self, params, cov, std_errors, tstats, pvalues, summary_text, statistics=None, extras=None):
+        self.params = params
+        self.cov = cov
+        self.std_errors = std_errors
+        self.tstats = tstats
+        self.pvalues = pvalues
+        self.summary = summary_text
+        self.statistics = statistics or {}
+        self.extras = extras or {}
+        for name, value in self.statistics.items():
+            setattr(self, name, value)
+
+    @property
+    def bse(self):
+        return self.std_errors
+
+    @property
+    def tvalues(self):
+        return self.tstats
+
+    def cov_params(self):
+        return self.cov
+
+    def __str__(self):
+        return self.summary
+
+    @classmethod
+    def from_results(cls, results, extras=None):
+        """把linearmodels、statsmodels或HDFEResults的结果对象转换为CachedResult"""
+        params = results.params
+        std_errors = getattr(results, 'std_errors', None)
+        if std_errors is None:
+            std_errors = results.bse
+        tstats = getattr(results, 'tstats', None)
+        if tstats is None:
+            tstats = results.tvalues
+        cov = results.cov if isinstance(getattr(results, 'cov', None), pd.DataFrame) else results.cov_params()
+
+        summary = getattr(results, 'summary', '')
+        summary_text = str(summary() if callable(summary) else summary)
+
+        statistics = {}
+        for name in SCALAR_STATISTICS:
+            value = getattr(results, name, None)
+            if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+                statistics[name] = value.item() if isinstance(value, np.generic) else value
+        return cls(params, cov, std_errors, tstats, results.pvalues, summary_text, statistics, extras)
+
+
+class ResultCache:
+    """
+    回归结果的磁盘缓存
+
+    参数:
+    directory: 缓存目录，默认当前目录下的.regression_cache
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or DEFAULT_CACHE_DIR
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key):
+        """读取缓存结果，不存在或已损坏时返回None"""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as stored:
+                names = [str(name) for name in stored['names']]
+                meta = json.loads(str(stored['meta']))
+                params = pd.Series(stored['params'], index=names, name='parameter')
+                return CachedResult(
+                    params=params,
+                    cov=pd.DataFrame(stored['cov'], index=names, columns=names),
+                    std_errors=pd.Series(stored['std_errors'], index=names, name='std_error'),
+                    tstats=pd.Series(stored['tstats'], index=names, name='tstat'),
+                    pvalues=pd.Series(stored['pvalues'], index=names, name='pvalue'),
+                    summary_text=meta['summary'],
+                    statistics=meta['statistics'],
+                    extras=meta['extras'],
+                )
+        except (OSError, KeyError, ValueError) as e:
+            print(f"   ⚠️ 回归结果缓存读取失败，将重新拟合: {e}")
+            return None
+
+    def put(self, key, results, extras=None):
+        """
+        保存回归结果
+
+        返回:
+        CachedResult（与之后从缓存读取的结果一致）
+        """
+        cached = results if isinstance(results, CachedResult) else CachedResult.from_results(results, extras)
+        os.makedirs(self.directory, exist_ok=True)
+        names = [str(name) for name in cached.params.index]
+        meta = json.dumps({'summary': cached.summary, 'statistics': cached.statistics,
+                           'extras': _normalize(cached.extras)}, ensure_ascii=False, default=str)
+
+        # 先写临时文件再替换，避免并行运行时读到写了一半的缓存
+        tmp_path = self._path(key) + f'.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                names=np.array(names),
+                params=cached.params.to_numpy(dtype=float),
+                cov=np.asarray(cached.cov, dtype=float),
+                std_errors=np.asarray(cached.std_errors, dtype=float),
+                tstats=np.asarray(cached.tstats, dtype=float),
+                pvalues=np.asarray(cached.pvalues, dtype=float),
+                meta=np.array(meta),
+            )
+        os.replace(tmp_path, self._path(key))
+        return cached
+
+    def clear(self):
+        """删除全部缓存结果"""
+        if not os.path.isdir(self.directory):
+            return 0
+        removed = 0
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                os.remove(os.path.join(self.directory, name))
+                removed += 1
+        return removed
+
+
+def get_cache(cache):
+    """cache参数：None/False不使用缓存，True使用默认目录，字符串为缓存目录，也可直接传入ResultCache"""
+    if not cache:
+        return None
+    if isinstance(cache, ResultCache):
+        return cache
+    return ResultCache(cache if isinstance(cache, str) else None)
+
+
+def cached_fit(cache, data, spec, fit, extras=None, code_file=None):
+    """
+    带缓存的回归拟合
+
+    参数:
+    cache: ResultCache或get_cache接受的参数
+    data: 回归用的DataFrame（计算内容哈希），或已算好的哈希
+    spec: 回归设定字典
+    fit: 无参数函数，返回回归结果对象
+    extras: 随结果保存的附加信息（可JSON序列化）
+    code_file: 计算代码哈希的模块文件，默认为调用cached_fit的模块；
+               该模块或其依赖的本地模块（如hdfe.py）修改后不再命中旧结果
+
+    返回:
+    未命中（或不使用缓存）时返回fit()的原始结果，命中时返回CachedResult
+    """
+    cache = get_cache(cache)
+    if cache is None:
+        return fit()
+
+    if code_file is None:
+        code_file = sys._getframe(1).f_globals.get('__file__')
+    code = code_fingerprint(code_file) if code_file else None
+    fingerprint = frame_fingerprint(data) if isinstance(data, pd.DataFrame) else data
+    key = spec_key(fingerprint, spec, code)
+    cached = cache.get(key)
+    if cached is not None:
+        print(f"   - 命中回归结果缓存: {key[:12]}")
+        return cached
+
+    results = fit()
+    cache.put(key, results, extras)
+    print(f"   - 回归结果已缓存: {key[:12]}")
+    return results
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程内的Excel读取缓存
+同一次流水线运行中invest.xlsx、gdp.xlsx会被多个步骤读取，解析xlsx是流水线中最耗时的操作之一；
+read_excel按(文件绝对路径, 工作表, 读取参数, 文件大小和修改时间)缓存解析结果，每个工作表在一个进程中只解析一次，
+文件被修改后自动重新解析。
+调用方拿到的是缓存的副本，修改副本不会影响缓存：pandas启用写时复制（copy-on-write，pandas 3默认启用）时为浅拷贝，
+否则为深拷贝
+缓存未命中时通过项目根目录的table_cache.read_table解析，跨进程、跨运行复用磁盘上的旁路缓存。
+解析在全局锁之外进行（线程池中的步骤可以同时解析不同的文件）；多个线程同时读取同一工作表时只有一个线程解析，
+其余线程等待它的结果
+"""
+
+import os
+import sys
+import threading
+from concurrent.futures import Future
+
+import pandas as pd
+
+# 添加项目根目录到Python路径（共享的表格读取缓存模块）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from table_cache import read_table
+
+_cache = {}
+# 正在解析的工作表: {缓存键: (文件版本, Future)}
+_loading = {}
+_stats = {'hits': 0, 'misses': 0}
+_lock = threading.Lock()
+
+
+def _copy_on_write_enabled():
+    """pandas是否启用了写时复制"""
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    return pd.options.mode.copy_on_write is True
+
+
+def _sheet_key(path, sheet_name):
+    """
+    工作表编号转换为工作表名，使read_excel(path)与read_excel(path, sheet_name='第一个表名')共用同一缓存项
+    （只读取工作簿目录，不加载单元格）
+    """
+    if not isinstance(sheet_name, int) or not path.endswith(('.xlsx', '.xlsm')):
+        return sheet_name
+    try:
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True)
+        try:
+            return workbook.sheetnames[sheet_name]
+        finally:
+            workbook.close()
+    except Exception:
+        return sheet_name
+
+
+def _copy(df):
+    return df.copy(deep=not _copy_on_write_enabled())
+
+
+def read_excel(path, sheet_name=0, **kwargs):
+    """
+    带缓存的pd.read_excel
+
+    参数:
+    path: Excel文件路径
+    sheet_name: 工作表名或编号（只支持单个工作表）
+    **kwargs: 传给pd.read_excel的其他参数（参数不同的读取分别缓存）
+
+    返回:
+    DataFrame（缓存的副本，可以自由修改）
+    """
+    if sheet_name is None or isinstance(sheet_name, (list, tuple)):
+        raise ValueError("read_excel只缓存单个工作表，sheet_name不能为None或列表")
+
+    full_path = os.path.abspath(path)
+    stat = os.stat(full_path)
+    key = (full_path, _sheet_key(full_path, sheet_name), tuple(sorted((k, repr(v)) for k, v in kwargs.items())))
+    version = (stat.st_size, stat.st_mtime_ns)
+
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] == version:
+            _stats['hits'] += 1
+            return _copy(entry[1])
+
+        pending = _loading.get(key)
+        loader = pending is None or pending[0] != version
+        if loader:
+            future = Future()
+            _loading[key] = (version, future)
+            _stats['misses'] += 1
+        else:
+            future = pending[1]
+            _stats['hits'] += 1
+
+    if not loader:
+        return _copy(future.result())
+
+    # 在锁外解析，完成后放入缓存并唤醒等待同一工作表的线程
+    try:
+        df = read_table(full_path, sheet_name=sheet_name, **kwargs)
+    except BaseException as e:
+        with _lock:
+            if _loading.get(key, (None, None))[1] is future:
+                del _loading[key]
+        future.set_exception(e)
+        raise
+    with _lock:
+        _cache[key] = (version, df)
+        if _loading.get(key, (None, None))[1] is future:
+            del _loading[key]
+    future.set_result(df)
+    return _copy(df)
+
+
+def cache_info():
+    """
+    缓存统计
+
+    返回:
+    {'hits': 命中次数, 'misses': 解析次数, 'entries': 缓存的工作表数}
+    """
+    with _lock:
+        return {'hits': _stats['hits'], 'misses': _stats['misses'], 'entries': len(_cache)}
+
+
+def clear():
+    """清空缓存并重置统计（流水线运行结束时调用，释放内存）"""
+    with _lock:
+        _cache.clear()
+        _stats['hits'] = 0
+        _stats['misses'] = 0
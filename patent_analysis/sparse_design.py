@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+稀疏设计矩阵
+省份、年份、行业等虚拟变量以scipy.sparse块的形式生成，回归时由稀疏乘积直接得到X'X和X'y，
+增加分类控制变量时内存不再随类别数成倍增长
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+def sparse_dummies(values, prefix, drop_first=True):
+    """
+    生成稀疏虚拟变量块
+
+    参数:
+    values: 分类变量取值（Series/数组），缺失值对应全零行
+    prefix: 虚拟变量列名前缀，如'province'
+    drop_first: 是否去掉第一个出现的类别作为基准
+
+    返回:
+    block: csr_matrix (n × 类别数)
+    names: 列名列表
+    """
+    codes, uniques = pd.factorize(np.asarray(values))
+    start = 1 if drop_first else 0
+    rows = np.flatnonzero(codes >= start)
+    cols = codes[rows] - start
+    block = sparse.csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)),
+                              shape=(len(codes), max(len(uniques) - start, 0)))
+    names = [f'{prefix}_{value}' for value in uniques[start:]]
+    return block, names
+
+
+def dummy_block(df, columns):
+    """从DataFrame中取出（可能是pandas稀疏类型的）虚拟变量列，返回csr_matrix"""
+    if not columns:
+        return sparse.csr_matrix((len(df), 0))
+    frame = df[columns]
+    if all(isinstance(dtype, pd.SparseDtype) for dtype in frame.dtypes):
+        return frame.sparse.to_coo().tocsr()
+    return sparse.csr_matrix(frame.to_numpy(dtype=float))
+
+
+def build_design(df, dense_columns, sparse_blocks=(), add_constant=True):
+    """
+    拼接稠密解释变量与稀疏虚拟变量块
+
+    参数:
+    df: 数据
+    dense_columns: 连续解释变量列名
+    sparse_blocks: [(csr_matrix, names), ...]
+    add_constant: 是否加入常数项
+
+    返回:
+    X: csr_matrix
+    names: 列名列表
+    """
+    parts, names = [], []
+    if add_constant:
+        parts.append(sparse.csr_matrix(np.ones((len(df), 1))))
+        names.append('const')
+    if dense_columns:
+        parts.append(sparse.csr_matrix(df[dense_columns].to_numpy(dtype=float)))
+        names += list(dense_columns)
+    for block, block_names in sparse_blocks:
+        parts.append(block)
+        names += list(block_names)
+    return sparse.hstack(parts, format='csr', dtype=float), names
+
+
+def sparse_ols(X, y, names, cluster=None, dependent=None):
+    """
+    用稀疏乘积构造正规方程求解OLS
+
+    参数:
+    X: 稀疏设计矩阵（需已包含常数项）
+    y: 被解释变量
+    names: X的列名
+    cluster: 聚类变量取值，None时为同方差标准误
+
+    返回:
+    HDFEResults（与hdfe.fit_hdfe相同的结果对象）
+    """
+    from hdfe import HDFEResults
+
+    X = sparse.csr_matrix(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # 被解释变量、任一解释变量（稀疏矩阵按行检查非零元素）或聚类变量缺失的行不参与回归；
+    # 加权回归时权重已乘入X和y，缺失的权重同样在这里剔除
+    keep = np.isfinite(y)
+    row_of_entry = np.repeat(np.arange(X.shape[0]), np.diff(X.indptr))
+    keep[row_of_entry[~np.isfinite(X.data)]] = False
+    if cluster is not None:
+        cluster_codes, _ = pd.factorize(np.asarray(cluster))
+        keep &= cluster_codes >= 0
+    if not keep.all():
+        X, y = X[keep], y[keep]
+        if cluster is not None:
+            cluster_codes = cluster_codes[keep]
+
+    xtx = (X.T @ X).toarray()
+    xty = X.T @ y
+    xtx_inv = np.linalg.pinv(xtx)
+    beta = xtx_inv @ xty
+    resid = y - X @ beta
+
+    n, k = X.shape
+    rank = np.linalg.matrix_rank(xtx)
+    df_resid = max(n - rank, 1)
+
+    n_clusters = None
+    if cluster is not None:
+        cluster_codes, _ = pd.factorize(cluster_codes)
+        n_clusters = int(cluster_codes.max()) + 1
+        # 聚类得分 = C'(X∘e)，C为n×G的稀疏聚类指示矩阵
+        indicator = sparse.csr_matrix((resid, (cluster_codes, np.arange(n))), shape=(n_clusters, n))
+        cluster_scores = (indicator @ X).toarray()
+        meat = cluster_scores.T @ cluster_scores
+        correction = n_clusters / (n_clusters - 1) * (n - 1) / df_resid
+        cov = correction * xtx_inv @ meat @ xtx_inv
+        cov_type = 'clustered'
+        df_resid = n_clusters - 1
+    else:
+        cov = float(resid @ resid) / df_resid * xtx_inv
+        cov_type = 'unadjusted'
+
+    params = pd.Series(beta, index=names, name='parameter')
+    cov = pd.DataFrame(cov, index=names, columns=names)
+    tss = float(((y - y.mean()) ** 2).sum())
+
+    return HDFEResults(params, cov, n, df_resid, resid, y, None, cov_type, [],
+                       n_clusters=n_clusters, tss_within=tss, dependent=dependent)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量多设定DID回归
+同一面板只读取一次；每个(样本, 固定效应结构)只做一次去均值和一次交叉乘积X'X、X'Y，
+所有被解释变量×控制变量组合在这组交叉乘积上以批量最小二乘求解，输出整洁的结果表
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+from scipy import sparse, stats
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# 添加项目根目录到Python路径（共享的表格读取缓存模块）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from table_cache import read_table
+
+from hdfe import (FixedEffectsAbsorber, absorbed_degrees_of_freedom, drop_singletons,
+                  effect_name, factorize_effect, _get_column)
+
+# 默认设定
+DEFAULT_OUTCOMES = ['ln_patent_plus_1', 'patent_count']
+DEFAULT_CONTROL_SETS = {
+    'DID': ['treatment', 'post', 'treatment_post'],
+    'DID+GDP': ['treatment', 'post', 'treatment_post', 'ln_gdp'],
+}
+DEFAULT_FE_SETS = {
+    '无固定效应': [],
+    '省份': ['province'],
+    '公司+年份': ['company', 'year'],
+}
+
+
+def _as_named(specs, label):
+    """把列表形式的设定转换为{名称: 设定}"""
+    if isinstance(specs, dict):
+        return specs
+    return {f'{label}{i + 1}': spec for i, spec in enumerate(specs)}
+
+
+def _sample_mask(panel_df, rule):
+    """样本规则：None为全样本，可以是布尔数组/Series或接收panel_df返回布尔值的函数"""
+    if rule is None:
+        return np.ones(len(panel_df), dtype=bool)
+    if callable(rule):
+        rule = rule(panel_df)
+    return np.asarray(rule, dtype=bool)
+
+
+class _ProjectedCrossProducts:
+    """一个(样本, 固定效应结构)下去均值后的数据和交叉乘积"""
+
+    def __init__(self, panel_df, mask, regressors, outcomes, absorb, cluster):
+        X = np.column_stack([np.asarray(_get_column(panel_df, name), dtype=float)[mask] for name in regressors])
+        Y = np.column_stack([np.asarray(_get_column(panel_df, name), dtype=float)[mask] for name in outcomes])
+        fe_codes = [factorize_effect(panel_df, effect)[mask] for effect in absorb]
+        cluster_codes = factorize_effect(panel_df, cluster)[mask] if cluster is not None else None
+
+        # 所有设定共用同一估计样本（所有变量均不缺失）
+        keep = np.isfinite(X).all(axis=1) & np.isfinite(Y).all(axis=1)
+        for codes in fe_codes:
+            keep &= codes >= 0
+        if cluster_codes is not None:
+            keep &= cluster_codes >= 0
+        if fe_codes:
+            keep = drop_singletons(fe_codes, keep)
+
+        X, Y = X[keep], Y[keep]
+        fe_codes = [pd.factorize(codes[keep])[0] for codes in fe_codes]
+        self.nobs = len(X)
+
+        absorber = FixedEffectsAbsorber(fe_codes or [np.zeros(self.nobs, dtype=np.int64)])
+        demeaned = absorber.demean(np.column_stack([X, Y]))
+        self.X = demeaned[:, :X.shape[1]]
+        self.Y = demeaned[:, X.shape[1]:]
+        self.iterations = absorber.iterations
+
+        # 交叉乘积只算一次
+        self.xtx = self.X.T @ self.X
+        self.xty = self.X.T @ self.Y
+
+        # 被固定效应完全吸收的解释变量
+        raw_norm = ((X - X.mean(axis=0)) ** 2).sum(axis=0)
+        self.absorbed = np.diag(self.xtx) <= 1e-16 * np.maximum(raw_norm, 1.0)
+
+        self.cluster_indicator = None
+        self.n_clusters = None
+        if cluster_codes is not None:
+            cluster_codes = pd.factorize(cluster_codes[keep])[0]
+            self.n_clusters = int(cluster_codes.max()) + 1
+            self.cluster_indicator = sparse.csr_matrix(
+                (np.ones(self.nobs), (cluster_codes, np.arange(self.nobs))), shape=(self.n_clusters, self.nobs))
+        self.dof_absorbed = absorbed_degrees_of_freedom(fe_codes, cluster_codes) if fe_codes else 1
+
+    def solve(self, columns):
+        """
+        对一组解释变量同时求解所有被解释变量
+
+        返回:
+        beta (k × m), cov (m × k × k), df_resid
+        """
+        A = self.xtx[np.ix_(columns, columns)]
+        A_inv = np.linalg.pinv(A)
+        beta = A_inv @ self.xty[columns]
+
+        Xs = self.X[:, columns]
+        resid = self.Y - Xs @ beta
+        n, k, m = self.nobs, len(columns), self.Y.shape[1]
+        df_resid = max(n - k - self.dof_absorbed, 1)
+
+        if self.cluster_indicator is not None:
+            # 每个聚类的得分 Σ x_i e_im，所有被解释变量一次计算
+            scores = (Xs[:, :, None] * resid[:, None, :]).reshape(n, k * m)
+            cluster_scores = np.asarray(self.cluster_indicator @ scores).reshape(self.n_clusters, k, m)
+            meat = np.einsum('gjm,glm->mjl', cluster_scores, cluster_scores)
+            G = self.n_clusters
+            correction = G / (G - 1) * (n - 1) / df_resid
+            cov = correction * np.einsum('jk,mkl,lp->mjp', A_inv, meat, A_inv)
+            df_resid = G - 1
+        else:
+            sigma2 = (resid ** 2).sum(axis=0) / df_resid
+            cov = sigma2[:, None, None] * A_inv[None, :, :]
+        return beta, cov, df_resid
+
+
+def run_spec_grid(panel_df, outcomes=None, control_sets=None, fe_sets=None, samples=None, cluster='company'):
+    """
+    在一个面板上批量估计所有设定组合
+
+    参数:
+    panel_df: 面板数据（build_panel_data的输出，需含treatment_post列）
+    outcomes: 被解释变量列表
+    control_sets: {名称: 解释变量列表}
+    fe_sets: {名称: 吸收的固定效应列表}
+    samples: {名称: 样本规则}，样本规则见_sample_mask，默认全样本
+    cluster: 聚类变量，None时为同方差标准误
+
+    返回:
+    整洁的结果表：每个(样本, 固定效应, 控制变量, 被解释变量, 变量)一行
+    """
+    outcomes = list(outcomes or DEFAULT_OUTCOMES)
+    control_sets = _as_named(control_sets or DEFAULT_CONTROL_SETS, '控制变量组')
+    fe_sets = _as_named(fe_sets if fe_sets is not None else DEFAULT_FE_SETS, '固定效应')
+    samples = _as_named(samples or {'全样本': None}, '样本')
+
+    regressors = list(dict.fromkeys(name for spec in control_sets.values() for name in spec))
+    position = {name: i for i, name in enumerate(regressors)}
+
+    rows = []
+    for sample_name, rule in samples.items():
+        mask = _sample_mask(panel_df, rule)
+        for fe_name, absorb in fe_sets.items():
+            print(f"   - 样本[{sample_name}] 固定效应[{fe_name}]: 去均值并计算交叉乘积...")
+            projected = _ProjectedCrossProducts(panel_df, mask, regressors, outcomes, list(absorb), cluster)
+
+            for control_name, spec in control_sets.items():
+                columns = [position[name] for name in spec if not projected.absorbed[position[name]]]
+                names = [regressors[i] for i in columns]
+                beta, cov, df_resid = projected.solve(columns)
+
+                for m, outcome in enumerate(outcomes):
+                    std_errors = np.sqrt(np.diag(cov[m]))
+                    tstats = beta[:, m] / std_errors
+                    pvalues = 2 * stats.t.sf(np.abs(tstats), df_resid)
+                    for j, term in enumerate(names):
+                        rows.append({
+                            'sample': sample_name,
+                            'fe': fe_name,
+                            'absorb': ', '.join(effect_name(e) for e in absorb),
+                            'controls': control_name,
+                            'outcome': outcome,
+                            'term': term,
+                            'coef': beta[j, m],
+                            'std_error': std_errors[j],
+                            'tstat': tstats[j],
+                            'pvalue': pvalues[j],
+                            'nobs': projected.nobs,
+                            'n_clusters': projected.n_clusters,
+                        })
+
+    return pd.DataFrame(rows)
+
+
+def run_did_spec_grid(input_file='regress_data_with_gdp.xlsx', outcomes=None, control_sets=None, fe_sets=None,
+                      samples=None, cluster='company', output_file=None):
+    """
+    读取一次回归数据，批量估计DID的所有设定组合
+
+    参数:
+    input_file: 带GDP数据的回归数据文件
+    其余参数见run_spec_grid
+    output_file: 结果表输出路径（xlsx），None时不保存
+
+    返回:
+    整洁的结果表
+    """
+    from did import build_panel_data
+
+    print("=== 批量多设定DID回归 ===")
+    print(f"1. 读取回归数据: {input_file}...")
+    df = read_table(input_file, sheet_name='回归数据')
+    print(f"   - 数据行数: {len(df):,}")
+
+    print("2. 创建面板数据...")
+    panel_df = build_panel_data(df)
+    panel_df['treatment_post'] = panel_df['treatment'] * panel_df['post']
+    print(f"   - 面板数据行数: {len(panel_df):,}")
+
+    print("3. 批量估计...")
+    results = run_spec_grid(panel_df, outcomes, control_sets, fe_sets, samples, cluster)
+
+    did_rows = results[results['term'] == 'treatment_post']
+    print("\n4. DID效应汇总:")
+    print(did_rows[['sample', 'fe', 'controls', 'outcome', 'coef', 'std_error', 'pvalue', 'nobs']]
+          .round(4).to_string(index=False))
+
+    if output_file:
+        results.to_excel(output_file, index=False, sheet_name='设定汇总')
+        print(f"\n结果已保存: {output_file}")
+
+    return results
+
+
+if __name__ == "__main__":
+    run_did_spec_grid(output_file='did_spec_grid.xlsx')
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+交错处理DID（Callaway–Sant'Anna组别-时期ATT）
+各公司首次获得投资的年份不同，双向固定效应的合并DID在交错处理下有偏。
+本模块按首次投资年份把处理公司分为队列g，对每个(队列g, 年份t)单元用从未处理或尚未处理的公司作对照估计ATT(g,t)，
+各单元互相独立，共享一个预先索引好的 公司×年份 结果矩阵并行计算，
+再用影响函数的乘数自助法聚合为事件时间ATT和总体ATT并给出标准误
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+from scipy import stats
+from concurrent.futures import ProcessPoolExecutor
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from hdfe import _get_column
+
+# 子进程共享的结果矩阵和队列（由_init_worker设置）
+_SHARED = None
+
+
+def _init_worker(shared):
+    global _SHARED
+    _SHARED = shared
+
+
+def build_outcome_matrix(panel_df, dependent='ln_patent_plus_1', entity='company', time='year',
+                         cohort='investment_year', treatment='treatment'):
+    """
+    把长面板转换为 公司×年份 的结果矩阵
+
+    参数:
+    panel_df: 面板数据（company/year可在索引中）
+    dependent: 结果变量
+    cohort: 首次投资年份列
+    treatment: 是否接受处理（0的公司为从未处理）
+
+    返回:
+    Y: 公司数 × 年份数 的结果矩阵（未观测为NaN）
+    years: 年份数组
+    cohorts: 每家公司的队列（首次投资年份），从未处理为0
+    """
+    firm_codes, _ = pd.factorize(np.asarray(_get_column(panel_df, entity)))
+    year_values = np.asarray(_get_column(panel_df, time), dtype=np.int64)
+    years = np.arange(year_values.min(), year_values.max() + 1)
+    year_codes = year_values - years[0]
+    values = np.asarray(_get_column(panel_df, dependent), dtype=float)
+
+    n_firms = firm_codes.max() + 1
+    sums = np.zeros((n_firms, len(years)))
+    counts = np.zeros((n_firms, len(years)))
+    valid = np.isfinite(values)
+    np.add.at(sums, (firm_codes[valid], year_codes[valid]), values[valid])
+    np.add.at(counts, (firm_codes[valid], year_codes[valid]), 1)
+    Y = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+    treated = np.asarray(_get_column(panel_df, treatment)) != 0
+    first_year = np.asarray(_get_column(panel_df, cohort), dtype=np.int64)
+    cohorts = np.zeros(n_firms, dtype=np.int64)
+    cohorts[firm_codes[treated]] = first_year[treated]
+    return Y, years, cohorts
+
+
+def _cohort_cells(g, control_group, base_period):
+    """
+    计算一个队列所有年份的ATT(g,t)及影响函数
+
+    返回:
+    [(g, t, att, n_treated, n_control, 影响函数), ...]
+    """
+    Y, years, cohorts = _SHARED['Y'], _SHARED['years'], _SHARED['cohorts']
+    n_firms = len(cohorts)
+    treated = cohorts == g
+    never = cohorts == 0
+    cells = []
+
+    for ti, t in enumerate(years):
+        if t == g - 1:
+            continue
+        # 处理后相对g-1比较；处理前按'varying'相对上一年比较，按'universal'统一相对g-1比较
+        b = g - 1 if (t >= g or base_period == 'universal') else t - 1
+        bi = b - years[0]
+        if bi < 0 or bi >= len(years):
+            continue
+
+        delta = Y[:, ti] - Y[:, bi]
+        observed = np.isfinite(delta)
+        if control_group == 'never_treated':
+            control = never
+        else:
+            # 尚未处理：在t和基期都还未获得投资的公司（含从未处理）
+            control = never | ((cohorts > max(t, b)) & (cohorts != g))
+
+        in_treated = treated & observed
+        in_control = control & observed
+        n_treated, n_control = int(in_treated.sum()), int(in_control.sum())
+        if n_treated == 0 or n_control == 0:
+            continue
+
+        mean_treated = delta[in_treated].mean()
+        mean_control = delta[in_control].mean()
+        influence = np.zeros(n_firms)
+        influence[in_treated] = n_firms / n_treated * (delta[in_treated] - mean_treated)
+        influence[in_control] = -n_firms / n_control * (delta[in_control] - mean_control)
+        cells.append((g, int(t), mean_treated - mean_control, n_treated, n_control, influence))
+
+    return cells
+
+
+def _multiplier_bootstrap(influence, reps, seed, level):
+    """
+    对影响函数做Rademacher乘数自助法
+
+    参数:
+    influence: 公司数 × 统计量数 的影响函数矩阵
+
+    返回:
+    标准误（四分位距口径）和逐点临界值
+    """
+    n_firms = influence.shape[0]
+    rng = np.random.default_rng(seed)
+    draws = np.empty((reps, influence.shape[1]))
+    chunk = 1000
+    for start in range(0, reps, chunk):
+        size = min(chunk, reps - start)
+        V = rng.integers(0, 2, size=(size, n_firms), dtype=np.int8).astype(float) * 2 - 1
+        draws[start:start + size] = V @ influence / n_firms
+
+    q75, q25 = np.quantile(draws, [0.75, 0.25], axis=0)
+    se = (q75 - q25) / (stats.norm.ppf(0.75) - stats.norm.ppf(0.25))
+    crit = stats.norm.ppf(0.5 + level / 2)
+    return se, crit
+
+
+def estimate_group_time_att(panel_df, dependent='ln_patent_plus_1', control_group='never_treated',
+                            base_period='varying', reps=999, seed=None, n_jobs=None, level=0.95):
+    """
+    Callaway–Sant'Anna组别-时期ATT及其聚合
+
+    参数:
+    panel_df: 面板数据（build_panel_data的输出）
+    dependent: 结果变量
+    control_group: 'never_treated'（从未处理）或'not_yet_treated'（尚未处理）
+    base_period: 处理前ATT的基期，'varying'（上一年）或'universal'（g-1）
+    reps: 乘数自助法次数
+    seed: 随机种子
+    n_jobs: 并行计算各队列单元的进程数，1时串行，None时使用全部CPU
+    level: 置信水平
+
+    返回:
+    dict:
+        group_time: 每个(队列, 年份)单元的ATT、标准误、样本数
+        event_time: 按相对投资年份聚合的ATT（以队列规模加权）
+        overall: 所有处理后单元按队列规模加权的总体ATT
+    """
+    if control_group not in ('never_treated', 'not_yet_treated'):
+        raise ValueError(f"未知的对照组: {control_group}")
+
+    Y, years, cohorts = build_outcome_matrix(panel_df, dependent)
+    shared = {'Y': Y, 'years': years, 'cohorts': cohorts}
+    groups = np.unique(cohorts[cohorts > 0])
+    args = ([int(g) for g in groups], [control_group] * len(groups), [base_period] * len(groups))
+
+    if n_jobs == 1:
+        _init_worker(shared)
+        results = list(map(_cohort_cells, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(shared,)) as executor:
+            results = list(executor.map(_cohort_cells, *args))
+    cells = [cell for cohort_cells in results for cell in cohort_cells]
+    if not cells:
+        raise ValueError("没有可估计的(队列, 年份)单元")
+
+    group_time = pd.DataFrame([cell[:5] for cell in cells],
+                              columns=['cohort', 'year', 'att', 'n_treated', 'n_control'])
+    group_time['event_time'] = group_time['year'] - group_time['cohort']
+    influence = np.column_stack([cell[5] for cell in cells])
+
+    # 队列规模权重（视为固定）
+    cohort_size = pd.Series(cohorts[cohorts > 0]).value_counts()
+    weight = group_time['cohort'].map(cohort_size).to_numpy(dtype=float)
+
+    # 事件时间聚合与总体ATT：ATT和影响函数都是单元的线性组合
+    event_times = np.sort(group_time['event_time'].unique())
+    aggregator = np.zeros((len(cells), len(event_times) + 1))
+    for j, e in enumerate(event_times):
+        selected = (group_time['event_time'] == e).to_numpy()
+        aggregator[selected, j] = weight[selected] / weight[selected].sum()
+    post = (group_time['event_time'] >= 0).to_numpy()
+    if post.any():
+        aggregator[post, -1] = weight[post] / weight[post].sum()
+
+    estimates = group_time['att'].to_numpy()
+    all_influence = np.column_stack([influence, influence @ aggregator])
+    se, crit = _multiplier_bootstrap(all_influence, reps, seed, level)
+    n_cells = len(cells)
+
+    group_time['std_error'] = se[:n_cells]
+    group_time['lower'] = group_time['att'] - crit * group_time['std_error']
+    group_time['upper'] = group_time['att'] + crit * group_time['std_error']
+
+    aggregated = estimates @ aggregator
+    event_table = pd.DataFrame({
+        'event_time': event_times,
+        'att': aggregated[:-1],
+        'std_error': se[n_cells:-1],
+    })
+    event_table['lower'] = event_table['att'] - crit * event_table['std_error']
+    event_table['upper'] = event_table['att'] + crit * event_table['std_error']
+
+    overall_att = aggregated[-1] if post.any() else np.nan
+    overall_se = se[-1] if post.any() else np.nan
+    overall = {
+        'att': overall_att,
+        'std_error': overall_se,
+        'lower': overall_att - crit * overall_se,
+        'upper': overall_att + crit * overall_se,
+        'pvalue': 2 * stats.norm.sf(abs(overall_att / overall_se)) if post.any() else np.nan,
+    }
+
+    return {
+        'group_time': group_time[['cohort', 'year', 'event_time', 'att', 'std_error', 'lower', 'upper',
+                                  'n_treated', 'n_control']],
+        'event_time': event_table,
+        'overall': overall,
+        'control_group': control_group,
+    }
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流水线增量执行清单
+为每个步骤记录指纹（输入文件内容哈希 + 参数 + 步骤源码及其本地依赖模块的哈希）和输出文件哈希，
+指纹不变且输出文件未被改动的步骤直接跳过。
+xlsx按压缩包内各成员的内容计算哈希（忽略docProps/core.xml中的写入时间），
+上游步骤重新运行但结果不变时，下游步骤的输入哈希不变，不会被连带重跑；
+文件大小和修改时间都未变时沿用上次的哈希，不重复读取大文件
+"""
+
+import os
+import ast
+import json
+import time
+import hashlib
+import zipfile
+
+# xlsx中只记录元数据（创建/修改时间）的成员，不计入内容哈希
+VOLATILE_ZIP_MEMBERS = {'docProps/core.xml', 'docProps/app.xml'}
+
+
+def _hash_file(path, chunk_size=1 << 20):
+    """文件内容的sha256；xlsx等zip格式按成员名和解压后内容计算，排除元数据成员"""
+    digest = hashlib.sha256()
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for name in sorted(archive.namelist()):
+                if name in VOLATILE_ZIP_MEMBERS:
+                    continue
+                digest.update(name.encode('utf-8') + b'\0')
+                with archive.open(name) as member:
+                    for block in iter(lambda: member.read(chunk_size), b''):
+                        digest.update(block)
+        return digest.hexdigest()
+
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def module_files(modules, search_dirs):
+    """模块名对应的本地模块文件（按search_dirs顺序查找，找不到的为第三方库，忽略）"""
+    files = []
+    for name in modules:
+        for search_dir in search_dirs:
+            path = os.path.join(search_dir, name + '.py')
+            if os.path.exists(path):
+                files.append(path)
+                break
+    return files
+
+
+def local_imports(module_file, search_dirs):
+    """源码中import的、位于search_dirs下的本地模块文件（不递归，函数内部的import也计入）"""
+    with open(module_file, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=module_file)
+
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split('.')[0])
+
+    return module_files(sorted(names), search_dirs)
+
+
+def source_files(modules, search_dirs):
+    """步骤所用模块及其递归依赖的本地模块文件"""
+    pending = module_files(modules, search_dirs)
+    seen = []
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.append(path)
+        pending.extend(local_imports(path, search_dirs))
+    return sorted(seen)
+
+
+class StepManifest:
+    """
+    步骤指纹清单（JSON文件）
+
+    参数:
+    manifest_file: 清单文件路径
+    base_dir: 步骤输入/输出文件的基础目录
+    source_dirs: 查找步骤源码模块的目录列表，默认为本目录和上级目录（province.py等在上级目录）
+    """
+
+    def __init__(self, manifest_file, base_dir='.', source_dirs=None):
+        self.manifest_file = manifest_file
+        self.base_dir = base_dir
+        here = os.path.dirname(os.path.abspath(__file__))
+        self.source_dirs = source_dirs or [here, os.path.dirname(here)]
+        self.steps = {}
+        self.file_stats = {}
+        self.failures = {}
+        if os.path.exists(manifest_file):
+            try:
+                with open(manifest_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.steps = data.get('steps', {})
+                self.file_stats = data.get('file_stats', {})
+                self.failures = data.get('failures', {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 清单文件读取失败，全部步骤将重新运行: {e}")
+
+    def file_digest(self, path):
+        """文件内容哈希；大小和修改时间与上次一致时直接复用，文件不存在时返回None"""
+        full_path = os.path.join(self.base_dir, path)
+        if not os.path.exists(full_path):
+            return None
+        stat = os.stat(full_path)
+        cached = self.file_stats.get(path)
+        if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            return cached['sha256']
+        digest = _hash_file(full_path)
+        self.file_stats[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}
+        return digest
+
+    def source_digest(self, step):
+        """步骤源码模块（含其本地依赖）的哈希"""
+        digest = hashlib.sha256()
+        for path in source_files(step.get('sources', []), self.source_dirs):
+            digest.update(os.path.basename(path).encode('utf-8') + b'\0')
+            digest.update(_hash_file(path).encode('ascii'))
+        return digest.hexdigest()
+
+    def fingerprint(self, step):
+        """
+        步骤指纹：输入文件哈希、参数、源码哈希
+        输入文件缺失时返回None
+        """
+        inputs = {}
+        for path in step['input_files']:
+            inputs[path] = self.file_digest(path)
+            if inputs[path] is None:
+                return None
+        payload = {
+            'inputs': inputs,
+            'outputs': list(step['output_files']),
+            'params': step.get('params', {}),
+            'source': self.source_digest(step),
+        }
+        encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def stale_reason(self, step):
+        """
+        步骤需要重新运行的原因，已是最新时返回None
+
+        返回:
+        str或None
+        """
+        record = self.steps.get(step['name'])
+        if record is None:
+            return "没有运行记录"
+        for path in step['output_files']:
+            digest = self.file_digest(path)
+            if digest is None:
+                return f"输出文件不存在: {path}"
+            if digest != record['outputs'].get(path):
+                return f"输出文件已被修改: {path}"
+        current = self.fingerprint(step)
+        if current is None:
+            return "输入文件缺失"
+        if current == record['fingerprint']:
+            return None
+        changed = [path for path in step['input_files'] if self.file_digest(path) != record['inputs'].get(path)]
+        if changed:
+            return f"输入文件已变化: {', '.join(changed)}"
+        if self.source_digest(step) != record.get('source'):
+            return "源码已变化"
+        return "参数已变化"
+
+    def is_up_to_date(self, step):
+        return self.stale_reason(step) is None
+
+    def record(self, step):
+        """步骤成功后记录其指纹和输出哈希"""
+        self.steps[step['name']] = {
+            'fingerprint': self.fingerprint(step),
+            'inputs': {path: self.file_digest(path) for path in step['input_files']},
+            'outputs': {path: self.file_digest(path) for path in step['output_files']},
+            'source': self.source_digest(step),
+            'params': step.get('params', {}),
+            'timestamp': time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self.failures.pop(step['name'], None)
+
+    def record_failure(self, step_name, message):
+        """记录步骤失败（供--resume从失败的步骤继续）"""
+        self.failures[step_name] = {'message': message, 'timestamp': time.strftime("%Y-%m-%d %H:%M:%S")}
+
+    def invalidate(self, step_name):
+        self.steps.pop(step_name, None)
+
+    def save(self):
+        """写入清单（先写临时文件再替换，中断时不会留下损坏的清单）"""
+        directory = os.path.dirname(os.path.abspath(self.manifest_file))
+        os.makedirs(directory, exist_ok=True)
+        tmp_file = self.manifest_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'steps': self.steps, 'file_stats': self.file_stats, 'failures': self.failures}, f,
+                      ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.manifest_file)
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流水线步骤性能剖析
+记录每个步骤的墙钟时间、CPU时间、峰值内存（RSS）、读写字节数、输入/输出行数，
+可选保存cProfile结果；每个步骤一行写入JSONL日志，并可对比历次运行、标出变慢或变大的步骤。
+峰值RSS在Linux上通过/proc/self/clear_refs在步骤开始时重置进程的内存高水位得到，
+其他平台只能取进程生命周期内的峰值（resource.getrusage），读写字节数取自/proc/self/io。
+这些都是进程级计数，步骤在线程池中与其他步骤并发执行时不采集（记为None，shared_process为True）
+"""
+
+import os
+import sys
+import json
+import time
+import cProfile
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 超过此大小的csv不逐行计数（如几GB的专利原始数据）
+MAX_CSV_BYTES_FOR_ROWS = 100 * 1024 * 1024
+
+# 对比报告默认检查的指标及判定为退化的最小绝对变化
+REGRESSION_METRICS = {
+    'wall_seconds': 1.0,
+    'cpu_seconds': 1.0,
+    'peak_rss_mb': 50.0,
+    'read_mb': 10.0,
+    'write_mb': 10.0,
+}
+
+
+def _proc_status_kb(field):
+    """读取/proc/self/status中的内存字段（kB），不可用时返回None"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """重置进程内存高水位（Linux），成功返回True"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    """当前内存高水位（MB）"""
+    hwm = _proc_status_kb('VmHWM')
+    if hwm is not None:
+        return hwm / 1024
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS单位为字节，Linux为kB
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    return None
+
+
+def _io_counters():
+    """进程累计读写字节数（read/write系统调用层面，含页缓存命中），不可用时返回None"""
+    try:
+        with open('/proc/self/io') as f:
+            values = dict(line.split(':') for line in f if ':' in line)
+        return int(values['rchar']), int(values['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def table_rows(path):
+    """
+    表格文件的数据行数（不含表头），无法低成本得到时返回None
+    xlsx读取第一个工作表的维度信息，不加载单元格；csv逐行计数（过大的文件跳过）
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        if path.endswith(('.xlsx', '.xlsm')):
+            from openpyxl import load_workbook
+
+            workbook = load_workbook(path, read_only=True)
+            try:
+                max_row = workbook.worksheets[0].max_row
+            finally:
+                workbook.close()
+            return max(max_row - 1, 0) if max_row else None
+        if path.endswith('.csv') and os.path.getsize(path) <= MAX_CSV_BYTES_FOR_ROWS:
+            with open(path, 'rb') as f:
+                return max(sum(1 for _ in f) - 1, 0)
+    except Exception:
+        return None
+    return None
+
+
+class StepProfiler:
+    """
+    步骤剖析器
+
+    参数:
+    log_file: JSONL日志路径，None时不写日志
+    profile_dir: cProfile结果目录，None时不做函数级剖析
+    trace_memory: 是否同时用tracemalloc统计Python对象的峰值内存（会明显拖慢步骤，默认关闭）
+    run_id: 本次运行的标识，默认为启动时间
+    """
+
+    def __init__(self, log_file=None, profile_dir=None, trace_memory=False, run_id=None):
+        self.log_file = log_file
+        self.profile_dir = profile_dir
+        self.trace_memory = trace_memory
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+
+    def run(self, step_name, func, input_files=(), output_files=(), rows_of=table_rows, shared_process=False):
+        """
+        执行func并采集指标
+
+        参数:
+        step_name: 步骤名（用于cProfile文件名）
+        func: 无参数函数
+        input_files, output_files: 统计行数的输入/输出文件
+        rows_of: 函数，rows_of(path)返回文件行数
+        shared_process: 步骤是否与其他并发步骤共享当前进程（线程池执行），为True时不采集CPU时间、
+                        峰值内存、读写字节数和tracemalloc峰值（记为None），也不重置进程内存高水位
+
+        返回:
+        (func的返回值, 指标字典)
+        """
+        metrics = {'rows_in': _sum_rows(rows_of, input_files)}
+
+        process_metrics = not shared_process
+        trace_memory = self.trace_memory and process_metrics
+        profiler = cProfile.Profile() if self.profile_dir else None
+        if trace_memory:
+            tracemalloc.start()
+        rss_reset = _reset_peak_rss() if process_metrics else False
+        io_before = _io_counters() if process_metrics else None
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            result = func()
+        finally:
+            if profiler:
+                profiler.disable()
+            metrics['wall_seconds'] = time.perf_counter() - wall_start
+            metrics['shared_process'] = shared_process
+            if process_metrics:
+                metrics['cpu_seconds'] = time.process_time() - cpu_start
+                io_after = _io_counters()
+                metrics['peak_rss_mb'] = _peak_rss_mb()
+                metrics['peak_rss_is_step'] = rss_reset
+                if io_before and io_after:
+                    metrics['read_mb'] = (io_after[0] - io_before[0]) / (1024 * 1024)
+                    metrics['write_mb'] = (io_after[1] - io_before[1]) / (1024 * 1024)
+            else:
+                metrics.update(cpu_seconds=None, peak_rss_mb=None, peak_rss_is_step=False, read_mb=None,
+                               write_mb=None)
+            if trace_memory:
+                metrics['python_peak_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+                tracemalloc.stop()
+            if profiler:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profile_file = os.path.join(self.profile_dir, f"{self.run_id}_{_safe_name(step_name)}.prof")
+                profiler.dump_stats(profile_file)
+                metrics['profile_file'] = profile_file
+
+        metrics['rows_out'] = _sum_rows(rows_of, output_files)
+        return result, metrics
+
+    def append(self, step_name, status, metrics):
+        """把一个步骤的指标追加到JSONL日志"""
+        if not self.log_file:
+            return
+        record = {
+            'run_id': self.run_id,
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'step': step_name,
+            'status': status,
+        }
+        record.update(metrics)
+        directory = os.path.dirname(os.path.abspath(self.log_file))
+        os.makedirs(directory, exist_ok=True)
+        with open(self.log_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+
+
+def _safe_name(name):
+    return ''.join(ch if ch.isalnum() or ch in '-_' else '_' for ch in name)
+
+
+def _sum_rows(rows_of, paths):
+    counts = [rows_of(path) for path in paths]
+    counts = [count for count in counts if count is not None]
+    return int(sum(counts)) if counts else None
+
+
+def format_metrics(metrics):
+    """指标的单行摘要（用于控制台日志）"""
+    parts = []
+    if metrics.get('cpu_seconds') is not None:
+        parts.append(f"CPU {metrics['cpu_seconds']:.2f}秒")
+    if metrics.get('peak_rss_mb') is not None:
+        parts.append(f"峰值内存 {metrics['peak_rss_mb']:.0f}MB")
+    if metrics.get('read_mb') is not None:
+        parts.append(f"读 {metrics['read_mb']:.1f}MB / 写 {metrics['write_mb']:.1f}MB")
+    if metrics.get('rows_in') is not None or metrics.get('rows_out') is not None:
+        rows_in = '-' if metrics.get('rows_in') is None else f"{metrics['rows_in']:,}"
+        rows_out = '-' if metrics.get('rows_out') is None else f"{metrics['rows_out']:,}"
+        parts.append(f"行数 {rows_in} → {rows_out}")
+    return ', '.join(parts)
+
+
+def load_profile_log(log_file):
+    """读取JSONL剖析日志为DataFrame（跳过损坏的行）"""
+    records = []
+    with open(log_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return pd.DataFrame(records)
+
+
+def compare_runs(log_file, run_id=None, baseline_runs=5, threshold=0.2, min_delta=None):
+    """
+    对比某次运行与之前若干次运行（取各步骤成功运行的中位数作为基线），标出退化的步骤
+
+    参数:
+    log_file: JSONL剖析日志
+    run_id: 要检查的运行，默认最近一次
+    baseline_runs: 基线使用之前最近几次运行
+    threshold: 相对基线增加超过该比例视为退化
+    min_delta: {指标: 最小绝对变化}，变化小于此值不报告（避免毫秒级波动），默认REGRESSION_METRICS
+
+    返回:
+    DataFrame，每行一个步骤×指标，含baseline、current、change、regression列
+    """
+    min_delta = min_delta or REGRESSION_METRICS
+    log = load_profile_log(log_file)
+    if log.empty:
+        return pd.DataFrame()
+
+    run_order = list(dict.fromkeys(log['run_id']))
+    if run_id is None:
+        run_id = run_order[-1]
+    if run_id not in run_order:
+        return pd.DataFrame()
+    previous = run_order[:run_order.index(run_id)][-baseline_runs:]
+
+    current = log[log['run_id'] == run_id]
+    baseline = log[log['run_id'].isin(previous) & (log['status'] == '成功')]
+    rows = []
+    for _, record in current.iterrows():
+        history = baseline[baseline['step'] == record['step']]
+        for metric, floor in min_delta.items():
+            if metric not in log.columns or pd.isna(record.get(metric)):
+                continue
+            values = history[metric].dropna() if metric in history else pd.Series(dtype=float)
+            base = float(values.median()) if len(values) else None
+            value = float(record[metric])
+            change = (value - base) / base if base else None
+            regression = base is not None and value - base > floor and (change is None or change > threshold)
+            rows.append({
+                'step': record['step'],
+                'metric': metric,
+                'baseline': base,
+                'current': value,
+                'change': change,
+                'regression': bool(regression),
+            })
+    report = pd.DataFrame(rows, columns=['step', 'metric', 'baseline', 'current', 'change', 'regression'])
+    report.attrs['run_id'] = run_id
+    report.attrs['baseline_runs'] = previous
+    return report
+
+
+def print_comparison(report):
+    """打印对比报告"""
+    print("=" * 80)
+    print(f"步骤性能对比: 运行 {report.attrs.get('run_id')} vs 之前 {len(report.attrs.get('baseline_runs', []))} 次运行的中位数")
+    print("=" * 80)
+    if report.empty:
+        print("没有可对比的记录")
+        return
+    for step, group in report.groupby('step', sort=False):
+        print(f"\n{step}:")
+        for _, row in group.iterrows():
+            base = '-' if row['baseline'] is None or pd.isna(row['baseline']) else f"{row['baseline']:.2f}"
+            change = '' if row['change'] is None or pd.isna(row['change']) else f" ({row['change']:+.0%})"
+            flag = "  ⚠️ 退化" if row['regression'] else ""
+            print(f"  {row['metric']:<14} {base:>10} → {row['current']:>10.2f}{change}{flag}")
+    regressions = report[report['regression']]
+    print("\n" + "=" * 80)
+    if regressions.empty:
+        print("✅ 没有发现性能退化")
+    else:
+        print(f"⚠️ 发现 {len(regressions)} 项性能退化: "
+              + ', '.join(f"{r.step}/{r.metric}" for r in regressions.itertuples()))
+
+
+if __name__ == "__main__":
+    log_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                  'pipeline_profile.jsonl')
+    print_comparison(compare_runs(log_path))
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分块流式（out-of-core）最小二乘
+面板超出内存时，按块读取长面板，只累加小矩阵，不在内存中保留整个面板：
+- 第1遍：累加每个固定效应组的观测数和变量之和（得到组均值），同时收集其余固定效应的水平
+- 第2遍：每块按组均值去均值后累加 Z'Z（Z = [y, X, 其余固定效应的虚拟变量]），解出系数
+- 第3遍（稳健/聚类标准误）：每块计算残差，累加各聚类的得分 X̃'e
+第一组固定效应（如公司）由组均值精确吸收；其余固定效应（如年份）水平较少，以虚拟变量形式加入后同样按组去均值，
+结果与hdfe.fit_hdfe的双向固定效应估计一致
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+from scipy import stats
+from scipy.sparse import coo_matrix, csr_matrix
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from hdfe import HDFEResults, _get_column
+
+
+def _effect_columns(effect):
+    """固定效应涉及的列名（交互固定效应为元组或'province#year'）"""
+    if isinstance(effect, str) and '#' in effect:
+        return tuple(effect.split('#'))
+    if isinstance(effect, (tuple, list)):
+        return tuple(effect)
+    return (effect,)
+
+
+def _effect_values(chunk, effect, mask):
+    """一块数据中某组固定效应（或聚类变量）的取值，交互固定效应为MultiIndex"""
+    columns = _effect_columns(effect)
+    if len(columns) == 1:
+        return pd.Index(np.asarray(_get_column(chunk, columns[0]), dtype=object)[mask])
+    return pd.MultiIndex.from_arrays([np.asarray(_get_column(chunk, name), dtype=object)[mask] for name in columns])
+
+
+def _effect_missing(chunk, effect):
+    """固定效应取值缺失的行"""
+    missing = np.zeros(len(chunk), dtype=bool)
+    for name in _effect_columns(effect):
+        missing |= pd.isna(_get_column(chunk, name))
+    return missing
+
+
+class _LevelEncoder:
+    """跨块一致的水平编码：新出现的水平追加到末尾"""
+
+    def __init__(self):
+        self.levels = None
+
+    def encode(self, values, frozen=False):
+        if self.levels is None:
+            self.levels = values.unique()
+        codes = self.levels.get_indexer(values)
+        if (codes < 0).any():
+            if frozen:
+                raise ValueError("第1遍之后的数据块中出现了新的固定效应水平，数据源在两遍读取之间发生了变化")
+            self.levels = self.levels.append(values[codes < 0].unique())
+            codes = self.levels.get_indexer(values)
+        return codes
+
+    def __len__(self):
+        return 0 if self.levels is None else len(self.levels)
+
+
+def frame_chunks(df, chunksize=100000):
+    """内存中的DataFrame按行分块（主要用于测试和与整体回归对比）"""
+    def generate():
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+    return generate
+
+
+def csv_chunks(path, chunksize=100000, **read_kwargs):
+    """CSV长面板按块读取"""
+    def generate():
+        yield from pd.read_csv(path, chunksize=chunksize, **read_kwargs)
+    return generate
+
+
+def excel_chunks(path, sheet_name=0, chunksize=2000):
+    """Excel按行分块读取（openpyxl只读模式，不把整张表读入内存）"""
+    def generate():
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            sheet = workbook[sheet_name] if isinstance(sheet_name, str) else workbook.worksheets[sheet_name]
+            rows = sheet.iter_rows(values_only=True)
+            header = [name if name is not None else f'Unnamed: {i}' for i, name in enumerate(next(rows))]
+            block = []
+            for row in rows:
+                block.append(row)
+                if len(block) == chunksize:
+                    yield pd.DataFrame(block, columns=header)
+                    block = []
+            if block:
+                yield pd.DataFrame(block, columns=header)
+        finally:
+            workbook.close()
+    return generate
+
+
+def panel_chunks(input_file, chunksize=2000, sheet_name='回归数据'):
+    """
+    从每家公司一行的回归数据按块生成DID长面板（每块公司展开为公司-年份观测并加上交互项）
+    """
+    from did import build_panel_data
+
+    source = excel_chunks(input_file, sheet_name, chunksize)
+
+    def generate():
+        for chunk in source():
+            panel = build_panel_data(chunk)
+            panel['treatment_post'] = panel['treatment'] * panel['post']
+            yield panel
+    return generate
+
+
+class StreamingResults(HDFEResults):
+    """分块流式回归结果，另提供statsmodels风格的拟合统计量（rsquared、fvalue、aic等）"""
+
+    def __init__(self, *args, tss=np.nan, n_params=0, chunks=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        ssr = kwargs['ssr']
+        self.ssr = ssr
+        self.chunks = chunks
+        self.rsquared = 1 - ssr / tss if tss else np.nan
+        df_model_resid = max(self.nobs - n_params, 1)
+        df_model = max(n_params - 1, 1)
+        self.rsquared_adj = 1 - (1 - self.rsquared) * (self.nobs - 1) / df_model_resid
+        self.fvalue = ((tss - ssr) / df_model) / (ssr / df_model_resid) if ssr > 0 else np.inf
+        self.f_pvalue = float(stats.f.sf(self.fvalue, df_model, df_model_resid))
+        self.llf = -self.nobs / 2 * (np.log(2 * np.pi) + np.log(ssr / self.nobs) + 1)
+        self.aic = -2 * self.llf + 2 * n_params
+        self.bic = -2 * self.llf + np.log(self.nobs) * n_params
+
+    @property
+    def bse(self):
+        return self.std_errors
+
+    @property
+    def tvalues(self):
+        return self.tstats
+
+
+def _update_nesting(state, codes, cluster_codes):
+    """
+    记录每个固定效应水平首次出现时所在的聚类，判断固定效应是否嵌套在聚类内
+    （嵌套的固定效应不计入吸收的自由度，与hdfe.absorbed_degrees_of_freedom一致）
+    """
+    if not state['nested']:
+        return
+    n_levels = int(codes.max()) + 1 if len(codes) else 0
+    if len(state['first']) < n_levels:
+        state['first'] = np.concatenate([state['first'], np.full(n_levels - len(state['first']), -1)])
+    first = state['first']
+    unseen = first[codes] < 0
+    first[codes[unseen]] = cluster_codes[unseen]
+    state['nested'] = bool(np.all(first[codes] == cluster_codes))
+
+
+def _extract(chunk, dependent, regressors, effects, add_constant):
+    """一块数据中的y、X和有效行（变量和固定效应均不缺失）"""
+    y = np.asarray(_get_column(chunk, dependent), dtype=float)
+    columns = [np.asarray(_get_column(chunk, name), dtype=float) for name in regressors]
+    if add_constant:
+        columns.insert(0, np.ones(len(chunk)))
+    X = np.column_stack(columns) if columns else np.empty((len(chunk), 0))
+    valid = np.isfinite(y) & np.isfinite(X).all(axis=1)
+    for effect in effects:
+        valid &= ~_effect_missing(chunk, effect)
+    return y[valid], X[valid], valid
+
+
+def fit_streaming(chunks, dependent, regressors, absorb=None, cluster=None, cov_type=None, add_constant=False,
+                  drop_singleton_groups=True, max_dummy_levels=1000, verbose=True):
+    """
+    分块流式最小二乘（可吸收固定效应、聚类稳健标准误）
+
+    参数:
+    chunks: 无参数函数，每次调用返回一个新的数据块迭代器（需要读取2-3遍），如panel_chunks/csv_chunks/frame_chunks的结果
+    dependent: 被解释变量列名
+    regressors: 解释变量列名列表
+    absorb: 固定效应列表，第一组由组均值吸收，其余（如年份）以虚拟变量形式加入，水平数不超过max_dummy_levels
+    cluster: 聚类变量列名
+    cov_type: 'unadjusted'、'robust'或'clustered'，默认有cluster时为'clustered'
+    add_constant: 是否加入常数项（不吸收固定效应的OLS使用）
+    drop_singleton_groups: 是否剔除第一组固定效应中只有一个观测的组
+    verbose: 是否打印各遍读取的进度
+
+    返回:
+    StreamingResults（属性与HDFEResults一致，不保留残差）
+    """
+    absorb = list(absorb or [])
+    regressors = list(regressors)
+    names_all = (['const'] if add_constant else []) + regressors
+    if cov_type is None:
+        cov_type = 'clustered' if cluster is not None else 'unadjusted'
+    effects = absorb + ([cluster] if cov_type == 'clustered' else [])
+    k = len(names_all)
+
+    fe_encoder = _LevelEncoder() if absorb else None
+    dummy_encoders = [_LevelEncoder() for _ in absorb[1:]]
+    cluster_encoder = _LevelEncoder() if cov_type == 'clustered' else None
+
+    # ---- 第1遍：组内计数和变量之和 ----
+    group_sums = np.zeros((0, 1 + k))
+    group_counts = np.zeros(0)
+    dummy_counts = [csr_matrix((0, 0)) for _ in dummy_encoders]
+    nesting = [{'first': np.zeros(0, dtype=np.int64), 'nested': cluster_encoder is not None} for _ in absorb]
+    column_sums = np.zeros(k)
+    column_squares = np.zeros(k)
+    n_valid = 0
+    n_chunks = 0
+
+    for chunk in chunks():
+        n_chunks += 1
+        y, X, valid = _extract(chunk, dependent, regressors, effects, add_constant)
+        if not len(y):
+            continue
+        n_valid += len(y)
+        column_sums += X.sum(axis=0)
+        column_squares += (X ** 2).sum(axis=0)
+        dummy_codes = [encoder.encode(_effect_values(chunk, effect, valid))
+                       for encoder, effect in zip(dummy_encoders, absorb[1:])]
+        cluster_codes = cluster_encoder.encode(_effect_values(chunk, cluster, valid)) if cluster_encoder is not None else None
+
+        if fe_encoder is None:
+            continue
+        codes = fe_encoder.encode(_effect_values(chunk, absorb[0], valid))
+        n_groups = len(fe_encoder)
+        if len(group_counts) < n_groups:
+            group_sums = np.vstack([group_sums, np.zeros((n_groups - len(group_counts), 1 + k))])
+            group_counts = np.concatenate([group_counts, np.zeros(n_groups - len(group_counts))])
+        group_counts += np.bincount(codes, minlength=n_groups)
+        Z = np.column_stack([y, X])
+        group_sums += csr_matrix((np.ones(len(codes)), (codes, np.arange(len(codes)))),
+                                 shape=(n_groups, len(codes))) @ Z
+        for j, level_codes in enumerate(dummy_codes):
+            counts = coo_matrix((np.ones(len(codes)), (codes, level_codes)),
+                                shape=(n_groups, len(dummy_encoders[j]))).tocsr()
+            dummy_counts[j].resize(counts.shape)
+            dummy_counts[j] = dummy_counts[j] + counts
+        if cluster_codes is not None:
+            for state, effect_codes in zip(nesting, [codes] + dummy_codes):
+                _update_nesting(state, effect_codes, cluster_codes)
+
+    if n_valid == 0:
+        raise ValueError("没有有效观测")
+    if verbose:
+        print(f"   - 第1遍: {n_chunks} 块, {n_valid:,} 个有效观测"
+              + (f", {len(fe_encoder):,} 个{absorb[0]}组" if fe_encoder is not None else ''))
+
+    # 其余固定效应的虚拟变量（按水平排序，去掉第一个水平作为基准）
+    dummy_maps = []
+    for encoder, effect in zip(dummy_encoders, absorb[1:]):
+        if len(encoder) > max_dummy_levels:
+            raise ValueError(f"固定效应{effect}有{len(encoder)}个水平，超过虚拟变量上限{max_dummy_levels}")
+        order = np.argsort(np.array([str(level) for level in encoder.levels]), kind='stable')
+        column = np.full(len(encoder), -1)
+        column[order[1:]] = np.arange(len(encoder) - 1)
+        dummy_maps.append(column)
+    n_dummies = sum(len(encoder) - 1 for encoder in dummy_encoders)
+    p = k + n_dummies
+
+    # 组均值（[y, X, 虚拟变量]），以及保留的组（剔除单观测组）
+    if fe_encoder is not None:
+        keep_group = group_counts > (1 if drop_singleton_groups else 0)
+        safe_counts = np.maximum(group_counts, 1)[:, None]
+        dummy_means = [np.asarray(counts[:, column >= 0].toarray())[:, np.argsort(column[column >= 0])] / safe_counts
+                       for counts, column in zip(dummy_counts, dummy_maps)]
+        group_means = np.hstack([group_sums / safe_counts] + dummy_means)
+
+    def demeaned_chunks(frozen=True):
+        """第2、3遍共用：按组均值去均值的 [y, X, 虚拟变量] 块"""
+        for chunk in chunks():
+            y, X, valid = _extract(chunk, dependent, regressors, effects, add_constant)
+            if not len(y):
+                continue
+            blocks = [y[:, None], X]
+            for encoder, effect, column in zip(dummy_encoders, absorb[1:], dummy_maps):
+                level_codes = column[encoder.encode(_effect_values(chunk, effect, valid), frozen)]
+                D = np.zeros((len(y), len(encoder) - 1))
+                rows = np.flatnonzero(level_codes >= 0)
+                D[rows, level_codes[rows]] = 1.0
+                blocks.append(D)
+            Z = np.hstack(blocks)
+            cluster_codes = cluster_encoder.encode(_effect_values(chunk, cluster, valid), frozen) \
+                if cluster_encoder is not None else None
+            if fe_encoder is not None:
+                codes = fe_encoder.encode(_effect_values(chunk, absorb[0], valid), frozen)
+                kept = keep_group[codes]
+                Z = Z[kept] - group_means[codes[kept]]
+                raw_y = y[kept]
+                cluster_codes = cluster_codes[kept] if cluster_codes is not None else None
+            else:
+                raw_y = y
+            yield Z, raw_y, cluster_codes
+
+    # ---- 第2遍：累加 Z'Z ----
+    ZtZ = np.zeros((1 + p, 1 + p))
+    n = 0
+    y_sum = y_squares = 0.0
+    for Z, raw_y, _ in demeaned_chunks():
+        ZtZ += Z.T @ Z
+        n += len(Z)
+        y_sum += raw_y.sum()
+        y_squares += raw_y @ raw_y
+    if verbose:
+        print(f"   - 第2遍: 累加 {1 + p} × {1 + p} 的叉积矩阵, {n:,} 个观测")
+
+    # 剔除被固定效应完全吸收的解释变量（与fit_hdfe的判定一致）
+    original_norm = np.sqrt(np.maximum(column_squares - column_sums ** 2 / n_valid, 0))
+    collinear = np.zeros(p, dtype=bool)
+    collinear[:k] = np.sqrt(np.maximum(np.diag(ZtZ)[1:k + 1], 0)) <= 1e-8 * np.maximum(original_norm, 1.0)
+    if add_constant:
+        collinear[0] = False
+    used = np.flatnonzero(~collinear)
+    A = ZtZ[1:, 1:][np.ix_(used, used)]
+    b = ZtZ[1:, 0][used]
+    A_inv = np.linalg.pinv(A)
+    beta = A_inv @ b
+    ssr = max(float(ZtZ[0, 0] - 2 * beta @ b + beta @ A @ beta), 0.0)
+
+    names = [name for name, flag in zip(names_all, collinear[:k]) if not flag]
+    dropped = [name for name, flag in zip(names_all, collinear[:k]) if flag]
+    k_used = len(names)
+
+    # 吸收的自由度：各组固定效应按连通处理，第一组之后每组减去1个冗余水平；
+    # 嵌套在聚类内的固定效应自身不计，但其后各组的冗余水平照常扣除
+    dof_absorbed = 0
+    if fe_encoder is not None and not nesting[0]['nested']:
+        dof_absorbed += int(keep_group.sum())
+    # 虚拟变量形式的固定效应中只有一个观测的水平：该观测被其虚拟变量完全拟合，与fit_hdfe一样不计入样本和自由度
+    for counts, encoder, state in zip(dummy_counts, dummy_encoders, nesting[1:]):
+        singletons = int((np.asarray(counts[keep_group].sum(axis=0)).ravel() == 1).sum())
+        n -= singletons
+        if not state['nested']:
+            dof_absorbed += len(encoder) - singletons - 1
+    df_resid = max(n - k_used - dof_absorbed, 1)
+
+    # ---- 第3遍：稳健/聚类标准误所需的得分 ----
+    n_clusters = None
+    if cov_type in ('robust', 'clustered'):
+        meat = np.zeros((len(used), len(used)))
+        n_cluster_levels = len(cluster_encoder) if cluster_encoder is not None else 0
+        cluster_scores = np.zeros((n_cluster_levels, len(used)))
+        cluster_counts = np.zeros(n_cluster_levels)
+        for Z, _, cluster_codes in demeaned_chunks():
+            Zx = Z[:, 1:][:, used]
+            scores = Zx * (Z[:, 0] - Zx @ beta)[:, None]
+            if cov_type == 'clustered':
+                cluster_scores += csr_matrix((np.ones(len(cluster_codes)), (cluster_codes, np.arange(len(cluster_codes)))),
+                                             shape=(n_cluster_levels, len(cluster_codes))) @ scores
+                cluster_counts += np.bincount(cluster_codes, minlength=n_cluster_levels)
+            else:
+                meat += scores.T @ scores
+        if cov_type == 'clustered':
+            # 剔除单观测组后不再有观测的聚类不计入聚类数
+            n_clusters = int((cluster_counts > 0).sum())
+            meat = cluster_scores.T @ cluster_scores
+            correction = n_clusters / (n_clusters - 1) * (n - 1) / df_resid
+        else:
+            correction = n / df_resid
+        cov_full = correction * A_inv @ meat @ A_inv
+        if verbose:
+            print(f"   - 第3遍: 累加{'各聚类' if cov_type == 'clustered' else '逐观测'}得分")
+    else:
+        cov_full = ssr / df_resid * A_inv
+
+    slope = np.arange(k_used)
+    params = pd.Series(beta[slope], index=names, name='parameter')
+    cov = pd.DataFrame(cov_full[np.ix_(slope, slope)], index=names, columns=names)
+    model_df_resid = df_resid
+    if cov_type == 'clustered':
+        df_resid = n_clusters - 1
+
+    # 组内R²的总平方和：y对全部固定效应（含虚拟变量形式的固定效应）去均值后的平方和
+    tss_within = float(ZtZ[0, 0])
+    if n_dummies:
+        b_dummies = ZtZ[1 + k:, 0]
+        tss_within -= float(b_dummies @ np.linalg.pinv(ZtZ[1 + k:, 1 + k:]) @ b_dummies)
+    tss = y_squares - (y_sum ** 2 / n if (add_constant or fe_encoder is not None) else 0.0)
+    return StreamingResults(params, cov, n, df_resid, None, None, None, cov_type, absorb,
+                            n_clusters=n_clusters, dropped=dropped, dof_absorbed=dof_absorbed,
+                            tss_within=tss_within, dependent=dependent, ssr=ssr,
+                            tss=tss, n_params=n - model_df_resid, chunks=n_chunks)
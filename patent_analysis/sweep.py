@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+稳健性检验参数扫描
+给定参数网格（窗口、省份筛选、匹配方式、固定效应设定等），按每个参数影响的阶段去重：
+- 上游阶段（专利扫描、回归数据准备、添加省份/GDP）：所有变体共用，只运行一次（沿用流水线的增量执行）
+- 样本阶段（省份筛选、匹配对照组）：每种不同的样本只构造一次
+- 估计阶段（窗口、回归引擎、固定效应、自助法等）：每个变体一次，在进程池中并行
+结果汇总为一张对比表（每个变体一行）
+"""
+
+import os
+import sys
+import json
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import session_cache
+
+# 可扫描的参数及其影响的阶段
+PARAMETER_STAGES = {
+    'branch': 'data',                      # 'patent'或'citation'：使用哪条流水线的回归数据
+    'provinces': 'sample',                 # None、'did'或省份名列表（见did.filter_provinces）
+    'match': 'sample',                     # None/False不匹配，True或matching.matched_sample参数字典
+    'window': 'estimate',                  # 投资前后几年（1-3）
+    'engine': 'estimate',
+    'absorb': 'estimate',
+    'enable_province_dummies': 'estimate',
+    'use_time_effects': 'estimate',
+    'bootstrap_reps': 'estimate',
+    'bootstrap_cluster': 'estimate',
+    'bootstrap_weights': 'estimate',
+}
+
+# 对比表中的结果列
+RESULT_COLUMNS = ['did_effect', 'did_t_value', 'did_p_value', 'did_bootstrap_p_value', 'gdp_effect', 'nobs']
+
+
+def expand_grid(grid):
+    """
+    参数网格展开为变体列表
+
+    参数:
+    grid: {参数名: 取值列表}，也可以直接给变体字典列表
+
+    返回:
+    [{参数名: 取值}, ...]
+    """
+    variants = grid if isinstance(grid, list) else [dict(zip(grid, values))
+                                                     for values in itertools.product(*grid.values())]
+    for variant in variants:
+        unknown = set(variant) - set(PARAMETER_STAGES)
+        if unknown:
+            raise ValueError(f"不支持扫描的参数: {', '.join(sorted(unknown))}")
+        if variant.get('engine') == 'streaming':
+            raise ValueError("参数扫描在内存中的样本上估计，不支持engine='streaming'")
+    return [dict(variant) for variant in variants]
+
+
+def _label(value):
+    """参数取值在对比表中的显示形式"""
+    if value is None:
+        return '-'
+    if isinstance(value, (list, tuple)):
+        return '、'.join(_label(v) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return value
+
+
+def _key(params, stage):
+    """变体在某阶段及之前各阶段的参数（用于去重）"""
+    stages = ['data', 'sample', 'estimate']
+    upto = stages[:stages.index(stage) + 1]
+    items = [(name, value) for name, value in params.items() if PARAMETER_STAGES[name] in upto]
+    return json.dumps(sorted(items, key=lambda item: item[0]), ensure_ascii=False, default=str)
+
+
+def build_sample(df, provinces=None, match=None):
+    """
+    样本阶段：省份筛选和匹配对照组
+
+    返回:
+    (样本DataFrame, 权重列名或None)
+    """
+    from did import filter_provinces
+
+    sample = filter_provinces(df, provinces)
+    if not match:
+        return sample, None
+    from matching import matched_sample
+
+    sample, _ = matched_sample(sample, **(match if isinstance(match, dict) else {}))
+    return sample, 'match_weight'
+
+
+# 工作进程中的共享样本（进程池初始化时传入一次，不随每个变体重复序列化）
+_WORKER = {}
+
+
+def _init_worker(samples):
+    _WORKER['samples'] = samples
+
+
+def _estimate(sample_key, params):
+    """估计阶段：在样本上执行一个变体的DID回归，返回结果字典（失败时含'error'）"""
+    from did import perform_did_regression_with_year_dummies
+
+    sample, weights, input_file = _WORKER['samples'][sample_key]
+    kwargs = {name: value for name, value in params.items() if PARAMETER_STAGES[name] == 'estimate'}
+    try:
+        result = perform_did_regression_with_year_dummies(input_file=input_file, data=sample.copy(), weights=weights,
+                                                          **kwargs)
+    except Exception as e:
+        return {'error': str(e)}
+    if result is None:
+        return {'error': 'DID回归失败'}
+    return {column: result.get(column, np.nan) for column in RESULT_COLUMNS}
+
+
+def _did_step(pipeline, branch):
+    """某条流水线的DID回归步骤"""
+    for step in pipeline.pipeline_steps:
+        if step.get('pipeline') == branch and 'did' in step.get('sources', []):
+            return step
+    raise ValueError(f"流水线{branch}中没有DID回归步骤")
+
+
+def run_sweep(grid, pipeline=None, base_dir='.', n_jobs=None, run_upstream=True, force=False, output_file=None):
+    """
+    运行参数扫描
+
+    参数:
+    grid: 参数网格{参数名: 取值列表}或变体字典列表，可用参数见PARAMETER_STAGES；未给branch时使用专利数量流水线
+    pipeline: PatentAnalysisPipeline实例，None时按base_dir新建
+    base_dir: 基础目录（pipeline为None时使用）
+    n_jobs: 估计阶段的进程数，1时在当前进程中串行，None时为变体数与CPU数中较小者
+    run_upstream: 是否先运行（或增量跳过）DID之前的上游步骤
+    force: 上游步骤是否忽略增量执行清单
+    output_file: 对比表输出文件（xlsx），None时不保存
+
+    返回:
+    对比表DataFrame（每个变体一行：参数列 + 样本公司数 + 结果列 + 状态），上游步骤失败时返回None
+    """
+    start_time = time.time()
+    variants = expand_grid(grid)
+    for variant in variants:
+        variant.setdefault('branch', 'patent')
+
+    if pipeline is None:
+        from pipeline import PatentAnalysisPipeline
+
+        pipeline = PatentAnalysisPipeline(base_dir)
+
+    did_steps = {branch: _did_step(pipeline, branch) for branch in dict.fromkeys(v['branch'] for v in variants)}
+    sample_keys = list(dict.fromkeys(_key(v, 'sample') for v in variants))
+
+    print("="*80)
+    print("稳健性检验参数扫描")
+    print("="*80)
+    print(f"变体数: {len(variants)}")
+    print(f"共享上游阶段: {', '.join(did_steps)} 流水线的DID之前的步骤（只运行一次）")
+    print(f"样本阶段: {len(sample_keys)} 种样本（省份筛选、匹配对照组只做一次）")
+    print(f"估计阶段: {len(variants)} 个回归并行执行")
+
+    # 1. 共享上游阶段
+    if run_upstream:
+        upstream = [step for step in pipeline.select_steps(targets=[s['name'] for s in did_steps.values()])
+                    if step['name'] not in {s['name'] for s in did_steps.values()}]
+        if upstream and not pipeline.run_pipeline(steps=upstream, force=force):
+            print("❌ 上游步骤失败，参数扫描中止")
+            return None
+
+    # 2. 样本阶段
+    print("\n" + "="*20 + " 构造样本 " + "="*20)
+    samples = {}
+    for variant in variants:
+        key = _key(variant, 'sample')
+        if key in samples:
+            continue
+        input_file = did_steps[variant['branch']]['input_files'][0]
+        df = session_cache.read_excel(os.path.join(pipeline.base_dir, input_file), sheet_name='回归数据')
+        sample, weights = build_sample(df, variant.get('provinces'), variant.get('match'))
+        samples[key] = (sample, weights, input_file)
+        print(f"✅ 样本 {len(samples)}: 分支={variant['branch']}, 省份={_label(variant.get('provinces'))}, "
+              f"匹配={_label(variant.get('match'))}, 公司数 {len(sample):,}")
+    session_cache.clear()
+
+    # 3. 估计阶段
+    print("\n" + "="*20 + " 执行回归 " + "="*20)
+    tasks = [(_key(v, 'sample'), v) for v in variants]
+    n_jobs = n_jobs or min(len(tasks), os.cpu_count() or 1)
+    if n_jobs == 1 or len(tasks) == 1:
+        _init_worker(samples)
+        outcomes = [_estimate(key, params) for key, params in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(samples,)) as executor:
+            outcomes = list(executor.map(_estimate, *zip(*tasks)))
+
+    # 4. 汇总对比表
+    param_names = [name for name in PARAMETER_STAGES if any(name in v for v in variants)]
+    rows = []
+    for (key, variant), outcome in zip(tasks, outcomes):
+        row = {name: _label(variant.get(name)) for name in param_names}
+        row['样本公司数'] = len(samples[key][0])
+        row.update({column: outcome.get(column, np.nan) for column in RESULT_COLUMNS})
+        row['状态'] = '失败: ' + outcome['error'] if 'error' in outcome else '成功'
+        rows.append(row)
+    table = pd.DataFrame(rows, columns=param_names + ['样本公司数'] + RESULT_COLUMNS + ['状态'])
+
+    failed = int((table['状态'] != '成功').sum())
+    print("\n" + "="*80)
+    print("参数扫描完成")
+    print("="*80)
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        print(table)
+    print(f"成功变体: {len(table) - failed}/{len(table)}")
+    print(f"总耗时: {time.time() - start_time:.2f}秒")
+
+    if output_file:
+        table.to_excel(output_file, sheet_name='参数扫描', index=False)
+        print(f"对比表已保存: {output_file}")
+    return table
+
+
+if __name__ == "__main__":
+    # 用法: python sweep.py grid.json [输出文件]
+    # grid.json示例: {"window": [1, 2, 3], "provinces": [null, "did"], "engine": ["panelols", "hdfe"]}
+    if len(sys.argv) < 2:
+        print("用法: python sweep.py grid.json [输出文件.xlsx]")
+        sys.exit(2)
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        sweep_grid = json.load(f)
+    sweep_table = run_sweep(sweep_grid, output_file=sys.argv[2] if len(sys.argv) > 2 else 'sweep_results.xlsx')
+    sys.exit(0 if sweep_table is not None and (sweep_table['状态'] == '成功').all() else 1)
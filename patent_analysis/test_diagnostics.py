@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试设计矩阵诊断 diagnostics.py
+用逐列辅助回归验证闭式VIF，并检查虚拟变量陷阱能被识别
+"""
+
+import sys
+import os
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+def auxiliary_vif(X):
+    """逐列辅助回归计算VIF（原check_multicollinearity的做法）"""
+    vif = []
+    for i in range(X.shape[1]):
+        others = np.column_stack([np.ones(len(X)), np.delete(X, i, axis=1)])
+        beta = np.linalg.lstsq(others, X[:, i], rcond=None)[0]
+        resid = X[:, i] - others @ beta
+        r_squared = 1 - resid.var() / X[:, i].var()
+        vif.append(1 / (1 - r_squared))
+    return np.array(vif)
+
+
+def test_closed_form_vif():
+    """测试闭式VIF与逐列回归一致"""
+    print("=" * 60)
+    print("测试闭式VIF")
+    print("=" * 60)
+
+    try:
+        from diagnostics import diagnose_design
+
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(2000, 5))
+        X[:, 3] = X[:, 0] + 0.3 * X[:, 1] + 0.1 * rng.normal(size=2000)
+        names = ['ln_gdp', 'x1', 'x2', 'x3', 'x4']
+
+        result = diagnose_design(X, names)
+        expected = auxiliary_vif(X)
+        print(f"闭式VIF: {np.round(result['vif'].to_numpy(), 3)}")
+        print(f"逐列回归: {np.round(expected, 3)}")
+
+        if not np.allclose(result['vif'].to_numpy(), expected, rtol=1e-8):
+            print("❌ 闭式VIF与逐列回归不一致")
+            return False
+        if result['rank'] != 5 or result['collinear_groups']:
+            print("❌ 满秩设计矩阵被误判为完全共线")
+            return False
+
+        print("✅ 闭式VIF与逐列回归一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ 闭式VIF测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_dummy_trap_detection():
+    """测试稀疏设计矩阵中虚拟变量陷阱的识别"""
+    print("\n" + "=" * 60)
+    print("测试虚拟变量陷阱识别")
+    print("=" * 60)
+
+    try:
+        from diagnostics import diagnose_design
+
+        rng = np.random.default_rng(1)
+        n, n_provinces = 5000, 8
+        province = rng.integers(0, n_provinces, n)
+        dummies = sparse.csr_matrix((np.ones(n), (np.arange(n), province)), shape=(n, n_provinces))
+        X = sparse.hstack([sparse.csr_matrix(np.ones((n, 1))), sparse.csr_matrix(rng.normal(size=(n, 1))), dummies]).tocsr()
+        names = ['const', 'ln_gdp'] + [f'province_{i}' for i in range(n_provinces)]
+
+        result = diagnose_design(X, names)
+        print(f"秩: {result['rank']} / {result['n_columns']}")
+        for group in result['collinear_groups']:
+            print(f"共线列组: {group['label']}")
+
+        if result['rank'] != result['n_columns'] - 1 or len(result['collinear_groups']) != 1:
+            print("❌ 没有识别出一个秩亏")
+            return False
+        members = set(result['collinear_groups'][0]['members'])
+        if members != {'const'} | {f'province_{i}' for i in range(n_provinces)}:
+            print(f"❌ 共线列组不正确: {sorted(members)}")
+            return False
+        if not np.isinf(result['condition_number']) and result['condition_number'] < 1e6:
+            print("❌ 完全共线时条件数应极大")
+            return False
+        if not np.isfinite(result['vif']['ln_gdp']):
+            print("❌ 不参与共线的变量VIF应为有限值")
+            return False
+
+        print("✅ 虚拟变量陷阱识别正确")
+        return True
+
+    except Exception as e:
+        print(f"❌ 虚拟变量陷阱测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_condition_number():
+    """测试中心化条件数与标准化数据的口径一致，不受变量均值影响；hdfe引擎诊断去除固定效应后的X"""
+    print("\n" + "=" * 60)
+    print("测试条件数口径与固定效应吸收后的诊断")
+    print("=" * 60)
+
+    try:
+        from diagnostics import diagnose_design, preflight_design
+        from hdfe import demeaned_design, fit_hdfe
+
+        # ln_gdp均值远大于标准差：Belsley条件数偏大，中心化条件数（原口径）正常
+        rng = np.random.default_rng(2)
+        n = 3000
+        X = np.column_stack([np.ones(n), 10 + 0.05 * rng.normal(size=n), rng.normal(size=n), rng.integers(0, 2, n)])
+        result = diagnose_design(X, ['const', 'ln_gdp', 'x1', 'treatment'])
+        standardized = (X[:, 1:] - X[:, 1:].mean(axis=0)) / X[:, 1:].std(axis=0)
+        eigenvalues = np.linalg.eigvalsh(standardized.T @ standardized)
+        expected = np.sqrt(eigenvalues[-1] / eigenvalues[0])
+        print(f"中心化条件数: {result['condition_number']:.3f}，Belsley条件数: {result['scaled_condition_number']:.1f}")
+        if not np.isclose(result['condition_number'], expected, rtol=1e-8):
+            print(f"❌ 中心化条件数与标准化数据的条件数不一致: {expected:.3f}")
+            return False
+        if result['condition_number'] > 30 or result['scaled_condition_number'] <= 30:
+            print("❌ 条件数口径不正确")
+            return False
+
+        # 公司固定效应下treatment被吸收；ln_gdp与公司均值高度相关，去除固定效应后不再共线
+        n_companies, n_years = 200, 8
+        company = np.repeat(np.arange(n_companies), n_years)
+        level = rng.normal(size=n_companies)[company]
+        panel = pd.DataFrame({
+            'company': company,
+            'treatment': (np.arange(n_companies) % 2)[company].astype(float),
+            'ln_gdp': 5 * level + rng.normal(size=len(company)),
+            'x1': level + 0.15 * rng.normal(size=len(company)),
+            'match_weight': rng.uniform(0.5, 2, len(company)),
+        })
+        panel['y'] = panel['ln_gdp'] + panel['x1'] + rng.normal(size=len(panel))
+        regressors = ['treatment', 'ln_gdp', 'x1']
+
+        X_tilde, kept, absorbed = demeaned_design(panel, 'y', regressors, absorb=['company'], cluster='company')
+        fitted = fit_hdfe(panel, 'y', regressors, absorb=['company'], cluster='company')
+        assert absorbed == ['treatment'] == fitted.dropped and kept == ['ln_gdp', 'x1'], (absorbed, kept)
+        assert np.allclose(X_tilde, fitted.demeaned_X)
+        raw = diagnose_design(panel[['ln_gdp', 'x1']].to_numpy(), kept)
+        within = preflight_design(X_tilde, kept)
+        print(f"去除固定效应前VIF: {raw['vif'].round(2).tolist()}，之后: {within['vif'].round(2).tolist()}")
+        assert raw['vif'].max() > 10 and within['vif'].max() < 2
+
+        # 加权时诊断sqrt(权重)缩放后的X
+        X_weighted, _, _ = demeaned_design(panel, 'y', regressors, absorb=['company'], cluster='company',
+                                           weights='match_weight')
+        weighted = fit_hdfe(panel, 'y', regressors, absorb=['company'], cluster='company', weights='match_weight')
+        assert np.allclose(X_weighted, weighted.demeaned_X * np.sqrt(panel['match_weight'].to_numpy())[:, None])
+
+        print("✅ 条件数口径与固定效应吸收后的诊断正确")
+        return True
+
+    except Exception as e:
+        print(f"❌ 条件数测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def main():
+    """主测试函数"""
+    print("设计矩阵诊断测试")
+    print("=" * 60)
+
+    tests = [
+        ("闭式VIF", test_closed_form_vif),
+        ("虚拟变量陷阱", test_dummy_trap_detection),
+        ("条件数与固定效应吸收", test_condition_number),
+    ]
+
+    success_count = 0
+    for test_name, test_func in tests:
+        if test_func():
+            success_count += 1
+            print(f"✅ {test_name} 测试通过")
+        else:
+            print(f"❌ {test_name} 测试失败")
+
+    print("\n" + "=" * 60)
+    print(f"成功测试: {success_count}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
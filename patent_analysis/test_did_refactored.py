@@ -215,6 +215,95 @@ def test_code_structure():
         traceback.print_exc()
         return False
 
+def loop_panel_data(df, min_year=1992, max_year=2025):
+    """逐行展开的参照实现（原prepare_panel_data中的循环，年份范围改为参数）"""
+    import numpy as np
+    import pandas as pd
+    
+    panel_data = []
+    for _, row in df.iterrows():
+        for post, prefix, sign in ((0, '前', -1), (1, '后', 1)):
+            for year_offset in range(1, 4):
+                year = row['投资年份'] + sign * year_offset
+                if (post == 0 and year < min_year) or (post == 1 and year > max_year):
+                    continue
+                patent_count = row[f'{prefix}3年专利数_{prefix}{year_offset}年']
+                panel_data.append({
+                    'company': row['公司名称'],
+                    'year': year,
+                    'investment_year': row['投资年份'],
+                    'treatment': row['treatment'],
+                    'post': post,
+                    'patent_count': patent_count,
+                    'ln_patent_plus_1': np.log(patent_count + 1),
+                    'province': row['省份'],
+                    'gdp': row[f'{prefix}3年GDP_{prefix}{year_offset}年'],
+                    'ln_gdp': row[f'ln_{prefix}3年GDP_{prefix}{year_offset}年'],
+                    'time_to_investment': -sign * year_offset,
+                    'period': 'post' if post else 'pre',
+                })
+    return pd.DataFrame(panel_data)
+
+def test_build_panel_data():
+    """测试向量化构造的面板与逐行展开逐行一致（含缺失GDP/专利数和年份范围截断）"""
+    print("\n" + "=" * 60)
+    print("测试面板数据构造")
+    print("=" * 60)
+    
+    try:
+        import numpy as np
+        import pandas as pd
+        from did import build_panel_data
+        
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({
+            '公司名称': ['甲公司', '乙公司', '丙公司', '丁公司', '戊公司'],
+            '投资年份': [1993, 2024, 2015, 2018, 2012],
+            'treatment': [1, 0, 1, 0, 1],
+            '省份': ['广东', '浙江', '北京', '广东', '江苏'],
+        })
+        for prefix in ('前', '后'):
+            for k in range(1, 4):
+                df[f'{prefix}3年专利数_{prefix}{k}年'] = rng.integers(0, 20, len(df)).astype(float)
+                df[f'{prefix}3年GDP_{prefix}{k}年'] = rng.uniform(1e4, 1e5, len(df))
+                df[f'ln_{prefix}3年GDP_{prefix}{k}年'] = np.log(df[f'{prefix}3年GDP_{prefix}{k}年'] + 1)
+        # 缺失GDP和缺失专利数的观测
+        df.loc[2, ['前3年GDP_前2年', 'ln_前3年GDP_前2年']] = np.nan
+        df.loc[3, '后3年专利数_后1年'] = np.nan
+        
+        for bounds in ({}, {'min_year': 2011, 'max_year': 2019}):
+            panel = build_panel_data(df, **bounds)
+            expected = loop_panel_data(df, **bounds)
+            print(f"年份范围 {bounds or '默认'}: {len(panel)} 行（逐行展开 {len(expected)} 行）")
+            
+            assert list(panel.columns) == list(expected.columns), list(panel.columns)
+            actual = panel.copy()
+            for column in ('company', 'province', 'period'):
+                actual[column] = actual[column].astype(str)
+            pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+            
+            # 截断与缺失值
+            # 投资前年份不早于min_year，投资后年份不晚于max_year
+            assert (panel.loc[panel['post'] == 0, 'year'] >= bounds.get('min_year', 1992)).all()
+            assert (panel.loc[panel['post'] == 1, 'year'] <= bounds.get('max_year', 2025)).all()
+            assert panel.loc[panel['company'] == '丙公司', 'ln_gdp'].isna().sum() == 1
+            assert panel.loc[panel['company'] == '丁公司', 'ln_patent_plus_1'].isna().sum() == 1
+        
+        default = build_panel_data(df)
+        assert default.loc[default['company'] == '甲公司', 'year'].tolist() == [1992, 1994, 1995, 1996]
+        assert default.loc[default['company'] == '乙公司', 'year'].tolist() == [2023, 2022, 2021, 2025]
+        assert set(default['time_to_investment']) == {-3, -2, -1, 1, 2, 3}
+        assert ((default['post'] == 1) == (default['time_to_investment'] < 0)).all()
+        
+        print("✅ 向量化面板与逐行展开一致")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 面板数据构造测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
 def main():
     """主测试函数"""
     print("重构后的DID功能测试")
@@ -226,6 +315,7 @@ def main():
         ("函数文档", test_function_documentation),
         ("主函数参数", test_main_function_parameters),
         ("代码结构", test_code_structure),
+        ("面板数据构造", test_build_panel_data),
     ]
     
     success_count = 0
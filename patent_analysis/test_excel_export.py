@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试流式Excel写出 excel_export.py
+"""
+
+import sys
+import os
+import tempfile
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+
+def make_frame(n=25):
+    """生成含整数、浮点（含缺失值）、文字和日期列的数据"""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        '公司名称': [f'公司{i}' for i in range(n)],
+        '投资年份': rng.integers(2010, 2020, n),
+        '专利增长率': rng.normal(size=n),
+        '投资时间': pd.date_range('2015-01-01', periods=n, freq='D'),
+    })
+    df.loc[3, '专利增长率'] = np.nan
+    return df
+
+
+def test_frame_round_trip():
+    """测试DataFrame流式写出后读回与pandas写出的结果一致（含分块写出、行索引和多层列名）"""
+    print("=" * 60)
+    print("测试DataFrame流式写出")
+    print("=" * 60)
+
+    try:
+        import excel_export
+        from excel_export import write_workbook
+
+        df = make_frame()
+        yearly = df.groupby('投资年份').agg({'专利增长率': 'mean', '公司名称': 'count'}).round(2)
+        grouped = df.groupby('投资年份').agg({'专利增长率': ['mean', 'count']}).round(2)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            streamed = os.path.join(tmp_dir, 'streamed.xlsx')
+            expected = os.path.join(tmp_dir, 'expected.xlsx')
+
+            chunk_rows = excel_export.CHUNK_ROWS
+            excel_export.CHUNK_ROWS = 7
+            try:
+                write_workbook(streamed, {'回归数据': df, '按年份统计': yearly, '按省份统计': grouped},
+                               no_index=['回归数据'])
+            finally:
+                excel_export.CHUNK_ROWS = chunk_rows
+            with pd.ExcelWriter(expected, engine='openpyxl') as writer:
+                df.to_excel(writer, sheet_name='回归数据', index=False)
+                yearly.to_excel(writer, sheet_name='按年份统计')
+
+            for sheet_name in ('回归数据', '按年份统计'):
+                pd.testing.assert_frame_equal(pd.read_excel(streamed, sheet_name=sheet_name),
+                                              pd.read_excel(expected, sheet_name=sheet_name))
+            assert pd.read_excel(streamed, sheet_name=None).keys() == {'回归数据', '按年份统计', '按省份统计'}
+
+            # 多层列名按层逐行写出
+            header = pd.read_excel(streamed, sheet_name='按省份统计', header=None, nrows=2)
+            assert header.iloc[0, 1] == '专利增长率' and pd.isna(header.iloc[0, 2]), header.iloc[0].tolist()
+            assert header.iloc[1].tolist() == ['投资年份', 'mean', 'count'], header.iloc[1].tolist()
+
+        print("✅ DataFrame流式写出正确")
+        return True
+
+    except Exception as e:
+        print(f"❌ DataFrame流式写出测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_sparse_sheets():
+    """测试稀疏矩阵宽表与稠密矩阵写出一致、长表只含非零元素"""
+    print("\n" + "=" * 60)
+    print("测试稀疏矩阵写出")
+    print("=" * 60)
+
+    try:
+        from excel_export import SparseSheet, write_workbook
+
+        companies = ['甲公司', '乙公司', '丙公司', '丁公司']
+        years = [2018, 2019, 2020]
+        matrix = csr_matrix(([3, 1, 5, 2], ([0, 0, 2, 3], [0, 2, 1, 2])), shape=(4, 3))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'company_patent_yearly.xlsx')
+            write_workbook(path, {
+                '原始数据': SparseSheet(matrix, companies, years),
+                '长表': SparseSheet(matrix, companies, years, layout='long', names=('公司名称', '年份', '专利数量')),
+            })
+
+            dense = os.path.join(tmp_dir, 'dense.xlsx')
+            pd.DataFrame(matrix.toarray(), index=companies, columns=years).to_excel(dense, sheet_name='原始数据')
+            pd.testing.assert_frame_equal(pd.read_excel(path, sheet_name=0), pd.read_excel(dense, sheet_name=0))
+
+            long_df = pd.read_excel(path, sheet_name='长表')
+            assert list(long_df.columns) == ['公司名称', '年份', '专利数量']
+            assert long_df.values.tolist() == [['甲公司', 2018, 3], ['甲公司', 2020, 1], ['丙公司', 2019, 5],
+                                               ['丁公司', 2020, 2]], long_df
+
+            try:
+                SparseSheet(matrix, companies[:3], years)
+                print("❌ 未检查行列标签数")
+                return False
+            except ValueError:
+                pass
+
+        print("✅ 稀疏矩阵写出正确")
+        return True
+
+    except Exception as e:
+        print(f"❌ 稀疏矩阵写出测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_separate_files():
+    """测试每个工作表单独写一个文件（进程池并行）"""
+    print("\n" + "=" * 60)
+    print("测试工作表分文件并行写出")
+    print("=" * 60)
+
+    try:
+        from excel_export import write_workbook, sheet_file
+
+        df = make_frame()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'report.xlsx')
+            sheets = {'回归数据': df, '数据统计': df.describe()}
+            written = write_workbook(path, sheets, no_index=['回归数据'], separate_files=True, n_jobs=2)
+            assert written == [sheet_file(path, '回归数据'), sheet_file(path, '数据统计')], written
+            assert not os.path.exists(path)
+            pd.testing.assert_frame_equal(pd.read_excel(written[0]), df)
+            stats = pd.read_excel(written[1], index_col=0)
+            assert np.allclose(stats.loc['mean', '专利增长率'], df['专利增长率'].mean())
+
+        print("✅ 工作表分文件并行写出正确")
+        return True
+
+    except Exception as e:
+        print(f"❌ 工作表分文件并行写出测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def main():
+    """主测试函数"""
+    print("流式Excel写出测试")
+    print("=" * 60)
+
+    tests = [
+        ("DataFrame流式写出", test_frame_round_trip),
+        ("稀疏矩阵写出", test_sparse_sheets),
+        ("工作表分文件并行写出", test_separate_files),
+    ]
+
+    success_count = 0
+    for test_name, test_func in tests:
+        if test_func():
+            success_count += 1
+            print(f"✅ {test_name} 测试通过")
+        else:
+            print(f"❌ {test_name} 测试失败")
+
+    print("\n" + "=" * 60)
+    print(f"成功测试: {success_count}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,665 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试高维固定效应回归 hdfe.py
+用虚拟变量OLS的结果验证交替投影吸收固定效应的估计
+"""
+
+import sys
+import os
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+
+
+def make_panel(n_companies=200, n_years=8, seed=0):
+    """生成带公司、年份效应的非平衡模拟面板"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'company': np.repeat(np.arange(n_companies), n_years),
+        'year': np.tile(np.arange(2010, 2010 + n_years), n_companies),
+    })
+    df = df.sample(frac=0.85, random_state=seed).reset_index(drop=True)
+    df['province'] = df['company'] % 7
+    company_effect = rng.normal(size=n_companies)[df['company']]
+    year_effect = rng.normal(size=n_years)[df['year'] - 2010]
+    df['x1'] = rng.normal(size=len(df)) + company_effect
+    df['x2'] = rng.normal(size=len(df)) + year_effect
+    df['treatment'] = (df['company'] % 2).astype(float)
+    df['y'] = 1 + 2 * df['x1'] - df['x2'] + company_effect + year_effect + rng.normal(size=len(df))
+    return df
+
+
+def dummy_ols(df, regressors):
+    """虚拟变量OLS（对照结果）"""
+    dummies = pd.get_dummies(df[['company', 'year']].astype(str), drop_first=True).astype(float)
+    X = np.column_stack([np.ones(len(df)), df[regressors].to_numpy(), dummies.to_numpy()])
+    beta, *_ = np.linalg.lstsq(X, df['y'].to_numpy(), rcond=None)
+    resid = df['y'].to_numpy() - X @ beta
+    sigma2 = resid @ resid / (len(df) - X.shape[1])
+    cov = sigma2 * np.linalg.inv(X.T @ X)
+    k = len(regressors)
+    return beta[1:1 + k], np.sqrt(np.diag(cov))[1:1 + k]
+
+
+def test_two_way_fixed_effects():
+    """测试公司+年份双向固定效应"""
+    print("=" * 60)
+    print("测试公司+年份双向固定效应")
+    print("=" * 60)
+
+    try:
+        from hdfe import fit_hdfe
+
+        df = make_panel()
+        result = fit_hdfe(df, 'y', ['x1', 'x2', 'treatment'], absorb=['company', 'year'], cov_type='unadjusted')
+        print(result)
+
+        expected_params, expected_se = dummy_ols(df, ['x1', 'x2'])
+
+        if not np.allclose(result.params[['x1', 'x2']].to_numpy(), expected_params, atol=1e-6):
+            print(f"❌ 系数不一致: {result.params.to_dict()} vs {expected_params}")
+            return False
+        print("✅ 系数与虚拟变量OLS一致")
+
+        if not np.allclose(result.std_errors[['x1', 'x2']].to_numpy(), expected_se, atol=1e-6):
+            print(f"❌ 标准误不一致: {result.std_errors.to_dict()} vs {expected_se}")
+            return False
+        print("✅ 标准误与虚拟变量OLS一致")
+
+        if result.dropped != ['treatment']:
+            print(f"❌ 应剔除被公司固定效应吸收的treatment，实际剔除: {result.dropped}")
+            return False
+        print("✅ 正确剔除被固定效应吸收的treatment")
+
+        return True
+
+    except Exception as e:
+        print(f"❌ 双向固定效应测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_interacted_fixed_effects():
+    """测试省份×年份交互固定效应和聚类标准误"""
+    print("\n" + "=" * 60)
+    print("测试省份×年份交互固定效应")
+    print("=" * 60)
+
+    try:
+        from hdfe import fit_hdfe
+
+        df = make_panel()
+        result = fit_hdfe(df, 'y', ['x1', 'x2'], absorb=['company', ('province', 'year')], cluster='company')
+        print(result)
+
+        if result.n_clusters != df['company'].nunique():
+            print(f"❌ 聚类数不正确: {result.n_clusters}")
+            return False
+        if not np.all(np.isfinite(result.std_errors)):
+            print("❌ 聚类标准误不是有限值")
+            return False
+
+        # 交互固定效应中任一部分缺失的观测编码为-1（与单个固定效应一致）
+        from hdfe import factorize_effect, absorbed_degrees_of_freedom
+        small = pd.DataFrame({'province': ['a', None, 'b', None], 'year': [2000, 2001, 2000, 2002]})
+        codes = factorize_effect(small, 'province#year')
+        if codes.tolist() != [0, -1, 1, -1] or factorize_effect(small, 'province').tolist() != [0, -1, 1, -1]:
+            print(f"❌ 交互固定效应缺失值编码不正确: {codes.tolist()}")
+            return False
+
+        # 公司固定效应嵌套在公司聚类内时不计入，但年份固定效应仍减去1个冗余水平
+        company = factorize_effect(df, 'company')
+        year = factorize_effect(df, 'year')
+        dof = absorbed_degrees_of_freedom([company, year], cluster_codes=company)
+        if dof != df['year'].nunique() - 1:
+            print(f"❌ 嵌套固定效应的吸收自由度不正确: {dof}")
+            return False
+
+        # 固定效应部分缺失时只在有效观测中找单观测组；全部缺失时给出明确的错误
+        from hdfe import drop_singletons
+        partial = np.array([0, 0, 1, -1, 2, 2])
+        if drop_singletons([partial], partial >= 0).tolist() != [True, True, False, False, True, True]:
+            print("❌ 含缺失编码时单观测组剔除不正确")
+            return False
+        missing_fe = df.assign(region=np.nan)
+        try:
+            fit_hdfe(missing_fe, 'y', ['x1'], absorb=['region'])
+            print("❌ 固定效应全部缺失时没有报错")
+            return False
+        except ValueError as e:
+            print(f"固定效应全部缺失: {e}")
+
+        print("✅ 交互固定效应与聚类标准误计算成功")
+        return True
+
+    except Exception as e:
+        print(f"❌ 交互固定效应测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_sparse_dummy_regression():
+    """测试稀疏虚拟变量块与稀疏正规方程"""
+    print("\n" + "=" * 60)
+    print("测试稀疏虚拟变量回归")
+    print("=" * 60)
+
+    try:
+        from sparse_design import sparse_dummies, build_design, sparse_ols
+
+        df = make_panel()
+        block, names = sparse_dummies(df['province'], 'province')
+        print(f"稀疏虚拟变量块: {block.shape}, 非零元素 {block.nnz}")
+
+        if block.shape[1] != df['province'].nunique() - 1 or block.nnz != (block.sum(axis=1) > 0).sum():
+            print("❌ 虚拟变量块形状不正确")
+            return False
+
+        X, design_names = build_design(df, ['x1', 'x2'], [(block, names)])
+        result = sparse_ols(X, df['y'], design_names, dependent='y')
+
+        dense = X.toarray()
+        expected, *_ = np.linalg.lstsq(dense, df['y'].to_numpy(), rcond=None)
+        if not np.allclose(result.params.to_numpy(), expected, atol=1e-8):
+            print("❌ 稀疏正规方程的系数与稠密最小二乘不一致")
+            return False
+
+        # 解释变量或聚类变量缺失的行被剔除，结果与删除这些行后的最小二乘一致
+        df_missing = df.copy()
+        df_missing.loc[df_missing.index[:5], 'x1'] = np.nan
+        cluster = df_missing['province'].astype(object)
+        cluster.iloc[7] = None
+        X, design_names = build_design(df_missing, ['x1', 'x2'], [(block, names)])
+        result = sparse_ols(X, df_missing['y'], design_names, cluster=cluster, dependent='y')
+        kept = df_missing['x1'].notna().to_numpy() & cluster.notna().to_numpy()
+        expected, *_ = np.linalg.lstsq(X.toarray()[kept], df_missing['y'].to_numpy()[kept], rcond=None)
+        if result.nobs != kept.sum() or not np.allclose(result.params.to_numpy(), expected, atol=1e-8):
+            print("❌ 含缺失解释变量时未剔除缺失行")
+            return False
+
+        print("✅ 稀疏正规方程的系数与稠密最小二乘一致，缺失行被剔除")
+        return True
+
+    except Exception as e:
+        print(f"❌ 稀疏虚拟变量回归测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_spec_grid():
+    """测试批量多设定回归与逐个fit_hdfe结果一致"""
+    print("\n" + "=" * 60)
+    print("测试批量多设定回归")
+    print("=" * 60)
+
+    try:
+        from hdfe import fit_hdfe
+        from spec_grid import run_spec_grid
+
+        df = make_panel()
+        df['y2'] = 0.5 * df['y'] + df['x2']
+        control_sets = {'基础': ['x1'], '全部': ['x1', 'x2', 'treatment']}
+        fe_sets = {'无': [], '公司+年份': ['company', 'year']}
+        grid = run_spec_grid(df, ['y', 'y2'], control_sets, fe_sets, cluster='company')
+        print(grid.round(4).to_string(index=False))
+
+        for fe_name, absorb in fe_sets.items():
+            for control_name, regressors in control_sets.items():
+                for outcome in ['y', 'y2']:
+                    single = fit_hdfe(df, outcome, regressors, absorb=absorb or None, cluster='company')
+                    rows = grid[(grid['fe'] == fe_name) & (grid['controls'] == control_name)
+                                & (grid['outcome'] == outcome)].set_index('term')
+                    if (list(rows.index) != list(single.params.index)
+                            or not np.allclose(rows['coef'], single.params[rows.index], atol=1e-8)
+                            or not np.allclose(rows['std_error'], single.std_errors[rows.index], atol=1e-8)):
+                        print(f"❌ 设定[{fe_name}/{control_name}/{outcome}]与fit_hdfe不一致")
+                        return False
+
+        print("✅ 所有设定的系数和聚类标准误与逐个估计一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ 批量多设定回归测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_wild_cluster_bootstrap():
+    """测试野聚类自助法与逐次重新估计的结果一致"""
+    print("\n" + "=" * 60)
+    print("测试野聚类自助法")
+    print("=" * 60)
+
+    try:
+        from hdfe import fit_hdfe
+        from wild_bootstrap import wild_cluster_bootstrap, draw_weights
+
+        df = make_panel()
+        df['d'] = ((df['province'] < 3) & (df['year'] > 2013)).astype(float)
+        result = wild_cluster_bootstrap(df, 'y', ['x1', 'd'], param='d', cluster='province',
+                                        absorb=['company', 'year'], reps=200, seed=1, n_jobs=1, chunk_size=200)
+        print(f"t值={result['t_stat']:.4f}, 自助法p值={result['pvalue']:.4f}")
+
+        # 用相同的权重逐次重新估计
+        fit = fit_hdfe(df, 'y', ['x1', 'd'], absorb=['company', 'year'], cluster='province')
+        X, y, codes, G = fit.demeaned_X, fit.demeaned_y, fit.cluster_codes, fit.n_clusters
+        b, *_ = np.linalg.lstsq(X[:, [0]], y, rcond=None)
+        fitted, u = X[:, [0]] @ b, y - X[:, [0]] @ b
+        rng = np.random.default_rng(np.random.SeedSequence(1).spawn(1)[0])
+        W = draw_weights(rng, 200, G)
+        correction = G / (G - 1) * (len(y) - 1) / (len(y) - 2 - fit.dof_absorbed)
+        Q = np.linalg.inv(X.T @ X)
+        expected = []
+        for w in W:
+            y_star = fitted + u * w[codes]
+            beta = Q @ X.T @ y_star
+            scores = np.zeros((G, 2))
+            np.add.at(scores, codes, X * (y_star - X @ beta)[:, None])
+            cov = correction * Q @ scores.T @ scores @ Q
+            expected.append(beta[1] / np.sqrt(cov[1, 1]))
+
+        if not np.allclose(result['t_boot'], expected):
+            print("❌ 自助法t统计量与逐次重新估计不一致")
+            return False
+        print("✅ 自助法t统计量与逐次重新估计一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ 野聚类自助法测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_weighted_bootstrap():
+    """测试加权、不含常数项时自助法使用与估计相同的模型"""
+    print("\n" + "=" * 60)
+    print("测试加权野聚类自助法")
+    print("=" * 60)
+
+    try:
+        from hdfe import fit_hdfe
+        from wild_bootstrap import wild_cluster_bootstrap, draw_weights
+        from linearmodels import PanelOLS
+
+        df = make_panel()
+        df['d'] = ((df['province'] < 3) & (df['year'] > 2013)).astype(float)
+        rng = np.random.default_rng(3)
+        df['wt'] = df['company'].map(dict(zip(df['company'].unique(), rng.uniform(0.5, 2.0, df['company'].nunique()))))
+
+        result = wild_cluster_bootstrap(df, 'y', ['x1', 'd'], param='d', cluster='province', absorb=['company', 'year'],
+                                        reps=20, seed=2, n_jobs=1, chunk_size=20, weights='wt')
+        weighted = fit_hdfe(df, 'y', ['x1', 'd'], absorb=['company', 'year'], cluster='province', weights='wt')
+        if not (np.isclose(result['coef'], weighted.params['d']) and np.isclose(result['std_error'], weighted.std_errors['d'])):
+            print("❌ 自助法的系数和标准误不是加权估计的结果")
+            return False
+
+        # 用相同的权重逐次做加权最小二乘（X'WX、聚类得分X'We）
+        X, y, codes, G = weighted.demeaned_X, weighted.demeaned_y, weighted.cluster_codes, weighted.n_clusters
+        wt = df['wt'].to_numpy()[weighted.sample_mask]
+        b = (X[:, 0] * wt) @ y / ((X[:, 0] * wt) @ X[:, 0])
+        fitted, u = X[:, 0] * b, y - X[:, 0] * b
+        W = draw_weights(np.random.default_rng(np.random.SeedSequence(2).spawn(1)[0]), 20, G)
+        correction = G / (G - 1) * (len(y) - 1) / (len(y) - 2 - weighted.dof_absorbed)
+        Q = np.linalg.inv(X.T @ (X * wt[:, None]))
+        expected = []
+        for w in W:
+            y_star = fitted + u * w[codes]
+            beta = Q @ (X * wt[:, None]).T @ y_star
+            scores = np.zeros((G, 2))
+            np.add.at(scores, codes, X * (wt * (y_star - X @ beta))[:, None])
+            cov = correction * Q @ scores.T @ scores @ Q
+            expected.append(beta[1] / np.sqrt(cov[1, 1]))
+        if not np.allclose(result['t_boot'], expected):
+            print("❌ 加权自助法t统计量与逐次加权重新估计不一致")
+            return False
+
+        # 不含常数项、不吸收固定效应时与PanelOLS(无常数项)的估计相同
+        no_constant = wild_cluster_bootstrap(df, 'y', ['x1', 'd'], param='d', cluster='province', absorb=[],
+                                             reps=20, seed=2, n_jobs=1, weights='wt', constant=False)
+        panel = df.set_index(['company', 'year'])
+        expected_coef = PanelOLS(panel['y'], panel[['x1', 'd']], weights=panel['wt']).fit().params['d']
+        if not np.isclose(no_constant['coef'], expected_coef):
+            print("❌ 不含常数项时自助法的系数与PanelOLS不一致")
+            return False
+
+        print("✅ 加权自助法与加权估计使用相同的模型")
+        return True
+
+    except Exception as e:
+        print(f"❌ 加权野聚类自助法测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_weighted_rsquared():
+    """测试加权回归的组内R²与加权最小二乘（虚拟变量）一致"""
+    print("\n" + "=" * 60)
+    print("测试加权组内R²")
+    print("=" * 60)
+
+    try:
+        import statsmodels.api as sm
+        from hdfe import fit_hdfe
+
+        df = make_panel()
+        rng = np.random.default_rng(4)
+        df['wt'] = rng.uniform(0.2, 5.0, len(df))
+        result = fit_hdfe(df, 'y', ['x1', 'x2'], absorb=['company'], cluster='company', weights='wt')
+
+        dummies = pd.get_dummies(df['company'].astype(str), drop_first=True).astype(float)
+        fe_only = sm.add_constant(dummies)
+        full = pd.concat([fe_only, df[['x1', 'x2']]], axis=1)
+        wls = sm.WLS(df['y'], full, weights=df['wt']).fit()
+        wls_fe = sm.WLS(df['y'], fe_only, weights=df['wt']).fit()
+        expected = 1 - wls.ssr / wls_fe.ssr
+        print(f"HDFE组内R²: {result.rsquared_within:.6f}, 加权虚拟变量回归: {expected:.6f}")
+
+        if not np.allclose(result.params.to_numpy(), wls.params[['x1', 'x2']].to_numpy()):
+            print("❌ 加权系数与WLS不一致")
+            return False
+        if not np.isclose(result.rsquared_within, expected):
+            print("❌ 加权组内R²与WLS不一致")
+            return False
+
+        print("✅ 加权组内R²正确")
+        return True
+
+    except Exception as e:
+        print(f"❌ 加权组内R²测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_placebo_permutations():
+    """测试批量置换得到的安慰剂系数与逐次估计一致"""
+    print("\n" + "=" * 60)
+    print("测试安慰剂置换检验")
+    print("=" * 60)
+
+    try:
+        import placebo
+        from hdfe import fit_hdfe
+
+        df = make_panel()
+        df['investment_year'] = 2012 + df['company'] % 3
+        df['post'] = (df['year'] > df['investment_year']).astype(int)
+
+        for mode in ['firms', 'timing']:
+            result = placebo.placebo_test(df, dependent='y', controls=['x1'], mode=mode,
+                                          reps=10, seed=5, n_jobs=1, chunk_size=10)
+            rng = np.random.default_rng(np.random.SeedSequence(5).spawn(1)[0])
+            D = placebo._placebo_regressors(placebo._CONTEXT, mode, 10, rng)
+            print(f"{mode}: 实际系数={result['coef']:.4f}, p值={result['pvalue']:.4f}")
+
+            for i in range(3):
+                single = fit_hdfe(df.assign(d=D[:, i]), 'y', ['d', 'x1'], absorb=['company', 'year'])
+                if not np.isclose(single.params['d'], result['placebo'][i], rtol=1e-6):
+                    print(f"❌ {mode}第{i}次置换的系数不一致: {single.params['d']} vs {result['placebo'][i]}")
+                    return False
+
+        # 年份固定效应以稀疏虚拟变量块处理（不生成稠密的n×类别数矩阵），与全部交替投影的结果一致
+        from scipy import sparse
+        context = placebo._CONTEXT
+        if not sparse.issparse(context['S']) or context['Z'].shape[1] != 1:
+            print("❌ 次要固定效应没有以稀疏虚拟变量块处理")
+            return False
+        dummy = placebo.placebo_test(df, dependent='y', controls=['x1'], reps=20, seed=7, n_jobs=1)
+        projected = placebo.placebo_test(df, dependent='y', controls=['x1'], reps=20, seed=7, n_jobs=1,
+                                         max_dummy_levels=0)
+        if placebo._CONTEXT['S'] is not None or not np.allclose(dummy['placebo'], projected['placebo'], rtol=1e-6):
+            print("❌ 稀疏虚拟变量与交替投影的安慰剂系数不一致")
+            return False
+
+        print("✅ 批量安慰剂系数与逐次估计一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ 安慰剂置换检验测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_event_study():
+    """测试事件研究的前导/滞后虚拟变量与逐个构造的虚拟变量回归一致"""
+    print("\n" + "=" * 60)
+    print("测试事件研究")
+    print("=" * 60)
+
+    try:
+        from hdfe import fit_hdfe
+        from event_study import estimate_event_study
+
+        df = make_panel()
+        df['investment_year'] = 2012 + df['company'] % 4
+        df['time_to_investment'] = df['investment_year'] - df['year']
+        rt = df['year'] - df['investment_year']
+        df['y'] += df['treatment'] * np.where(rt >= 0, 0.5 * (rt + 1), 0.0)
+
+        event = estimate_event_study(df, dependent='y', controls=['x1'], window=(-3, 3))
+        print(event['table'].round(4).to_string())
+
+        # 逐个构造的虚拟变量（窗口外归入端点）
+        clipped = rt.clip(-3, 3)
+        manual = {f'd{k}': df['treatment'] * (clipped == k) for k in range(-3, 4) if k != -1}
+        single = fit_hdfe(df.assign(**manual), 'y', list(manual) + ['x1'], absorb=['company', 'year'], cluster='company')
+        expected = np.array([single.params[f'd{k}'] if k != -1 else 0.0 for k in range(-3, 4)])
+
+        if not np.array_equal(event['event_time'], np.arange(-3, 4)):
+            print(f"❌ 相对时间不正确: {event['event_time']}")
+            return False
+        if not np.allclose(event['coef'], expected, atol=1e-8):
+            print(f"❌ 事件研究系数不一致: {event['coef']} vs {expected}")
+            return False
+
+        print("✅ 事件研究系数与逐个构造虚拟变量的回归一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ 事件研究测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_staggered_did():
+    """测试组别-时期ATT与手工计算的2×2 DID一致"""
+    print("\n" + "=" * 60)
+    print("测试交错处理DID")
+    print("=" * 60)
+
+    try:
+        from staggered_did import estimate_group_time_att
+
+        df = make_panel()
+        df['investment_year'] = 2012 + df['company'] % 4
+        df['y'] += df['treatment'] * (df['year'] >= df['investment_year'])
+
+        result = estimate_group_time_att(df, dependent='y', reps=199, seed=0, n_jobs=1)
+        print(result['event_time'].round(4).to_string(index=False))
+        print(f"总体ATT: {result['overall']['att']:.4f} (标准误 {result['overall']['std_error']:.4f})")
+
+        wide = df.pivot_table(index='company', columns='year', values='y')
+        cohort = df.groupby('company').apply(lambda d: d['investment_year'].iloc[0] * d['treatment'].iloc[0])
+        for _, cell in result['group_time'].sample(5, random_state=0).iterrows():
+            g, t = int(cell['cohort']), int(cell['year'])
+            base = g - 1 if t >= g else t - 1
+            delta = (wide[t] - wide[base]).dropna()
+            expected = delta[cohort[delta.index] == g].mean() - delta[cohort[delta.index] == 0].mean()
+            if not np.isclose(cell['att'], expected):
+                print(f"❌ ATT({g},{t})不一致: {cell['att']} vs {expected}")
+                return False
+
+        if not np.all(np.isfinite(result['event_time']['std_error'])):
+            print("❌ 事件时间ATT的标准误不是有限值")
+            return False
+
+        print("✅ 组别-时期ATT与手工计算的2×2 DID一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ 交错处理DID测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_ppml():
+    """测试PPML与虚拟变量泊松GLM一致，并剔除结果全为0的公司"""
+    print("\n" + "=" * 60)
+    print("测试高维固定效应PPML")
+    print("=" * 60)
+
+    try:
+        import statsmodels.api as sm
+        from ppml import fit_ppml
+
+        df = make_panel()
+        rng = np.random.default_rng(1)
+        company_effect = rng.normal(size=200) - 0.5
+        company_effect[:10] = -30   # 从未申请专利的公司
+        mu = np.exp(company_effect[df['company']] + 0.3 * df['x2'] + 0.4 * df['treatment'] * (df['year'] >= 2014))
+        df['count'] = rng.poisson(mu).astype(float)
+        df['treatment_post'] = df['treatment'] * (df['year'] >= 2014)
+
+        result = fit_ppml(df, 'count', ['treatment_post', 'x2'], absorb=['company', 'year'], cluster='company')
+        print(result)
+
+        sample = df[result.sample_mask]
+        if (sample.groupby('company')['count'].sum() == 0).any() or result.separated == 0:
+            print("❌ 结果全为0的公司没有被剔除")
+            return False
+
+        dummies = pd.get_dummies(sample[['company', 'year']].astype(str), drop_first=True).astype(float)
+        X = sm.add_constant(pd.concat([sample[['treatment_post', 'x2']], dummies], axis=1))
+        glm = sm.GLM(sample['count'], X, family=sm.families.Poisson()).fit(tol=1e-12)
+        expected = glm.params[['treatment_post', 'x2']].to_numpy()
+        print(f"GLM虚拟变量: {expected}")
+        if not np.allclose(result.params.to_numpy(), expected, atol=1e-6):
+            print("❌ PPML系数与泊松GLM不一致")
+            return False
+
+        # 聚类标准误下p值按t(G-1)分布计算，摘要中标为T-stat
+        from scipy import stats
+        expected_p = 2 * stats.t.sf(np.abs(result.tstats), result.n_clusters - 1)
+        if not np.allclose(result.pvalues, expected_p) or 'T-stat' not in str(result):
+            print("❌ PPML的p值分布或摘要列名不正确")
+            return False
+
+        warm = fit_ppml(df, 'count', ['treatment_post'], absorb=['company', 'year'], cluster='company', start=result)
+        cold = fit_ppml(df, 'count', ['treatment_post'], absorb=['company', 'year'], cluster='company')
+        if not np.allclose(warm.params.to_numpy(), cold.params.to_numpy(), atol=1e-6):
+            print("❌ warm start改变了估计结果")
+            return False
+        print(f"IRLS迭代次数: warm start {warm.irls_iterations}, 冷启动 {cold.irls_iterations}")
+
+        print("✅ PPML与虚拟变量泊松GLM一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ PPML测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_streaming_regression():
+    """测试分块流式回归与整体估计一致"""
+    print("\n" + "=" * 60)
+    print("测试分块流式回归")
+    print("=" * 60)
+
+    try:
+        import statsmodels.api as sm
+        from hdfe import fit_hdfe
+        from streaming_ols import fit_streaming, frame_chunks
+
+        df = make_panel()
+        # 打乱行顺序，同一公司的观测分散在不同块中
+        df = df.sample(frac=1, random_state=1).reset_index(drop=True)
+
+        expected = fit_hdfe(df, 'y', ['x1', 'x2', 'treatment'], absorb=['company', 'year'], cluster='company')
+        result = fit_streaming(frame_chunks(df, 97), 'y', ['x1', 'x2', 'treatment'], absorb=['company', 'year'],
+                               cluster='company')
+        print(result)
+        if result.dropped != expected.dropped or result.nobs != expected.nobs:
+            print(f"❌ 样本或剔除变量不一致: {result.nobs} vs {expected.nobs}, {result.dropped} vs {expected.dropped}")
+            return False
+        if not (np.allclose(result.params, expected.params, atol=1e-8)
+                and np.allclose(result.std_errors, expected.std_errors, rtol=1e-6)):
+            print("❌ 双向固定效应的系数或聚类标准误与fit_hdfe不一致")
+            return False
+
+        ols = sm.OLS(df['y'], sm.add_constant(df[['x1', 'x2']])).fit()
+        streamed = fit_streaming(frame_chunks(df, 250), 'y', ['x1', 'x2'], add_constant=True, verbose=False)
+        for name in ['params', 'bse', 'rsquared', 'fvalue', 'aic']:
+            if not np.allclose(getattr(streamed, name), getattr(ols, name)):
+                print(f"❌ 常数项OLS的{name}与statsmodels不一致")
+                return False
+
+        # 流式引擎不支持的参数直接报错，而不是被忽略
+        from did import perform_did_regression_with_year_dummies
+        for option in ({'window': 1}, {'match': True}, {'weights': 'match_weight'}, {'data': df},
+                       {'bootstrap_reps': 9}):
+            try:
+                perform_did_regression_with_year_dummies('missing.xlsx', engine='streaming', **option)
+                print(f"❌ engine='streaming'没有拒绝参数: {list(option)}")
+                return False
+            except ValueError:
+                pass
+
+        print("✅ 分块流式回归与整体估计一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ 分块流式回归测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def main():
+    """主测试函数"""
+    print("高维固定效应回归测试")
+    print("=" * 60)
+
+    tests = [
+        ("双向固定效应", test_two_way_fixed_effects),
+        ("交互固定效应", test_interacted_fixed_effects),
+        ("稀疏虚拟变量回归", test_sparse_dummy_regression),
+        ("批量多设定回归", test_spec_grid),
+        ("野聚类自助法", test_wild_cluster_bootstrap),
+        ("加权野聚类自助法", test_weighted_bootstrap),
+        ("加权组内R²", test_weighted_rsquared),
+        ("安慰剂置换检验", test_placebo_permutations),
+        ("事件研究", test_event_study),
+        ("交错处理DID", test_staggered_did),
+        ("高维固定效应PPML", test_ppml),
+        ("分块流式回归", test_streaming_regression),
+    ]
+
+    success_count = 0
+    for test_name, test_func in tests:
+        if test_func():
+            success_count += 1
+            print(f"✅ {test_name} 测试通过")
+        else:
+            print(f"❌ {test_name} 测试失败")
+
+    print("\n" + "=" * 60)
+    print(f"成功测试: {success_count}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试匹配对照组 matching.py
+用逐个处理组的暴力搜索验证精确分块 + 最近邻匹配
+"""
+
+import sys
+import os
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+
+
+def make_firms(n=3000, seed=0):
+    """生成每家公司一行的模拟回归数据"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        '公司名称': [f'公司{i}' for i in range(n)],
+        '省份': rng.choice(['北京市', '广东省', '江苏省', '浙江省'], n),
+        '行业(清科)': rng.choice(['IT', '生物技术/医疗健康', '半导体及电子设备'], n),
+        '投资年份': rng.integers(2015, 2020, n),
+        '前3年专利总数': rng.poisson(4, n),
+        '后3年专利总数': rng.poisson(5, n),
+        'treatment': (rng.random(n) < 0.2).astype(int),
+    })
+
+
+def brute_force_distances(df, treated_index, distance, k):
+    """暴力搜索同一精确块内最近的k个对照组距离"""
+    X = np.log1p(df[list(distance)].to_numpy(dtype=float))
+    X = X / X.std(axis=0)
+    row = df.index.get_loc(treated_index)
+    same = ((df['省份'] == df.iloc[row]['省份']) & (df['行业(清科)'] == df.iloc[row]['行业(清科)'])
+            & (df['投资年份'] == df.iloc[row]['投资年份']) & (df['treatment'] == 0)).to_numpy()
+    d = np.sqrt(((X[same] - X[row]) ** 2).sum(axis=1))
+    return np.sort(d)[:k]
+
+
+def test_nearest_neighbour_matching():
+    """测试单变量（排序查找）和多变量（KD树）最近邻匹配"""
+    print("=" * 60)
+    print("测试精确分块 + 最近邻匹配")
+    print("=" * 60)
+
+    try:
+        from matching import match_controls
+
+        df = make_firms()
+        for distance in [('前3年专利总数',), ('前3年专利总数', '后3年专利总数')]:
+            matches = match_controls(df, distance=distance, n_neighbors=2)
+            print(f"{' + '.join(distance)}: {matches['treated_index'].nunique()} 家处理组匹配成功")
+
+            for treated_index, group in matches.groupby('treated_index'):
+                expected = brute_force_distances(df, treated_index, distance, 2)
+                if not np.allclose(np.sort(group['distance'].to_numpy()), expected):
+                    print(f"❌ 处理组{treated_index}的匹配距离与暴力搜索不一致")
+                    return False
+                controls = df.loc[group['control_index']]
+                if (controls['treatment'] != 0).any() or controls['省份'].nunique() != 1:
+                    print(f"❌ 处理组{treated_index}匹配到了不同块或处理组公司")
+                    return False
+
+        print("✅ 匹配结果与暴力搜索一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ 最近邻匹配测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_matched_sample_weights():
+    """测试卡尺和匹配样本权重"""
+    print("\n" + "=" * 60)
+    print("测试卡尺和匹配样本权重")
+    print("=" * 60)
+
+    try:
+        from matching import matched_sample
+
+        df = make_firms()
+        matched_df, matches = matched_sample(df, n_neighbors=3, caliper=0.05)
+
+        if (matches['distance'] > 0.05).any():
+            print("❌ 存在超出卡尺的配对")
+            return False
+
+        treated = matched_df[matched_df['treatment'] == 1]
+        controls = matched_df[matched_df['treatment'] == 0]
+        if not np.isclose(controls['match_weight'].sum(), len(treated)):
+            print(f"❌ 对照组权重之和应等于处理组数: {controls['match_weight'].sum()} vs {len(treated)}")
+            return False
+
+        print("✅ 卡尺与匹配权重正确")
+        return True
+
+    except Exception as e:
+        print(f"❌ 匹配样本权重测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_missing_distance_values():
+    """测试连续匹配变量缺失的公司不参与匹配，其余公司仍按最近邻匹配"""
+    print("\n" + "=" * 60)
+    print("测试匹配变量缺失")
+    print("=" * 60)
+
+    try:
+        from matching import match_controls
+
+        df = make_firms().astype({'前3年专利总数': float, '后3年专利总数': float})
+        treated_rows = np.flatnonzero(df['treatment'] == 1)
+        control_rows = np.flatnonzero(df['treatment'] == 0)
+        missing = df.index[[treated_rows[0], control_rows[0], control_rows[1]]]
+        df.loc[missing, ['前3年专利总数', '后3年专利总数']] = np.nan
+        complete = df.drop(index=missing)
+
+        for distance in [('前3年专利总数',), ('前3年专利总数', '后3年专利总数')]:
+            matches = match_controls(df, distance=distance)
+            expected = match_controls(complete, distance=distance)
+            print(f"{' + '.join(distance)}: 平均匹配距离 {matches['distance'].mean():.4f}，"
+                  f"缺失 {matches.attrs['missing_distance']}")
+            if matches.attrs['missing_distance'] != {'treated': 1, 'control': 2}:
+                print(f"❌ 缺失计数不正确: {matches.attrs['missing_distance']}")
+                return False
+            if set(missing) & (set(matches['treated_index']) | set(matches['control_index'])):
+                print("❌ 匹配变量缺失的公司参与了匹配")
+                return False
+            pd.testing.assert_frame_equal(matches, expected)
+
+        print("✅ 匹配变量缺失的公司被排除，其余匹配不受影响")
+        return True
+
+    except Exception as e:
+        print(f"❌ 匹配变量缺失测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def main():
+    """主测试函数"""
+    print("匹配对照组测试")
+    print("=" * 60)
+
+    tests = [
+        ("最近邻匹配", test_nearest_neighbour_matching),
+        ("匹配样本权重", test_matched_sample_weights),
+        ("匹配变量缺失", test_missing_distance_values),
+    ]
+
+    success_count = 0
+    for test_name, test_func in tests:
+        if test_func():
+            success_count += 1
+            print(f"✅ {test_name} 测试通过")
+        else:
+            print(f"❌ {test_name} 测试失败")
+
+    print("\n" + "=" * 60)
+    print(f"成功测试: {success_count}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,24 @@
 
 import sys
 import os
+import time
+import functools
+import tempfile
 
 # 添加当前目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+
+def _fake_step(base_dir, step_name, output_files, delay, fail=False):
+    """模拟流水线步骤：等待一段时间后写出输出文件（模块级函数，可传入工作进程）"""
+    time.sleep(delay)
+    if fail:
+        return False, f"{step_name}模拟失败"
+    for output_file in output_files:
+        with open(os.path.join(base_dir, output_file), 'w') as f:
+            f.write(f"{step_name} {time.time()}")
+    return True, f"{step_name}完成"
+
 def test_pipeline_structure():
     """测试流水线结构"""
     print("=" * 60)
@@ -162,6 +176,436 @@ def test_pipeline_independence():
         traceback.print_exc()
         return False
 
+def test_dag_scheduler():
+    """测试依赖图调度：两条分支同时执行、分支内按依赖顺序、失败后不再启动下游步骤"""
+    print("\n" + "=" * 60)
+    print("测试依赖图调度")
+    print("=" * 60)
+    
+    try:
+        from dag_scheduler import build_dependency_graph, topological_order, run_dag
+        from executors import StepExecutor
+        from pipeline import PatentAnalysisPipeline
+        
+        # 真实流水线的依赖图：两条分支各自是一条链，互不依赖
+        pipeline = PatentAnalysisPipeline()
+        graph = build_dependency_graph(pipeline.pipeline_steps)
+        kinds = {step['name']: step['pipeline'] for step in pipeline.pipeline_steps}
+        for name, upstream in graph.items():
+            assert all(kinds[u] == kinds[name] for u in upstream), f"{name}依赖了另一条流水线的步骤"
+        assert sum(1 for upstream in graph.values() if not upstream) == 2
+        print(f"✅ 流水线依赖图: {sum(len(u) for u in graph.values())}条依赖边，2个起始步骤")
+        
+        try:
+            topological_order({'a': ['b'], 'b': ['a']})
+            print("❌ 循环依赖未被检测")
+            return False
+        except ValueError:
+            print("✅ 循环依赖检测正常")
+        
+        # 两条各3步的分支，每步0.5秒：串行约3秒，并行约1.5秒
+        delay = 0.5
+        steps = []
+        for branch in ['patent', 'citation']:
+            previous = f"{branch}_input.txt"
+            for i in range(3):
+                output = f"{branch}_{i}.txt"
+                steps.append({'name': f"{branch}{i}", 'input_files': [previous], 'output_files': [output],
+                              'description': f"{branch}步骤{i}", 'fail': False})
+                previous = output
+        
+        def task_for(base_dir):
+            return lambda step: functools.partial(_fake_step, base_dir, step['name'], step['output_files'],
+                                                  delay, step['fail'])
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            log = []
+            start = time.time()
+            executor = StepExecutor('process', max_workers=2)
+            try:
+                status = run_dag(steps, task_for(tmp_dir), executor=executor,
+                                 log=lambda name, state, message, duration: log.append((name, state)))
+            finally:
+                executor.shutdown()
+            elapsed = time.time() - start
+            print(f"并行执行耗时: {elapsed:.2f}秒 (串行约{delay * len(steps):.1f}秒)")
+            assert all(value == '成功' for value in status.values()), status
+            assert elapsed < delay * len(steps) * 0.8, "两条分支没有同时执行"
+            
+            # 分支内按依赖顺序：输出文件的写入时间递增
+            for branch in ['patent', 'citation']:
+                stamps = [float(open(os.path.join(tmp_dir, f"{branch}_{i}.txt")).read().split()[1]) for i in range(3)]
+                assert stamps == sorted(stamps), f"{branch}分支顺序错误"
+            finished = [name for name, state in log if state == '成功']
+            assert finished.index('patent0') < finished.index('patent1') < finished.index('patent2')
+            print("✅ 两条分支同时执行，分支内按依赖顺序执行")
+        
+        # 专利分支第2步失败：其下游不再启动
+        steps[1]['fail'] = True
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            status = run_dag(steps, task_for(tmp_dir), executor=StepExecutor('serial'))
+            print(f"失败后的状态: {status}")
+            assert status['patent1'] == '失败'
+            assert status['patent2'] == '未执行'
+            assert not os.path.exists(os.path.join(tmp_dir, 'patent_2.txt'))
+            print("✅ 步骤失败后下游步骤未执行")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ 依赖图调度测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_incremental_execution():
+    """测试增量执行：未变化的步骤跳过，源码变化只重跑对应步骤，上游结果不变时下游不重跑"""
+    print("\n" + "=" * 60)
+    print("测试增量执行")
+    print("=" * 60)
+    
+    try:
+        import pandas as pd
+        from pipeline import PatentAnalysisPipeline
+        from step_manifest import StepManifest
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.makedirs(os.path.join(tmp_dir, 'patent_analysis'))
+            for module in ['scan_step', 'regress_step']:
+                with open(os.path.join(tmp_dir, module + '.py'), 'w') as f:
+                    f.write("VERSION = 1\n")
+            with open(os.path.join(tmp_dir, 'raw.csv'), 'w') as f:
+                f.write("value\n1\n2\n")
+            
+            executed = []
+            
+            def scan():
+                # 输出只取决于原始数据的行数
+                raw = pd.read_csv(os.path.join(tmp_dir, 'raw.csv'))
+                pd.DataFrame({'rows': [len(raw)]}).to_excel(os.path.join(tmp_dir, 'scan.xlsx'), index=False)
+                executed.append('scan')
+                return True, "扫描完成"
+            
+            def regress():
+                rows = pd.read_excel(os.path.join(tmp_dir, 'scan.xlsx'))['rows'].iloc[0]
+                pd.DataFrame({'coef': [rows * 2]}).to_excel(os.path.join(tmp_dir, 'result.xlsx'), index=False)
+                executed.append('regress')
+                return True, "回归完成"
+            
+            pipeline = PatentAnalysisPipeline(tmp_dir)
+            pipeline.manifest = StepManifest(pipeline.manifest.manifest_file, tmp_dir, source_dirs=[tmp_dir])
+            pipeline.pipeline_steps = [
+                {'name': 'scan', 'function': scan, 'sources': ['scan_step'], 'input_files': ['raw.csv'],
+                 'output_files': ['scan.xlsx'], 'description': '扫描', 'pipeline': 'patent'},
+                {'name': 'regress', 'function': regress, 'sources': ['regress_step'], 'input_files': ['scan.xlsx'],
+                 'output_files': ['result.xlsx'], 'description': '回归', 'pipeline': 'patent'},
+            ]
+            
+            def run():
+                executed.clear()
+                assert pipeline.run_pipeline()
+                return list(executed)
+            
+            assert run() == ['scan', 'regress']
+            assert run() == [], "未变化的步骤没有跳过"
+            print("✅ 输入、参数和源码都未变化时全部跳过")
+            
+            with open(os.path.join(tmp_dir, 'regress_step.py'), 'w') as f:
+                f.write("VERSION = 2\n")
+            assert run() == ['regress'], "源码变化应只重跑对应步骤"
+            print("✅ 修改回归模块只重跑回归步骤")
+            
+            # 原始数据变化但扫描结果不变（行数相同）：扫描重跑，回归不重跑
+            time.sleep(1.1)
+            with open(os.path.join(tmp_dir, 'raw.csv'), 'w') as f:
+                f.write("value\n3\n4\n")
+            assert run() == ['scan'], "上游结果未变化时下游不应重跑"
+            print("✅ 上游重跑但输出内容不变，下游步骤跳过")
+            
+            with open(os.path.join(tmp_dir, 'raw.csv'), 'w') as f:
+                f.write("value\n3\n4\n5\n")
+            assert run() == ['scan', 'regress']
+            print("✅ 上游输出变化时下游步骤重跑")
+            
+            pipeline.pipeline_steps[1]['params'] = {'cluster': 'company'}
+            assert run() == ['regress']
+            executed.clear()
+            assert pipeline.run_pipeline(force=True) and executed == ['scan', 'regress']
+            print("✅ 参数变化重跑，force=True时全部重跑")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ 增量执行测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_artifact_handoff():
+    """测试内存数据传递：下游直接拿到上游DataFrame，xlsx延后写出，写完后记录增量执行清单"""
+    print("\n" + "=" * 60)
+    print("测试内存数据传递")
+    print("=" * 60)
+    
+    try:
+        import pandas as pd
+        from pipeline import PatentAnalysisPipeline
+        from step_manifest import StepManifest
+        
+        for write_mode in ['async', 'end']:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                os.makedirs(os.path.join(tmp_dir, 'patent_analysis'))
+                with open(os.path.join(tmp_dir, 'raw.csv'), 'w') as f:
+                    f.write("value\n1\n2\n3\n")
+                
+                def make_pipeline():
+                    pipeline = PatentAnalysisPipeline(tmp_dir, artifacts=write_mode)
+                    pipeline.manifest = StepManifest(pipeline.manifest.manifest_file, tmp_dir, source_dirs=[tmp_dir])
+                    
+                    def prepare():
+                        df = pd.read_csv(os.path.join(tmp_dir, 'raw.csv'))
+                        df['double'] = df['value'] * 2
+                        path = os.path.join(tmp_dir, 'prepared.xlsx')
+                        
+                        def write():
+                            time.sleep(0.5)
+                            df.to_excel(path, sheet_name='回归数据', index=False)
+                        
+                        pipeline._keep_artifact({'timeline_df': df, 'excel_file': 'prepared.xlsx', 'write': write})
+                        return True, "准备完成"
+                    
+                    def regress():
+                        df = pipeline._upstream('prepared.xlsx')
+                        assert df is not None, "下游没有拿到内存中的上游数据"
+                        assert not os.path.exists(os.path.join(tmp_dir, 'prepared.xlsx')), "上游文件不应已写完"
+                        df['triple'] = df['value'] * 3
+                        df.to_excel(os.path.join(tmp_dir, 'result.xlsx'), index=False)
+                        return True, f"回归完成 ({df['double'].sum()})"
+                    
+                    pipeline.pipeline_steps = [
+                        {'name': 'prepare', 'function': prepare, 'input_files': ['raw.csv'],
+                         'output_files': ['prepared.xlsx'], 'description': '准备', 'pipeline': 'patent'},
+                        {'name': 'regress', 'function': regress, 'input_files': ['prepared.xlsx'],
+                         'output_files': ['result.xlsx'], 'description': '回归', 'pipeline': 'patent'},
+                    ]
+                    return pipeline
+                
+                pipeline = make_pipeline()
+                assert pipeline.run_pipeline()
+                written = pd.read_excel(os.path.join(tmp_dir, 'prepared.xlsx'), sheet_name='回归数据')
+                assert list(written.columns) == ['value', 'double'], "下游的修改不应影响上游写出的文件"
+                assert set(pipeline.manifest.steps) == {'prepare', 'regress'}
+                
+                # 文件写出后记录的清单可用于下一次增量执行
+                rerun = make_pipeline()
+                assert rerun.run_pipeline()
+                assert [entry['status'] for entry in rerun.pipeline_log] == ['跳过', '跳过']
+                print(f"✅ write_mode='{write_mode}': 下游使用内存数据，xlsx延后写出，清单记录正常")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ 内存数据传递测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_executor_backends():
+    """测试执行后端：串行后端结果确定、按资源类型分配后端、依赖图模式可在当前进程中执行自定义步骤"""
+    print("\n" + "=" * 60)
+    print("测试执行后端")
+    print("=" * 60)
+    
+    try:
+        from executors import SerialExecutor, StepExecutor, create_executor
+        from pipeline import PatentAnalysisPipeline
+        
+        # 串行执行器：提交时立即执行，异常保存在Future中
+        executor = SerialExecutor()
+        order = []
+        futures = [executor.submit(order.append, i) for i in range(3)]
+        assert order == [0, 1, 2] and all(f.done() for f in futures)
+        assert isinstance(executor.submit(lambda: 1 / 0).exception(), ZeroDivisionError)
+        
+        # auto后端按资源类型分配
+        router = StepExecutor('auto')
+        assert router.backend_for({'name': 'scan', 'resources': 'io'}) == 'thread'
+        assert router.backend_for({'name': 'did', 'resources': 'cpu'}) == 'process'
+        assert router.backend_for({'name': 'legacy'}) == 'process'
+        assert StepExecutor('serial').in_process({'name': 'did', 'resources': 'cpu'})
+        assert router.shares_process({'name': 'scan', 'resources': 'io'})
+        assert not router.shares_process({'name': 'did', 'resources': 'cpu'})
+        assert not StepExecutor('serial').shares_process({'name': 'scan', 'resources': 'io'})
+        for bad in (lambda: StepExecutor('gpu'), lambda: router.backend_for({'name': 'x', 'resources': 'gpu'})):
+            try:
+                bad()
+                print("❌ 未拒绝未知的后端或资源类型")
+                return False
+            except ValueError:
+                pass
+        try:
+            create_executor('dask').shutdown()
+            print("✅ dask后端可用")
+        except ImportError as e:
+            print(f"⚠️ 未安装dask，跳过dask后端: {e}")
+        
+        # 真实流水线的每个步骤都声明了资源类型
+        pipeline = PatentAnalysisPipeline()
+        assert all(step['resources'] in ('io', 'cpu') for step in pipeline.pipeline_steps)
+        print("✅ 后端分配正确")
+        
+        # 依赖图模式：串行和线程后端在当前进程中执行（自定义步骤函数也可用），输出一致
+        outputs = {}
+        for backend in ('serial', 'thread'):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                os.makedirs(os.path.join(tmp_dir, 'patent_analysis'))
+                
+                def make_step(name, inputs, output, resources, value):
+                    def run():
+                        total = sum(int(open(os.path.join(tmp_dir, f)).read()) for f in inputs)
+                        with open(os.path.join(tmp_dir, output), 'w') as f:
+                            f.write(str(total + value))
+                        return True, f"{name}完成"
+                    return {'name': name, 'function': run, 'input_files': inputs, 'output_files': [output],
+                            'description': name, 'resources': resources, 'pipeline': 'patent'}
+                
+                pipeline = PatentAnalysisPipeline(tmp_dir, incremental=False, executor=backend)
+                pipeline.pipeline_steps = [
+                    make_step('scan_a', [], 'a.txt', 'io', 1),
+                    make_step('scan_b', [], 'b.txt', 'io', 2),
+                    make_step('merge', ['a.txt', 'b.txt'], 'ab.txt', 'cpu', 10),
+                ]
+                assert pipeline.run_dag_pipeline(max_workers=2)
+                outputs[backend] = open(os.path.join(tmp_dir, 'ab.txt')).read()
+                started = [entry['step'] for entry in pipeline.pipeline_log if entry['status'] == '成功']
+                if backend == 'serial':
+                    assert started == ['scan_a', 'scan_b', 'merge'], started
+                # 线程池中并发执行的步骤不记录进程级指标
+                for entry in pipeline.pipeline_log:
+                    if entry['status'] == '成功':
+                        assert entry['shared_process'] == (backend == 'thread'), entry
+                        assert (entry['cpu_seconds'] is None) == (backend == 'thread'), entry
+        assert outputs == {'serial': '13', 'thread': '13'}, outputs
+        print("✅ 串行和线程后端执行依赖图结果一致")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ 执行后端测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_pipeline_cli():
+    """测试命令行入口：按名称/类型/目标选择步骤、dry run计划、失败后续跑"""
+    print("\n" + "=" * 60)
+    print("测试命令行入口")
+    print("=" * 60)
+    
+    try:
+        import pandas as pd
+        from pipeline import PatentAnalysisPipeline, main as pipeline_main
+        from step_manifest import StepManifest
+        
+        pipeline = PatentAnalysisPipeline()
+        names = [step['name'] for step in pipeline.select_steps(targets=['专利数量DID回归分析'])]
+        assert names == [step['name'] for step in pipeline.pipeline_steps if step['pipeline'] == 'patent'], names
+        assert [step['name'] for step in pipeline.select_steps(names=['1', '被引证次数分析'])] == ['专利数量分析', '被引证次数分析']
+        assert len(pipeline.select_steps(tags=['citation'])) == 5
+        print("✅ 按名称、编号、类型和目标选择步骤正确")
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.makedirs(os.path.join(tmp_dir, 'patent_analysis'))
+            assert pipeline_main(['--base-dir', tmp_dir, '--list']) == 0
+            assert pipeline_main(['--base-dir', tmp_dir, '--steps', '不存在的步骤']) == 2
+            assert pipeline_main(['--base-dir', tmp_dir, '--resume']) == 0
+            assert pipeline_main(['--base-dir', tmp_dir, '--tag', 'patent', '--dry-run']) == 0
+            
+            # 缺少原始数据时第一步失败，失败记录写入清单，--resume从第一个失败步骤起全部续跑
+            assert pipeline_main(['--base-dir', tmp_dir, '--tag', 'patent']) == 1
+            resumed = PatentAnalysisPipeline(tmp_dir).resume_steps()
+            assert [step['name'] for step in resumed] == [step['name'] for step in pipeline.pipeline_steps], \
+                [step['name'] for step in resumed]
+            assert [step['name'] for step in PatentAnalysisPipeline(tmp_dir).resume_steps(
+                pipeline.select_steps(tags=['patent']))] == names
+            assert pipeline_main(['--base-dir', tmp_dir, '--resume', '--dry-run']) == 0
+        
+        # 顺序执行在中间步骤失败时停止：--resume包括因停止而没有运行的其他分支步骤
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            calls = []
+            outcomes = {'p1': True, 'p2': False, 'c1': True, 'c2': True}
+            
+            def make_step(name, inputs, outputs):
+                def run():
+                    calls.append(name)
+                    if outcomes[name]:
+                        for output in outputs:
+                            pd.DataFrame({'v': [1]}).to_excel(os.path.join(tmp_dir, output), index=False)
+                    return outcomes[name], "完成" if outcomes[name] else "失败"
+                return {'name': name, 'function': run, 'input_files': inputs, 'output_files': outputs,
+                        'description': name, 'pipeline': 'patent' if name.startswith('p') else 'citation'}
+            
+            pipeline = PatentAnalysisPipeline(tmp_dir)
+            pipeline.pipeline_steps = [make_step('p1', [], ['p1.xlsx']), make_step('p2', ['p1.xlsx'], ['p2.xlsx']),
+                                       make_step('c1', [], ['c1.xlsx']), make_step('c2', ['c1.xlsx'], ['c2.xlsx'])]
+            assert not pipeline.run_pipeline()
+            assert calls == ['p1', 'p2'], calls
+            resumed = pipeline.resume_steps()
+            assert [step['name'] for step in resumed] == ['p2', 'c1', 'c2'], [step['name'] for step in resumed]
+            outcomes['p2'] = True
+            calls.clear()
+            assert pipeline.run_pipeline(steps=resumed)
+            assert calls == ['p2', 'c1', 'c2'], calls
+            assert pipeline.resume_steps() == []
+            print("✅ 失败记录和--resume续跑范围正确")
+        
+        # dry run的缓存状态
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.makedirs(os.path.join(tmp_dir, 'patent_analysis'))
+            for module in ['scan_step', 'regress_step']:
+                with open(os.path.join(tmp_dir, module + '.py'), 'w') as f:
+                    f.write("VERSION = 1\n")
+            with open(os.path.join(tmp_dir, 'raw.csv'), 'w') as f:
+                f.write("value\n1\n")
+            
+            def scan():
+                pd.read_csv(os.path.join(tmp_dir, 'raw.csv')).to_excel(os.path.join(tmp_dir, 'scan.xlsx'), index=False)
+                return True, "扫描完成"
+            
+            def regress():
+                pd.read_excel(os.path.join(tmp_dir, 'scan.xlsx')).to_excel(os.path.join(tmp_dir, 'result.xlsx'), index=False)
+                return True, "回归完成"
+            
+            pipeline = PatentAnalysisPipeline(tmp_dir)
+            pipeline.manifest = StepManifest(pipeline.manifest.manifest_file, tmp_dir, source_dirs=[tmp_dir])
+            pipeline.pipeline_steps = [
+                {'name': 'scan', 'function': scan, 'sources': ['scan_step'], 'input_files': ['raw.csv'],
+                 'output_files': ['scan.xlsx'], 'description': '扫描', 'pipeline': 'patent'},
+                {'name': 'regress', 'function': regress, 'sources': ['regress_step'], 'input_files': ['scan.xlsx'],
+                 'output_files': ['result.xlsx'], 'description': '回归', 'pipeline': 'patent'},
+            ]
+            assert pipeline.show_plan() == {'scan': '运行', 'regress': '运行'}
+            assert pipeline.run_pipeline()
+            assert pipeline.show_plan() == {'scan': '缓存', 'regress': '缓存'}
+            with open(os.path.join(tmp_dir, 'regress_step.py'), 'w') as f:
+                f.write("VERSION = 2\n")
+            assert pipeline.show_plan() == {'scan': '缓存', 'regress': '运行'}
+            with open(os.path.join(tmp_dir, 'raw.csv'), 'w') as f:
+                f.write("value\n2\n3\n")
+            assert pipeline.show_plan(pipeline.select_steps(names=['scan'])) == {'scan': '运行'}
+            with open(os.path.join(tmp_dir, 'regress_step.py'), 'w') as f:
+                f.write("VERSION = 1\n")
+            assert pipeline.show_plan() == {'scan': '运行', 'regress': '可能运行'}
+            print("✅ dry run的缓存状态正确")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ 命令行入口测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
 def main():
     """主测试函数"""
     print("并行流水线功能测试")
@@ -172,6 +616,11 @@ def main():
         ("流水线方法", test_pipeline_methods),
         ("流水线状态显示", test_pipeline_status),
         ("流水线独立性", test_pipeline_independence),
+        ("依赖图调度", test_dag_scheduler),
+        ("增量执行", test_incremental_execution),
+        ("内存数据传递", test_artifact_handoff),
+        ("命令行入口", test_pipeline_cli),
+        ("执行后端", test_executor_backends),
     ]
     
     success_count = 0
@@ -197,9 +646,13 @@ def main():
         print("\n主要改进:")
         print("1. 专利数量和被引证次数现在是两条独立的流水线")
         print("2. 每条流水线可以独立运行")
-        print("3. 两条流水线可以并行执行（概念上）")
+        print("3. 两条流水线按依赖图在不同进程中同时执行")
         print("4. 流水线状态按类型分组显示")
         print("5. 新增了专门的流水线运行方法")
+        print("6. 输入、参数和源码都未变化的步骤增量跳过")
+        print("7. 顺序执行时步骤间可直接传递DataFrame，xlsx延后写出")
+        print("8. 命令行入口支持按名称/类型/目标选择步骤、dry run和失败后续跑")
+        print("9. 依赖图模式可选串行、线程、进程或dask后端，io/cpu步骤分别进线程池/进程池")
     else:
         print("⚠️ 部分测试失败，请检查错误信息")
 
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试回归结果缓存 result_cache.py
+"""
+
+import sys
+import os
+import tempfile
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+
+
+def make_data(n=500, seed=0):
+    """生成模拟回归数据"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'const': 1.0, 'x1': rng.normal(size=n), 'x2': rng.normal(size=n)})
+    df['y'] = 1 + 0.5 * df['x1'] - 0.2 * df['x2'] + rng.normal(size=n)
+    return df
+
+
+def test_cache_hit_and_invalidation():
+    """测试命中缓存时结果一致、数据、设定或拟合代码变化时重新拟合"""
+    print("=" * 60)
+    print("测试回归结果缓存")
+    print("=" * 60)
+
+    try:
+        import statsmodels.api as sm
+        from result_cache import cached_fit, CachedResult
+
+        df = make_data()
+        spec = {'dependent': 'y', 'regressors': ['const', 'x1', 'x2'], 'cov_type': 'nonrobust'}
+        calls = []
+
+        def fit(data):
+            def run():
+                calls.append(1)
+                return sm.OLS(data['y'], data[['const', 'x1', 'x2']]).fit()
+            return run
+
+        with tempfile.TemporaryDirectory() as directory:
+            first = cached_fit(directory, df, spec, fit(df))
+            second = cached_fit(directory, df, spec, fit(df))
+            if len(calls) != 1 or not isinstance(second, CachedResult):
+                print(f"❌ 相同数据和设定应命中缓存，实际拟合次数: {len(calls)}")
+                return False
+            for name in ['params', 'bse', 'tvalues', 'pvalues']:
+                if not np.allclose(getattr(first, name), getattr(second, name)):
+                    print(f"❌ 缓存结果的{name}与原结果不一致")
+                    return False
+            if not np.allclose(first.cov_params(), second.cov_params()) or second.rsquared != first.rsquared:
+                print("❌ 缓存的协方差矩阵或R²与原结果不一致")
+                return False
+
+            changed = df.copy()
+            changed.loc[0, 'x1'] += 1e-6
+            cached_fit(directory, changed, spec, fit(changed))
+            cached_fit(directory, df, dict(spec, cov_type='HC1'), fit(df))
+            if len(calls) != 3:
+                print(f"❌ 数据或设定变化后应重新拟合，实际拟合次数: {len(calls)}")
+                return False
+
+            # 拟合代码（调用模块或其依赖的本地模块）变化后重新拟合
+            code_dir = os.path.join(directory, 'code')
+            os.makedirs(code_dir)
+            module_file = os.path.join(code_dir, 'estimator.py')
+            helper_file = os.path.join(code_dir, 'estimator_helper.py')
+            with open(module_file, 'w') as f:
+                f.write("import estimator_helper\n")
+            with open(helper_file, 'w') as f:
+                f.write("SCALE = 1\n")
+            cached_fit(directory, df, spec, fit(df), code_file=module_file)
+            cached_fit(directory, df, spec, fit(df), code_file=module_file)
+            with open(helper_file, 'w') as f:
+                f.write("SCALE = 2\n")
+            cached_fit(directory, df, spec, fit(df), code_file=module_file)
+            if len(calls) != 5:
+                print(f"❌ 依赖模块修改后应重新拟合，实际拟合次数: {len(calls)}")
+                return False
+
+        print("✅ 缓存命中与失效正确")
+        return True
+
+    except Exception as e:
+        print(f"❌ 回归结果缓存测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def main():
+    """主测试函数"""
+    print("回归结果缓存测试")
+    print("=" * 60)
+
+    tests = [
+        ("回归结果缓存", test_cache_hit_and_invalidation),
+    ]
+
+    success_count = 0
+    for test_name, test_func in tests:
+        if test_func():
+            success_count += 1
+            print(f"✅ {test_name} 测试通过")
+        else:
+            print(f"❌ {test_name} 测试失败")
+
+    print("\n" + "=" * 60)
+    print(f"成功测试: {success_count}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
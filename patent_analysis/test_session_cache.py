@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试进程内Excel读取缓存 session_cache.py
+"""
+
+import sys
+import os
+import time
+import tempfile
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+
+
+def _write_invest(path, companies):
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        pd.DataFrame({'融资主体': companies, '地区': ['广东省深圳市', '浙江省杭州市'][:len(companies)]}).to_excel(
+            writer, sheet_name='有专利公司首次投资', index=False)
+        pd.DataFrame({'融资主体': companies}).to_excel(writer, sheet_name='所有投资', index=False)
+
+
+def test_read_excel_cache():
+    """测试缓存命中、副本隔离、工作表编号与名称共用缓存、文件修改后重新解析"""
+    print("=" * 60)
+    print("测试Excel读取缓存")
+    print("=" * 60)
+
+    try:
+        import session_cache
+
+        session_cache.clear()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'invest.xlsx')
+            _write_invest(path, ['甲公司', '乙公司'])
+
+            first = session_cache.read_excel(path, sheet_name='有专利公司首次投资')
+            first['投资年份'] = 2020
+            first.loc[0, '融资主体'] = '已修改'
+            second = session_cache.read_excel(path)
+            assert list(second.columns) == ['融资主体', '地区'], second.columns
+            assert second.loc[0, '融资主体'] == '甲公司'
+            assert session_cache.cache_info() == {'hits': 1, 'misses': 1, 'entries': 1}
+
+            # 其他工作表、其他读取参数分别缓存
+            session_cache.read_excel(path, sheet_name='所有投资')
+            session_cache.read_excel(path, sheet_name='有专利公司首次投资', usecols=['融资主体'])
+            assert session_cache.cache_info()['misses'] == 3
+
+            # 文件修改后重新解析
+            time.sleep(0.01)
+            _write_invest(path, ['丙公司'])
+            third = session_cache.read_excel(path, sheet_name='有专利公司首次投资')
+            assert list(third['融资主体']) == ['丙公司']
+            assert session_cache.cache_info()['misses'] == 4
+
+            session_cache.clear()
+            assert session_cache.cache_info() == {'hits': 0, 'misses': 0, 'entries': 0}
+
+        print("✅ Excel读取缓存正确")
+        return True
+
+    except Exception as e:
+        print(f"❌ Excel读取缓存测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_steps_share_cache():
+    """测试两条分支的添加省份步骤只解析一次invest.xlsx"""
+    print("\n" + "=" * 60)
+    print("测试步骤共用读取缓存")
+    print("=" * 60)
+
+    cwd = os.getcwd()
+    try:
+        import session_cache
+        from add_gdp import extract_province_from_region
+
+        session_cache.clear()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            _write_invest('invest.xlsx', ['甲公司', '乙公司'])
+            timeline = pd.DataFrame({'公司名称': ['甲公司', '乙公司'], '投资年份': [2020, 2020],
+                                     '前3年专利总数': [1, 2], '后3年专利总数': [3, 4], '专利增长率': [2.0, 1.0],
+                                     'treatment': [1, 0]})
+
+            for input_file in ('regress_data_patents.xlsx', 'regress_data_citations.xlsx'):
+                result = extract_province_from_region(input_file, data=timeline.copy(), save=False)
+                assert list(result['timeline_df']['省份']) == ['广东省', '浙江省'], result['timeline_df']['省份']
+
+            info = session_cache.cache_info()
+            print(f"缓存统计: {info}")
+            assert info['misses'] == 1 and info['hits'] == 1, info
+            session_cache.clear()
+
+        print("✅ 步骤共用读取缓存正确")
+        return True
+
+    except Exception as e:
+        print(f"❌ 步骤共用读取缓存测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        os.chdir(cwd)
+
+
+def test_concurrent_reads():
+    """测试不同文件在线程中并行解析、同一工作表的并发读取只解析一次"""
+    print("\n" + "=" * 60)
+    print("测试并发读取")
+    print("=" * 60)
+
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    import session_cache
+
+    original = session_cache.read_table
+    try:
+        session_cache.clear()
+        # 两个不同文件的解析同时进行时屏障才会通过（在锁内串行解析会超时）
+        barrier = threading.Barrier(2, timeout=10)
+        calls = []
+
+        def slow_read(path, **kwargs):
+            calls.append(os.path.basename(path))
+            if os.path.basename(path) in ('a.xlsx', 'b.xlsx'):
+                barrier.wait()
+            time.sleep(0.2)
+            return original(path, **kwargs)
+
+        session_cache.read_table = slow_read
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = {name: os.path.join(tmp_dir, name) for name in ('a.xlsx', 'b.xlsx', 'c.xlsx')}
+            for path in paths.values():
+                _write_invest(path, ['甲公司', '乙公司'])
+
+            with ThreadPoolExecutor(max_workers=6) as executor:
+                frames = list(executor.map(session_cache.read_excel,
+                                           [paths['a.xlsx'], paths['b.xlsx']] + [paths['c.xlsx']] * 4))
+
+            assert all(list(df['融资主体']) == ['甲公司', '乙公司'] for df in frames)
+            assert sorted(calls) == ['a.xlsx', 'b.xlsx', 'c.xlsx'], calls
+            info = session_cache.cache_info()
+            print(f"缓存统计: {info}")
+            assert info == {'hits': 3, 'misses': 3, 'entries': 3}, info
+
+        print("✅ 不同文件并行解析，同一工作表只解析一次")
+        return True
+
+    except Exception as e:
+        print(f"❌ 并发读取测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        session_cache.read_table = original
+        session_cache.clear()
+
+
+def main():
+    """主测试函数"""
+    print("Excel读取缓存测试")
+    print("=" * 60)
+
+    tests = [
+        ("Excel读取缓存", test_read_excel_cache),
+        ("步骤共用读取缓存", test_steps_share_cache),
+        ("并发读取", test_concurrent_reads),
+    ]
+
+    success_count = 0
+    for test_name, test_func in tests:
+        if test_func():
+            success_count += 1
+            print(f"✅ {test_name} 测试通过")
+        else:
+            print(f"❌ {test_name} 测试失败")
+
+    print("\n" + "=" * 60)
+    print(f"成功测试: {success_count}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试流水线步骤性能剖析 step_profiler.py
+"""
+
+import sys
+import os
+import json
+import tempfile
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+
+
+def test_step_metrics():
+    """测试步骤指标采集：CPU时间、峰值内存、写入字节数、行数、cProfile结果"""
+    print("=" * 60)
+    print("测试步骤指标采集")
+    print("=" * 60)
+
+    try:
+        from step_profiler import StepProfiler, format_metrics
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file = os.path.join(tmp_dir, 'input.csv')
+            output_file = os.path.join(tmp_dir, 'output.xlsx')
+            pd.DataFrame({'x': range(100)}).to_csv(input_file, index=False)
+
+            def step():
+                block = np.ones(25_000_000)   # 约200MB
+                total = float(block.sum())
+                del block
+                with open(os.path.join(tmp_dir, 'blob.bin'), 'wb') as f:
+                    f.write(b'\0' * (20 * 1024 * 1024))
+                pd.DataFrame({'x': range(40)}).to_excel(output_file, index=False)
+                return True, total
+
+            profiler = StepProfiler(os.path.join(tmp_dir, 'profile.jsonl'), profile_dir=os.path.join(tmp_dir, 'prof'))
+            (success, total), metrics = profiler.run('测试 步骤', step, [input_file], [output_file])
+            print(format_metrics(metrics))
+
+            assert success and total == 25_000_000
+            assert metrics['rows_in'] == 100 and metrics['rows_out'] == 40, metrics
+            assert metrics['cpu_seconds'] > 0 and metrics['wall_seconds'] >= 0
+            if metrics.get('write_mb') is not None:
+                assert metrics['write_mb'] >= 19, metrics
+            if metrics.get('peak_rss_mb') is not None:
+                assert metrics['peak_rss_mb'] >= 150, metrics
+            assert os.path.exists(metrics['profile_file'])
+
+            profiler.append('测试 步骤', '成功', metrics)
+            with open(profiler.log_file, encoding='utf-8') as f:
+                record = json.loads(f.readline())
+            assert record['step'] == '测试 步骤' and record['run_id'] == profiler.run_id
+
+            # 与其他步骤共享进程（线程池执行）时不采集进程级指标
+            (success, _), shared = profiler.run('线程步骤', step, [input_file], [output_file], shared_process=True)
+            assert success and shared['shared_process'] and not metrics['shared_process']
+            assert all(shared[key] is None for key in ('cpu_seconds', 'peak_rss_mb', 'read_mb', 'write_mb')), shared
+            assert shared['peak_rss_is_step'] is False and shared['rows_out'] == 40 and shared['wall_seconds'] > 0
+            print(format_metrics(shared))
+
+        print("✅ 步骤指标采集正确")
+        return True
+
+    except Exception as e:
+        print(f"❌ 步骤指标采集测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_compare_runs():
+    """测试历次运行对比：只标出超过相对阈值且超过最小绝对变化的指标"""
+    print("\n" + "=" * 60)
+    print("测试历次运行对比")
+    print("=" * 60)
+
+    try:
+        from step_profiler import StepProfiler, compare_runs, print_comparison
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            log_file = os.path.join(tmp_dir, 'profile.jsonl')
+            for i, (wall, rss) in enumerate([(10.0, 500.0), (11.0, 510.0), (10.5, 490.0), (20.0, 505.0)]):
+                profiler = StepProfiler(log_file, run_id=f"run{i}")
+                profiler.append('DID回归', '成功', {'wall_seconds': wall, 'cpu_seconds': 0.1, 'peak_rss_mb': rss})
+                profiler.append('添加GDP', '成功', {'wall_seconds': 2.0 + 0.1 * i, 'cpu_seconds': 0.1,
+                                                   'peak_rss_mb': 100.0})
+
+            report = compare_runs(log_file)
+            print_comparison(report)
+            flagged = set(zip(report.loc[report['regression'], 'step'], report.loc[report['regression'], 'metric']))
+            assert flagged == {('DID回归', 'wall_seconds')}, flagged
+            row = report[(report['step'] == 'DID回归') & (report['metric'] == 'wall_seconds')].iloc[0]
+            assert row['baseline'] == 10.5 and abs(row['change'] - 20 / 10.5 + 1) < 1e-12
+
+            # 指定较早的运行时只和它之前的运行比较
+            assert not compare_runs(log_file, run_id='run2')['regression'].any()
+            assert compare_runs(log_file, run_id='不存在').empty
+
+        print("✅ 历次运行对比正确")
+        return True
+
+    except Exception as e:
+        print(f"❌ 历次运行对比测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_pipeline_profile_log():
+    """测试流水线执行时把步骤指标写入执行日志和JSONL性能日志"""
+    print("\n" + "=" * 60)
+    print("测试流水线性能日志")
+    print("=" * 60)
+
+    try:
+        from pipeline import PatentAnalysisPipeline
+        from step_profiler import load_profile_log
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.makedirs(os.path.join(tmp_dir, 'patent_analysis'))
+            pd.DataFrame({'x': range(30)}).to_excel(os.path.join(tmp_dir, 'raw.xlsx'), index=False)
+
+            def halve():
+                df = pd.read_excel(os.path.join(tmp_dir, 'raw.xlsx'))
+                df.iloc[:15].to_excel(os.path.join(tmp_dir, 'half.xlsx'), index=False)
+                return True, "完成"
+
+            pipeline = PatentAnalysisPipeline(tmp_dir, incremental=False)
+            pipeline.pipeline_steps = [{'name': 'halve', 'function': halve, 'input_files': ['raw.xlsx'],
+                                        'output_files': ['half.xlsx'], 'description': '取前一半',
+                                        'pipeline': 'patent'}]
+            assert pipeline.run_pipeline()
+
+            entry = pipeline.pipeline_log[-1]
+            assert entry['rows_in'] == 30 and entry['rows_out'] == 15, entry
+            assert 'cpu_seconds' in entry and 'peak_rss_mb' in entry
+            log = load_profile_log(pipeline.profiler.log_file)
+            assert list(log['step']) == ['halve'] and log['run_id'].iloc[0] == pipeline.profiler.run_id
+            saved = pd.read_excel(os.path.join(tmp_dir, 'patent_analysis', 'pipeline_log.xlsx'))
+            assert 'cpu_seconds' in saved.columns
+
+        print("✅ 流水线性能日志正确")
+        return True
+
+    except Exception as e:
+        print(f"❌ 流水线性能日志测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def main():
+    """主测试函数"""
+    print("流水线步骤性能剖析测试")
+    print("=" * 60)
+
+    tests = [
+        ("步骤指标采集", test_step_metrics),
+        ("历次运行对比", test_compare_runs),
+        ("流水线性能日志", test_pipeline_profile_log),
+    ]
+
+    success_count = 0
+    for test_name, test_func in tests:
+        if test_func():
+            success_count += 1
+            print(f"✅ {test_name} 测试通过")
+        else:
+            print(f"❌ {test_name} 测试失败")
+
+    print("\n" + "=" * 60)
+    print(f"成功测试: {success_count}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
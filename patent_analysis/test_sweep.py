@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试稳健性检验参数扫描 sweep.py
+"""
+
+import sys
+import os
+import tempfile
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+
+
+def make_regress_data(n=400, seed=0):
+    """生成每家公司一行的模拟回归数据（带GDP数据的回归数据格式）"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        '公司名称': [f'公司{i}' for i in range(n)],
+        '省份': rng.choice(['广东省', '浙江省', '江苏省', '北京市'], n),
+        '投资年份': rng.integers(2012, 2019, n),
+        'treatment': (rng.random(n) < 0.4).astype(int),
+    })
+    for k in range(1, 4):
+        df[f'前3年专利数_前{k}年'] = rng.poisson(3, n)
+        df[f'后3年专利数_后{k}年'] = rng.poisson(3 + 2 * df['treatment'])
+        for prefix, suffix in (('前3年GDP', f'前{k}年'), ('后3年GDP', f'后{k}年')):
+            gdp = rng.uniform(1e4, 1e5, n)
+            df[f'{prefix}_{suffix}'] = gdp
+            df[f'ln_{prefix}_{suffix}'] = np.log(gdp + 1)
+    return df
+
+
+def test_expand_grid():
+    """测试参数网格展开和参数校验"""
+    print("=" * 60)
+    print("测试参数网格展开")
+    print("=" * 60)
+
+    try:
+        from sweep import expand_grid, _key
+
+        variants = expand_grid({'window': [1, 2, 3], 'provinces': [None, 'did'], 'engine': ['panelols', 'hdfe']})
+        assert len(variants) == 12
+        assert len({_key(v, 'sample') for v in variants}) == 2
+        assert len({_key(v, 'estimate') for v in variants}) == 12
+
+        for bad_grid in ({'min_year': [2000]}, {'engine': ['streaming']}):
+            try:
+                expand_grid(bad_grid)
+                print(f"❌ 未拒绝不支持的参数: {bad_grid}")
+                return False
+            except ValueError:
+                pass
+
+        print("✅ 参数网格展开正确")
+        return True
+
+    except Exception as e:
+        print(f"❌ 参数网格展开测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_sweep_shares_upstream():
+    """测试上游步骤只运行一次、变体并行估计、结果与单独回归一致"""
+    print("\n" + "=" * 60)
+    print("测试参数扫描")
+    print("=" * 60)
+
+    try:
+        from pipeline import PatentAnalysisPipeline
+        from sweep import run_sweep
+        from did import perform_did_regression_with_year_dummies
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.makedirs(os.path.join(tmp_dir, 'patent_analysis'))
+            calls = []
+
+            def prepare():
+                calls.append('prepare')
+                with pd.ExcelWriter(os.path.join(tmp_dir, 'regress.xlsx'), engine='openpyxl') as writer:
+                    make_regress_data().to_excel(writer, sheet_name='回归数据', index=False)
+                return True, "完成"
+
+            def did_step():
+                calls.append('did')
+                return True, "完成"
+
+            pipeline = PatentAnalysisPipeline(tmp_dir)
+            pipeline.pipeline_steps = [
+                {'name': 'prepare', 'function': prepare, 'input_files': [], 'output_files': ['regress.xlsx'],
+                 'description': '准备回归数据', 'pipeline': 'patent'},
+                {'name': 'did', 'function': did_step, 'sources': ['did'], 'input_files': ['regress.xlsx'],
+                 'output_files': ['did.xlsx'], 'description': 'DID回归', 'pipeline': 'patent'},
+            ]
+
+            grid = {'window': [2, 3], 'provinces': [None, ['广东', '浙江']], 'engine': ['panelols', 'hdfe']}
+            output_file = os.path.join(tmp_dir, 'sweep.xlsx')
+            table = run_sweep(grid, pipeline=pipeline, n_jobs=2, output_file=output_file)
+            assert calls == ['prepare'], calls
+            assert len(table) == 8 and (table['状态'] == '成功').all(), table['状态']
+            assert os.path.exists(output_file)
+
+            full = table[table['provinces'] == '-']
+            subset = table[table['provinces'] == '广东、浙江']
+            assert subset['样本公司数'].max() < full['样本公司数'].min()
+            assert full.loc[full['window'] == 2, 'nobs'].max() < full.loc[full['window'] == 3, 'nobs'].min()
+
+            # 窗口为3、全样本、panelols的变体与直接回归一致
+            direct = perform_did_regression_with_year_dummies(data=make_regress_data())
+            row = table[(table['window'] == 3) & (table['provinces'] == '-') & (table['engine'] == 'panelols')].iloc[0]
+            assert np.isclose(row['did_effect'], direct['did_effect']), (row['did_effect'], direct['did_effect'])
+
+            # 再次扫描：上游步骤沿用增量执行清单，不再运行
+            table = run_sweep({'window': [1, 3]}, pipeline=pipeline, n_jobs=1)
+            assert calls == ['prepare'], calls
+            assert (table['状态'] == '成功').all()
+
+        print("✅ 参数扫描正确")
+        return True
+
+    except Exception as e:
+        print(f"❌ 参数扫描测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_sweep_cli_jobs():
+    """测试命令行--sweep把--jobs原样传给run_sweep（默认1为串行）"""
+    print("\n" + "=" * 60)
+    print("测试参数扫描的--jobs")
+    print("=" * 60)
+
+    import sweep
+    original = sweep.run_sweep
+    try:
+        from pipeline import main as pipeline_main
+
+        received = []
+
+        def fake_run_sweep(grid, pipeline=None, n_jobs=None, **kwargs):
+            received.append(n_jobs)
+            return pd.DataFrame({'状态': ['成功']})
+
+        sweep.run_sweep = fake_run_sweep
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            grid_file = os.path.join(tmp_dir, 'grid.json')
+            with open(grid_file, 'w', encoding='utf-8') as f:
+                f.write('{"window": [1, 3]}')
+            assert pipeline_main(['--base-dir', tmp_dir, '--sweep', grid_file]) == 0
+            assert pipeline_main(['--base-dir', tmp_dir, '--sweep', grid_file, '--jobs', '3']) == 0
+        assert received == [1, 3], received
+
+        print("✅ --jobs原样传给参数扫描")
+        return True
+
+    except Exception as e:
+        print(f"❌ 参数扫描--jobs测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        sweep.run_sweep = original
+
+
+def main():
+    """主测试函数"""
+    print("稳健性检验参数扫描测试")
+    print("=" * 60)
+
+    tests = [
+        ("参数网格展开", test_expand_grid),
+        ("参数扫描", test_sweep_shares_upstream),
+        ("参数扫描--jobs", test_sweep_cli_jobs),
+    ]
+
+    success_count = 0
+    for test_name, test_func in tests:
+        if test_func():
+            success_count += 1
+            print(f"✅ {test_name} 测试通过")
+        else:
+            print(f"❌ {test_name} 测试失败")
+
+    print("\n" + "=" * 60)
+    print(f"成功测试: {success_count}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
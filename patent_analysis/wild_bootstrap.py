@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+野聚类自助法（wild cluster bootstrap, WCR）
+聚类数较少（如按省份聚类只有约30个聚类）时，解析聚类标准误的t检验严重过度拒绝。
+本模块在原假设约束下的残差上做野自助法：吸收固定效应后的X̃、约束残差和(X'X)^{-1}只计算一次，
+B次自助法的系数和聚类标准误都表示为权重矩阵W（B × 聚类数）的线性函数，
+每个分块只需一次矩阵乘法，各分块再分配到进程池中并行计算
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+WEBB_WEIGHTS = np.array([-np.sqrt(1.5), -1.0, -np.sqrt(0.5), np.sqrt(0.5), 1.0, np.sqrt(1.5)])
+
+
+def draw_weights(rng, n_draws, n_clusters, weight_type='rademacher'):
+    """
+    生成 (n_draws × n_clusters) 的自助法权重矩阵
+
+    参数:
+    rng: numpy随机数生成器
+    weight_type: 'rademacher'（±1等概率）或'webb'（六点分布，聚类数很少时使用）
+    """
+    if weight_type == 'rademacher':
+        return rng.integers(0, 2, size=(n_draws, n_clusters), dtype=np.int8).astype(float) * 2 - 1
+    if weight_type == 'webb':
+        return WEBB_WEIGHTS[rng.integers(0, 6, size=(n_draws, n_clusters))]
+    raise ValueError(f"未知的权重类型: {weight_type}")
+
+
+def _bootstrap_chunk(a, S, P, correction, weight_type, n_draws, seed):
+    """
+    计算一个分块的自助法t统计量
+
+    第b次自助法中 β*_j - r = w_b'a，第g个聚类的得分 = w_bg a_g - (w_b'S) P_g'，
+    因此整块只需 W @ a 和 W @ S 两次矩阵乘法
+    """
+    rng = np.random.default_rng(seed)
+    W = draw_weights(rng, n_draws, len(a), weight_type)
+    numerator = W @ a
+    scores = W * a[None, :] - (W @ S) @ P.T
+    variance = correction * (scores ** 2).sum(axis=1)
+    return numerator / np.sqrt(variance)
+
+
+def wild_cluster_bootstrap(df, dependent, regressors, param='treatment_post', cluster='province',
+                           absorb=None, reps=9999, weight_type='rademacher', null=0.0,
+                           seed=None, n_jobs=None, chunk_size=2000, weights=None, constant=True):
+    """
+    对单个系数做约束野聚类自助法t检验
+
+    参数:
+    df: 数据
+    dependent: 被解释变量
+    regressors: 解释变量列表（需包含param）
+    param: 检验的系数
+    cluster: 聚类变量（如'province'）
+    absorb: 吸收的固定效应，与hdfe.fit_hdfe相同
+    reps: 自助法次数B
+    weight_type: 'rademacher'或'webb'
+    null: 原假设下的系数取值
+    seed: 随机种子（分块种子由它派生，结果与n_jobs无关）
+    n_jobs: 进程数，1时串行，None时使用全部CPU
+    chunk_size: 每个分块的自助法次数
+    weights: 观测权重列名（加权回归时与估计使用相同的权重），None为等权
+    constant: 没有固定效应时是否包含常数项，与hdfe.fit_hdfe相同
+
+    返回:
+    dict: 系数、解析聚类标准误、t值、自助法p值、临界值和自助法t统计量分布
+    """
+    from hdfe import fit_hdfe, _get_column
+
+    results = fit_hdfe(df, dependent, regressors, absorb=absorb, cluster=cluster, weights=weights, constant=constant)
+    if param not in results.params.index:
+        raise ValueError(f"系数{param}不在回归结果中（可能被固定效应吸收）")
+
+    X = results.demeaned_X
+    y = results.demeaned_y
+    if weights is not None:
+        # 加权最小二乘等价于对√w·X̃、√w·ỹ做OLS，聚类得分X̃'Wu也相同
+        root_w = np.sqrt(np.asarray(_get_column(df, weights), dtype=float)[results.sample_mask])
+        X = X * root_w[:, None]
+        y = y * root_w
+    codes = results.cluster_codes
+    G = results.n_clusters
+    n, k = X.shape
+    j = results.params.index.get_loc(param)
+
+    # 原假设约束下的估计和残差
+    others = np.delete(np.arange(k), j)
+    y_restricted = y - null * X[:, j]
+    if len(others):
+        beta_restricted, *_ = np.linalg.lstsq(X[:, others], y_restricted, rcond=None)
+        u = y_restricted - X[:, others] @ beta_restricted
+    else:
+        u = y_restricted
+
+    # 只计算一次的量
+    Q = np.linalg.pinv(X.T @ X)
+    q = Q[:, j]
+    S = np.zeros((G, k))
+    np.add.at(S, codes, X * u[:, None])                     # s_g = X_g'u_g
+    M = np.zeros((G, k, k))
+    np.add.at(M, codes, X[:, :, None] * X[:, None, :])      # M_g = X_g'X_g
+    a = S @ q
+    P = np.einsum('j,gjl->gl', q, M) @ Q                    # P_g = q'M_g Q
+
+    df_resid = max(n - k - results.dof_absorbed, 1)
+    correction = G / (G - 1) * (n - 1) / df_resid
+    t_stat = (results.params[param] - null) / results.std_errors[param]
+
+    n_chunks = max(int(np.ceil(reps / chunk_size)), 1)
+    sizes = [chunk_size] * (n_chunks - 1) + [reps - chunk_size * (n_chunks - 1)]
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    tasks = [(a, S, P, correction, weight_type, size, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+
+    if n_jobs == 1 or n_chunks == 1:
+        chunks = [_bootstrap_chunk(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            chunks = list(executor.map(_bootstrap_chunk, *zip(*tasks)))
+    t_boot = np.concatenate(chunks)
+
+    return {
+        'param': param,
+        'coef': results.params[param],
+        'std_error': results.std_errors[param],
+        't_stat': t_stat,
+        'pvalue': float(np.mean(np.abs(t_boot) >= abs(t_stat))),
+        'critical_value_95': float(np.quantile(np.abs(t_boot), 0.95)),
+        'n_clusters': G,
+        'reps': reps,
+        'weight_type': weight_type,
+        't_boot': t_boot,
+    }
+
+
+def print_bootstrap_result(result):
+    """打印自助法检验结果"""
+    print(f"   - 野聚类自助法 ({result['weight_type']}, B={result['reps']:,}, {result['n_clusters']} 个聚类):")
+    print(f"     {result['param']}: 系数={result['coef']:.4f}, 聚类标准误={result['std_error']:.4f}, "
+          f"t值={result['t_stat']:.4f}")
+    print(f"     自助法p值={result['pvalue']:.4f}, 自助法5%临界值={result['critical_value_95']:.4f}")
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+省份名称统一解析
+各数据源里省份的写法不一致（'广西'、'广西壮族自治区'、'中国|广东省|深圳市'、'北京'/'北京市'），
+这里用一张预先编译好的别名字典把它们统一映射为省级行政区划代码，再按需要转换成各种名称口径
+"""
+
+import numbers
+from functools import lru_cache
+
+import pandas as pd
+
+# (行政区划代码, 简称, 统计口径名称, 全称)
+# 统计口径名称与gdp.xlsx的'省级'列、invest.xlsx的'地区'列保持一致
+PROVINCES = [
+    (110000, '北京', '北京市', '北京市'),
+    (120000, '天津', '天津市', '天津市'),
+    (130000, '河北', '河北省', '河北省'),
+    (140000, '山西', '山西省', '山西省'),
+    (150000, '内蒙古', '内蒙古', '内蒙古自治区'),
+    (210000, '辽宁', '辽宁省', '辽宁省'),
+    (220000, '吉林', '吉林省', '吉林省'),
+    (230000, '黑龙江', '黑龙江省', '黑龙江省'),
+    (310000, '上海', '上海市', '上海市'),
+    (320000, '江苏', '江苏省', '江苏省'),
+    (330000, '浙江', '浙江省', '浙江省'),
+    (340000, '安徽', '安徽省', '安徽省'),
+    (350000, '福建', '福建省', '福建省'),
+    (360000, '江西', '江西省', '江西省'),
+    (370000, '山东', '山东省', '山东省'),
+    (410000, '河南', '河南省', '河南省'),
+    (420000, '湖北', '湖北省', '湖北省'),
+    (430000, '湖南', '湖南省', '湖南省'),
+    (440000, '广东', '广东省', '广东省'),
+    (450000, '广西', '广西', '广西壮族自治区'),
+    (460000, '海南', '海南省', '海南省'),
+    (500000, '重庆', '重庆市', '重庆市'),
+    (510000, '四川', '四川省', '四川省'),
+    (520000, '贵州', '贵州省', '贵州省'),
+    (530000, '云南', '云南省', '云南省'),
+    (540000, '西藏', '西藏', '西藏自治区'),
+    (610000, '陕西', '陕西省', '陕西省'),
+    (620000, '甘肃', '甘肃省', '甘肃省'),
+    (630000, '青海', '青海省', '青海省'),
+    (640000, '宁夏', '宁夏', '宁夏回族自治区'),
+    (650000, '新疆', '新疆', '新疆维吾尔自治区'),
+    (710000, '台湾', '台湾', '台湾省'),
+    (810000, '香港', '香港', '香港特别行政区'),
+    (820000, '澳门', '澳门', '澳门特别行政区'),
+]
+
+# 31个内地省级行政区
+MAINLAND_PROVINCE_CODES = frozenset(code for code, *_ in PROVINCES if code < 700000)
+
+_NAME_STYLES = {'short': 1, 'stat': 2, 'full': 3}
+_CODE_TO_ROW = {row[0]: row for row in PROVINCES}
+
+
+def _build_alias_table():
+    """构建 别名 -> 代码 的查找表"""
+    aliases = {}
+    for code, short, stat, full in PROVINCES:
+        for alias in (short, stat, full, short + '省', short + '市', short + '自治区', str(code)):
+            aliases[alias] = code
+    return aliases
+
+
+_ALIAS_TO_CODE = _build_alias_table()
+_MAX_ALIAS_LEN = max(len(alias) for alias in _ALIAS_TO_CODE)
+
+# 地区字符串中不代表省份的层级
+_SKIP_PARTS = {'中国', '中华人民共和国'}
+
+
+def _match_text(text):
+    """先精确匹配，再按最长前缀匹配（如'广东省深圳市南山区'）"""
+    code = _ALIAS_TO_CODE.get(text)
+    if code is not None:
+        return code
+    for length in range(min(len(text), _MAX_ALIAS_LEN), 1, -1):
+        code = _ALIAS_TO_CODE.get(text[:length])
+        if code is not None:
+            return code
+    return None
+
+
+@lru_cache(maxsize=None)
+def _resolve_cached(value):
+    if isinstance(value, numbers.Real):
+        if value != value:  # NaN
+            return None
+        return int(value) if int(value) in _CODE_TO_ROW else None
+
+    text = str(value).strip()
+    if not text:
+        return None
+
+    # 地区格式通常是: "中国|省份|城市|区县"
+    if '|' in text:
+        for part in text.split('|'):
+            part = part.strip()
+            if part and part not in _SKIP_PARTS:
+                return _match_text(part)
+        return None
+
+    return _match_text(text)
+
+
+def resolve_province(value):
+    """
+    把任意写法的省份解析为行政区划代码
+
+    参数:
+    value: 省份名称/地区字符串/行政区划代码
+
+    返回:
+    int行政区划代码，无法识别时返回None
+    """
+    if value is None:
+        return None
+    try:
+        return _resolve_cached(value)
+    except TypeError:
+        # 不可哈希的值
+        return None
+
+
+def province_name(value, style='stat'):
+    """
+    把任意写法的省份转换为指定口径的名称
+
+    参数:
+    value: 省份名称/地区字符串/行政区划代码
+    style: 'short'简称（北京）、'stat'统计口径（北京市/广西）、'full'全称（广西壮族自治区）
+
+    返回:
+    省份名称，无法识别时返回None
+    """
+    code = resolve_province(value)
+    if code is None:
+        return None
+    return _CODE_TO_ROW[code][_NAME_STYLES[style]]
+
+
+def resolve_province_series(series, to='code'):
+    """
+    批量解析一列省份，只对去重后的取值做一次解析
+
+    参数:
+    series: 省份列
+    to: 'code'返回行政区划代码（可空整数），'short'/'stat'/'full'返回对应口径的名称
+
+    返回:
+    与series索引一致的Series
+    """
+    codes, uniques = pd.factorize(series)
+    resolved = [resolve_province(value) for value in uniques]
+
+    if to == 'code':
+        lookup = pd.array(resolved + [None], dtype='Int64')
+    else:
+        column = _NAME_STYLES[to]
+        lookup = pd.array([_CODE_TO_ROW[code][column] if code is not None else None
+                           for code in resolved] + [None], dtype=object)
+
+    # factorize对缺失值返回-1，正好取到末尾的None
+    return pd.Series(lookup[codes], index=series.index, name=series.name)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Excel读取的磁盘缓存
+openpyxl解析xlsx每个文件要几秒到几分钟，而各脚本反复读取的是同一批工作簿（gdp.xlsx、invest.xlsx、
+govfund_filtered.xlsx、regress_data_with_gdp.xlsx、各省统计年鉴表等）。
+read_table第一次读取某个工作表时把结果另存为旁路缓存文件，之后文件未变化（路径、工作表、读取参数、
+大小和修改时间都相同）时直接读缓存文件。
+缓存文件优先用Parquet（需要安装pyarrow或fastparquet，且表格能转换为Parquet，如列名都是字符串），
+否则用pickle；缓存目录总大小超过上限时按最近使用时间淘汰（LRU）。
+环境变量：TABLE_CACHE_DIR（缓存目录）、TABLE_CACHE_MAX_MB（总大小上限）、TABLE_CACHE=0（禁用缓存）
+"""
+
+import os
+import json
+import hashlib
+import importlib
+
+import pandas as pd
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.table_cache')
+DEFAULT_MAX_MB = 2048
+
+_config = {
+    'cache_dir': os.environ.get('TABLE_CACHE_DIR', DEFAULT_CACHE_DIR),
+    'max_bytes': int(float(os.environ.get('TABLE_CACHE_MAX_MB', DEFAULT_MAX_MB)) * 1024 * 1024),
+    'enabled': os.environ.get('TABLE_CACHE', '1') != '0',
+}
+_parquet_engine = []
+
+CACHE_SUFFIXES = ('.parquet', '.pkl')
+
+
+def configure(cache_dir=None, max_mb=None, enabled=None):
+    """
+    修改缓存设置（未给出的参数保持不变）
+
+    参数:
+    cache_dir: 缓存目录
+    max_mb: 缓存目录总大小上限（MB）
+    enabled: 是否启用缓存
+    """
+    if cache_dir is not None:
+        _config['cache_dir'] = cache_dir
+    if max_mb is not None:
+        _config['max_bytes'] = int(max_mb * 1024 * 1024)
+    if enabled is not None:
+        _config['enabled'] = enabled
+
+
+def _has_parquet_engine():
+    """是否安装了Parquet引擎（结果只检测一次）"""
+    if not _parquet_engine:
+        available = False
+        for module in ('pyarrow', 'fastparquet'):
+            try:
+                importlib.import_module(module)
+                available = True
+                break
+            except ImportError:
+                continue
+        _parquet_engine.append(available)
+    return _parquet_engine[0]
+
+
+def cache_key(path, sheet_name=0, **kwargs):
+    """缓存键：文件绝对路径、工作表、读取参数、文件大小和修改时间的哈希"""
+    full_path = os.path.abspath(path)
+    stat = os.stat(full_path)
+    payload = [full_path, repr(sheet_name), sorted((k, repr(v)) for k, v in kwargs.items()),
+               stat.st_size, stat.st_mtime_ns]
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _cached_file(key):
+    """已有的缓存文件路径，没有时返回None"""
+    for suffix in CACHE_SUFFIXES:
+        path = os.path.join(_config['cache_dir'], key + suffix)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _load(cache_file):
+    if cache_file.endswith('.parquet'):
+        return pd.read_parquet(cache_file)
+    return pd.read_pickle(cache_file)
+
+
+def _store(key, df):
+    """写入缓存文件（先写临时文件再替换，并发读取时不会读到半个文件），返回缓存文件路径"""
+    cache_dir = _config['cache_dir']
+    os.makedirs(cache_dir, exist_ok=True)
+    if _has_parquet_engine():
+        target = os.path.join(cache_dir, key + '.parquet')
+        tmp_file = f"{target}.{os.getpid()}.tmp"
+        try:
+            df.to_parquet(tmp_file)
+            os.replace(tmp_file, target)
+            return target
+        except Exception:
+            # 列名不是字符串、同一列混有数字和文字等无法写成Parquet的表格改用pickle
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+    target = os.path.join(cache_dir, key + '.pkl')
+    tmp_file = f"{target}.{os.getpid()}.tmp"
+    df.to_pickle(tmp_file)
+    os.replace(tmp_file, target)
+    return target
+
+
+def evict(max_bytes=None):
+    """
+    缓存目录总大小超过上限时，按最近使用时间从旧到新删除缓存文件
+
+    返回:
+    删除的文件数
+    """
+    max_bytes = _config['max_bytes'] if max_bytes is None else max_bytes
+    cache_dir = _config['cache_dir']
+    if not os.path.isdir(cache_dir):
+        return 0
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(CACHE_SUFFIXES):
+            stat = os.stat(os.path.join(cache_dir, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def clear_cache():
+    """删除全部缓存文件"""
+    return evict(max_bytes=0)
+
+
+def read_table(path, sheet_name=0, **kwargs):
+    """
+    带磁盘缓存的pd.read_excel（参数与pd.read_excel相同）
+
+    参数:
+    path: Excel文件路径
+    sheet_name: 工作表名或编号；None或列表（读取多个工作表）时不缓存
+    **kwargs: 传给pd.read_excel的其他参数，参数不同的读取分别缓存
+
+    返回:
+    DataFrame
+    """
+    if not _config['enabled'] or sheet_name is None or isinstance(sheet_name, (list, tuple)):
+        return pd.read_excel(path, sheet_name=sheet_name, **kwargs)
+
+    key = cache_key(path, sheet_name, **kwargs)
+    cache_file = _cached_file(key)
+    if cache_file is not None:
+        try:
+            df = _load(cache_file)
+            # 更新修改时间，作为LRU淘汰的最近使用时间
+            os.utime(cache_file, None)
+            return df
+        except Exception:
+            # 缓存文件损坏或被其他进程淘汰时重新解析
+            pass
+
+    df = pd.read_excel(path, sheet_name=sheet_name, **kwargs)
+    try:
+        _store(key, df)
+        evict()
+    except Exception as e:
+        print(f"⚠️ 表格缓存写入失败（不影响读取结果）: {e}")
+    return df
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试省份名称统一解析模块 province.py
+"""
+
+import pandas as pd
+import traceback
+
+def test_province_variants():
+    """测试不同写法的省份解析"""
+    print("=== 测试不同写法的省份解析 ===")
+
+    try:
+        from province import resolve_province, province_name
+
+        cases = [
+            ('广西', 450000),
+            ('广西壮族自治区', 450000),
+            ('中国|广东省|深圳市', 440000),
+            ('中国|广东省|深圳市|南山区', 440000),
+            ('北京', 110000),
+            ('北京市', 110000),
+            ('黑龙江省', 230000),
+            ('新疆维吾尔自治区', 650000),
+            ('广东省深圳市', 440000),
+            (440000, 440000),
+            ('中国', None),
+            ('', None),
+            (None, None),
+            (float('nan'), None),
+        ]
+
+        all_ok = True
+        for value, expected in cases:
+            code = resolve_province(value)
+            ok = code == expected
+            all_ok = all_ok and ok
+            print(f"  {'✓' if ok else '✗'} {value!r} -> {code}")
+
+        # 名称口径
+        name_cases = [
+            (('广西壮族自治区', 'stat'), '广西'),
+            (('中国|江苏省|南京市', 'stat'), '江苏省'),
+            (('北京市', 'short'), '北京'),
+            (('广西', 'full'), '广西壮族自治区'),
+        ]
+        for (value, style), expected in name_cases:
+            name = province_name(value, style)
+            ok = name == expected
+            all_ok = all_ok and ok
+            print(f"  {'✓' if ok else '✗'} {value!r} [{style}] -> {name}")
+
+        return all_ok
+
+    except Exception as e:
+        print(f"  ✗ 省份解析测试失败: {e}")
+        traceback.print_exc()
+        return False
+
+def test_province_series():
+    """测试批量解析"""
+    print("\n=== 测试批量解析 ===")
+
+    try:
+        from province import resolve_province_series
+
+        series = pd.Series(['广西', '中国|广东省|深圳市', None, '火星', '广西'], index=[5, 6, 7, 8, 9])
+
+        codes = resolve_province_series(series)
+        names = resolve_province_series(series, to='stat')
+
+        print(f"  代码: {codes.tolist()}")
+        print(f"  名称: {names.tolist()}")
+
+        ok = (codes.index.equals(series.index)
+              and codes.tolist()[:2] == [450000, 440000]
+              and codes.isna().tolist() == [False, False, True, True, False]
+              and names.tolist()[:2] == ['广西', '广东省'])
+        print(f"  {'✓' if ok else '✗'} 批量解析结果正确")
+        return ok
+
+    except Exception as e:
+        print(f"  ✗ 批量解析测试失败: {e}")
+        traceback.print_exc()
+        return False
+
+def main():
+    """主函数"""
+    print("province.py 功能测试")
+    print("=" * 50)
+
+    test1 = test_province_variants()
+    test2 = test_province_series()
+
+    print("\n" + "=" * 50)
+    print("测试结果总结:")
+    print(f"  省份写法解析: {'✓ 通过' if test1 else '✗ 失败'}")
+    print(f"  批量解析: {'✓ 通过' if test2 else '✗ 失败'}")
+
+if __name__ == "__main__":
+    main()
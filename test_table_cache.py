@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试Excel读取的磁盘缓存 table_cache.py
+"""
+
+import os
+import time
+import tempfile
+import traceback
+
+import pandas as pd
+
+
+def _write_workbook(path, values):
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        pd.DataFrame({'省份': ['广东省', '浙江省', '江苏省'][:len(values)], 'GDP': values}).to_excel(
+            writer, sheet_name='gdp', index=False)
+        pd.DataFrame({2020: [1.5], 2021: [2.5]}).to_excel(writer, sheet_name='年份列', index=False)
+
+
+def _cache_files(cache_dir):
+    if not os.path.isdir(cache_dir):
+        return []
+    return sorted(name for name in os.listdir(cache_dir) if not name.endswith('.tmp'))
+
+
+def test_read_table_cache():
+    """测试缓存命中、读取参数分别缓存、文件修改后重新解析、禁用缓存"""
+    print("=== 测试旁路缓存读取 ===")
+
+    try:
+        import table_cache
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_dir = os.path.join(tmp_dir, 'cache')
+            table_cache.configure(cache_dir=cache_dir, max_mb=64, enabled=True)
+            path = os.path.join(tmp_dir, 'gdp.xlsx')
+            _write_workbook(path, [100.0, 200.0])
+
+            first = table_cache.read_table(path, sheet_name='gdp')
+            assert len(_cache_files(cache_dir)) == 1, _cache_files(cache_dir)
+            second = table_cache.read_table(path, sheet_name='gdp')
+            pd.testing.assert_frame_equal(first, second)
+            assert len(_cache_files(cache_dir)) == 1
+
+            # 列名不是字符串的表格也能缓存（无法写成Parquet时用pickle）
+            years = table_cache.read_table(path, sheet_name='年份列')
+            pd.testing.assert_frame_equal(years, table_cache.read_table(path, sheet_name='年份列'))
+            assert list(years.columns) == [2020, 2021], years.columns
+
+            # 读取参数不同分别缓存
+            subset = table_cache.read_table(path, sheet_name='gdp', usecols=['GDP'])
+            assert list(subset.columns) == ['GDP']
+            assert len(_cache_files(cache_dir)) == 3, _cache_files(cache_dir)
+
+            # 文件修改后重新解析
+            time.sleep(0.01)
+            _write_workbook(path, [300.0, 400.0, 500.0])
+            third = table_cache.read_table(path, sheet_name='gdp')
+            assert third['GDP'].tolist() == [300.0, 400.0, 500.0], third
+
+            # 缓存文件损坏时重新解析
+            for name in _cache_files(cache_dir):
+                with open(os.path.join(cache_dir, name), 'wb') as f:
+                    f.write(b'broken')
+            assert table_cache.read_table(path, sheet_name='gdp')['GDP'].tolist() == [300.0, 400.0, 500.0]
+
+            # 禁用缓存时不写缓存文件
+            table_cache.clear_cache()
+            table_cache.configure(enabled=False)
+            table_cache.read_table(path, sheet_name='gdp')
+            assert _cache_files(cache_dir) == []
+
+        print("  ✓ 旁路缓存读取正确")
+        return True
+
+    except Exception as e:
+        print(f"  ✗ 旁路缓存读取测试失败: {e}")
+        traceback.print_exc()
+        return False
+    finally:
+        import table_cache
+        table_cache.configure(cache_dir=table_cache.DEFAULT_CACHE_DIR, max_mb=table_cache.DEFAULT_MAX_MB, enabled=True)
+
+
+def test_lru_eviction():
+    """测试缓存目录超过上限时淘汰最久未使用的缓存文件"""
+    print("\n=== 测试缓存淘汰 ===")
+
+    try:
+        import table_cache
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_dir = os.path.join(tmp_dir, 'cache')
+            table_cache.configure(cache_dir=cache_dir, max_mb=64, enabled=True)
+            paths = []
+            for i in range(3):
+                path = os.path.join(tmp_dir, f'table{i}.xlsx')
+                _write_workbook(path, [float(i), float(i + 1)])
+                paths.append(path)
+                table_cache.read_table(path, sheet_name='gdp')
+
+            files = {path: table_cache._cached_file(table_cache.cache_key(path, 'gdp')) for path in paths}
+            # 依次设置最近使用时间：table0最新，table1最旧
+            now = time.time()
+            for offset, path in ((300, paths[1]), (200, paths[2]), (100, paths[0])):
+                os.utime(files[path], (now - offset, now - offset))
+
+            sizes = {path: os.path.getsize(files[path]) for path in paths}
+            removed = table_cache.evict(max_bytes=sizes[paths[0]] + sizes[paths[2]])
+            assert removed == 1, removed
+            assert not os.path.exists(files[paths[1]])
+            assert os.path.exists(files[paths[0]]) and os.path.exists(files[paths[2]])
+
+            assert table_cache.clear_cache() == 2
+            assert _cache_files(cache_dir) == []
+
+        print("  ✓ 缓存淘汰正确")
+        return True
+
+    except Exception as e:
+        print(f"  ✗ 缓存淘汰测试失败: {e}")
+        traceback.print_exc()
+        return False
+    finally:
+        import table_cache
+        table_cache.configure(cache_dir=table_cache.DEFAULT_CACHE_DIR, max_mb=table_cache.DEFAULT_MAX_MB, enabled=True)
+
+
+def main():
+    """主函数"""
+    print("table_cache.py 功能测试")
+    print("=" * 50)
+
+    test1 = test_read_table_cache()
+    test2 = test_lru_eviction()
+
+    print("\n" + "=" * 50)
+    print("测试结果总结:")
+    print(f"  旁路缓存读取: {'✓ 通过' if test1 else '✗ 失败'}")
+    print(f"  缓存淘汰: {'✓ 通过' if test2 else '✗ 失败'}")
+
+if __name__ == "__main__":
+    main()